@@ -23,6 +23,33 @@ const libreofficeApp =
       }
     : null
 
+// 常驻拆分服务：按CPU核数启动各自独立的 soffice 实例（端口 2102 起），
+// 保持连接并把拆分任务分给空闲实例；拆分API带 engine=libreoffice|hybrid 时
+// split_docx_pages_unified.py 经 LIBREOFFICE_SPLIT_SERVICE 把任务交给它
+const splitServiceApp =
+  platform !== 'win32'
+    ? {
+        name: 'libreoffice-split-service',
+        script: './server/api/files/libreoffice_split_service.py',
+        args: '--listen=127.0.0.1:2012 --instances=auto',
+        interpreter: 'python3',
+        autorestart: true,
+        restart_delay: 3000,
+        kill_timeout: 15000,
+        error_file: './logs/split-service-err.log',
+        out_file: './logs/split-service-out.log',
+        time: true,
+        env: {
+          SOFFICE_FARM_MAX_JOBS: 50,
+          SOFFICE_FARM_MAX_MEMORY_MB: 1024,
+          SOFFICE_FARM_HANG_TIMEOUT: 300,
+          // 单次UNO调用的截止时间，应小于 SOFFICE_FARM_HANG_TIMEOUT
+          LIBREOFFICE_CALL_TIMEOUT: 60,
+          LIBREOFFICE_LOAD_TIMEOUT: 180,
+        },
+      }
+    : null
+
 // 应用配置
 const apps = [
   {
@@ -37,6 +64,7 @@ const apps = [
       DEEPSEEK_API_KEY: process.env.DEEPSEEK_API_KEY,
       LIBREOFFICE_HOST: '127.0.0.1',
       LIBREOFFICE_PORT: 2002,
+      LIBREOFFICE_SPLIT_SERVICE: platform !== 'win32' ? '127.0.0.1:2012' : '',
     },
     env_production: {
       NODE_ENV: 'production',
@@ -56,5 +84,8 @@ const apps = [
 if (libreofficeApp) {
   apps.push(libreofficeApp)
 }
+if (splitServiceApp) {
+  apps.push(splitServiceApp)
+}
 
 module.exports = { apps }
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Excel修改引擎基准测试
+
+为 ExcelProcessor（modify_excel.py）和 ExcelSequenceProcessor
+（modify_excel_by_sequence.py）生成确定性的合成负载并分阶段计时：
+- 工作簿：1k ~ 1M 行，最多 300 列，可选合并单元格和虚高的 max_row
+- AI结果：与工作簿对应的Markdown表格，命中率可控（运行后核对实际匹配行数）
+- 每个阶段单独计时，结果写为JSON，并与保存的基线（scripts/bench_excel_baseline.json）比较
+
+完全离线运行，只依赖 openpyxl（requirements.txt 中已有）。
+
+用法:
+    python scripts/bench_excel_modify.py --preset smoke
+    python scripts/bench_excel_modify.py --rows 1000 10000 --cols 10 300 --output bench.json
+    python scripts/bench_excel_modify.py --preset default --update-baseline
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+from typing import List, Dict, Any, Optional, Tuple
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.worksheet.cell_range import CellRange
+
+FILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server', 'api', 'files')
+sys.path.insert(0, os.path.abspath(FILES_DIR))
+
+import modify_excel  # noqa: E402
+import modify_excel_by_sequence  # noqa: E402
+from excel_sidecar import load_snapshot, sidecar_path_for  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_excel_baseline.json')
+
+PRESETS = {
+    'smoke': {'rows': [1000], 'cols': [10]},
+    'default': {'rows': [1000, 10000, 100000], 'cols': [10, 50]},
+    'large': {'rows': [1000, 10000, 100000, 1000000], 'cols': [10, 100, 300]},
+}
+
+# AI表格中出现的列，与真实的清单表头一致
+AI_HEADERS = ['序号', '名称', '品牌', '型号', '数量', '单位', '备注']
+UNITS = ['个', '台', '套', '米', '根', '块', '组', '批']
+# 未命中行的数量取值从这里开始，工作簿中的数量在 1-999 之间
+MISS_QUANTITY_BASE = 10 ** 6
+MISS_REMARK = '缺失行'
+
+
+# ============================================================================
+# 确定性生成器
+# ============================================================================
+
+def generate_workbook(path: str, rows: int, cols: int, seed: int,
+                      merged: int = 0, bloat: int = 0) -> List[List[Any]]:
+    """
+    生成合成工作簿
+
+    第1行为标题，第2行为表头，数据从第3行开始。
+
+    Args:
+        path: 输出路径
+        rows: 数据行数
+        cols: 总列数（不少于AI表头列数）
+        seed: 随机种子
+        merged: 在"备注"列中生成的纵向合并区域数量
+        bloat: 数据之后追加的空行数（只带格式），用于虚高 max_row
+
+    Returns:
+        数据行列表（只含AI表头对应的列），供生成AI结果使用
+    """
+    rng = random.Random(seed)
+    cols = max(cols, len(AI_HEADERS))
+    filler_headers = [f'扩展列{n}' for n in range(1, cols - len(AI_HEADERS) + 1)]
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('清单')
+    worksheet.append(['合成基准清单'])
+    worksheet.append(AI_HEADERS + filler_headers)
+
+    data_rows = []
+    for i in range(1, rows + 1):
+        row = [
+            i,
+            f'设备{rng.randrange(10 ** 6):06d}',
+            f'品牌{rng.randrange(500)}',
+            f'{rng.choice("ABCDEFGH")}{rng.randrange(10 ** 5)}-{rng.randrange(100)}',
+            rng.randrange(1, 1000),
+            rng.choice(UNITS),
+            None,
+        ]
+        data_rows.append(row)
+        filler = [rng.randrange(10 ** 6) if n % 2 else f'v{rng.randrange(10 ** 6)}'
+                  for n in range(len(filler_headers))]
+        worksheet.append(row + filler)
+
+    # 合并区域放在"备注"列，两行一组，互不重叠
+    remark_col = AI_HEADERS.index('备注') + 1
+    if merged and rows >= 2:
+        starts = rng.sample(range(0, rows // 2), min(merged, rows // 2))
+        for start in sorted(starts):
+            first = 3 + start * 2
+            worksheet.merged_cells.add(CellRange(
+                min_col=remark_col, min_row=first, max_col=remark_col, max_row=first + 1
+            ))
+
+    if bloat:
+        for _ in range(bloat - 1):
+            worksheet.append([])
+        styled = WriteOnlyCell(worksheet, value=None)
+        styled.font = Font(bold=True)
+        worksheet.append([styled])
+
+    workbook.save(path)
+    return data_rows
+
+
+def generate_ai_result(data_rows: List[List[Any]], ai_rows: int, hit_rate: float,
+                       seed: int) -> Tuple[str, int]:
+    """
+    生成与工作簿对应的Markdown AI结果
+
+    命中的行与工作簿中的行完全一致（只修改数量和备注）；
+    未命中的行每一列都写入工作簿中不存在的值：序号超出行数，文本列加"缺失"前缀，
+    数量不小于 MISS_QUANTITY_BASE，备注为非空的 MISS_REMARK（工作簿中备注为空），
+    保证两个引擎都匹配不到。
+
+    Returns:
+        (Markdown文本, 应匹配的行数)
+    """
+    rng = random.Random(seed + 1)
+    count = min(ai_rows, len(data_rows))
+    picked = sorted(rng.sample(range(len(data_rows)), count))
+    hits = set(rng.sample(picked, int(round(count * hit_rate))))
+
+    lines = ['以下是修改后的清单：', '',
+             '| ' + ' | '.join(AI_HEADERS) + ' |',
+             '|' + '---|' * len(AI_HEADERS)]
+    missing_seq = len(data_rows) + 1
+    for index in picked:
+        seq, name, brand, model, _, unit, _ = data_rows[index]
+        if index in hits:
+            cells = [seq, name, brand, model, rng.randrange(1, 1000), unit, '已核对']
+        else:
+            cells = [missing_seq, f'缺失{name}', f'缺失{brand}', f'缺失{model}',
+                     MISS_QUANTITY_BASE + missing_seq, f'缺失{unit}', MISS_REMARK]
+            missing_seq += 1
+        lines.append('| ' + ' | '.join(str(c) for c in cells) + ' |')
+    lines.append('')
+    return '\n'.join(lines), len(hits)
+
+
+# ============================================================================
+# 分阶段计时
+# ============================================================================
+
+class PhaseTimer:
+    """记录各阶段耗时"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+
+    def run(self, name: str, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+
+def bench_modify(excel_path: str, ai_result: str, use_cache: bool) -> Dict[str, Any]:
+    """按 ExcelProcessor.process 的步骤分阶段运行行级匹配引擎"""
+    timer = PhaseTimer()
+    config = modify_excel.ProcessingConfig(use_sidecar_cache=use_cache)
+    processor = modify_excel.ExcelProcessor(excel_path, ai_result, config)
+
+    tables = timer.run('extract', modify_excel.TableExtractor.extract_all_tables, ai_result)
+    processor.snapshot, processor.workbook = timer.run('load', load_snapshot, excel_path, use_cache)
+    if processor.workbook:
+        processor.worksheet = processor.workbook.active
+    for table_text in tables:
+        timer.run('match', processor.process_single_table, table_text)
+    if processor.statistics.matched_rows:
+        timer.run('save', processor.save_workbook)
+    processor.close()
+
+    return {'phases': timer.phases, 'matched_rows': processor.statistics.matched_rows,
+            'total_rows': processor.statistics.total_rows}
+
+
+def bench_sequence(excel_path: str, ai_result: str, use_cache: bool) -> Dict[str, Any]:
+    """按 ExcelSequenceProcessor.process 的步骤分阶段运行序号匹配引擎"""
+    module = modify_excel_by_sequence
+    timer = PhaseTimer()
+    config = module.ProcessingConfig(use_sidecar_cache=use_cache)
+    processor = module.ExcelSequenceProcessor(excel_path, ai_result, config)
+
+    tables = timer.run('extract', module.TableExtractor.extract_all_tables, ai_result)
+    processor.snapshot, processor.workbook = timer.run('load', load_snapshot, excel_path, use_cache)
+    if processor.workbook:
+        processor.worksheet = processor.workbook.active
+    info = timer.run('locate', module.SequenceColumnLocator.locate_sequence_column,
+                     processor.snapshot, config.max_header_search_rows)
+    if info is None:
+        processor.close()
+        raise RuntimeError('合成工作簿中未找到序号列')
+    matcher = timer.run('index', module.SequenceMatcher,
+                        processor.snapshot, info.column_index, info.header_row)
+    for table in tables:
+        timer.run('match', processor.process_single_table, table, matcher, info.column_headers)
+    if processor.statistics.matched_rows:
+        timer.run('save', processor.save_workbook)
+    processor.close()
+
+    return {'phases': timer.phases, 'matched_rows': processor.statistics.matched_rows,
+            'total_rows': processor.statistics.total_rows}
+
+
+ENGINES = {
+    'modify': bench_modify,
+    'sequence': bench_sequence,
+}
+
+
+# ============================================================================
+# 基线比较
+# ============================================================================
+
+def compare_with_baseline(results: Dict[str, Any], baseline: Dict[str, Any],
+                          threshold: float, min_delta: float) -> List[str]:
+    """
+    与基线比较，返回回归描述列表
+
+    某阶段耗时超过 基线 × (1 + threshold) 且绝对差值超过 min_delta 秒时视为回归。
+    """
+    regressions = []
+    baseline_cases = baseline.get('cases', {})
+    for key, case in results['cases'].items():
+        base_case = baseline_cases.get(key)
+        if not base_case:
+            continue
+        for phase, seconds in case['phases'].items():
+            base_seconds = base_case['phases'].get(phase)
+            if base_seconds is None:
+                continue
+            if seconds > base_seconds * (1 + threshold) and seconds - base_seconds > min_delta:
+                regressions.append(
+                    f"{key} [{phase}]: {seconds:.3f}s > 基线 {base_seconds:.3f}s "
+                    f"(+{(seconds / base_seconds - 1) * 100 if base_seconds else float('inf'):.0f}%)"
+                )
+    return regressions
+
+
+# ============================================================================
+# 主函数
+# ============================================================================
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Excel修改引擎基准测试')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='smoke', help='规模预设')
+    parser.add_argument('--rows', type=int, nargs='+', help='数据行数列表（覆盖预设）')
+    parser.add_argument('--cols', type=int, nargs='+', help='列数列表（覆盖预设，最大300）')
+    parser.add_argument('--engines', nargs='+', choices=sorted(ENGINES), default=sorted(ENGINES))
+    parser.add_argument('--ai-rows', type=int, default=200, help='AI结果中的数据行数')
+    parser.add_argument('--hit-rate', type=float, default=0.9, help='AI行命中率 [0, 1]')
+    parser.add_argument('--merged', type=int, default=50, help='合并单元格区域数量')
+    parser.add_argument('--bloat', type=int, default=0, help='追加的空行数（虚高max_row）')
+    parser.add_argument('--seed', type=int, default=20240105, help='随机种子')
+    parser.add_argument('--output', help='结果JSON输出路径（默认输出到stdout）')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基线JSON路径')
+    parser.add_argument('--update-baseline', action='store_true', help='用本次结果覆盖基线')
+    parser.add_argument('--threshold', type=float, default=0.25, help='回归阈值（相对基线的增幅）')
+    parser.add_argument('--min-delta', type=float, default=0.05, help='忽略小于该秒数的差异')
+    parser.add_argument('--keep', action='store_true', help='保留生成的临时文件')
+    args = parser.parse_args(argv)
+
+    args.rows = args.rows or PRESETS[args.preset]['rows']
+    args.cols = args.cols or PRESETS[args.preset]['cols']
+    if any(c > 300 or c < 1 for c in args.cols):
+        parser.error('列数必须在 1-300 之间')
+    if not 0.0 <= args.hit_rate <= 1.0:
+        parser.error('命中率必须在 0-1 之间')
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+
+    # 引擎的逐行日志会干扰计时
+    logging.getLogger().setLevel(logging.ERROR)
+
+    workdir = tempfile.mkdtemp(prefix='bench_excel_')
+    original_cwd = os.getcwd()
+    results: Dict[str, Any] = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'ai_rows': args.ai_rows,
+            'hit_rate': args.hit_rate,
+            'merged': args.merged,
+            'bloat': args.bloat,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'cases': {},
+    }
+
+    try:
+        # 引擎把结果写到相对路径 uploads/modified
+        os.chdir(workdir)
+        for rows in args.rows:
+            for cols in args.cols:
+                excel_path = os.path.join(workdir, f'bench_{rows}x{cols}.xlsx')
+                print(f"生成工作簿 {rows} 行 × {cols} 列...", file=sys.stderr)
+                gen_start = time.perf_counter()
+                data_rows = generate_workbook(excel_path, rows, cols, args.seed,
+                                              merged=args.merged, bloat=args.bloat)
+                ai_result, expected_hits = generate_ai_result(data_rows, args.ai_rows, args.hit_rate, args.seed)
+                gen_seconds = time.perf_counter() - gen_start
+                del data_rows
+
+                for engine in args.engines:
+                    # cold: 不使用sidecar；warm: 先生成sidecar再计时命中路径
+                    for mode in ('cold', 'warm'):
+                        sidecar = sidecar_path_for(excel_path)
+                        if os.path.exists(sidecar):
+                            os.remove(sidecar)
+                        if mode == 'warm':
+                            snapshot, workbook = load_snapshot(excel_path, True)
+                            snapshot.close()
+                            if workbook:
+                                workbook.close()
+
+                        key = f"{engine}/rows={rows}/cols={cols}/{mode}"
+                        print(f"运行 {key}...", file=sys.stderr)
+                        case = ENGINES[engine](excel_path, ai_result, mode == 'warm')
+                        case['phases']['total'] = sum(case['phases'].values())
+                        case['generate_seconds'] = gen_seconds
+                        results['cases'][key] = case
+                        phases = ', '.join(f"{k}={v:.3f}s" for k, v in case['phases'].items())
+                        print(f"  {phases} (匹配 {case['matched_rows']}/{case['total_rows']})",
+                              file=sys.stderr)
+                        # 匹配行数与命中行数不符时计时没有可比性（负载不是请求的命中率）
+                        if case['matched_rows'] != expected_hits:
+                            raise RuntimeError(f"{key}: 匹配了 {case['matched_rows']} 行，"
+                                               f"应为命中的 {expected_hits} 行")
+                        case['expected_hits'] = expected_hits
+    finally:
+        os.chdir(original_cwd)
+        if not args.keep:
+            import shutil
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    payload = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        print(f"基线已更新: {args.baseline}", file=sys.stderr)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"未找到基线 {args.baseline}，跳过回归比较（使用 --update-baseline 生成）", file=sys.stderr)
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare_with_baseline(results, baseline, args.threshold, args.min_delta)
+    if regressions:
+        print(f"✗ 检测到 {len(regressions)} 处性能回归（阈值 {args.threshold * 100:.0f}%）:", file=sys.stderr)
+        for line in regressions:
+            print(f"  {line}", file=sys.stderr)
+        return 1
+
+    print("✓ 未检测到性能回归", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
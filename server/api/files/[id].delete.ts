@@ -1,6 +1,7 @@
 import { promises as fs } from 'fs'
 import { join } from 'path'
 import type { FileInfo } from '~/types'
+import { removeContentCacheEntries } from '~/server/utils/fileCleanup'
 
 const UPLOAD_DIR = join(process.cwd(), 'uploads')
 
@@ -20,14 +21,24 @@ export default defineEventHandler(async (event) => {
     const metaContent = await fs.readFile(metaPath, 'utf-8')
     const fileInfo = JSON.parse(metaContent) as FileInfo
     
-    // Delete actual file
+    // Delete actual file (split cache entries are keyed by its content hash,
+    // so drop them first while the file can still be hashed)
     const filePath = join(UPLOAD_DIR, fileInfo.name)
+    await removeContentCacheEntries(filePath)
     try {
       await fs.unlink(filePath)
     } catch (error) {
       console.warn(`Could not delete file ${filePath}:`, error)
     }
     
+    // Delete sidecar cache written by the Excel modify scripts
+    const sidecarPath = join(UPLOAD_DIR, `${fileId}.sheetcache`)
+    try {
+      await fs.unlink(sidecarPath)
+    } catch {
+      // Sidecar only exists for processed workbooks, ignore
+    }
+    
     // Delete metadata file
     await fs.unlink(metaPath)
     
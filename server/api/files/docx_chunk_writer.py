@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+zip级DOCX分块写出器
+
+拆分时每个分块只需要重新生成 word/document.xml（源文档body的一个切片），
+其余part（styles.xml、numbering.xml、settings.xml、theme、fontTable、
+页眉页脚、图片等）直接按源文件中的压缩数据原样拷贝，不解压也不重新序列化。
+源文件只读取一次，之后每个分块只是一次小的写入。
+
+每个分块只写出自己用到的关系和part：统计body切片和节设置中引用的
+r:embed / r:id / r:link，document.xml.rels中只保留这些图片、超链接、
+嵌入对象、页眉页脚等内容关系（样式、编号、设置等结构关系始终保留），
+再从保留的关系出发收集可达的part，[Content_Types].xml随之重写。
+图片较多的文档，每个分块的大小和写入量只与分块自身的内容有关。
+
+用法:
+    writer = DocxChunkWriter(input_path)
+    blocks = writer.body_blocks()
+    writer.write_chunk(out_path, blocks[0:100])
+    writer.close()
+"""
+
+import copy
+import zlib
+import struct
+import zipfile
+import posixpath
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from lxml import etree
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+CONTENT_TYPES_PART = '[Content_Types].xml'
+PACKAGE_RELS_PART = '_rels/.rels'
+DOCUMENT_PART = 'word/document.xml'
+
+# 由正文内容引用、可以按分块裁剪的关系类型（关系类型URI的最后一段）
+CONTENT_REL_TYPES = frozenset((
+    'image', 'hyperlink', 'oleObject', 'package', 'chart', 'control',
+    'diagramData', 'diagramLayout', 'diagramQuickStyle', 'diagramColors', 'diagramDrawing',
+    'header', 'footer', 'video', 'audio', 'media', 'subDocument', 'aFChunk',
+))
+
+# 元素子树中所有关系引用属性（r:*，以及VML的o:relid）
+_REL_REFERENCES = etree.XPath('.//@*[namespace-uri()=$r or local-name()="relid"]')
+
+# 按顺序拷贝的body子元素：段落、表格、内容控件
+BODY_BLOCK_TAGS = (f'{{{W_NS}}}p', f'{{{W_NS}}}tbl', f'{{{W_NS}}}sdt')
+SECT_PR_TAG = f'{{{W_NS}}}sectPr'
+BODY_TAG = f'{{{W_NS}}}body'
+
+# 超过该大小的压缩数据不常驻内存，每次写出时从源文件读取
+RAW_CACHE_LIMIT = 1024 * 1024
+
+_LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+_LOCAL_HEADER_SIGNATURE = b'PK\003\004'
+_CENTRAL_HEADER = struct.Struct('<4s4B4HL2L5H2L')
+_CENTRAL_HEADER_SIGNATURE = b'PK\001\002'
+_END_RECORD = struct.Struct('<4s4H2LH')
+_END_RECORD_SIGNATURE = b'PK\005\006'
+_ZIP64_END_RECORD = struct.Struct('<4sQ2H2L4Q')
+_ZIP64_END_RECORD_SIGNATURE = b'PK\006\006'
+_ZIP64_LOCATOR = struct.Struct('<4sLQL')
+_ZIP64_LOCATOR_SIGNATURE = b'PK\006\007'
+_ZIP64_EXTRA_ID = 0x0001
+_FLAG_ENCRYPTED = 0x01
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+# 超过该值的大小和偏移写入ZIP64扩展字段（与zipfile一致）
+_ZIP64_LIMIT = zipfile.ZIP64_LIMIT
+_ZIP64_VERSION = 45
+_DEFAULT_VERSION = 20
+
+
+class _Relationship(NamedTuple):
+    rid: str
+    kind: str                 # 关系类型URI的最后一段，如 image、styles
+    target: str               # 内部关系为包内part名（无前导/），外部关系为原始地址
+    external: bool
+    element: object           # 原始 Relationship 元素，用于重写rels
+
+
+def rels_part_for(part_name: str) -> str:
+    """返回part对应的关系文件名，如 word/document.xml → word/_rels/document.xml.rels"""
+    directory, name = posixpath.split(part_name)
+    return posixpath.join(directory, '_rels', f'{name}.rels')
+
+
+def _parse_rels(xml: bytes, source_part: str):
+    """解析关系文件，返回 (根元素, 关系列表)"""
+    root = etree.fromstring(xml)
+    base = posixpath.dirname(source_part)
+    relationships = []
+    for element in root:
+        target = element.get('Target', '')
+        external = element.get('TargetMode') == 'External'
+        if not external:
+            if target.startswith('/'):
+                target = target.lstrip('/')
+            else:
+                target = posixpath.normpath(posixpath.join(base, target))
+        relationships.append(_Relationship(
+            rid=element.get('Id', ''),
+            kind=element.get('Type', '').rsplit('/', 1)[-1],
+            target=target,
+            external=external,
+            element=element,
+        ))
+    return root, relationships
+
+
+def resolve_document_part(archive: zipfile.ZipFile) -> str:
+    """按包级关系找到主文档part，缺失时使用 word/document.xml"""
+    try:
+        _, package_rels = _parse_rels(archive.read(PACKAGE_RELS_PART), '')
+    except KeyError:
+        return DOCUMENT_PART
+    for rel in package_rels:
+        if rel.kind == 'officeDocument' and not rel.external:
+            return rel.target
+    return DOCUMENT_PART
+
+
+def collect_rel_references(elements: Iterable) -> Set[str]:
+    """收集元素子树中引用的所有rId"""
+    referenced: Set[str] = set()
+    for element in elements:
+        referenced.update(str(value) for value in _REL_REFERENCES(element, r=R_NS))
+    return referenced
+
+
+class _ChunkZip:
+    """
+    分块DOCX的zip写出器
+
+    zipfile没有公开的"写入已压缩数据"接口，这里自己写本地文件头、中央目录和
+    （需要时的）ZIP64记录，只读取源条目ZipInfo的公开字段。源条目的数据描述符
+    不保留：CRC和大小取自源文件的中央目录，直接写在本地文件头中。
+    """
+
+    def __init__(self, path: str):
+        self._fp = open(path, 'wb')
+        self._central: List[bytes] = []
+
+    def write_raw(self, info: zipfile.ZipInfo, raw: bytes) -> None:
+        """写出源条目的原始压缩数据（不解压、不重新压缩）"""
+        self._write(info, raw, info.compress_type, info.CRC, info.file_size,
+                    info.flag_bits & ~_FLAG_DATA_DESCRIPTOR)
+
+    def write_bytes(self, info: zipfile.ZipInfo, data: bytes) -> None:
+        """按 info 的文件名、时间和属性写出一段数据（deflate压缩）"""
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        raw = compressor.compress(data) + compressor.flush()
+        self._write(info, raw, zipfile.ZIP_DEFLATED, zlib.crc32(data), len(data), 0)
+
+    def _write(self, info: zipfile.ZipInfo, raw: bytes, method: int, crc: int, size: int, flags: int) -> None:
+        try:
+            name = info.filename.encode('ascii')
+            flags &= ~_FLAG_UTF8
+        except UnicodeEncodeError:
+            name = info.filename.encode('utf-8')
+            flags |= _FLAG_UTF8
+        year, month, day, hour, minute, second = info.date_time
+        dos_date = (max(year, 1980) - 1980) << 9 | month << 5 | day
+        dos_time = hour << 11 | minute << 5 | second // 2
+        offset = self._fp.tell()
+        compressed = len(raw)
+
+        zip64_sizes = size > _ZIP64_LIMIT or compressed > _ZIP64_LIMIT
+        version = max(info.extract_version, _ZIP64_VERSION if zip64_sizes else _DEFAULT_VERSION)
+        local_extra = struct.pack('<2H2Q', _ZIP64_EXTRA_ID, 16, size, compressed) if zip64_sizes else b''
+        field_size, field_compressed = (0xFFFFFFFF, 0xFFFFFFFF) if zip64_sizes else (size, compressed)
+        self._fp.write(_LOCAL_HEADER.pack(
+            _LOCAL_HEADER_SIGNATURE, version, 0, flags, method, dos_time, dos_date,
+            crc, field_compressed, field_size, len(name), len(local_extra)))
+        self._fp.write(name)
+        self._fp.write(local_extra)
+        self._fp.write(raw)
+
+        central_values = [size, compressed] if zip64_sizes else []
+        field_offset = offset
+        if offset > _ZIP64_LIMIT:
+            central_values.append(offset)
+            field_offset = 0xFFFFFFFF
+            version = max(version, _ZIP64_VERSION)
+        central_extra = b''
+        if central_values:
+            central_extra = struct.pack(f'<2H{len(central_values)}Q', _ZIP64_EXTRA_ID,
+                                        8 * len(central_values), *central_values)
+        self._central.append(_CENTRAL_HEADER.pack(
+            _CENTRAL_HEADER_SIGNATURE, version, info.create_system, version, 0, flags, method,
+            dos_time, dos_date, crc, field_compressed, field_size, len(name), len(central_extra), 0,
+            0, info.internal_attr, info.external_attr, field_offset) + name + central_extra)
+
+    def close(self) -> None:
+        """写出中央目录和目录结束记录"""
+        if self._fp.closed:
+            return
+        try:
+            start = self._fp.tell()
+            for record in self._central:
+                self._fp.write(record)
+            end = self._fp.tell()
+            count, size = len(self._central), end - start
+            if count >= 0xFFFF or size > _ZIP64_LIMIT or start > _ZIP64_LIMIT:
+                self._fp.write(_ZIP64_END_RECORD.pack(
+                    _ZIP64_END_RECORD_SIGNATURE, _ZIP64_END_RECORD.size - 12, _ZIP64_VERSION, _ZIP64_VERSION,
+                    0, 0, count, count, size, start))
+                self._fp.write(_ZIP64_LOCATOR.pack(_ZIP64_LOCATOR_SIGNATURE, 0, end, 1))
+                count, size, start = min(count, 0xFFFF), min(size, 0xFFFFFFFF), min(start, 0xFFFFFFFF)
+            self._fp.write(_END_RECORD.pack(_END_RECORD_SIGNATURE, 0, 0, count, count, size, start, 0))
+        finally:
+            self._fp.close()
+
+    def __enter__(self) -> '_ChunkZip':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+class DocxChunkWriter:
+    """
+    DOCX分块写出器
+
+    Args:
+        input_path: 源DOCX路径
+        document_element: 已解析好的 w:document 根元素（例如python-docx的
+                          doc.element），传入时不再重复解析document.xml
+        parse_document: 为False时不解析document.xml，只能用 write_document
+                        写出已生成好的document.xml（页面片段拼接）
+    """
+
+    def __init__(self, input_path: str, document_element=None, parse_document: bool = True):
+        self.input_path = input_path
+        self._archive = zipfile.ZipFile(input_path)
+        self._raw_file = open(input_path, 'rb')
+        self._entries = {info.filename: info for info in self._archive.infolist()}
+
+        # 所有part的关系表 {源part名: 关系列表}，包级关系的源part名为空字符串
+        self._rels: Dict[str, List[_Relationship]] = {}
+        self._document_rels_root = None
+        self.document_part = DOCUMENT_PART
+        if PACKAGE_RELS_PART in self._entries:
+            _, package_rels = _parse_rels(self._archive.read(PACKAGE_RELS_PART), '')
+            self._rels[''] = package_rels
+            for rel in package_rels:
+                if rel.kind == 'officeDocument' and not rel.external:
+                    self.document_part = rel.target
+        for name in self._entries:
+            if name.endswith('.rels') and name != PACKAGE_RELS_PART:
+                directory, rels_name = posixpath.split(name)
+                source_part = posixpath.join(posixpath.dirname(directory), rels_name[:-len('.rels')])
+                root, relationships = _parse_rels(self._archive.read(name), source_part)
+                self._rels[source_part] = relationships
+                if source_part == self.document_part:
+                    self._document_rels_root = root
+        self.document_rels_part = rels_part_for(self.document_part)
+
+        self._content_types = etree.fromstring(self._archive.read(CONTENT_TYPES_PART))
+
+        if document_element is None and parse_document:
+            document_element = etree.fromstring(self._archive.read(self.document_part))
+        self.root = document_element
+        self.body = self.root.find(BODY_TAG) if self.root is not None else None
+        self.sect_pr = self.body.find(SECT_PR_TAG) if self.body is not None else None
+
+        self._raw_cache: Dict[str, bytes] = {}
+
+    def body_blocks(self) -> List:
+        """按文档顺序返回body中的段落、表格和内容控件元素"""
+        if self.body is None:
+            return []
+        return [child for child in self.body if child.tag in BODY_BLOCK_TAGS]
+
+    def build_document_xml(self, blocks: Iterable, sect_pr=None, owned: bool = False) -> bytes:
+        """
+        由body切片生成 document.xml
+
+        根元素的命名空间声明和属性（如mc:Ignorable）沿用源文档，
+        body之外的子元素（如w:background）原样保留。
+
+        Args:
+            blocks: 源文档body元素的切片
+            sect_pr: 分块的节设置，默认使用源文档最后一节
+            owned: blocks是否为调用方已深拷贝、不再使用的元素（流式拆分），
+                   是则直接移入新文档，不再拷贝
+        """
+        root = etree.Element(self.root.tag, attrib=dict(self.root.attrib), nsmap=self.root.nsmap)
+        for child in self.root:
+            if child is self.body:
+                body = etree.SubElement(root, BODY_TAG)
+                for block in blocks:
+                    body.append(block if owned else copy.deepcopy(block))
+                sect_pr = self.sect_pr if sect_pr is None else sect_pr
+                if sect_pr is not None:
+                    body.append(copy.deepcopy(sect_pr))
+            else:
+                root.append(copy.deepcopy(child))
+        return etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+
+    def _chunk_parts(self, document_rels: List[_Relationship]) -> Set[str]:
+        """从包级关系和裁剪后的文档关系出发，收集分块需要写出的所有part"""
+        parts: Set[str] = {CONTENT_TYPES_PART, self.document_part}
+        pending = [rel for rel in self._rels.get('', []) if rel.target != self.document_part]
+        pending.extend(document_rels)
+        while pending:
+            rel = pending.pop()
+            if rel.external or rel.target in parts or rel.target not in self._entries:
+                continue
+            parts.add(rel.target)
+            pending.extend(self._rels.get(rel.target, ()))
+
+        for part in list(parts):
+            rels_name = rels_part_for(part)
+            if rels_name in self._entries:
+                parts.add(rels_name)
+        parts.add(PACKAGE_RELS_PART)
+        return parts
+
+    def _build_document_rels(self, document_rels: List[_Relationship]) -> bytes:
+        root = etree.Element(self._document_rels_root.tag, nsmap=self._document_rels_root.nsmap)
+        for rel in document_rels:
+            root.append(copy.deepcopy(rel.element))
+        return etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+
+    def _build_content_types(self, parts: Set[str]) -> bytes:
+        """只保留写出的part的Override，以及写出的part用到的扩展名Default"""
+        extensions = {posixpath.splitext(part)[1].lstrip('.').lower() for part in parts}
+        extensions.update(('rels', 'xml'))
+        root = etree.Element(self._content_types.tag, nsmap=self._content_types.nsmap)
+        for element in self._content_types:
+            if not isinstance(element.tag, str):
+                continue
+            local_name = etree.QName(element).localname
+            if local_name == 'Default':
+                if element.get('Extension', '').lower() not in extensions:
+                    continue
+            elif local_name == 'Override':
+                if element.get('PartName', '').lstrip('/') not in parts:
+                    continue
+            root.append(copy.deepcopy(element))
+        return etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+
+    def _read_raw(self, info: zipfile.ZipInfo) -> bytes:
+        """读取源文件中某个条目的压缩数据（不解压）"""
+        cached = self._raw_cache.get(info.filename)
+        if cached is not None:
+            return cached
+        self._raw_file.seek(info.header_offset)
+        header = _LOCAL_HEADER.unpack(self._raw_file.read(_LOCAL_HEADER.size))
+        if header[0] != _LOCAL_HEADER_SIGNATURE:
+            raise zipfile.BadZipFile(f'本地文件头损坏: {info.filename}')
+        name_length, extra_length = header[-2], header[-1]
+        self._raw_file.seek(info.header_offset + _LOCAL_HEADER.size + name_length + extra_length)
+        raw = self._raw_file.read(info.compress_size)
+        if info.compress_size <= RAW_CACHE_LIMIT:
+            self._raw_cache[info.filename] = raw
+        return raw
+
+    def _copy_entry(self, target: _ChunkZip, info: zipfile.ZipInfo) -> None:
+        """把源条目拷贝到目标zip：能原样拷贝压缩数据时不解压、不重新压缩"""
+        if info.flag_bits & _FLAG_ENCRYPTED:
+            target.write_bytes(info, self._archive.read(info))
+            return
+        target.write_raw(info, self._read_raw(info))
+
+    def write_chunk(self, out_path: str, blocks: Iterable, sect_pr=None, owned: bool = False) -> None:
+        """
+        写出一个分块DOCX
+
+        Args:
+            out_path: 输出路径
+            blocks: 源文档body元素的切片
+            sect_pr: 分块的节设置，默认使用源文档最后一节
+            owned: 见 build_document_xml
+        """
+        blocks = list(blocks)
+        sect_pr = self.sect_pr if sect_pr is None else sect_pr
+        document_xml = self.build_document_xml(blocks, sect_pr, owned)
+        referenced = None
+        if self._document_rels_root is not None:
+            referenced = collect_rel_references(blocks + ([sect_pr] if sect_pr is not None else []))
+            referenced |= self.shared_references()
+        self.write_document(out_path, document_xml, referenced)
+
+    def shared_references(self) -> Set[str]:
+        """body之外的元素（如w:background）和最后一节引用的rId，每个分块都需要"""
+        return collect_rel_references(
+            ([self.sect_pr] if self.sect_pr is not None else [])
+            + [child for child in self.root if child is not self.body]
+        )
+
+    def write_document(self, out_path: str, document_xml: bytes, referenced: Optional[Set[str]]) -> None:
+        """
+        用已生成的document.xml写出一个分块DOCX（页面片段拼接时使用）
+
+        Args:
+            out_path: 输出路径
+            document_xml: 分块的 document.xml
+            referenced: 分块引用的所有rId，用于裁剪关系和part
+        """
+        # 裁剪文档关系：内容关系只保留本分块引用到的
+        generated: Dict[str, bytes] = {self.document_part: document_xml}
+        parts: Optional[Set[str]] = None
+        if self._document_rels_root is not None:
+            referenced = referenced or set()
+            document_rels = [
+                rel for rel in self._rels.get(self.document_part, [])
+                if rel.kind not in CONTENT_REL_TYPES or rel.rid in referenced
+            ]
+            parts = self._chunk_parts(document_rels)
+            parts.add(self.document_rels_part)
+            generated[self.document_rels_part] = self._build_document_rels(document_rels)
+            generated[CONTENT_TYPES_PART] = self._build_content_types(parts)
+
+        with _ChunkZip(out_path) as target:
+            # 保持源文件中的part顺序（[Content_Types].xml在最前）
+            for info in self._archive.infolist():
+                if info.filename in generated:
+                    target.write_bytes(info, generated[info.filename])
+                elif parts is None or info.filename in parts:
+                    self._copy_entry(target, info)
+
+    def close(self) -> None:
+        """关闭源文件"""
+        self._raw_cache.clear()
+        self._raw_file.close()
+        self._archive.close()
+
+    def __enter__(self) -> 'DocxChunkWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
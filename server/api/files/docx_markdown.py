@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+body块 → Markdown（供AI分析直接使用，不生成DOCX）
+
+拆分结果的唯一用途往往是送进大模型，模型只需要文字和表格。
+MarkdownConverter 把顶层body块（段落、表格、内容控件）直接转成Markdown：
+
+    - 标题段落（样式或段落本身带大纲级别，或样式名为 heading N / 标题 N）转成 # 标题
+    - 带编号的段落（段落或样式带 numPr）转成 "- " 列表项（编号值需要排版计算，这里不还原）
+    - 表格转成管道表格，第一行作为表头，格式与 modify_excel_by_sequence.py
+      的 TableExtractor 解析的一致：单元格内的 | 替换为全角 ｜，换行替换为空格，
+      横向合并的单元格补空列，纵向合并的后续单元格留空，表头的空单元格填 列N
+    - 嵌套表格和文本框的文字并入所在单元格或段落
+
+用法:
+    converter = MarkdownConverter.for_input(input_path)
+    markdown = converter.blocks_to_markdown(blocks)
+"""
+
+import re
+import zipfile
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+from lxml import etree
+
+from docx_chunk_writer import W_NS
+
+_STYLES_PART = 'word/styles.xml'
+MAX_HEADING_LEVEL = 6
+
+
+def _w(tag: str) -> str:
+    return f'{{{W_NS}}}{tag}'
+
+
+_P = _w('p')
+_TBL = _w('tbl')
+_TR = _w('tr')
+_TC = _w('tc')
+_SDT = _w('sdt')
+_SDT_CONTENT = _w('sdtContent')
+_T = _w('t')
+_TAB = _w('tab')
+_BR = _w('br')
+_CR = _w('cr')
+_W_VAL = _w('val')
+
+# 样式名中的标题级别：heading 1 / Heading1 / 标题 1
+_HEADING_NAME_RE = re.compile(r'^(?:heading|标题)\s*(\d)$', re.IGNORECASE)
+_SPACES_RE = re.compile(r'\s+')
+
+
+def _outline_level(ppr) -> Optional[int]:
+    """pPr中的大纲级别（0-8），9表示正文"""
+    if ppr is None:
+        return None
+    outline = ppr.find(_w('outlineLvl'))
+    if outline is None:
+        return None
+    try:
+        return int(outline.get(_W_VAL))
+    except (TypeError, ValueError):
+        return None
+
+
+def _heading_styles(styles_root) -> Dict[str, int]:
+    """段落样式ID → 标题级别（1起），大纲级别沿basedOn继承"""
+    if styles_root is None:
+        return {}
+    own: Dict[str, Optional[int]] = {}
+    based_on: Dict[str, str] = {}
+    for style in styles_root.iter(_w('style')):
+        if style.get(_w('type')) != 'paragraph':
+            continue
+        style_id = style.get(_w('styleId'))
+        if not style_id:
+            continue
+        level = _outline_level(style.find(_w('pPr')))
+        name = style.find(_w('name'))
+        match = _HEADING_NAME_RE.match(name.get(_W_VAL, '').strip()) if name is not None else None
+        if level is None and match:
+            level = int(match.group(1)) - 1
+        own[style_id] = level
+        parent = style.find(_w('basedOn'))
+        if parent is not None and parent.get(_W_VAL):
+            based_on[style_id] = parent.get(_W_VAL)
+
+    result = {}
+    for style_id in own:
+        current, seen = style_id, set()
+        while current in own and current not in seen:
+            seen.add(current)
+            if own[current] is not None:
+                if own[current] < 9:
+                    result[style_id] = min(own[current] + 1, MAX_HEADING_LEVEL)
+                break
+            current = based_on.get(current)
+    return result
+
+
+def _numbered_styles(styles_root) -> FrozenSet[str]:
+    """自身带编号（pPr/numPr）的段落样式ID，如 List Bullet"""
+    if styles_root is None:
+        return frozenset()
+    return frozenset(
+        style.get(_w('styleId')) for style in styles_root.iter(_w('style'))
+        if style.get(_w('type')) == 'paragraph' and style.find(f'{_w("pPr")}/{_w("numPr")}') is not None
+    )
+
+
+def paragraph_text(paragraph) -> str:
+    """段落文字（含文本框等嵌套内容），制表符和换行转成空格"""
+    parts = []
+    for element in paragraph.iter(_T, _TAB, _BR, _CR):
+        if element.tag == _T:
+            if element.text:
+                parts.append(element.text)
+        else:
+            parts.append(' ')
+    return ''.join(parts).strip()
+
+
+def _cell_text(cell) -> str:
+    """单元格文字：段落之间、嵌套表格的单元格之间用空格连接"""
+    parts = []
+    for element in cell.iterchildren(_P, _TBL, _SDT):
+        if element.tag == _P:
+            parts.append(paragraph_text(element))
+        elif element.tag == _TBL:
+            for row in element.iterchildren(_TR):
+                parts.extend(_cell_text(child) for child in row.iterchildren(_TC))
+        else:
+            content = element.find(_SDT_CONTENT)
+            if content is not None:
+                parts.append(_cell_text(content))
+    text = _SPACES_RE.sub(' ', ' '.join(part for part in parts if part)).strip()
+    return text.replace('|', '｜')
+
+
+def _cell_span(cell) -> int:
+    span = cell.find(f'{_w("tcPr")}/{_w("gridSpan")}')
+    try:
+        return max(int(span.get(_W_VAL)), 1) if span is not None else 1
+    except (TypeError, ValueError):
+        return 1
+
+
+def _is_merged_continuation(cell) -> bool:
+    """纵向合并中除第一个之外的单元格（w:vMerge 不带 val 或 val="continue"）"""
+    merge = cell.find(f'{_w("tcPr")}/{_w("vMerge")}')
+    return merge is not None and merge.get(_W_VAL, 'continue') == 'continue'
+
+
+def table_rows(table) -> List[List[str]]:
+    """表格各行的单元格文字，按网格列展开合并单元格"""
+    rows = []
+    for row in table.iterchildren(_TR):
+        cells = []
+        for cell in row.iterchildren(_TC):
+            cells.append('' if _is_merged_continuation(cell) else _cell_text(cell))
+            cells.extend([''] * (_cell_span(cell) - 1))
+        rows.append(cells)
+    return rows
+
+
+def table_to_markdown(table) -> str:
+    """管道表格：第一行作为表头，各行补齐到相同列数"""
+    rows = [row for row in table_rows(table) if any(row)]
+    if not rows:
+        return ''
+    width = max(len(row) for row in rows)
+    rows = [row + [''] * (width - len(row)) for row in rows]
+    header = [cell or f'列{index}' for index, cell in enumerate(rows[0], start=1)]
+    lines = ['| ' + ' | '.join(header) + ' |', '|' + ' --- |' * width]
+    lines.extend('| ' + ' | '.join(row) + ' |' for row in rows[1:])
+    return '\n'.join(lines)
+
+
+class MarkdownConverter:
+    """
+    body块的Markdown转换器
+
+    Args:
+        styles_root: 已解析的 word/styles.xml 根元素（可为None，此时只按段落自身的大纲级别识别标题）
+    """
+
+    def __init__(self, styles_root=None):
+        self._heading_styles = _heading_styles(styles_root)
+        self._numbered_styles = _numbered_styles(styles_root)
+
+    @classmethod
+    def for_input(cls, input_path: str) -> 'MarkdownConverter':
+        """从DOCX中读取styles.xml（只读这一个part）"""
+        styles_root = None
+        with zipfile.ZipFile(input_path) as archive:
+            try:
+                styles_root = etree.fromstring(archive.read(_STYLES_PART))
+            except (KeyError, etree.XMLSyntaxError):
+                pass
+        return cls(styles_root)
+
+    def _heading_level(self, ppr) -> Optional[int]:
+        level = _outline_level(ppr)
+        if level is not None:
+            return min(level + 1, MAX_HEADING_LEVEL) if level < 9 else None
+        style = ppr.find(_w('pStyle')) if ppr is not None else None
+        if style is None:
+            return None
+        return self._heading_styles.get(style.get(_W_VAL))
+
+    def _is_list_item(self, ppr) -> bool:
+        if ppr is None:
+            return False
+        if ppr.find(_w('numPr')) is not None:
+            return True
+        style = ppr.find(_w('pStyle'))
+        return style is not None and style.get(_W_VAL) in self._numbered_styles
+
+    def paragraph_to_markdown(self, paragraph) -> str:
+        text = paragraph_text(paragraph)
+        if not text:
+            return ''
+        ppr = paragraph.find(_w('pPr'))
+        level = self._heading_level(ppr)
+        if level:
+            return '#' * level + ' ' + _SPACES_RE.sub(' ', text)
+        if self._is_list_item(ppr):
+            return '- ' + text
+        return text
+
+    def block_to_markdown(self, block) -> str:
+        """单个body块的Markdown，没有文字时返回空字符串"""
+        if block.tag == _P:
+            return self.paragraph_to_markdown(block)
+        if block.tag == _TBL:
+            return table_to_markdown(block)
+        if block.tag == _SDT:
+            content = block.find(_SDT_CONTENT)
+            if content is not None:
+                return self.blocks_to_markdown(content.iterchildren(_P, _TBL, _SDT))
+        return ''
+
+    def blocks_to_markdown(self, blocks: Iterable) -> str:
+        """多个body块的Markdown，块之间空一行"""
+        parts = (self.block_to_markdown(block) for block in blocks)
+        return '\n\n'.join(part for part in parts if part)
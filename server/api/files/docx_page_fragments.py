@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按页缓存的正文片段（拆分一次，任意页段直接拼接）
+
+第一次拆分某个文档时，把每个body块序列化一次，按文档顺序写入片段文件，
+并记录每个块在片段文件中的偏移、引用的rId、估算的token数和每页的起始块。
+之后无论换每文件页数、取任意页段、单页还是按token预算切块，
+都只需把对应的一段连续字节拼进 document.xml，交给
+DocxChunkWriter.write_document 按zip级写出，不再解析源文档，也不再分页。
+
+缓存按输入文件内容的SHA-256寻址，每个文档一个目录：
+    <缓存目录>/<sha256>/manifest.json   页码映射、每块偏移/rId/token数、document.xml首尾
+    <缓存目录>/<sha256>/fragments.bin   按页顺序拼接的片段（UTF-8 XML）
+
+缓存目录默认为上传目录下的 .fragmentcache，可通过环境变量调整：
+    SPLIT_FRAGMENT_CACHE=0               不保留片段（仍按片段拼接，用完即删）
+    SPLIT_FRAGMENT_CACHE_DIR=<目录>       缓存目录
+    SPLIT_FRAGMENT_CACHE_MAX_MB=1024      缓存总大小上限，超出时按最近使用时间淘汰
+
+命中时刷新 manifest.json 的mtime，fileCleanup.ts 按24小时规则清理长期未使用的目录。
+
+用法:
+    store = FragmentStore.for_input(input_path)
+    fragments = store.open(content_hash)
+    if fragments is None:
+        builder = store.builder(content_hash, writer, page_map)
+        for block in blocks:
+            builder.add(block)
+        fragments = builder.finish()
+    start, end = fragments.page_blocks(1, 30)
+    writer.write_document(out_path, fragments.document_xml(start, end), fragments.references(start, end))
+"""
+
+import os
+import json
+import mmap
+import shutil
+import logging
+from bisect import bisect_left
+from typing import List, Optional, Set, Tuple
+
+from lxml import etree
+
+from docx_chunk_writer import collect_rel_references
+from docx_page_map import PageMap
+from docx_token_budget import estimate_block_tokens
+
+logger = logging.getLogger(__name__)
+
+FRAGMENT_CACHE_ENV = 'SPLIT_FRAGMENT_CACHE'
+FRAGMENT_CACHE_DIR_ENV = 'SPLIT_FRAGMENT_CACHE_DIR'
+FRAGMENT_CACHE_MAX_MB_ENV = 'SPLIT_FRAGMENT_CACHE_MAX_MB'
+
+CACHE_DIRNAME = '.fragmentcache'
+MANIFEST_NAME = 'manifest.json'
+FRAGMENTS_NAME = 'fragments.bin'
+FRAGMENT_VERSION = 2
+DEFAULT_MAX_MB = 1024
+
+# 生成document.xml首尾时body中的占位注释
+_BODY_MARKER = 'page-fragments'
+
+
+def fragment_cache_enabled() -> bool:
+    return os.environ.get(FRAGMENT_CACHE_ENV, '1').strip().lower() not in ('0', 'false', 'no')
+
+
+def _max_bytes() -> int:
+    try:
+        return int(float(os.environ.get(FRAGMENT_CACHE_MAX_MB_ENV, DEFAULT_MAX_MB)) * 1024 * 1024)
+    except ValueError:
+        return DEFAULT_MAX_MB * 1024 * 1024
+
+
+def _namespace_declarations(root) -> List[bytes]:
+    """根元素上的命名空间声明；片段起始标签中与之相同的声明可以去掉"""
+    declarations = []
+    for prefix, uri in root.nsmap.items():
+        name = f'xmlns:{prefix}' if prefix else 'xmlns'
+        declarations.append(f' {name}="{uri}"'.encode('utf-8'))
+    return declarations
+
+
+def serialize_fragment(block, declarations: List[bytes]) -> bytes:
+    """
+    序列化单个body块
+
+    lxml单独序列化子元素时会在起始标签上重复声明所有祖先的命名空间，
+    拼接后的document.xml根元素已声明这些命名空间，这里把它们去掉。
+    """
+    xml = etree.tostring(block, encoding='UTF-8', with_tail=False)
+    end = xml.index(b'>')
+    start_tag = xml[:end]
+    for declaration in declarations:
+        start_tag = start_tag.replace(declaration, b'')
+    return start_tag + xml[end:]
+
+
+class PageFragments:
+    """一个文档的页面片段（只读）"""
+
+    def __init__(self, directory: str, manifest: dict):
+        self.directory = directory
+        self.total_pages = manifest['total_pages']
+        self.method = manifest['method']
+        self.block_count = manifest['block_count']
+        self._page_starts = manifest['page_starts']
+        self._block_offsets = manifest['block_offsets']
+        self.block_tokens: List[int] = manifest['block_tokens']
+        # 只记录引用了rId的块：[(块索引, [rId])]，按块索引升序
+        self._block_refs = [(int(index), refs) for index, refs in manifest['block_refs']]
+        self._ref_indexes = [index for index, _ in self._block_refs]
+        self._shared_refs = set(manifest['shared_refs'])
+        self._head = manifest['head'].encode('utf-8')
+        self._tail = manifest['tail'].encode('utf-8')
+        self._file = open(os.path.join(directory, FRAGMENTS_NAME), 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    @classmethod
+    def open(cls, directory: str, content_hash: str) -> Optional['PageFragments']:
+        """打开片段目录，不存在、损坏或内容哈希不符时返回None"""
+        manifest_path = os.path.join(directory, MANIFEST_NAME)
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"页面片段缓存无效，将重新生成: {directory}: {e}")
+            return None
+        if manifest.get('version') != FRAGMENT_VERSION or manifest.get('content_hash') != content_hash:
+            return None
+        try:
+            fragments = cls(directory, manifest)
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"页面片段缓存无效，将重新生成: {directory}: {e}")
+            return None
+        try:
+            os.utime(manifest_path)
+        except OSError:
+            pass
+        return fragments
+
+    def page_map(self) -> PageMap:
+        starts = {page: start for page, start in enumerate(self._page_starts, start=1)}
+        return PageMap.from_page_starts(starts, self.total_pages, self.method)
+
+    def page_blocks(self, start_page: int, end_page: int) -> Tuple[int, int]:
+        """起始页落在 [start_page, end_page] 内的body块切片 (起始索引, 结束索引)"""
+        return self._page_starts[start_page - 1], self._page_starts[end_page]
+
+    def document_xml(self, start: int, end: int) -> bytes:
+        """拼接body块 [start, end) 的 document.xml"""
+        body = self._data[self._block_offsets[start]:self._block_offsets[end]]
+        return b''.join((self._head, body, self._tail))
+
+    def references(self, start: int, end: int) -> Set[str]:
+        """body块 [start, end) 引用的所有rId（含body外元素和节设置引用的）"""
+        referenced = set(self._shared_refs)
+        for _, refs in self._block_refs[bisect_left(self._ref_indexes, start):bisect_left(self._ref_indexes, end)]:
+            referenced.update(refs)
+        return referenced
+
+    def close(self) -> None:
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+
+class PageFragmentBuilder:
+    """
+    按文档顺序接收body块并写出页面片段
+
+    Args:
+        directory: 最终的片段目录（先写到临时目录，完成后整体改名）
+        writer: 持有源文档外壳和最后一节节设置的 DocxChunkWriter
+        page_map: 页码映射
+        content_hash: 输入文件内容的SHA-256
+    """
+
+    def __init__(self, directory: str, writer, page_map: PageMap, content_hash: str):
+        self.directory = directory
+        self.content_hash = content_hash
+        self._page_map = page_map
+        self._declarations = _namespace_declarations(writer.root)
+
+        marker = etree.Comment(_BODY_MARKER)
+        shell = writer.build_document_xml([marker], owned=True)
+        self._head, self._tail = shell.split(f'<!--{_BODY_MARKER}-->'.encode('utf-8'), 1)
+        self._shared_refs = writer.shared_references()
+
+        self._tmp_dir = f"{directory}.{os.getpid()}.tmp"
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+        os.makedirs(self._tmp_dir)
+        self._file = open(os.path.join(self._tmp_dir, FRAGMENTS_NAME), 'wb')
+        self._block_offsets: List[int] = []
+        self._block_tokens: List[int] = []
+        self._block_refs: List[Tuple[int, List[str]]] = []
+        self._offset = 0
+
+    def add(self, block) -> None:
+        """追加下一个body块（调用方随后即可释放该块）"""
+        index = len(self._block_offsets)
+        self._block_offsets.append(self._offset)
+        data = serialize_fragment(block, self._declarations)
+        self._file.write(data)
+        self._offset += len(data)
+        self._block_tokens.append(estimate_block_tokens(block))
+        refs = collect_rel_references([block])
+        if refs:
+            self._block_refs.append((index, sorted(refs)))
+
+    def finish(self) -> PageFragments:
+        """写出manifest并把临时目录改名为片段目录"""
+        self._file.close()
+        page_starts = [start for _, start in sorted(self._page_map.page_starts().items())]
+        manifest = {
+            'version': FRAGMENT_VERSION,
+            'content_hash': self.content_hash,
+            'total_pages': self._page_map.total_pages,
+            'method': self._page_map.method,
+            'block_count': len(self._block_offsets),
+            # page_starts[p - 1] 为第p页的第一个块索引，最后一项为块总数
+            'page_starts': page_starts,
+            # block_offsets[i] 为第i个块在片段文件中的起始偏移，最后一项为文件大小
+            'block_offsets': self._block_offsets + [self._offset],
+            'block_tokens': self._block_tokens,
+            'block_refs': self._block_refs,
+            'shared_refs': sorted(self._shared_refs),
+            'head': self._head.decode('utf-8'),
+            'tail': self._tail.decode('utf-8'),
+        }
+        with open(os.path.join(self._tmp_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+
+        try:
+            os.replace(self._tmp_dir, self.directory)
+        except OSError:
+            # 其他进程已生成同一文档的片段（内容相同），使用已有目录
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+        return PageFragments(self.directory, manifest)
+
+    def abort(self) -> None:
+        self._file.close()
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+
+class FragmentStore:
+    """内容寻址的页面片段缓存目录"""
+
+    def __init__(self, cache_dir: str, max_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = _max_bytes() if max_bytes is None else max_bytes
+
+    @classmethod
+    def for_input(cls, input_path: str) -> 'FragmentStore':
+        """默认缓存目录：输入文件所在目录（即uploads）下的 .fragmentcache"""
+        cache_dir = os.environ.get(FRAGMENT_CACHE_DIR_ENV) or os.path.join(
+            os.path.dirname(os.path.abspath(input_path)), CACHE_DIRNAME)
+        return cls(cache_dir)
+
+    def path_for(self, content_hash: str) -> str:
+        return os.path.join(self.cache_dir, content_hash)
+
+    def open(self, content_hash: str) -> Optional[PageFragments]:
+        return PageFragments.open(self.path_for(content_hash), content_hash)
+
+    def builder(self, content_hash: str, writer, page_map: PageMap) -> PageFragmentBuilder:
+        """只在 open() 未命中时调用；残留的旧版本或损坏目录先删除，否则改名时会被当成已生成"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        shutil.rmtree(self.path_for(content_hash), ignore_errors=True)
+        return PageFragmentBuilder(self.path_for(content_hash), writer, page_map, content_hash)
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """总大小超过上限时，按manifest的mtime从旧到新删除文档目录，返回删除的目录数"""
+        entries = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if not entry.is_dir() or entry.name.endswith('.tmp'):
+                        continue
+                    try:
+                        mtime = os.stat(os.path.join(entry.path, MANIFEST_NAME)).st_mtime
+                        size = sum(child.stat().st_size for child in os.scandir(entry.path))
+                    except OSError:
+                        continue
+                    entries.append((mtime, size, entry.path))
+        except OSError:
+            return 0
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DOCX页码映射（不启动Word / LibreOffice）
+
+一次遍历body，为每个body块（段落、表格、内容控件，顺序与
+DocxChunkWriter.body_blocks 一致）确定其起始页码。按可信度分三级：
+
+1. rendered  —— Word保存时记录的 w:lastRenderedPageBreak 标记，
+                与 docProps/app.xml 的 <Pages> 基本一致时直接采用
+2. app_pages —— 没有可用的渲染标记但 <Pages> 可信时，
+                用文本度量模型的相对位置按 <Pages> 缩放
+3. metrics   —— 文本度量模型：按页面尺寸、页边距和字号估算每个块的高度，
+                遇到 w:br type="page"、分页前置和分节符时强制换页
+
+强制分页位置由 build_page_break_index 对body做一次预编译的XPath求值得到，
+包括表格内的手动分页符和从段落样式（含basedOn继承）获得的段前分页。
+
+超大文档可用 build_page_map_streaming 配合 StreamingBodyReader 逐块构建，结果相同。
+
+用法:
+    page_map = build_page_map(input_path)
+    start, end = page_map.block_range(1, 30)   # 第1-30页对应的body块切片
+"""
+
+import math
+import zipfile
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from lxml import etree
+
+from docx_chunk_writer import BODY_BLOCK_TAGS, BODY_TAG, DOCUMENT_PART, SECT_PR_TAG, W_NS
+
+APP_PART = 'docProps/app.xml'
+STYLES_PART = 'word/styles.xml'
+EP_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/extended-properties'
+WP_NS = 'http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing'
+
+
+def _w(tag: str) -> str:
+    return f'{{{W_NS}}}{tag}'
+
+
+_P = _w('p')
+_TBL = _w('tbl')
+_TR = _w('tr')
+_TC = _w('tc')
+_T = _w('t')
+_BR = _w('br')
+_TAB = _w('tab')
+_RENDERED_BREAK = _w('lastRenderedPageBreak')
+_EXTENT = f'{{{WP_NS}}}extent'
+_W_VAL = _w('val')
+
+# A4、上下2.54cm、左右3.17cm（Word中文默认）
+DEFAULT_PAGE_WIDTH = 11906
+DEFAULT_PAGE_HEIGHT = 16838
+DEFAULT_MARGIN_TB = 1440
+DEFAULT_MARGIN_LR = 1800
+# 五号字（半磅单位）
+DEFAULT_FONT_HALF_POINTS = 21
+# 行高相对字号的倍数（单倍行距下中文字体约1.3）
+LINE_HEIGHT_FACTOR = 1.3
+# 西文字符平均宽度相对字号的比例
+LATIN_CHAR_WIDTH = 0.55
+EMU_PER_POINT = 12700
+
+# 渲染标记页数与 <Pages> 相差在该比例内时认为标记可信
+RENDERED_TOLERANCE = 0.05
+
+# 一次求值取出body中所有强制分页位置：
+# - 块内任意位置（含表格单元格）的 w:br type="page"           → 块后分页
+# - 顶层段落（含内容控件中的段落）中的非连续分节符              → 块后分页
+# - 顶层段落的直接段前分页，或来自样式的段前分页且未被直接关闭  → 块前分页
+_BR_PAGE = 'descendant::w:br[@w:type="page"]'
+_SECT_BREAK = 'w:pPr/w:sectPr[not(w:type/@w:val="continuous")]'
+_BREAK_BEFORE = (
+    '[w:pPr/w:pageBreakBefore[not(@w:val="0" or @w:val="false")]'
+    ' or (w:pPr/w:pStyle and not(w:pPr/w:pageBreakBefore)'
+    '     and contains($styles, concat(" ", w:pPr/w:pStyle/@w:val, " ")))]'
+)
+_PAGE_BREAK_XPATH = etree.XPath(
+    f'{_BR_PAGE} | ./w:p/{_SECT_BREAK} | ./w:sdt/w:sdtContent/w:p/{_SECT_BREAK} | ./w:p{_BREAK_BEFORE}',
+    namespaces={'w': W_NS},
+)
+# 流式读取时逐块求值的同一组条件
+_BLOCK_BREAK_BEFORE_XPATH = etree.XPath(f'boolean(self::w:p{_BREAK_BEFORE})', namespaces={'w': W_NS})
+_BLOCK_BREAK_AFTER_XPATH = etree.XPath(
+    f'boolean({_BR_PAGE} | self::w:p/{_SECT_BREAK} | self::w:sdt/w:sdtContent/w:p/{_SECT_BREAK})',
+    namespaces={'w': W_NS},
+)
+
+
+@dataclass
+class PageMap:
+    """body块索引 → 起始页码（1-based，单调不减）"""
+    block_pages: List[int]
+    total_pages: int
+    method: str
+
+    def block_range(self, start_page: int, end_page: int) -> Tuple[int, int]:
+        """返回起始页落在 [start_page, end_page] 内的body块切片 (起始索引, 结束索引)"""
+        start = bisect_left(self.block_pages, start_page)
+        end = bisect_left(self.block_pages, end_page + 1)
+        return start, end
+
+    def page_starts(self) -> Dict[int, int]:
+        """页码 → 该页第一个body块索引（含 total_pages + 1 → 块总数），供页码缓存保存"""
+        return {page: bisect_left(self.block_pages, page) for page in range(1, self.total_pages + 2)}
+
+    @classmethod
+    def from_page_starts(cls, starts: Dict[int, int], total_pages: int, method: str) -> 'PageMap':
+        """由 page_starts 的结果还原映射"""
+        block_pages = []
+        for page in range(1, total_pages + 1):
+            block_pages.extend([page] * (starts[page + 1] - starts[page]))
+        return cls(block_pages=block_pages, total_pages=total_pages, method=method)
+
+
+@dataclass
+class PageBreakIndex:
+    """强制分页的body块索引（升序数组，另附集合用于O(1)判断）"""
+    before: List[int]
+    after: List[int]
+    _before_set: FrozenSet[int] = field(default=frozenset(), repr=False)
+    _after_set: FrozenSet[int] = field(default=frozenset(), repr=False)
+
+    def __post_init__(self):
+        self._before_set = frozenset(self.before)
+        self._after_set = frozenset(self.after)
+
+    def breaks_before(self, block_index: int) -> bool:
+        return block_index in self._before_set
+
+    def breaks_after(self, block_index: int) -> bool:
+        return block_index in self._after_set
+
+
+@dataclass
+class _PageGeometry:
+    width: float               # 版心宽度（磅）
+    height: float              # 版心高度（磅）
+    font_size: float           # 默认字号（磅）
+
+
+def _twips(element, attr: str, default: int) -> int:
+    if element is None:
+        return default
+    try:
+        return int(element.get(_w(attr), default))
+    except ValueError:
+        return default
+
+
+def _page_geometry(sect_pr, font_half_points: int) -> _PageGeometry:
+    pg_sz = sect_pr.find(_w('pgSz')) if sect_pr is not None else None
+    pg_mar = sect_pr.find(_w('pgMar')) if sect_pr is not None else None
+    width = _twips(pg_sz, 'w', DEFAULT_PAGE_WIDTH)
+    height = _twips(pg_sz, 'h', DEFAULT_PAGE_HEIGHT)
+    text_width = width - _twips(pg_mar, 'left', DEFAULT_MARGIN_LR) - _twips(pg_mar, 'right', DEFAULT_MARGIN_LR)
+    text_height = height - abs(_twips(pg_mar, 'top', DEFAULT_MARGIN_TB)) - abs(_twips(pg_mar, 'bottom', DEFAULT_MARGIN_TB))
+    return _PageGeometry(
+        width=max(text_width, 1440) / 20.0,
+        height=max(text_height, 1440) / 20.0,
+        font_size=font_half_points / 2.0,
+    )
+
+
+def _parse_styles(styles_xml: Optional[bytes]):
+    if not styles_xml:
+        return None
+    try:
+        return etree.fromstring(styles_xml)
+    except etree.XMLSyntaxError:
+        return None
+
+
+def _default_font_half_points(styles_root) -> int:
+    """styles.xml中docDefaults的默认字号"""
+    if styles_root is None:
+        return DEFAULT_FONT_HALF_POINTS
+    sz = styles_root.find(f'{_w("docDefaults")}/{_w("rPrDefault")}/{_w("rPr")}/{_w("sz")}')
+    try:
+        return int(sz.get(_W_VAL)) if sz is not None else DEFAULT_FONT_HALF_POINTS
+    except (TypeError, ValueError):
+        return DEFAULT_FONT_HALF_POINTS
+
+
+def _page_break_styles(styles_root) -> FrozenSet[str]:
+    """设置了段前分页的段落样式ID（沿basedOn继承，直接关闭的不算）"""
+    if styles_root is None:
+        return frozenset()
+    own: Dict[str, Optional[bool]] = {}
+    based_on: Dict[str, str] = {}
+    for style in styles_root.iter(_w('style')):
+        if style.get(_w('type')) != 'paragraph':
+            continue
+        style_id = style.get(_w('styleId'))
+        if not style_id:
+            continue
+        flag = style.find(f'{_w("pPr")}/{_w("pageBreakBefore")}')
+        own[style_id] = None if flag is None else flag.get(_W_VAL, 'true') not in ('0', 'false')
+        parent = style.find(_w('basedOn'))
+        if parent is not None and parent.get(_W_VAL):
+            based_on[style_id] = parent.get(_W_VAL)
+
+    result = set()
+    for style_id in own:
+        current, seen = style_id, set()
+        while current in own and current not in seen:
+            seen.add(current)
+            if own[current] is not None:
+                if own[current]:
+                    result.add(style_id)
+                break
+            current = based_on.get(current)
+    return frozenset(result)
+
+
+def _styles_param(styles_root) -> str:
+    """XPath变量 $styles：空格分隔、首尾带空格的段前分页样式ID"""
+    return ' ' + ' '.join(sorted(_page_break_styles(styles_root))) + ' '
+
+
+def build_page_break_index(body, blocks: List, styles_root=None) -> PageBreakIndex:
+    """
+    一次XPath求值构建强制分页索引
+
+    Args:
+        body: w:body元素
+        blocks: body块列表（与 DocxChunkWriter.body_blocks 一致）
+        styles_root: styles.xml根元素，用于解析样式中的段前分页
+
+    Returns:
+        PageBreakIndex对象
+    """
+    if body is None or not blocks:
+        return PageBreakIndex(before=[], after=[])
+    block_positions = {block: index for index, block in enumerate(blocks)}
+    styles = _styles_param(styles_root)
+
+    before, after = set(), set()
+    for node in _PAGE_BREAK_XPATH(body, styles=styles):
+        # 向上找到所属的body块
+        block = node
+        parent = block.getparent()
+        while parent is not None and parent is not body:
+            block = parent
+            parent = block.getparent()
+        index = block_positions.get(block)
+        if index is None:
+            continue
+        if node.tag == _P:
+            before.add(index)
+        else:
+            after.add(index)
+    return PageBreakIndex(before=sorted(before), after=sorted(after))
+
+
+def _app_pages(app_xml: Optional[bytes], has_text: bool) -> Optional[int]:
+    """
+    docProps/app.xml中Word记录的总页数
+
+    python-docx等工具生成的文档沿用模板里的app.xml（Pages=1、Words=0），
+    正文有文字而Words为0时视为过期。
+    """
+    if not app_xml:
+        return None
+    try:
+        root = etree.fromstring(app_xml)
+        pages = root.find(f'{{{EP_NS}}}Pages')
+        words = root.find(f'{{{EP_NS}}}Words')
+        if has_text and words is not None and (words.text or '0').strip() == '0':
+            return None
+        return int(pages.text) if pages is not None and pages.text else None
+    except (etree.XMLSyntaxError, ValueError):
+        return None
+
+
+class _BlockMeasure:
+    """单个body块的排版信息"""
+
+    __slots__ = ('height', 'rendered_leading', 'rendered_trailing')
+
+    def __init__(self):
+        self.height = 0.0
+        self.rendered_leading = 0
+        self.rendered_trailing = 0
+
+
+def _text_width_em(text: str) -> float:
+    width = 0.0
+    for char in text:
+        width += 1.0 if ord(char) >= 0x2E80 else LATIN_CHAR_WIDTH
+    return width
+
+
+def _paragraph_height(paragraph, width: float, default_size: float) -> float:
+    """估算段落高度（磅）：文本行数 × 行高，内嵌图片按实际高度计"""
+    size = default_size
+    sz = paragraph.find(f'{_w("pPr")}/{_w("rPr")}/{_w("sz")}')
+    if sz is None:
+        sz = paragraph.find(f'{_w("r")}/{_w("rPr")}/{_w("sz")}')
+    if sz is not None:
+        try:
+            size = int(sz.get(_W_VAL)) / 2.0
+        except (TypeError, ValueError):
+            pass
+
+    text_em = 0.0
+    lines = 1
+    image_height = 0.0
+    for node in paragraph.iter(_T, _TAB, _BR, _EXTENT):
+        if node.tag == _T:
+            text_em += _text_width_em(node.text or '')
+        elif node.tag == _TAB:
+            text_em += 2
+        elif node.tag == _BR:
+            if node.get(_w('type')) in (None, 'textWrapping'):
+                lines += 1
+        else:
+            try:
+                image_height += int(node.get('cy', 0)) / EMU_PER_POINT
+            except ValueError:
+                pass
+    lines += max(0, math.ceil(text_em * size / width) - 1)
+    return lines * size * LINE_HEIGHT_FACTOR + image_height
+
+
+def _table_height(table, width: float, default_size: float) -> float:
+    """估算表格高度：每行取最高的单元格"""
+    height = 0.0
+    for row in table.iter(_TR):
+        cells = [cell for cell in row if cell.tag == _TC]
+        if not cells:
+            continue
+        cell_width = max(width / len(cells), 20.0)
+        row_height = 0.0
+        for cell in cells:
+            cell_height = sum(
+                _paragraph_height(p, cell_width, default_size) for p in cell.iter(_P)
+            )
+            row_height = max(row_height, cell_height)
+        height += row_height
+    return height
+
+
+def _rendered_breaks(block) -> Tuple[int, int]:
+    """
+    统计块中的渲染分页标记，返回 (块开始前的标记数, 块内部的标记数)
+
+    出现在块内第一个文本之前的标记表示块本身从新的一页开始。
+    表格跨页时每个单元格都会记录标记，按行取最大值。
+    """
+    if block.tag == _TBL:
+        leading = trailing = 0
+        for row_index, row in enumerate(block.iter(_TR)):
+            row_breaks = 0
+            for cell in row:
+                if cell.tag == _TC:
+                    row_breaks = max(row_breaks, sum(1 for _ in cell.iter(_RENDERED_BREAK)))
+            if row_index == 0 and row_breaks:
+                first_cell_leading, _ = _rendered_breaks_in_flow(next(iter(row.iter(_TC))))
+                leading = min(first_cell_leading, row_breaks)
+                row_breaks -= leading
+            trailing += row_breaks
+        return leading, trailing
+    return _rendered_breaks_in_flow(block)
+
+
+def _rendered_breaks_in_flow(element) -> Tuple[int, int]:
+    leading = trailing = 0
+    seen_text = False
+    for node in element.iter(_RENDERED_BREAK, _T):
+        if node.tag == _T:
+            if node.text:
+                seen_text = True
+        elif seen_text:
+            trailing += 1
+        else:
+            leading += 1
+    return leading, trailing
+
+
+def _measure_block(block, geometry: _PageGeometry) -> _BlockMeasure:
+    measure = _BlockMeasure()
+    measure.rendered_leading, measure.rendered_trailing = _rendered_breaks(block)
+
+    if block.tag == _TBL:
+        measure.height = _table_height(block, geometry.width, geometry.font_size)
+        return measure
+
+    paragraphs = [block] if block.tag == _P else block.iter(_P)
+    for paragraph in paragraphs:
+        measure.height += _paragraph_height(paragraph, geometry.width, geometry.font_size)
+    return measure
+
+
+def _metrics_pages(measures: List[_BlockMeasure], breaks: PageBreakIndex,
+                   geometry: _PageGeometry) -> Tuple[List[int], int, int]:
+    """
+    文本度量模型
+
+    Returns:
+        (块起始页码列表, 总页数, 仅由强制分页得到的页数)
+    """
+    pages = []
+    page = 1
+    used = 0.0
+    forced_pages = 1
+    for index, measure in enumerate(measures):
+        if breaks.breaks_before(index) and used > 0:
+            page += 1
+            forced_pages += 1
+            used = 0.0
+        elif used > 0 and used + measure.height > geometry.height:
+            page += 1
+            used = 0.0
+        pages.append(page)
+        used += measure.height
+        # 超过一页的块（长表格、大图）占据后续整页
+        while used > geometry.height:
+            page += 1
+            used -= geometry.height
+        if breaks.breaks_after(index):
+            page += 1
+            forced_pages += 1
+            used = 0.0
+    total = page if used > 0 or not pages else max(page - 1, pages[-1])
+    return pages, max(total, 1), forced_pages
+
+
+def _resolve_page_map(measures: List[_BlockMeasure], breaks_factory: Callable[[], PageBreakIndex],
+                      geometry: _PageGeometry, app_pages: Optional[int]) -> PageMap:
+    """按可信度依次尝试三级页码来源"""
+    if not measures:
+        return PageMap(block_pages=[], total_pages=1, method='metrics')
+
+    # 第1级：Word渲染标记
+    if any(m.rendered_leading or m.rendered_trailing for m in measures):
+        block_pages = []
+        page = 1
+        for measure in measures:
+            page += measure.rendered_leading
+            block_pages.append(page)
+            page += measure.rendered_trailing
+        rendered_total = page
+        if app_pages is None or abs(rendered_total - app_pages) <= max(2, app_pages * RENDERED_TOLERANCE):
+            return PageMap(block_pages=block_pages, total_pages=max(rendered_total, app_pages or 0),
+                           method='rendered')
+
+    metric_pages, metric_total, forced_pages = _metrics_pages(measures, breaks_factory(), geometry)
+
+    # 第2级：用 <Pages> 缩放度量结果（<Pages>明显与内容不符时视为过期）
+    if (app_pages and app_pages >= forced_pages
+            and metric_total / 2 <= app_pages <= metric_total * 2):
+        scale = app_pages / metric_total
+        block_pages = [min(app_pages, 1 + int((page - 1) * scale)) for page in metric_pages]
+        return PageMap(block_pages=block_pages, total_pages=app_pages, method='app_pages')
+
+    # 第3级：纯文本度量
+    return PageMap(block_pages=metric_pages, total_pages=metric_total, method='metrics')
+
+
+def _read_styles_and_app(archive: zipfile.ZipFile):
+    names = set(archive.namelist())
+    styles_xml = archive.read(STYLES_PART) if STYLES_PART in names else None
+    app_xml = archive.read(APP_PART) if APP_PART in names else None
+    return _parse_styles(styles_xml), app_xml
+
+
+def build_page_map(input_path: str, document_element=None) -> PageMap:
+    """
+    构建DOCX的页码映射
+
+    Args:
+        input_path: DOCX路径
+        document_element: 已解析好的 w:document 根元素，传入时不再重复解析document.xml
+
+    Returns:
+        PageMap对象
+    """
+    with zipfile.ZipFile(input_path) as archive:
+        if document_element is None:
+            document_element = etree.fromstring(archive.read(DOCUMENT_PART))
+        styles_root, app_xml = _read_styles_and_app(archive)
+
+    body = document_element.find(BODY_TAG)
+    blocks = [child for child in body if child.tag in BODY_BLOCK_TAGS] if body is not None else []
+    geometry = _page_geometry(
+        body.find(SECT_PR_TAG) if body is not None else None,
+        _default_font_half_points(styles_root),
+    )
+
+    # 一次遍历得到所有块的度量信息和渲染标记
+    measures = [_measure_block(block, geometry) for block in blocks]
+    if not measures:
+        return _resolve_page_map(measures, None, geometry, None)
+
+    app_pages = _app_pages(app_xml, any(node.text for node in body.iter(_T)))
+    return _resolve_page_map(
+        measures, lambda: build_page_break_index(body, blocks, styles_root), geometry, app_pages)
+
+
+def build_page_map_streaming(reader) -> PageMap:
+    """
+    流式构建页码映射（不把整个document.xml载入内存）
+
+    每个块读入后立即度量并逐块判断强制分页，随后即被释放。
+
+    Args:
+        reader: 已 scan() 过的 StreamingBodyReader（需要最后一节的页面尺寸）
+
+    Returns:
+        PageMap对象
+    """
+    with zipfile.ZipFile(reader.input_path) as archive:
+        styles_root, app_xml = _read_styles_and_app(archive)
+
+    geometry = _page_geometry(reader.sect_pr, _default_font_half_points(styles_root))
+    styles = _styles_param(styles_root)
+    measures = []
+    before, after = [], []
+    has_text = False
+    for index, block in enumerate(reader.iter_blocks()):
+        measures.append(_measure_block(block, geometry))
+        if _BLOCK_BREAK_BEFORE_XPATH(block, styles=styles):
+            before.append(index)
+        if _BLOCK_BREAK_AFTER_XPATH(block):
+            after.append(index)
+        if not has_text:
+            has_text = any(node.text for node in block.iter(_T))
+
+    breaks = PageBreakIndex(before=before, after=after)
+    return _resolve_page_map(measures, lambda: breaks, geometry, _app_pages(app_xml, has_text))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式读取DOCX正文（lxml.etree.iterparse）
+
+python-docx 的 Document() 会把整个包（包括所有图片）和完整的document.xml
+对象树载入内存，几百MB的扫描件标书会超出进程的内存上限。
+StreamingBodyReader 直接从zip中边解压边解析 word/document.xml，
+每次只交出一个完整的顶层body块（段落、表格、内容控件），
+调用方处理完后该块连同之前的兄弟节点一起被清除，
+内存中始终只有文档根元素、body外的少量元素和当前块。
+
+用法:
+    reader = StreamingBodyReader(input_path)
+    block_count = reader.scan()              # 第一遍：块数和最后一节的节设置
+    for block in reader.iter_blocks():       # 之后每一遍重新流式解析
+        ...                                  # 取下一个块之前必须用完当前块（需要保留时深拷贝）
+
+scan() 之后 reader.root 为只剩外壳的 w:document 元素（body外的子元素如
+w:background 完整保留，body中只剩最后一节的 w:sectPr），可直接交给
+DocxChunkWriter 作为 document_element。
+"""
+
+import zipfile
+from typing import Iterator, Optional
+
+from lxml import etree
+
+from docx_chunk_writer import BODY_BLOCK_TAGS, BODY_TAG, SECT_PR_TAG, resolve_document_part
+
+_STREAM_TAGS = (BODY_TAG, SECT_PR_TAG) + BODY_BLOCK_TAGS
+
+
+def _release(element) -> None:
+    """清除已处理的块，并删除它之前的兄弟节点（包括body中非块的元素）"""
+    element.clear(keep_tail=True)
+    parent = element.getparent()
+    if parent is None:
+        return
+    while element.getprevious() is not None:
+        del parent[0]
+
+
+class StreamingBodyReader:
+    """
+    document.xml的流式读取器
+
+    Args:
+        input_path: DOCX路径
+    """
+
+    def __init__(self, input_path: str):
+        self.input_path = input_path
+        with zipfile.ZipFile(input_path) as archive:
+            self.document_part = resolve_document_part(archive)
+        self.root = None
+        self.body = None
+        self.sect_pr: Optional[etree._Element] = None
+
+    def iter_blocks(self) -> Iterator:
+        """
+        按文档顺序逐个产出顶层body块
+
+        产出的元素只在取下一个块之前有效；每一遍都会重新解析document.xml，
+        并更新 root / body。sect_pr 在读完一整遍后才更新为这一遍的最后一节节设置
+        （没有时为None），中途放弃的一遍不会留下半途的状态。
+        """
+        sect_pr = None
+        with zipfile.ZipFile(self.input_path) as archive, archive.open(self.document_part) as stream:
+            previous = None
+            for _, element in etree.iterparse(stream, events=('end',), tag=_STREAM_TAGS,
+                                              huge_tree=True):
+                parent = element.getparent()
+                if element.tag == BODY_TAG:
+                    self.body, self.root = element, parent
+                    continue
+                if parent is None or parent.tag != BODY_TAG:
+                    continue
+                if self.body is not parent:
+                    self.body, self.root = parent, parent.getparent()
+                if previous is not None:
+                    _release(previous)
+                    previous = None
+                if element.tag == SECT_PR_TAG:
+                    sect_pr = element
+                    continue
+                yield element
+                previous = element
+            if previous is not None:
+                _release(previous)
+        self.sect_pr = sect_pr
+
+    def scan(self) -> int:
+        """完整读一遍，得到块数、文档外壳和最后一节的节设置"""
+        count = 0
+        for _ in self.iter_blocks():
+            count += 1
+        return count
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按token预算拆分（供AI分析流水线使用）
+
+按固定页数拆分时，每块的文字量可能相差十倍：满页表格和只有标题的封面页
+都算一页。拆分结果要送进 server/api/analyze 的大模型调用，块太大会超出上下文，
+太小则白白多调用几次。--tokens=N 模式改为按估算的token数切块：
+
+    - 每个body块（段落、表格、内容控件）的token数在生成页面片段时顺带统计，
+      与片段一起缓存，换预算重新拆分不必再读源文档
+    - 块边界只落在顶层段落或表格的边界上，表格整体属于一个块，不会从中间切开
+    - 单个body块本身超过预算（如超长表格）时单独成块，并提示
+    - 每个分块的估算token数通过 PROGRESS:FILE_TOKENS 输出
+
+估算规则参照DeepSeek的官方换算：1个中文字符约0.6个token，
+1个英文字符（含数字、空格和标点）约0.3个token；另外每个段落和表格行
+计1个token（换行），每个单元格计2个token（转成文本时的分隔符）。
+结果只用于装箱，不要求与分词器完全一致。
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+from docx_chunk_writer import W_NS
+
+TOKEN_BUDGET_FLAG = '--tokens='
+
+# 每个中文（CJK）字符与其他字符的token数
+CJK_TOKENS_PER_CHAR = 0.6
+OTHER_TOKENS_PER_CHAR = 0.3
+# 结构开销：段落/表格行换行，单元格分隔符
+PARAGRAPH_TOKENS = 1
+ROW_TOKENS = 1
+CELL_TOKENS = 2
+
+MIN_TOKEN_BUDGET = 100
+
+_T = f'{{{W_NS}}}t'
+_TAB = f'{{{W_NS}}}tab'
+_BR = f'{{{W_NS}}}br'
+_P = f'{{{W_NS}}}p'
+_TR = f'{{{W_NS}}}tr'
+_TC = f'{{{W_NS}}}tc'
+
+# CJK部首、标点、假名和统一汉字，韩文，兼容汉字，全角符号，扩展汉字
+_CJK_RE = re.compile('[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef\U00020000-\U0002fa1f]')
+
+TokenChunk = Tuple[int, int, int]
+
+
+def estimate_text_tokens(text: str) -> float:
+    """估算一段文字的token数"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk * CJK_TOKENS_PER_CHAR + (len(text) - cjk) * OTHER_TOKENS_PER_CHAR
+
+
+def estimate_block_tokens(block) -> int:
+    """
+    估算一个顶层body块的token数
+
+    一次遍历块内的文字、制表符、换行、段落、表格行和单元格，
+    不区分段落、表格还是内容控件。
+    """
+    chars = []
+    structure = 0
+    for element in block.iter(_T, _TAB, _BR, _P, _TR, _TC):
+        tag = element.tag
+        if tag == _T:
+            if element.text:
+                chars.append(element.text)
+        elif tag == _P:
+            structure += PARAGRAPH_TOKENS
+        elif tag == _TC:
+            structure += CELL_TOKENS
+        elif tag == _TR:
+            structure += ROW_TOKENS
+        else:
+            chars.append(' ')
+    return int(estimate_text_tokens(''.join(chars)) + structure + 0.5)
+
+
+def plan_token_chunks(block_tokens: List[int], budget: int) -> List[TokenChunk]:
+    """
+    按token预算把body块依次装箱
+
+    当前块加上下一个body块会超出预算时在两者之间切开；单个body块超过预算时单独成块。
+
+    Returns:
+        [(起始块索引, 结束块索引（不含）, 估算token数)]
+    """
+    chunks = []
+    start = 0
+    tokens = 0
+    for index, block in enumerate(block_tokens):
+        if index > start and tokens + block > budget:
+            chunks.append((start, index, tokens))
+            start, tokens = index, 0
+        tokens += block
+    if start < len(block_tokens):
+        chunks.append((start, len(block_tokens), tokens))
+    return chunks
+
+
+def extract_token_budget_arg(argv: List[str]) -> Tuple[List[str], Optional[int]]:
+    """
+    从命令行参数中取出 --tokens=N
+
+    Returns:
+        (剩余参数, 每块token预算或None)
+
+    Raises:
+        ValueError: 预算不是整数或小于 MIN_TOKEN_BUDGET
+    """
+    remaining = []
+    budget = None
+    for arg in argv:
+        if arg.startswith(TOKEN_BUDGET_FLAG):
+            value = arg[len(TOKEN_BUDGET_FLAG):]
+            try:
+                budget = int(value)
+            except ValueError:
+                raise ValueError(f"无效的token预算: {value}")
+            if budget < MIN_TOKEN_BUDGET:
+                raise ValueError(f"token预算不能小于 {MIN_TOKEN_BUDGET}")
+        else:
+            remaining.append(arg)
+    return remaining, budget
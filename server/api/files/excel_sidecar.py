@@ -0,0 +1,587 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Excel列式旁路缓存（sidecar）
+
+上传的工作簿第一次被读取时，在上传文件旁生成一个 `.sheetcache` 文件，
+保存活动工作表的列式标准化值、每个单元格的规范化比较键、表头候选行和
+"序号"索引，以文件内容的SHA-256 作为键。之后 modify_excel.py / modify_excel_by_sequence.py 再次
+处理同一文件时直接 mmap 该文件完成匹配，只在写入阶段才打开xlsx。
+
+文件布局（单个扁平文件，便于mmap）：
+    MAGIC(8字节) | 头部长度(u32, 小端) | 头部JSON | 对齐到4字节 | 数据区
+数据区按列依次存放值和比较键两组：
+    偏移数组(u32 × (max_row + 1)) | UTF-8数据
+第r行的值为 数据[偏移[r-1]:偏移[r]]。比较键与值完全相同的列不重复存放。
+构建时逐列写出，内存中同时只有一列的值和比较键。
+
+格式或比较键规则变化时递增 SIDECAR_VERSION，旧文件随之失效重建。
+"""
+
+import os
+import sys
+import json
+import mmap
+import struct
+import re
+import shutil
+import hashlib
+import logging
+import tempfile
+import unicodedata
+from array import array
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal, InvalidOperation
+from typing import List, Dict, Tuple, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+SIDECAR_SUFFIX = '.sheetcache'
+SIDECAR_MAGIC = b'XLSNAP01'
+SIDECAR_VERSION = 4
+
+# 表头候选行数，与两个脚本的表头扫描范围保持一致
+HEADER_SCAN_ROWS = 20
+SEQUENCE_HEADER = '序号'
+
+
+# ============================================================================
+# 标准化函数
+# ============================================================================
+
+def normalize_cell_value(value: Any) -> str:
+    """
+    标准化单元格值：None转为空字符串，其余转字符串并去除首尾空白
+
+    两个脚本比较、定位表头时使用的都是这个形式。
+    """
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+# 数字文本：可带千分位逗号；整数部分有前导零的（如编号"007"）仍按文本比较
+_NUMERIC_TEXT = re.compile(r'^[+-]?(?:0|[1-9]\d{0,2}(?:,\d{3})+|[1-9]\d*)(?:\.\d+)?$')
+_DATE_TEXT = re.compile(r'^(\d{4})[-/.年](\d{1,2})[-/.月](\d{1,2})日?$')
+
+
+def _canonical_decimal(value: Decimal) -> str:
+    if value == value.to_integral_value():
+        return str(int(value))
+    return format(value.normalize(), 'f')
+
+
+def _canonical_float(value: float) -> str:
+    if value != value or value in (float('inf'), float('-inf')):
+        return str(value).casefold()
+    if value.is_integer():
+        return str(int(value))
+    # 15位有效数字可以消除Excel浮点误差（如0.1+0.2），再按Decimal的规则输出，与数字文本一致
+    return _canonical_decimal(Decimal(format(value, '.15g')))
+
+
+def _canonical_datetime(value: datetime) -> str:
+    if value.hour == value.minute == value.second == value.microsecond == 0:
+        return value.date().isoformat()
+    if value.second == value.microsecond == 0:
+        return value.strftime('%Y-%m-%d %H:%M')
+    return value.isoformat(sep=' ')
+
+
+def _canonical_text(text: str) -> str:
+    # NFKC同时完成全角→半角（数字、字母、标点、全角空格）
+    if not text.isascii():
+        text = unicodedata.normalize('NFKC', text)
+    text = text.strip().casefold()
+    if not text:
+        return ''
+    if text.isdigit():
+        return text
+    if _NUMERIC_TEXT.match(text):
+        return _canonical_decimal(Decimal(text.replace(',', '')))
+    match = _DATE_TEXT.match(text)
+    if match:
+        year, month, day = match.groups()
+        return f"{year}-{int(month):02d}-{int(day):02d}"
+    return text
+
+
+def canonical_key(value: Any) -> str:
+    """
+    计算单元格或AI值的规范化比较键
+
+    规范化规则：
+    - None → 空字符串
+    - 整数值的浮点数/Decimal → 整数文本（10.0 → "10"），其余去掉末尾的零（10.50 → "10.5"）
+    - 日期/日期时间 → ISO格式（零点的日期时间只保留日期）
+    - 文本 → Unicode NFKC（全角转半角）、去除首尾空白、忽略大小写；
+      "10.50"、"1,000"这类数字文本按Decimal解析后与数值同样归一，
+      "2024/1/5"这类日期文本归一为ISO格式
+
+    Excel一侧在构建快照时按列一次性计算，AI一侧在匹配前计算一次，
+    两边都规范化后直接比较字符串即可。
+    """
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return _canonical_text(value)
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return _canonical_float(value)
+    if isinstance(value, Decimal):
+        try:
+            return _canonical_decimal(value)
+        except (InvalidOperation, ValueError):
+            return str(value).casefold()
+    if isinstance(value, datetime):
+        return _canonical_datetime(value)
+    if isinstance(value, (date, dt_time)):
+        return value.isoformat()
+    return _canonical_text(str(value))
+
+
+def normalize_sequence(value: Any) -> str:
+    """
+    标准化序号值
+
+    序号按字面比较，不使用 canonical_key 的数值归一（"1.10"与"1.1"是不同的序号）。
+
+    标准化规则：
+    1. 整数值的浮点数转为整数（1.0 → "1"），其余转为字符串
+    2. Unicode NFKC（全角数字转半角），去除前导和尾随空格
+    3. 纯数字去除前导零（但保留单个"0"）
+    4. 统一处理None和空字符串
+
+    Args:
+        value: 原始序号值（可以是数字、字符串等）
+
+    Returns:
+        标准化后的字符串
+    """
+    if value is None or value == "":
+        return ""
+
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    str_value = str(value)
+    if not str_value.isascii():
+        str_value = unicodedata.normalize('NFKC', str_value)
+    str_value = str_value.strip()
+
+    if not str_value:
+        return ""
+
+    if str_value.isdigit():
+        str_value = str(int(str_value))
+
+    return str_value
+
+
+def compute_content_hash(path: str) -> str:
+    """计算文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sidecar_path_for(excel_path: str) -> str:
+    """返回上传文件对应的sidecar路径（与上传文件同名，扩展名为.sheetcache）"""
+    return os.path.splitext(excel_path)[0] + SIDECAR_SUFFIX
+
+
+# ============================================================================
+# SheetSnapshot类
+# ============================================================================
+
+class _RowView:
+    """快照中一行的惰性视图，按列索引（0-based）返回标准化值或比较键"""
+
+    __slots__ = ('_snapshot', '_row', '_read')
+
+    def __init__(self, snapshot: 'SheetSnapshot', row: int, keys: bool = False):
+        self._snapshot = snapshot
+        self._row = row
+        self._read = snapshot.key if keys else snapshot.value
+
+    def __len__(self) -> int:
+        return self._snapshot.max_column
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += self._snapshot.max_column
+        if index < 0 or index >= self._snapshot.max_column:
+            raise IndexError('列索引超出范围')
+        return self._read(self._row, index + 1)
+
+    def __iter__(self):
+        for col in range(1, self._snapshot.max_column + 1):
+            yield self._read(self._row, col)
+
+
+class SheetSnapshot:
+    """
+    工作表快照 - 活动工作表标准化值的只读视图，外加写入覆盖层
+
+    匹配阶段所有读取都经过快照；写入先记录在覆盖层中（后续读取能看到），
+    保存前通过 apply_writes 一次性回放到真实的openpyxl工作表。
+    合并单元格（非左上角）的写入会像openpyxl的MergedCell一样抛出AttributeError。
+    """
+
+    def __init__(self, buffer, header: Dict[str, Any], data_start: int, mapped: Optional[mmap.mmap] = None):
+        self._buffer = buffer
+        self._mapped = mapped
+        self.header = header
+        self.title: str = header['sheet_title']
+        self.max_row: int = header['max_row']
+        self.max_column: int = header['max_column']
+        self.content_hash: str = header['content_hash']
+
+        self._offsets = []
+        self._blob_starts = []
+        self._key_offsets = []
+        self._key_blob_starts = []
+        view = memoryview(buffer)
+        row_span = 4 * (self.max_row + 1)
+        for column in header['columns']:
+            start = data_start + column['offsets_pos']
+            self._offsets.append(view[start:start + row_span].cast('I'))
+            self._blob_starts.append(data_start + column['blob_pos'])
+            key_start = data_start + column['key_offsets_pos']
+            self._key_offsets.append(view[key_start:key_start + row_span].cast('I'))
+            self._key_blob_starts.append(data_start + column['key_blob_pos'])
+
+        self._merged_cells = None
+        self._overlay: Dict[Tuple[int, int], str] = {}
+        self._key_overlay: Dict[Tuple[int, int], str] = {}
+        self._writes: List[Tuple[int, int, Any]] = []
+
+    @property
+    def is_mapped(self) -> bool:
+        """快照是否mmap自文件（sidecar，或不写缓存时的匿名临时文件）"""
+        return self._mapped is not None
+
+    @property
+    def header_candidates(self) -> List[List[str]]:
+        """前HEADER_SCAN_ROWS行的标准化值（不含覆盖层）"""
+        return self.header['header_candidates']
+
+    @property
+    def sequence_index(self) -> Optional[Dict[str, Any]]:
+        """预先构建的序号索引 {column_index, header_row, map, duplicates}，没有序号列时为None"""
+        return self.header.get('sequence_index')
+
+    def value(self, row: int, col: int) -> str:
+        """读取标准化值（行列均为1-based），超出范围返回空字符串"""
+        if self._overlay:
+            written = self._overlay.get((row, col))
+            if written is not None:
+                return written
+        if row < 1 or row > self.max_row or col < 1 or col > self.max_column:
+            return ''
+        if row <= len(self.header_candidates):
+            return self.header_candidates[row - 1][col - 1]
+        offsets = self._offsets[col - 1]
+        start = offsets[row - 1]
+        end = offsets[row]
+        if start == end:
+            return ''
+        base = self._blob_starts[col - 1]
+        return str(self._buffer[base + start:base + end], 'utf-8')
+
+    def key(self, row: int, col: int) -> str:
+        """读取规范化比较键（见 canonical_key），超出范围返回空字符串"""
+        if self._key_overlay:
+            written = self._key_overlay.get((row, col))
+            if written is not None:
+                return written
+        if row < 1 or row > self.max_row or col < 1 or col > self.max_column:
+            return ''
+        offsets = self._key_offsets[col - 1]
+        start = offsets[row - 1]
+        end = offsets[row]
+        if start == end:
+            return ''
+        base = self._key_blob_starts[col - 1]
+        return str(self._buffer[base + start:base + end], 'utf-8')
+
+    def __getitem__(self, row: int) -> _RowView:
+        return _RowView(self, row)
+
+    def keys(self, row: int) -> _RowView:
+        """返回一行比较键的惰性视图"""
+        return _RowView(self, row, keys=True)
+
+    def is_merged(self, row: int, col: int) -> bool:
+        """是否是合并区域中的非左上角单元格（对应openpyxl的MergedCell）"""
+        if self._merged_cells is None:
+            merged = set()
+            for min_row, min_col, max_row, max_col in self.header['merged_ranges']:
+                for r in range(min_row, max_row + 1):
+                    for c in range(min_col, max_col + 1):
+                        if r != min_row or c != min_col:
+                            merged.add((r, c))
+            self._merged_cells = merged
+        return (row, col) in self._merged_cells
+
+    def set_value(self, row: int, col: int, value: Any) -> None:
+        """记录一次写入，保存前由 apply_writes 回放"""
+        if self.is_merged(row, col):
+            raise AttributeError("'MergedCell' object attribute 'value' is read-only")
+        self._overlay[(row, col)] = normalize_cell_value(value)
+        self._key_overlay[(row, col)] = canonical_key(value)
+        self._writes.append((row, col, value))
+
+    @property
+    def pending_writes(self) -> int:
+        return len(self._writes)
+
+    def apply_writes(self, worksheet) -> int:
+        """
+        将覆盖层中的写入按顺序回放到openpyxl工作表
+
+        Returns:
+            回放的写入次数
+        """
+        for row, col, value in self._writes:
+            worksheet.cell(row, col).value = value
+        return len(self._writes)
+
+    def close(self) -> None:
+        """释放mmap"""
+        self._offsets = []
+        self._key_offsets = []
+        if self._mapped is not None:
+            try:
+                self._mapped.close()
+            except BufferError:
+                # 仍有memoryview引用时由GC负责释放
+                pass
+            self._mapped = None
+
+
+# ============================================================================
+# 构建与读写
+# ============================================================================
+
+def _find_sequence_header(header_candidates: List[List[str]]) -> Optional[Tuple[int, int]]:
+    """按 modify_excel_by_sequence.py 的规则查找"序号"表头，返回 (行号, 列号)"""
+    for row_num, row in enumerate(header_candidates, start=1):
+        for col_idx, cell_value in enumerate(row, start=1):
+            if cell_value == SEQUENCE_HEADER:
+                return row_num, col_idx
+    return None
+
+
+def _build_sequence_index(header_row: int, col_idx: int, values: List[Any], max_row: int) -> Dict[str, Any]:
+    """由序号列的原始值构建序号索引（按 normalize_sequence 比较，不用比较键）"""
+    sequence_map: Dict[str, int] = {}
+    duplicates: List[List[Any]] = []
+    for r in range(header_row + 1, max_row + 1):
+        normalized = normalize_sequence(values[r - 1])
+        if not normalized:
+            continue
+        if normalized in sequence_map:
+            duplicates.append([normalized, sequence_map[normalized], r])
+        else:
+            sequence_map[normalized] = r
+    return {
+        'column_index': col_idx,
+        'header_row': header_row,
+        'map': sequence_map,
+        'duplicates': duplicates,
+    }
+
+
+def _pad4(length: int) -> int:
+    return (4 - length % 4) % 4
+
+
+def _encode_column(values: List[str], data) -> Tuple[int, int]:
+    """把一列字符串追加到数据区文件，返回 (偏移数组位置, 数据位置)"""
+    offsets = array('I', [0])
+    blob = bytearray()
+    for value in values:
+        if value:
+            blob += value.encode('utf-8')
+        offsets.append(len(blob))
+    offsets_pos = data.tell()
+    data.write(offsets.tobytes())
+    blob_pos = data.tell()
+    data.write(blob)
+    data.write(b'\0' * _pad4(len(blob)))
+    return offsets_pos, blob_pos
+
+
+def write_snapshot(worksheet, content_hash: str, out) -> None:
+    """
+    从openpyxl工作表构建sidecar文件内容，写入 out
+
+    逐列读取、标准化并写入临时数据区，再在其前面写出头部（各列在数据区中的位置要写完才知道）。
+
+    Args:
+        worksheet: openpyxl工作表对象
+        content_hash: 源文件的SHA-256
+        out: 以二进制模式打开的文件对象
+    """
+    max_row = worksheet.max_row
+    max_column = worksheet.max_column
+
+    scan_rows = min(HEADER_SCAN_ROWS, max_row)
+    header_candidates = [
+        [normalize_cell_value(v) for v in row_values]
+        for row_values in worksheet.iter_rows(min_row=1, max_row=scan_rows,
+                                              max_col=max_column, values_only=True)
+    ]
+    sequence_header = _find_sequence_header(header_candidates)
+    sequence_index = None
+
+    merged_ranges = [
+        [rng.min_row, rng.min_col, rng.max_row, rng.max_col]
+        for rng in worksheet.merged_cells.ranges
+    ]
+
+    # 数据区：每列的偏移数组和值数据
+    column_entries = []
+    with tempfile.TemporaryFile() as data:
+        for col_idx, raw_values in enumerate(worksheet.iter_cols(min_row=1, max_row=max_row,
+                                                                 max_col=max_column, values_only=True),
+                                             start=1):
+            # 兼容iter_cols返回行数少于max_row的情况
+            raw_values = list(raw_values) + [None] * (max_row - len(raw_values))
+            values = [normalize_cell_value(v) for v in raw_values]
+            keys = [canonical_key(v) for v in raw_values]
+            offsets_pos, blob_pos = _encode_column(values, data)
+            if keys == values:
+                key_offsets_pos, key_blob_pos = offsets_pos, blob_pos
+            else:
+                key_offsets_pos, key_blob_pos = _encode_column(keys, data)
+            column_entries.append({
+                'offsets_pos': offsets_pos, 'blob_pos': blob_pos,
+                'key_offsets_pos': key_offsets_pos, 'key_blob_pos': key_blob_pos,
+            })
+            if sequence_header is not None and sequence_header[1] == col_idx:
+                sequence_index = _build_sequence_index(sequence_header[0], col_idx, raw_values, max_row)
+
+        header = {
+            'version': SIDECAR_VERSION,
+            'byteorder': sys.byteorder,
+            'content_hash': content_hash,
+            'sheet_title': worksheet.title,
+            'max_row': max_row,
+            'max_column': max_column,
+            'merged_ranges': merged_ranges,
+            'header_candidates': header_candidates,
+            'sequence_index': sequence_index,
+            'columns': column_entries,
+        }
+        header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        prefix = SIDECAR_MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes
+        out.write(prefix + b'\0' * _pad4(len(prefix)))
+        data.seek(0)
+        shutil.copyfileobj(data, out)
+
+
+def _parse_header(buffer) -> Tuple[Dict[str, Any], int]:
+    """解析sidecar头部，返回 (头部字典, 数据区起始位置)"""
+    if len(buffer) < 12 or bytes(buffer[:8]) != SIDECAR_MAGIC:
+        raise ValueError('不是有效的sidecar文件')
+    (header_len,) = struct.unpack('<I', bytes(buffer[8:12]))
+    header = json.loads(bytes(buffer[12:12 + header_len]).decode('utf-8'))
+    data_start = 12 + header_len
+    data_start += _pad4(data_start)
+    return header, data_start
+
+
+def open_sidecar(sidecar_path: str, content_hash: str) -> Optional[SheetSnapshot]:
+    """
+    mmap并校验sidecar文件
+
+    Returns:
+        命中时返回SheetSnapshot；文件不存在、损坏或内容哈希不一致时返回None
+    """
+    if not os.path.exists(sidecar_path):
+        return None
+
+    try:
+        with open(sidecar_path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        logger.warning(f"无法打开sidecar缓存 {sidecar_path}: {e}")
+        return None
+
+    try:
+        header, data_start = _parse_header(mapped)
+        if (header.get('version') != SIDECAR_VERSION
+                or header.get('byteorder') != sys.byteorder
+                or header.get('content_hash') != content_hash):
+            mapped.close()
+            return None
+        return SheetSnapshot(mapped, header, data_start, mapped=mapped)
+    except Exception as e:
+        logger.warning(f"sidecar缓存无效，将重新构建: {e}")
+        mapped.close()
+        return None
+
+
+def write_sidecar(sidecar_path: str, worksheet, content_hash: str) -> bool:
+    """构建并原子写入sidecar文件（先写临时文件再替换）"""
+    tmp_path = f"{sidecar_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            write_snapshot(worksheet, content_hash, f)
+        os.replace(tmp_path, sidecar_path)
+        return True
+    except OSError as e:
+        logger.warning(f"写入sidecar缓存失败 {sidecar_path}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
+
+
+def load_snapshot(excel_path: str, use_cache: bool = True) -> Tuple[SheetSnapshot, Optional[Any]]:
+    """
+    获取工作簿活动工作表的快照
+
+    命中sidecar时只mmap sidecar，不打开xlsx；未命中时加载工作簿、
+    构建快照并写出sidecar，同时返回已加载的工作簿供写入阶段复用。
+
+    Args:
+        excel_path: Excel文件路径
+        use_cache: 是否读写sidecar缓存
+
+    Returns:
+        (快照, 已加载的工作簿或None)
+    """
+    from openpyxl import load_workbook
+
+    content_hash = compute_content_hash(excel_path)
+    sidecar_path = sidecar_path_for(excel_path)
+
+    if use_cache:
+        snapshot = open_sidecar(sidecar_path, content_hash)
+        if snapshot is not None:
+            logger.info(f"✓ 命中sidecar缓存: {sidecar_path}")
+            return snapshot, None
+
+    workbook = load_workbook(excel_path)
+
+    if use_cache and write_sidecar(sidecar_path, workbook.active, content_hash):
+        logger.info(f"✓ 已生成sidecar缓存: {sidecar_path}")
+        snapshot = open_sidecar(sidecar_path, content_hash)
+        if snapshot is not None:
+            return snapshot, workbook
+
+    # 不写缓存（或写入失败）时构建到匿名临时文件中再mmap，同样不在内存中拼出整个文件
+    with tempfile.TemporaryFile() as f:
+        write_snapshot(workbook.active, content_hash, f)
+        f.flush()
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header, data_start = _parse_header(mapped)
+    return SheetSnapshot(mapped, header, data_start, mapped=mapped), workbook
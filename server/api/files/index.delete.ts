@@ -1,5 +1,6 @@
 import { promises as fs } from 'fs'
 import { join } from 'path'
+import { CONTENT_CACHE_DIRS } from '~/server/utils/fileCleanup'
 
 const UPLOAD_DIR = join(process.cwd(), 'uploads')
 
@@ -9,7 +10,7 @@ export default defineEventHandler(async (event) => {
     const files = await fs.readdir(UPLOAD_DIR)
     
     // Delete all files
-    const deletePromises = files.map(async (file) => {
+    const deletePromises = files.filter(file => !CONTENT_CACHE_DIRS.includes(file)).map(async (file) => {
       const filePath = join(UPLOAD_DIR, file)
       try {
         await fs.unlink(filePath)
@@ -20,6 +21,11 @@ export default defineEventHandler(async (event) => {
     
     await Promise.all(deletePromises)
     
+    // Drop the split scripts' content caches along with the uploads
+    for (const cacheDir of CONTENT_CACHE_DIRS) {
+      await fs.rm(join(UPLOAD_DIR, cacheDir), { recursive: true, force: true })
+    }
+    
     return {
       success: true,
       message: 'All files deleted successfully',
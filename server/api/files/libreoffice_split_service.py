@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻 LibreOffice 拆分服务
+
+每个拆分请求都启动一次 split_docx_pages_libreoffice.py，先花几秒连接 soffice。
+本服务常驻运行，用 UnoBridgePool 保持连接，通过本机TCP端口接收拆分任务，
+连接耗时不再出现在请求路径上：
+
+    python libreoffice_split_service.py [--listen=127.0.0.1:2012]
+
+设置环境变量 LIBREOFFICE_SPLIT_SERVICE=127.0.0.1:2012 后，
+split_docx_pages_libreoffice.py 把任务转交给服务，原样转发服务输出的日志和
+PROGRESS 行并以任务的退出码退出；服务未运行时仍在本进程中拆分。
+
+协议（每个TCP连接一个任务，UTF-8文本行）：
+    客户端 → 服务: {"argv": [脚本参数...], "cwd": "<工作目录>"}
+    服务 → 客户端: 任务的标准输出，逐行转发
+    服务 → 客户端: SPLIT_SERVICE:EXIT:<退出码>（最后一行）
+
+任务在主线程中依次执行（connect_to_libreoffice 的超时依赖 SIGALRM，
+只能在主线程中使用），等待中的连接在 listen 队列中排队。
+空闲超过 HEALTH_CHECK_INTERVAL 秒时检查并重连所有连接。
+
+--instances=N（或 auto，按CPU核数）时本服务改为农场模式（soffice_farm.py）：
+启动N个独立的 soffice 和各自的工作进程（即单连接的本服务），
+每个任务分给一个空闲的工作进程，由转发线程把输出送回客户端，吞吐随核数增加。
+工作进程中UNO调用超时时，看门狗（uno_watchdog.py）结束该槽位的 soffice，
+转发线程发现后立即重启它，工作进程重新连接后重试受影响的分块。
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import signal
+import logging
+import threading
+import traceback
+import contextlib
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SPLIT_SERVICE_ENV = 'LIBREOFFICE_SPLIT_SERVICE'
+LISTEN_FLAG = '--listen='
+INSTANCES_FLAG = '--instances='
+DEFAULT_LISTEN = '127.0.0.1:2012'
+EXIT_PREFIX = 'SPLIT_SERVICE:EXIT:'
+
+HEALTH_CHECK_INTERVAL = 30
+# 客户端发送任务的超时；任务本身的耗时不受限制
+REQUEST_TIMEOUT = 10
+LISTEN_BACKLOG = 32
+# 农场模式转发线程检查 soffice 是否退出的间隔
+POLL_INTERVAL = 1
+
+
+def parse_address(spec: str) -> Tuple[str, int]:
+    """解析 "host:port"（只写端口时为 127.0.0.1）"""
+    host, sep, port = spec.strip().rpartition(':')
+    if not sep:
+        host, port = '127.0.0.1', spec.strip()
+    return host or '127.0.0.1', int(port)
+
+
+def submit_job(address: str, argv: List[str]) -> Optional[int]:
+    """
+    把任务交给拆分服务，转发服务的输出
+
+    Returns:
+        任务的退出码；服务未运行（无法连接）时返回 None，由调用方在本进程中拆分
+    """
+    try:
+        host, port = parse_address(address)
+        conn = socket.create_connection((host, port), timeout=REQUEST_TIMEOUT)
+    except (OSError, ValueError) as e:
+        print(f"拆分服务不可用 ({address}: {e})，在本进程中拆分")
+        return None
+
+    with conn:
+        conn.settimeout(None)
+        request = json.dumps({'argv': argv, 'cwd': os.getcwd()}, ensure_ascii=False)
+        conn.sendall(request.encode('utf-8') + b'\n')
+        with conn.makefile('r', encoding='utf-8', errors='replace', newline='\n') as reader:
+            for line in reader:
+                line = line.rstrip('\n')
+                if line.startswith(EXIT_PREFIX):
+                    return int(line[len(EXIT_PREFIX):])
+                print(line, flush=True)
+
+    print(f"拆分服务 {address} 在任务完成前断开了连接")
+    return 1
+
+
+@contextlib.contextmanager
+def _job_output(conn):
+    """任务执行期间把标准输出转到客户端连接（行缓冲，PROGRESS 行即时送达）"""
+    writer = conn.makefile('w', encoding='utf-8', errors='replace', newline='\n', buffering=1)
+    original = sys.stdout
+    sys.stdout = writer
+    try:
+        yield writer
+    finally:
+        sys.stdout = original
+        try:
+            writer.flush()
+        except OSError:
+            pass
+
+
+@contextlib.contextmanager
+def _job_cwd(cwd: Optional[str]):
+    """按客户端的工作目录解析任务中的相对路径"""
+    original = os.getcwd()
+    if cwd:
+        os.chdir(cwd)
+    try:
+        yield
+    finally:
+        os.chdir(original)
+
+
+def _read_request(conn) -> Optional[dict]:
+    """读取任务；连接后直接断开（如端口探测）时返回None"""
+    conn.settimeout(REQUEST_TIMEOUT)
+    with conn.makefile('r', encoding='utf-8', newline='\n') as reader:
+        line = reader.readline()
+    if not line.strip():
+        return None
+    request = json.loads(line)
+    conn.settimeout(None)
+    if not isinstance(request.get('argv'), list):
+        raise ValueError("任务缺少 argv")
+    return request
+
+
+def run_job(conn, pool) -> int:
+    """执行一个任务并返回退出码；任务输出和退出码写回客户端"""
+    from split_docx_pages_libreoffice import main as split_main
+
+    request = _read_request(conn)
+    if request is None:
+        return 0
+    argv = [str(arg) for arg in request['argv']]
+    started = time.time()
+    code = 1
+    with _job_output(conn) as writer:
+        try:
+            with _job_cwd(request.get('cwd')), pool.acquire() as bridge:
+                print(f"✓ 使用拆分服务的 LibreOffice 连接 {bridge.address}（第 {bridge.jobs} 个任务）")
+                split_main(argv, bridge=bridge)
+            code = 0
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception as e:
+            print(f"拆分失败: {e}")
+            traceback.print_exc()
+        writer.write(f"{EXIT_PREFIX}{code}\n")
+    logger.info(f"任务结束 退出码={code} 耗时={time.time() - started:.1f}s 参数={argv[1:]}")
+    return code
+
+
+def serve(listen: str) -> None:
+    from uno_bridge_pool import UnoBridgePool
+
+    pool = UnoBridgePool.from_env()
+    host, port = parse_address(listen)
+    available = pool.check_all()
+    logger.info(f"LibreOffice 连接: {available}/{len(pool.bridges)} 可用 {pool.status()}")
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, port))
+    server.listen(LISTEN_BACKLOG)
+    server.settimeout(HEALTH_CHECK_INTERVAL)
+    logger.info(f"拆分服务已启动: {host}:{port}")
+
+    with server:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                pool.check_all()
+                continue
+            with conn:
+                try:
+                    run_job(conn, pool)
+                except (OSError, ValueError) as e:
+                    # 客户端中途断开或请求无效，不影响后续任务
+                    logger.warning(f"任务未完成: {e}")
+
+
+def _send_exit(conn, message: str, code: int = 1) -> None:
+    with contextlib.suppress(OSError):
+        conn.sendall(f"{message}\n{EXIT_PREFIX}{code}\n".encode('utf-8'))
+
+
+def _worker_lines(worker, slot, farm):
+    """
+    逐行读取工作进程的输出
+
+    等待期间槽位的 soffice 退出（被工作进程的看门狗结束）时立即重启，
+    工作进程重新连接后继续任务；超过 hang_timeout 秒没有任何输出时抛出 socket.timeout。
+    """
+    worker.settimeout(POLL_INTERVAL)
+    buffer = b''
+    last_output = time.monotonic()
+    while True:
+        try:
+            data = worker.recv(65536)
+        except socket.timeout:
+            if slot.soffice is not None and slot.soffice.poll() is not None:
+                farm.restart_soffice(slot)
+            if time.monotonic() - last_output > farm.hang_timeout:
+                raise
+            continue
+        if not data:
+            if buffer:
+                yield buffer
+            return
+        last_output = time.monotonic()
+        *lines, buffer = (buffer + data).split(b'\n')
+        for line in lines:
+            yield line + b'\n'
+
+
+def proxy_job(conn, farm) -> None:
+    """农场模式：把客户端的任务交给一个空闲槽位的工作进程，转发输出直到退出码行"""
+    conn.settimeout(REQUEST_TIMEOUT)
+    with conn.makefile('rb') as reader:
+        request = reader.readline()
+    if not request.strip():
+        return
+    if not request.endswith(b'\n'):
+        raise ValueError("任务请求不完整")
+
+    with farm.acquire() as slot:
+        try:
+            worker = socket.create_connection(('127.0.0.1', slot.worker_port), timeout=REQUEST_TIMEOUT)
+        except OSError as e:
+            _send_exit(conn, f"拆分工作进程 {slot.index} 不可用: {e}")
+            return
+        with worker:
+            worker.sendall(request)
+            conn.settimeout(None)
+            client_gone = False
+            try:
+                for line in _worker_lines(worker, slot, farm):
+                    # 客户端断开后继续读到任务结束，槽位空闲时工作进程才真正空闲
+                    if not client_gone:
+                        try:
+                            conn.sendall(line)
+                        except OSError:
+                            client_gone = True
+                    if line.startswith(EXIT_PREFIX.encode('utf-8')):
+                        return
+            except socket.timeout:
+                # 超过 hang_timeout 秒没有任何输出视为卡死
+                _send_exit(conn, f"拆分任务超过 {farm.hang_timeout:.0f} 秒没有输出，"
+                                 f"已重启 soffice 实例 {slot.index}，可带 --resume 重试")
+                raise TimeoutError(f"soffice 实例 {slot.index} 卡死")
+            _send_exit(conn, f"拆分工作进程 {slot.index} 在任务完成前退出")
+
+
+def _proxy_connection(conn, farm) -> None:
+    with conn:
+        try:
+            proxy_job(conn, farm)
+        except TimeoutError as e:
+            logger.warning(str(e))
+        except (OSError, ValueError) as e:
+            logger.warning(f"任务未完成: {e}")
+
+
+def serve_farm(listen: str, instances: int) -> None:
+    from soffice_farm import SofficeFarm
+
+    farm = SofficeFarm(instances)
+    host, port = parse_address(listen)
+    try:
+        farm.start()
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((host, port))
+        server.listen(LISTEN_BACKLOG)
+        logger.info(f"拆分服务（{instances} 个 soffice 实例）已启动: {host}:{port}")
+        with server:
+            while True:
+                conn, _ = server.accept()
+                threading.Thread(target=_proxy_connection, args=(conn, farm), daemon=True).start()
+    finally:
+        farm.stop()
+
+
+def instances_arg(value: str) -> int:
+    """--instances=N 或 auto（CPU核数）"""
+    if value.strip().lower() == 'auto':
+        return os.cpu_count() or 1
+    instances = int(value)
+    if instances < 0:
+        raise ValueError(f"无效的实例数: {value}")
+    return instances
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s',
+                        stream=sys.stderr)
+    listen = os.environ.get(SPLIT_SERVICE_ENV) or DEFAULT_LISTEN
+    instances = 0
+    for arg in sys.argv[1:]:
+        if arg.startswith(LISTEN_FLAG):
+            listen = arg[len(LISTEN_FLAG):]
+        elif arg.startswith(INSTANCES_FLAG):
+            instances = instances_arg(arg[len(INSTANCES_FLAG):])
+    # pm2 / systemd 以 SIGTERM 停止服务，农场模式需要借此结束各 soffice 实例
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        if instances:
+            serve_farm(listen, instances)
+        else:
+            serve(listen)
+    except KeyboardInterrupt:
+        pass
+    logger.info("拆分服务已停止")
+
+
+if __name__ == "__main__":
+    main()
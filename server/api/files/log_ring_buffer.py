@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+逐行日志的环形缓冲模式
+
+Excel修改脚本在处理每一行时都会记录日志，万行级表格下格式化并写出
+这些日志（stderr再由Node缓冲）本身就占用可观的时间。环形缓冲模式下：
+- 逐行明细写入独立的 `<模块名>.rows` logger，只保存在有界的内存环形缓冲中
+- 表格级汇总仍通过主logger正常输出
+- 缓冲只在出现ERROR日志、收到SIGUSR1或显式调用 dump_log_buffer 时输出
+- 缓冲中保存的是未格式化的LogRecord，只有真正输出时才格式化
+
+通过 ProcessingConfig.log_mode 或环境变量切换：
+    EXCEL_LOG_MODE=stream|ring   （默认 stream，与原行为一致）
+    EXCEL_LOG_RING_SIZE=2000     （环形缓冲容量）
+    EXCEL_LOG_DUMP=1             （处理结束时总是输出缓冲）
+"""
+
+import os
+import sys
+import signal
+import logging
+from collections import deque
+from typing import Optional
+
+LOG_MODE_ENV = 'EXCEL_LOG_MODE'
+LOG_RING_SIZE_ENV = 'EXCEL_LOG_RING_SIZE'
+LOG_DUMP_ENV = 'EXCEL_LOG_DUMP'
+
+LOG_MODE_STREAM = 'stream'
+LOG_MODE_RING = 'ring'
+DEFAULT_RING_SIZE = 2000
+
+
+def default_log_mode() -> str:
+    """从环境变量读取日志模式"""
+    mode = os.environ.get(LOG_MODE_ENV, LOG_MODE_STREAM).strip().lower()
+    return mode if mode in (LOG_MODE_STREAM, LOG_MODE_RING) else LOG_MODE_STREAM
+
+
+def default_ring_size() -> int:
+    """从环境变量读取环形缓冲容量"""
+    try:
+        return max(1, int(os.environ.get(LOG_RING_SIZE_ENV, DEFAULT_RING_SIZE)))
+    except ValueError:
+        return DEFAULT_RING_SIZE
+
+
+def dump_requested() -> bool:
+    """是否要求处理结束时输出缓冲"""
+    return os.environ.get(LOG_DUMP_ENV, '').strip().lower() in ('1', 'true', 'yes')
+
+
+class RingBufferHandler(logging.Handler):
+    """
+    环形缓冲日志处理器
+
+    只保留最近 capacity 条记录；dump 时交给目标处理器格式化并输出。
+    """
+
+    def __init__(self, capacity: int, target: Optional[logging.Handler] = None):
+        super().__init__()
+        self.buffer = deque(maxlen=capacity)
+        self.target = target
+        self.dropped = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(record)
+
+    def dump(self, reason: str = '') -> int:
+        """输出并清空缓冲，返回输出的记录数"""
+        target = self.target or _stderr_handler()
+        records = list(self.buffer)
+        self.buffer.clear()
+        if not records:
+            return 0
+
+        header = f"---- 逐行日志缓冲 ({len(records)} 条"
+        if self.dropped:
+            header += f"，已丢弃更早的 {self.dropped} 条"
+        header += f"){'：' + reason if reason else ''} ----"
+        target.handle(logging.makeLogRecord({
+            'name': records[0].name, 'msg': header,
+            'levelno': logging.INFO, 'levelname': 'INFO',
+        }))
+        for record in records:
+            target.handle(record)
+        self.dropped = 0
+        return len(records)
+
+
+class _DumpOnErrorHandler(logging.Handler):
+    """挂在主logger上，出现ERROR时先输出环形缓冲作为上下文"""
+
+    def __init__(self, ring: RingBufferHandler):
+        super().__init__(level=logging.ERROR)
+        self.ring = ring
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.ring.dump('遇到错误')
+
+
+def _stderr_handler() -> logging.Handler:
+    """复用根logger上已配置的输出处理器（basicConfig创建的stderr处理器）"""
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.StreamHandler):
+            return handler
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    return handler
+
+
+def configure_row_logging(logger: logging.Logger, mode: Optional[str] = None,
+                          capacity: Optional[int] = None) -> logging.Logger:
+    """
+    配置并返回逐行明细logger（`<logger名>.rows`）
+
+    stream模式下逐行日志照常向上传递到根logger；ring模式下写入环形缓冲，
+    主logger出现ERROR时自动输出缓冲内容。重复调用会替换之前的配置。
+
+    Args:
+        logger: 脚本主logger
+        mode: 'stream' 或 'ring'，默认读取环境变量
+        capacity: 环形缓冲容量，默认读取环境变量
+
+    Returns:
+        逐行明细logger
+    """
+    row_logger = logging.getLogger(f"{logger.name}.rows")
+    mode = (mode or default_log_mode()).lower()
+    capacity = capacity or default_ring_size()
+
+    # 清理之前的配置
+    for handler in list(row_logger.handlers):
+        if isinstance(handler, RingBufferHandler):
+            row_logger.removeHandler(handler)
+    for handler in list(logger.handlers):
+        if isinstance(handler, _DumpOnErrorHandler):
+            logger.removeHandler(handler)
+
+    if mode != LOG_MODE_RING:
+        row_logger.propagate = True
+        return row_logger
+
+    ring = RingBufferHandler(capacity)
+    row_logger.addHandler(ring)
+    row_logger.propagate = False
+    logger.addHandler(_DumpOnErrorHandler(ring))
+
+    # 运行中按需输出：kill -USR1 <pid>
+    if hasattr(signal, 'SIGUSR1'):
+        try:
+            signal.signal(signal.SIGUSR1, lambda signum, frame: ring.dump('收到SIGUSR1'))
+        except ValueError:
+            # 非主线程中无法设置信号处理器
+            pass
+
+    return row_logger
+
+
+def dump_log_buffer(row_logger: logging.Logger, reason: str = '') -> int:
+    """输出逐行logger的环形缓冲内容，stream模式下不做任何事"""
+    dumped = 0
+    for handler in row_logger.handlers:
+        if isinstance(handler, RingBufferHandler):
+            dumped += handler.dump(reason)
+    return dumped
@@ -22,6 +22,10 @@ from typing import List, Dict, Tuple, Optional
 from dataclasses import dataclass, field
 from openpyxl import load_workbook
 from difflib import SequenceMatcher
+from excel_sidecar import SheetSnapshot, canonical_key, load_snapshot
+from profiling_hook import default_job_id, extract_profile_args, profile_session
+from log_ring_buffer import (configure_row_logging, default_log_mode, default_ring_size,
+                             dump_log_buffer, dump_requested)
 
 # 配置日志
 logging.basicConfig(
@@ -29,6 +33,8 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
+# 逐行明细日志（ring模式下只进入环形缓冲），一律使用%格式延迟格式化
+row_logger = logging.getLogger(f"{__name__}.rows")
 
 
 # ============================================================================
@@ -93,7 +99,10 @@ class ProcessingConfig:
     enable_wraparound_search: bool = True
     max_search_distance: int = 1000
     preserve_formulas: bool = True
+    use_sidecar_cache: bool = True
     log_level: str = "INFO"
+    log_mode: str = field(default_factory=default_log_mode)      # stream | ring
+    log_ring_size: int = field(default_factory=default_ring_size)
 
 
 @dataclass
@@ -486,7 +495,7 @@ class HeaderMatcher:
         
         Args:
             ai_headers: AI表格的表头列表
-            excel_sheet: Excel工作表对象（openpyxl.worksheet.worksheet.Worksheet）
+            excel_sheet: 工作表快照（SheetSnapshot）
             match_threshold: 匹配阈值，范围[0.0, 1.0]，默认0.5表示50%
             
         Returns:
@@ -609,7 +618,7 @@ class HeaderMatcher:
         3. 返回得分最高的行
         
         Args:
-            worksheet: openpyxl的worksheet对象
+            worksheet: 工作表快照（SheetSnapshot）
             
         Returns:
             (表头行号, 表头字典{列索引: 列名})，如果找不到返回None
@@ -627,9 +636,9 @@ class HeaderMatcher:
             
             # 收集非空单元格
             non_empty_cells = []
-            for col_idx, cell in enumerate(row, start=1):
-                if cell.value is not None and str(cell.value).strip():
-                    non_empty_cells.append((col_idx, str(cell.value).strip()))
+            for col_idx, cell_value in enumerate(row, start=1):
+                if cell_value:
+                    non_empty_cells.append((col_idx, cell_value))
             
             # 至少需要3个非空单元格才可能是表头
             if len(non_empty_cells) < 3:
@@ -707,7 +716,7 @@ class RowMatcher:
         
         Args:
             ai_row: AI数据行（列表）
-            excel_sheet: Excel工作表对象
+            excel_sheet: 工作表快照（SheetSnapshot）
             column_mapping: 列映射字典 {AI列索引: Excel列索引}
             start_row: 数据开始行号（通常是表头行+1）
             header_row: 表头行号
@@ -719,11 +728,14 @@ class RowMatcher:
         """
         try:
             search_start = self.current_pointer if self.current_pointer > start_row else start_row
-            logger.debug(f"    搜索范围: 第{search_start}行 到 第{excel_sheet.max_row}行")
+            row_logger.debug("    搜索范围: 第%d行 到 第%d行", search_start, excel_sheet.max_row)
+            
+            # AI值只规范化一次，Excel一侧的比较键已在快照中预先计算
+            ai_keys = [canonical_key(value) for value in ai_row]
             
             # 第一次搜索：从当前指针到文件末尾
             result = self._search_range(
-                ai_row, excel_sheet, column_mapping,
+                ai_row, ai_keys, excel_sheet, column_mapping,
                 search_start,
                 excel_sheet.max_row
             )
@@ -734,18 +746,19 @@ class RowMatcher:
             
             # 回环搜索：从表头下一行到当前指针
             if enable_wraparound and self.current_pointer > start_row:
-                logger.debug(f"    第一次搜索未找到，执行回环搜索: 第{start_row}行 到 第{self.current_pointer - 1}行")
+                row_logger.debug("    第一次搜索未找到，执行回环搜索: 第%d行 到 第%d行",
+                                 start_row, self.current_pointer - 1)
                 result = self._search_range(
-                    ai_row, excel_sheet, column_mapping,
+                    ai_row, ai_keys, excel_sheet, column_mapping,
                     start_row, self.current_pointer - 1
                 )
                 
                 if result:
                     self.current_pointer = result.row_number
-                    logger.debug(f"    ✓ 回环搜索成功找到匹配")
+                    row_logger.debug("    ✓ 回环搜索成功找到匹配")
                     return result
                 else:
-                    logger.debug(f"    ✗ 回环搜索也未找到匹配")
+                    row_logger.debug("    ✗ 回环搜索也未找到匹配")
             
             return None
             
@@ -756,6 +769,7 @@ class RowMatcher:
     
     def _search_range(self,
                      ai_row: List[str],
+                     ai_keys: List[str],
                      excel_sheet,
                      column_mapping: Dict[int, int],
                      start_row: int,
@@ -765,7 +779,8 @@ class RowMatcher:
         
         Args:
             ai_row: AI数据行
-            excel_sheet: Excel工作表对象
+            ai_keys: AI数据行的规范化比较键（见 canonical_key）
+            excel_sheet: 工作表快照（SheetSnapshot）
             column_mapping: 列映射字典
             start_row: 开始行号
             end_row: 结束行号
@@ -774,14 +789,18 @@ class RowMatcher:
             RowMatchResult对象，如果未找到返回None
         """
         for row_num in range(start_row, end_row + 1):
-            excel_row = excel_sheet[row_num]
+            excel_keys = excel_sheet.keys(row_num)
             matched_count, matched_names = self.compare_rows(
-                ai_row, excel_row, column_mapping
+                ai_keys, excel_keys, column_mapping
             )
             
             if matched_count >= self.match_threshold:
-                logger.info(f"  ✓ 行匹配成功: Excel第{row_num}行 (匹配{matched_count}列: {', '.join(matched_names)})")
-                logger.debug(f"    AI数据: {ai_row[:3]}..." if len(ai_row) > 3 else f"    AI数据: {ai_row}")
+                row_logger.info("  ✓ 行匹配成功: Excel第%d行 (匹配%d列: %s)",
+                                row_num, matched_count, ', '.join(matched_names))
+                if len(ai_row) > 3:
+                    row_logger.debug("    AI数据: %s...", ai_row[:3])
+                else:
+                    row_logger.debug("    AI数据: %s", ai_row)
                 return RowMatchResult(
                     matched=True,
                     row_number=row_num,
@@ -792,30 +811,30 @@ class RowMatcher:
         return None
     
     @staticmethod
-    def compare_rows(ai_row: List[str],
-                    excel_row,
+    def compare_rows(ai_keys: List[str],
+                    excel_keys,
                     column_mapping: Dict[int, int]) -> Tuple[int, List[str]]:
         """
         比较两行数据，返回匹配的列数和列名
         
         比较规则：
-        - 将两个值转换为字符串
-        - 去除前后空白
-        - 忽略大小写进行比较
+        - 两边都使用规范化比较键（见 excel_sidecar.canonical_key）：
+          去除前后空白、忽略大小写、全角转半角，
+          10.0与"10"、日期与"2024/1/5"视为相同
         - 完全相同才算匹配
         
         Args:
-            ai_row: AI数据行（列表）
-            excel_row: Excel行对象（openpyxl的Row对象）
+            ai_keys: AI数据行的比较键（列表）
+            excel_keys: Excel行比较键视图（SheetSnapshot.keys按行号返回）
             column_mapping: 列映射字典 {AI列索引: Excel列索引}
             
         Returns:
             元组 (匹配的列数, 匹配的列名列表)
             
         Example:
-            >>> ai_row = ['1', '测试', '10']
-            >>> # excel_row 包含相同数据
-            >>> count, names = RowMatcher.compare_rows(ai_row, excel_row, {0:1, 1:2, 2:3})
+            >>> ai_keys = [canonical_key(v) for v in ['1', '测试', '10']]
+            >>> # excel_keys 包含相同数据
+            >>> count, names = RowMatcher.compare_rows(ai_keys, excel_keys, {0:1, 1:2, 2:3})
             >>> count
             3
         """
@@ -823,15 +842,11 @@ class RowMatcher:
         matched_names = []
         
         for ai_col_idx, excel_col_idx in column_mapping.items():
-            if ai_col_idx >= len(ai_row):
+            if ai_col_idx >= len(ai_keys):
                 continue
             
-            ai_value = str(ai_row[ai_col_idx]).strip()
-            excel_cell = excel_row[excel_col_idx - 1]  # openpyxl行是0-based索引
-            excel_value = str(excel_cell.value).strip() if excel_cell.value is not None else ""
-            
-            # 比较值（忽略大小写和空白）
-            if ai_value.lower() == excel_value.lower():
+            # 行视图是0-based索引，两边都已规范化
+            if ai_keys[ai_col_idx] == excel_keys[excel_col_idx - 1]:
                 matched_count += 1
                 matched_names.append(f"列{excel_col_idx}")
         
@@ -847,6 +862,7 @@ class DataReplacer:
     数据替换器 - 替换Excel中的行数据
     
     负责将AI数据行的内容精确替换到Excel文件的目标行。
+    写入先记录在工作表快照中，保存前统一回放到工作簿。
     
     替换策略：
     - 仅替换列映射中指定的列
@@ -870,13 +886,12 @@ class DataReplacer:
         4. 处理空值（转换为空字符串）
         
         Args:
-            excel_sheet: Excel工作表对象
+            excel_sheet: 工作表快照（SheetSnapshot）
             row_number: 要替换的行号（1-based）
             ai_row: AI数据行（列表）
             column_mapping: 列映射字典 {AI列索引: Excel列索引}
         """
         try:
-            excel_row = excel_sheet[row_number]
             replaced_count = 0
             
             # 仅替换映射的列
@@ -890,16 +905,15 @@ class DataReplacer:
                     else:
                         ai_value = str(ai_value).strip()
                     
-                    # 写入数据（保留原有格式）
-                    cell = excel_row[excel_col_idx - 1]  # openpyxl行是0-based索引
-                    old_value = cell.value
-                    cell.value = ai_value
+                    # 写入数据（保留原有格式，合并单元格会抛出AttributeError）
+                    old_value = excel_sheet.value(row_number, excel_col_idx)
+                    excel_sheet.set_value(row_number, excel_col_idx, ai_value)
                     replaced_count += 1
                     
                     if old_value != ai_value:
-                        logger.debug(f"    列{excel_col_idx}: '{old_value}' -> '{ai_value}'")
+                        row_logger.debug("    列%d: '%s' -> '%s'", excel_col_idx, old_value, ai_value)
             
-            logger.debug(f"  ✓ 成功替换第{row_number}行的{replaced_count}个单元格")
+            row_logger.debug("  ✓ 成功替换第%d行的%d个单元格", row_number, replaced_count)
             
         except Exception as e:
             error_response = ErrorHandler.handle_data_replacement_error(e)
@@ -930,7 +944,9 @@ class ExcelProcessor:
         self.config = config or ProcessingConfig()
         self.workbook = None
         self.worksheet = None
+        self.snapshot: Optional[SheetSnapshot] = None
         self.statistics = ProcessingStatistics()
+        configure_row_logging(logger, self.config.log_mode, self.config.log_ring_size)
     
     def process(self) -> ProcessingResult:
         """
@@ -973,9 +989,13 @@ class ExcelProcessor:
             
             try:
                 logger.info("加载Excel文件...")
-                self.workbook = load_workbook(self.excel_path)
-                self.worksheet = self.workbook.active
-                logger.info(f"✓ Excel文件加载成功 (工作表: {self.worksheet.title}, 行数: {self.worksheet.max_row})")
+                # 命中sidecar缓存时只mmap快照，工作簿延迟到写入阶段再打开
+                self.snapshot, self.workbook = load_snapshot(
+                    self.excel_path, self.config.use_sidecar_cache
+                )
+                if self.workbook:
+                    self.worksheet = self.workbook.active
+                logger.info(f"✓ Excel文件加载成功 (工作表: {self.snapshot.title}, 行数: {self.snapshot.max_row})")
             except Exception as e:
                 error_response = ErrorHandler.handle_file_operation_error(e)
                 logger.error(f"✗ {error_response.user_message}")
@@ -1011,8 +1031,7 @@ class ExcelProcessor:
                     # 如果是不可恢复的错误，停止处理
                     if not ErrorHandler.is_recoverable_error(e):
                         logger.error("遇到不可恢复的错误，停止处理")
-                        if self.workbook:
-                            self.workbook.close()
+                        self.close()
                         return ProcessingResult(
                             success=False,
                             error=error_response.user_message,
@@ -1024,7 +1043,7 @@ class ExcelProcessor:
             
             # 4. 保存文件
             if self.statistics.matched_rows == 0:
-                self.workbook.close()
+                self.close()
                 logger.error("✗ 没有任何行被成功匹配和替换")
                 return ProcessingResult(
                     success=False,
@@ -1035,11 +1054,11 @@ class ExcelProcessor:
             
             try:
                 logger.info("保存修改后的文件...")
-                output_path = self._save_workbook()
-                self.workbook.close()
+                output_path = self.save_workbook()
+                self.close()
                 logger.info(f"✓ 文件保存成功: {output_path}")
             except Exception as e:
-                self.workbook.close()
+                self.close()
                 error_response = ErrorHandler.handle_file_operation_error(e)
                 logger.error(f"✗ {error_response.user_message}")
                 return ProcessingResult(
@@ -1076,8 +1095,7 @@ class ExcelProcessor:
         except Exception as e:
             error_response = ErrorHandler.handle_error(e, "Excel处理")
             logger.error(f"✗ {error_response.user_message}")
-            if self.workbook:
-                self.workbook.close()
+            self.close()
             
             return ProcessingResult(
                 success=False,
@@ -1112,7 +1130,7 @@ class ExcelProcessor:
             logger.info("  开始匹配表头...")
             header_result = HeaderMatcher.match_header(
                 table_data.headers,
-                self.worksheet,
+                self.snapshot,
                 self.config.header_match_threshold
             )
             
@@ -1133,12 +1151,12 @@ class ExcelProcessor:
             # 4. 处理每一行
             for row_idx, ai_row in enumerate(table_data.rows, 1):
                 try:
-                    logger.debug(f"  处理第 {row_idx}/{len(table_data.rows)} 行...")
+                    row_logger.debug("  处理第 %d/%d 行...", row_idx, len(table_data.rows))
                     
                     # 查找匹配行
                     match_result = row_matcher.find_matching_row(
                         ai_row,
-                        self.worksheet,
+                        self.snapshot,
                         header_result.column_mapping,
                         header_result.header_row + 1,
                         header_result.header_row,
@@ -1148,7 +1166,7 @@ class ExcelProcessor:
                     if match_result and match_result.matched:
                         # 替换数据
                         DataReplacer.replace_row(
-                            self.worksheet,
+                            self.snapshot,
                             match_result.row_number,
                             ai_row,
                             header_result.column_mapping
@@ -1156,8 +1174,8 @@ class ExcelProcessor:
                         self.statistics.matched_rows += 1
                         matched_in_table += 1
                     else:
-                        logger.warning(f"  ⚠ 跳过第 {row_idx} 行: 未找到匹配的Excel行")
-                        logger.debug(f"    AI数据: {ai_row}")
+                        row_logger.warning("  ⚠ 跳过第 %d 行: 未找到匹配的Excel行", row_idx)
+                        row_logger.debug("    AI数据: %s", ai_row)
                         self.statistics.skipped_rows += 1
                         skipped_in_table += 1
                         
@@ -1177,13 +1195,30 @@ class ExcelProcessor:
             logger.error(f"  ✗ {error_response.user_message}")
             return False
     
-    def _save_workbook(self) -> str:
+    def close(self) -> None:
+        """关闭工作簿并释放快照"""
+        if self.workbook:
+            self.workbook.close()
+        if self.snapshot:
+            self.snapshot.close()
+    
+    def save_workbook(self) -> str:
         """
         保存工作簿
         
+        将快照中记录的写入回放到工作簿后保存；
+        如果快照来自sidecar缓存，此时才真正打开xlsx。
+        
         Returns:
             保存后的文件路径
         """
+        if self.workbook is None:
+            logger.info("打开Excel文件以写入修改...")
+            self.workbook = load_workbook(self.excel_path)
+            self.worksheet = self.workbook.active
+        applied = self.snapshot.apply_writes(self.worksheet)
+        logger.debug(f"已回放 {applied} 次单元格写入")
+        
         output_dir = 'uploads/modified'
         os.makedirs(output_dir, exist_ok=True)
         
@@ -1233,6 +1268,10 @@ def modify_excel(original_path: str, ai_result: str, output_dir: str = 'uploads/
         processor = ExcelProcessor(original_path, ai_result, config)
         result = processor.process()
         
+        # 环形缓冲模式下，失败或显式要求时输出逐行明细
+        if not result.success or dump_requested():
+            dump_log_buffer(row_logger, '处理结束' if result.success else '处理失败')
+        
         # 转换为字典格式（保持API兼容性）
         response = {
             'success': result.success,
@@ -1275,7 +1314,9 @@ def main():
     sys.stdin = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', line_buffering=True)
     
-    if len(sys.argv) < 2:
+    argv, profile_options = extract_profile_args(sys.argv)
+    
+    if len(argv) < 2:
         result = {
             'success': False,
             'error': '参数不足。用法: python modify_excel.py <原文件路径> [输出目录] (AI结果从stdin读取)'
@@ -1283,14 +1324,17 @@ def main():
         print(json.dumps(result, ensure_ascii=False))
         sys.exit(1)
     
-    original_path = sys.argv[1]
-    output_dir = sys.argv[2] if len(sys.argv) > 2 else 'uploads/modified'
+    original_path = argv[1]
+    output_dir = argv[2] if len(argv) > 2 else 'uploads/modified'
     
     # 从stdin读取AI结果
     ai_result = sys.stdin.read()
     
-    # 执行处理
-    result = modify_excel(original_path, ai_result, output_dir)
+    # 执行处理（开启剖析时结果中附带剖析文件路径）
+    with profile_session(default_job_id(argv[0], original_path), profile_options) as profile:
+        result = modify_excel(original_path, ai_result, output_dir)
+    if profile:
+        result['profile'] = profile.to_dict()
     
     # 输出JSON结果
     print(json.dumps(result, ensure_ascii=False))
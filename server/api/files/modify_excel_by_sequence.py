@@ -23,6 +23,10 @@ import re
 from typing import List, Dict, Optional, Any, Tuple
 from dataclasses import dataclass, field
 from openpyxl import load_workbook
+from excel_sidecar import SheetSnapshot, load_snapshot, normalize_sequence as normalize_sequence_value
+from profiling_hook import default_job_id, extract_profile_args, profile_session
+from log_ring_buffer import (configure_row_logging, default_log_mode, default_ring_size,
+                             dump_log_buffer, dump_requested)
 
 # 配置日志
 logging.basicConfig(
@@ -30,6 +34,8 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
+# 逐行明细日志（ring模式下只进入环形缓冲），一律使用%格式延迟格式化
+row_logger = logging.getLogger(f"{__name__}.rows")
 
 
 # ============================================================================
@@ -82,7 +88,10 @@ class ProcessingConfig:
     max_header_search_rows: int = 20        # 最大表头搜索行数
     normalize_sequence: bool = True         # 是否标准化序号值
     skip_empty_sequence: bool = True        # 是否跳过空序号行
+    use_sidecar_cache: bool = True          # 是否使用sidecar列式缓存
     log_level: str = "INFO"                 # 日志级别
+    log_mode: str = field(default_factory=default_log_mode)         # 日志模式: stream | ring
+    log_ring_size: int = field(default_factory=default_ring_size)   # 环形缓冲容量
 
 
 # ============================================================================
@@ -295,7 +304,7 @@ class SequenceColumnLocator:
         在Excel工作表中定位序号列
         
         Args:
-            worksheet: openpyxl工作表对象
+            worksheet: 工作表快照（SheetSnapshot）
             max_rows: 最大搜索行数，默认20
             
         Returns:
@@ -309,10 +318,8 @@ class SequenceColumnLocator:
             for row_num in range(1, max_scan_rows + 1):
                 row = worksheet[row_num]
                 
-                for col_idx, cell in enumerate(row, start=1):
-                    if cell.value is not None:
-                        cell_value = str(cell.value).strip()
-                        
+                for col_idx, cell_value in enumerate(row, start=1):
+                    if cell_value:
                         # 检查是否是"序号"列
                         if cell_value == "序号" or cell_value.lower() == "序号":
                             logger.info(f"✓ 找到序号列: 第{row_num}行, 第{col_idx}列")
@@ -339,7 +346,7 @@ class SequenceColumnLocator:
         解析表头行，创建列名到列索引的映射
         
         Args:
-            worksheet: openpyxl工作表对象
+            worksheet: 工作表快照（SheetSnapshot）
             header_row: 表头所在行号
             
         Returns:
@@ -348,10 +355,10 @@ class SequenceColumnLocator:
         column_headers = {}
         row = worksheet[header_row]
         
-        for col_idx, cell in enumerate(row, start=1):
-            if cell.value is not None:
+        for col_idx, cell_value in enumerate(row, start=1):
+            if cell_value:
                 # 去除所有空格（包括中间的空格）以实现更好的匹配
-                header_name = str(cell.value).strip().replace(' ', '').replace('\u3000', '')
+                header_name = cell_value.replace(' ', '').replace('\u3000', '')
                 if header_name:
                     column_headers[header_name] = col_idx
         
@@ -368,7 +375,7 @@ class SequenceMatcher:
     序号匹配器 - 基于序号值进行行匹配
     
     核心功能：
-    - 构建序号到行号的映射表（O(1)查找）
+    - 构建序号到行号的映射表（O(1)查找），sidecar缓存中已有时直接复用
     - 标准化序号值（处理前导零、空格、类型等）
     - 通过序号值直接查找目标行
     """
@@ -378,7 +385,7 @@ class SequenceMatcher:
         初始化序号匹配器
         
         Args:
-            worksheet: openpyxl工作表对象
+            worksheet: 工作表快照（SheetSnapshot）
             sequence_col_index: 序号列的列索引（1-based）
             header_row: 表头所在行号
         """
@@ -397,22 +404,34 @@ class SequenceMatcher:
         Returns:
             序号值到行号的字典 {标准化序号值: 行号}
         """
-        sequence_map = {}
         start_row = self.header_row + 1
         
+        # sidecar中预先构建的索引与当前定位结果一致时直接复用
+        cached_index = self.worksheet.sequence_index
+        if (cached_index
+                and cached_index['column_index'] == self.sequence_col_index
+                and cached_index['header_row'] == self.header_row):
+            for normalized_seq, first_row, row_num in cached_index['duplicates']:
+                row_logger.warning("  发现重复序号 '%s' (行%d 和 行%d), 使用第一个",
+                                   normalized_seq, first_row, row_num)
+            sequence_map = cached_index['map']
+            logger.info(f"✓ 复用缓存的序号映射表，共{len(sequence_map)}个序号")
+            return sequence_map
+        
+        sequence_map = {}
         logger.info(f"构建序号映射表（从第{start_row}行开始）...")
         
         for row_num in range(start_row, self.worksheet.max_row + 1):
-            cell = self.worksheet.cell(row_num, self.sequence_col_index)
+            normalized_seq = self.normalize_sequence(
+                self.worksheet.key(row_num, self.sequence_col_index)
+            )
             
-            if cell.value is not None:
-                normalized_seq = self.normalize_sequence(cell.value)
-                
-                if normalized_seq:  # 跳过空序号
-                    if normalized_seq in sequence_map:
-                        logger.warning(f"  发现重复序号 '{normalized_seq}' (行{sequence_map[normalized_seq]} 和 行{row_num}), 使用第一个")
-                    else:
-                        sequence_map[normalized_seq] = row_num
+            if normalized_seq:  # 跳过空序号
+                if normalized_seq in sequence_map:
+                    row_logger.warning("  发现重复序号 '%s' (行%d 和 行%d), 使用第一个",
+                                       normalized_seq, sequence_map[normalized_seq], row_num)
+                else:
+                    sequence_map[normalized_seq] = row_num
         
         logger.info(f"✓ 序号映射表构建完成，共{len(sequence_map)}个序号")
         return sequence_map
@@ -439,8 +458,8 @@ class SequenceMatcher:
         """
         标准化序号值
         
-        标准化规则：
-        1. 转换为字符串
+        标准化规则（按字面比较，"1.10"与"1.1"不同）：
+        1. 整数值的浮点数转为整数（1.0、"１"与"1"相同）
         2. 去除前导和尾随空格
         3. 去除前导零（但保留单个"0"）
         4. 统一处理None和空字符串
@@ -451,20 +470,8 @@ class SequenceMatcher:
         Returns:
             标准化后的字符串
         """
-        if value is None or value == "":
-            return ""
-        
-        # 转换为字符串并去除空格
-        str_value = str(value).strip()
-        
-        if not str_value:
-            return ""
-        
-        # 去除前导零，但保留单个"0"
-        if str_value.isdigit():
-            str_value = str(int(str_value))
-        
-        return str_value
+        # 与sidecar构建序号索引时使用同一实现
+        return normalize_sequence_value(value)
 
 
 # ============================================================================
@@ -476,6 +483,7 @@ class DataReplacer:
     数据替换器 - 替换Excel中的行数据
     
     负责将AI数据行的内容精确替换到Excel文件的目标行。
+    写入先记录在工作表快照中，保存前统一回放到工作簿。
     """
     
     # 列名映射规则：AI列名 -> Excel列名
@@ -516,7 +524,7 @@ class DataReplacer:
         # 3. 模糊匹配：检查是否包含关键词
         for excel_col in column_mapping.keys():
             if excel_col in col_name or col_name in excel_col:
-                logger.debug(f"    模糊匹配: '{col_name}' -> '{excel_col}'")
+                row_logger.debug("    模糊匹配: '%s' -> '%s'", col_name, excel_col)
                 return excel_col
         
         return None
@@ -530,7 +538,7 @@ class DataReplacer:
         替换指定行的数据
         
         Args:
-            worksheet: openpyxl工作表对象
+            worksheet: 工作表快照（SheetSnapshot）
             row_number: 目标行号（1-based）
             ai_row_data: AI数据行（列名到值的字典）
             column_mapping: 列名到Excel列索引的映射
@@ -547,11 +555,10 @@ class DataReplacer:
                 
                 if excel_col_name:
                     excel_col_idx = column_mapping[excel_col_name]
-                    cell = worksheet.cell(row_number, excel_col_idx)
                     
                     # 检查是否是合并单元格
                     if DataReplacer.is_merged_cell(worksheet, row_number, excel_col_idx):
-                        logger.debug(f"    列'{col_name}': 跳过合并单元格 (行{row_number}, 列{excel_col_idx})")
+                        row_logger.debug("    列'%s': 跳过合并单元格 (行%d, 列%d)", col_name, row_number, excel_col_idx)
                         continue
                     
                     # 处理空值
@@ -560,20 +567,20 @@ class DataReplacer:
                     else:
                         new_value = str(col_value).strip()
                     
-                    old_value = cell.value
+                    old_value = worksheet.value(row_number, excel_col_idx)
                     
                     try:
-                        cell.value = new_value
+                        worksheet.set_value(row_number, excel_col_idx, new_value)
                         replaced_count += 1
                         
                         if old_value != new_value:
-                            logger.debug(f"    列'{col_name}': '{old_value}' -> '{new_value}'")
+                            row_logger.debug("    列'%s': '%s' -> '%s'", col_name, old_value, new_value)
                     except AttributeError as e:
                         # 处理MergedCell错误
-                        logger.debug(f"    列'{col_name}': 跳过合并单元格 (AttributeError)")
+                        row_logger.debug("    列'%s': 跳过合并单元格 (AttributeError)", col_name)
                         continue
             
-            logger.debug(f"  ✓ 成功替换第{row_number}行的{replaced_count}个单元格")
+            row_logger.debug("  ✓ 成功替换第%d行的%d个单元格", row_number, replaced_count)
             return replaced_count
             
         except Exception as e:
@@ -586,16 +593,14 @@ class DataReplacer:
         检查单元格是否是合并单元格
         
         Args:
-            worksheet: openpyxl工作表对象
+            worksheet: 工作表快照（SheetSnapshot）
             row: 行号（1-based）
             col: 列号（1-based）
             
         Returns:
             是否是合并单元格
         """
-        from openpyxl.cell.cell import MergedCell
-        cell = worksheet.cell(row, col)
-        return isinstance(cell, MergedCell)
+        return worksheet.is_merged(row, col)
 
 
 # 文件未完成，继续在下一部分...
@@ -622,7 +627,9 @@ class ExcelSequenceProcessor:
         self.config = config or ProcessingConfig()
         self.workbook = None
         self.worksheet = None
+        self.snapshot: Optional[SheetSnapshot] = None
         self.statistics = ProcessingStatistics()
+        configure_row_logging(logger, self.config.log_mode, self.config.log_ring_size)
     
     def process(self) -> ProcessingResult:
         """
@@ -665,9 +672,13 @@ class ExcelSequenceProcessor:
             
             try:
                 logger.info("加载Excel文件...")
-                self.workbook = load_workbook(self.excel_path)
-                self.worksheet = self.workbook.active
-                logger.info(f"✓ Excel文件加载成功 (工作表: {self.worksheet.title}, 行数: {self.worksheet.max_row})")
+                # 命中sidecar缓存时只mmap快照，工作簿延迟到写入阶段再打开
+                self.snapshot, self.workbook = load_snapshot(
+                    self.excel_path, self.config.use_sidecar_cache
+                )
+                if self.workbook:
+                    self.worksheet = self.workbook.active
+                logger.info(f"✓ Excel文件加载成功 (工作表: {self.snapshot.title}, 行数: {self.snapshot.max_row})")
             except Exception as e:
                 logger.error(f"✗ 加载Excel文件失败: {str(e)}")
                 return ProcessingResult(
@@ -679,12 +690,12 @@ class ExcelSequenceProcessor:
             # 3. 定位序号列
             logger.info("-" * 80)
             seq_col_info = SequenceColumnLocator.locate_sequence_column(
-                self.worksheet,
+                self.snapshot,
                 self.config.max_header_search_rows
             )
             
             if not seq_col_info:
-                self.workbook.close()
+                self.close()
                 error_msg = f"在前{self.config.max_header_search_rows}行中未找到'序号'列，无法进行匹配"
                 logger.error(f"✗ {error_msg}")
                 return ProcessingResult(
@@ -696,7 +707,7 @@ class ExcelSequenceProcessor:
             # 4. 构建序号匹配器
             logger.info("-" * 80)
             sequence_matcher = SequenceMatcher(
-                self.worksheet,
+                self.snapshot,
                 seq_col_info.column_index,
                 seq_col_info.header_row
             )
@@ -740,7 +751,7 @@ class ExcelSequenceProcessor:
             
             # 6. 保存文件
             if self.statistics.matched_rows == 0:
-                self.workbook.close()
+                self.close()
                 logger.error("✗ 没有任何行被成功匹配和替换")
                 return ProcessingResult(
                     success=False,
@@ -751,11 +762,11 @@ class ExcelSequenceProcessor:
             
             try:
                 logger.info("保存修改后的文件...")
-                output_path = self._save_workbook()
-                self.workbook.close()
+                output_path = self.save_workbook()
+                self.close()
                 logger.info(f"✓ 文件保存成功: {output_path}")
             except Exception as e:
-                self.workbook.close()
+                self.close()
                 logger.error(f"✗ 保存文件失败: {str(e)}")
                 return ProcessingResult(
                     success=False,
@@ -790,8 +801,7 @@ class ExcelSequenceProcessor:
             
         except Exception as e:
             logger.error(f"✗ Excel处理失败: {str(e)}", exc_info=True)
-            if self.workbook:
-                self.workbook.close()
+            self.close()
             
             return ProcessingResult(
                 success=False,
@@ -839,12 +849,12 @@ class ExcelSequenceProcessor:
                     sequence_value = row_data.get("序号", "")
                     
                     if not sequence_value or str(sequence_value).strip() == "":
-                        logger.warning(f"  ⚠ 跳过第 {row_idx} 行: 序号为空")
+                        row_logger.warning("  ⚠ 跳过第 %d 行: 序号为空", row_idx)
                         self.statistics.skipped_rows += 1
                         skipped_in_table += 1
                         continue
                     
-                    logger.debug(f"  处理第 {row_idx}/{len(table.rows)} 行 (序号: {sequence_value})...")
+                    row_logger.debug("  处理第 %d/%d 行 (序号: %s)...", row_idx, len(table.rows), sequence_value)
                     
                     # 查找匹配行
                     excel_row_num = sequence_matcher.find_row_by_sequence(sequence_value)
@@ -852,22 +862,23 @@ class ExcelSequenceProcessor:
                     if excel_row_num:
                         # 替换数据
                         replaced_count = DataReplacer.replace_row(
-                            self.worksheet,
+                            self.snapshot,
                             excel_row_num,
                             row_data,
                             column_mapping
                         )
                         
                         if replaced_count > 0:
-                            logger.info(f"  ✓ 序号 {sequence_value} 匹配成功 -> Excel第{excel_row_num}行 (替换{replaced_count}列)")
+                            row_logger.info("  ✓ 序号 %s 匹配成功 -> Excel第%d行 (替换%d列)",
+                                            sequence_value, excel_row_num, replaced_count)
                             self.statistics.matched_rows += 1
                             matched_in_table += 1
                         else:
-                            logger.warning(f"  ⚠ 序号 {sequence_value} 找到但未替换任何列")
+                            row_logger.warning("  ⚠ 序号 %s 找到但未替换任何列", sequence_value)
                             self.statistics.skipped_rows += 1
                             skipped_in_table += 1
                     else:
-                        logger.warning(f"  ⚠ 跳过第 {row_idx} 行: 序号 {sequence_value} 在Excel中未找到")
+                        row_logger.warning("  ⚠ 跳过第 %d 行: 序号 %s 在Excel中未找到", row_idx, sequence_value)
                         self.statistics.skipped_rows += 1
                         skipped_in_table += 1
                         
@@ -885,13 +896,30 @@ class ExcelSequenceProcessor:
             logger.error(f"  ✗ 表格处理失败: {str(e)}", exc_info=True)
             return False
     
-    def _save_workbook(self) -> str:
+    def close(self) -> None:
+        """关闭工作簿并释放快照"""
+        if self.workbook:
+            self.workbook.close()
+        if self.snapshot:
+            self.snapshot.close()
+    
+    def save_workbook(self) -> str:
         """
         保存工作簿
         
+        将快照中记录的写入回放到工作簿后保存；
+        如果快照来自sidecar缓存，此时才真正打开xlsx。
+        
         Returns:
             保存后的文件路径
         """
+        if self.workbook is None:
+            logger.info("打开Excel文件以写入修改...")
+            self.workbook = load_workbook(self.excel_path)
+            self.worksheet = self.workbook.active
+        applied = self.snapshot.apply_writes(self.worksheet)
+        logger.debug(f"已回放 {applied} 次单元格写入")
+        
         output_dir = 'uploads/modified'
         os.makedirs(output_dir, exist_ok=True)
         
@@ -941,6 +969,10 @@ def modify_excel_by_sequence(original_path: str, ai_result: str, output_dir: str
         processor = ExcelSequenceProcessor(original_path, ai_result, config)
         result = processor.process()
         
+        # 环形缓冲模式下，失败或显式要求时输出逐行明细
+        if not result.success or dump_requested():
+            dump_log_buffer(row_logger, '处理结束' if result.success else '处理失败')
+        
         # 转换为字典格式（保持API兼容性）
         response = {
             'success': result.success,
@@ -982,7 +1014,9 @@ def main():
     sys.stdin = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', line_buffering=True)
     
-    if len(sys.argv) < 2:
+    argv, profile_options = extract_profile_args(sys.argv)
+    
+    if len(argv) < 2:
         result = {
             'success': False,
             'error': '参数不足。用法: python modify_excel_by_sequence.py <原文件路径> [输出目录] (AI结果从stdin读取)'
@@ -990,14 +1024,17 @@ def main():
         print(json.dumps(result, ensure_ascii=False))
         sys.exit(1)
     
-    original_path = sys.argv[1]
-    output_dir = sys.argv[2] if len(sys.argv) > 2 else 'uploads/modified'
+    original_path = argv[1]
+    output_dir = argv[2] if len(argv) > 2 else 'uploads/modified'
     
     # 从stdin读取AI结果
     ai_result = sys.stdin.read()
     
-    # 执行处理
-    result = modify_excel_by_sequence(original_path, ai_result, output_dir)
+    # 执行处理（开启剖析时结果中附带剖析文件路径）
+    with profile_session(default_job_id(argv[0], original_path), profile_options) as profile:
+        result = modify_excel_by_sequence(original_path, ai_result, output_dir)
+    if profile:
+        result['profile'] = profile.to_dict()
     
     # 输出JSON结果
     print(json.dumps(result, ensure_ascii=False))
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+拆分引擎共用的页码边界缓存（按内容寻址）
+
+分页是拆分中最慢的一步（Word 的 ComputeStatistics / GoTo，LibreOffice 的
+逐页遍历，python-docx 的页码映射）。用户经常只改 pages_per_file
+重新拆分同一个上传文件，所以把"页码 → body位置"的边界按
+<输入文件SHA-256>.<引擎>.json 保存下来，之后的运行直接复用，只做切片。
+
+body位置的含义由引擎决定：
+    python_docx  body块索引（与 DocxChunkWriter.body_blocks 一致），边界完整
+    word         文档字符偏移（doc.GoTo(...).Start），按需补全
+    libreoffice  只缓存总页数（UNO文本范围无法跨进程保存），指定页码范围时只需遍历到最后一个页段
+    libreoffice_hybrid  body块索引（LibreOffice分页后对齐到body块），边界完整
+
+缓存目录默认为上传目录下的 .pagemapcache（与上传文件同盘，随上传清理一起过期），
+可通过环境变量调整：
+    PAGE_MAP_CACHE=0             关闭缓存
+    PAGE_MAP_CACHE_DIR=<目录>     缓存目录
+    PAGE_MAP_CACHE_MAX_MB=64      缓存总大小上限，超出时按最近使用时间（mtime）淘汰
+
+命中时会刷新条目的mtime，因此mtime即最近使用时间；
+fileCleanup.ts 按同样的24小时规则清理长期未使用的条目。
+"""
+
+import os
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PAGE_MAP_CACHE_ENV = 'PAGE_MAP_CACHE'
+PAGE_MAP_CACHE_DIR_ENV = 'PAGE_MAP_CACHE_DIR'
+PAGE_MAP_CACHE_MAX_MB_ENV = 'PAGE_MAP_CACHE_MAX_MB'
+
+CACHE_DIRNAME = '.pagemapcache'
+CACHE_SUFFIX = '.json'
+CACHE_VERSION = 1
+DEFAULT_MAX_MB = 64
+
+
+@dataclass
+class PageBoundaries:
+    """
+    一个文档在某个引擎下的分页结果
+
+    starts[p] 为第p页第一个内容的body位置；starts[total_pages + 1]（若有）为文档末尾。
+    """
+    engine: str
+    total_pages: int
+    starts: Dict[int, int] = field(default_factory=dict)
+    method: str = ''
+
+    def has_pages(self, pages: List[int]) -> bool:
+        return all(page in self.starts for page in pages)
+
+    def to_dict(self, content_hash: str) -> Dict:
+        return {
+            'version': CACHE_VERSION,
+            'content_hash': content_hash,
+            'engine': self.engine,
+            'total_pages': self.total_pages,
+            'method': self.method,
+            'starts': {str(page): pos for page, pos in sorted(self.starts.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'PageBoundaries':
+        return cls(
+            engine=data['engine'],
+            total_pages=int(data['total_pages']),
+            starts={int(page): int(pos) for page, pos in data.get('starts', {}).items()},
+            method=data.get('method', ''),
+        )
+
+
+def cache_enabled() -> bool:
+    return os.environ.get(PAGE_MAP_CACHE_ENV, '1').strip().lower() not in ('0', 'false', 'no')
+
+
+def _max_bytes() -> int:
+    try:
+        return int(float(os.environ.get(PAGE_MAP_CACHE_MAX_MB_ENV, DEFAULT_MAX_MB)) * 1024 * 1024)
+    except ValueError:
+        return DEFAULT_MAX_MB * 1024 * 1024
+
+
+class PageMapCache:
+    """内容寻址的页码边界缓存目录"""
+
+    def __init__(self, cache_dir: str, max_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = _max_bytes() if max_bytes is None else max_bytes
+
+    @classmethod
+    def for_input(cls, input_path: str) -> 'PageMapCache':
+        """默认缓存目录：输入文件所在目录（即uploads）下的 .pagemapcache"""
+        cache_dir = os.environ.get(PAGE_MAP_CACHE_DIR_ENV) or os.path.join(
+            os.path.dirname(os.path.abspath(input_path)), CACHE_DIRNAME)
+        return cls(cache_dir)
+
+    def entry_path(self, content_hash: str, engine: str) -> str:
+        return os.path.join(self.cache_dir, f"{content_hash}.{engine}{CACHE_SUFFIX}")
+
+    def load(self, content_hash: str, engine: str) -> Optional[PageBoundaries]:
+        """读取缓存条目，命中时刷新mtime；不存在、损坏或版本不符时返回None"""
+        path = self.entry_path(content_hash, engine)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"页码缓存无效，将重新分页: {path}: {e}")
+            return None
+
+        if (data.get('version') != CACHE_VERSION
+                or data.get('content_hash') != content_hash
+                or data.get('engine') != engine):
+            return None
+
+        try:
+            boundaries = PageBoundaries.from_dict(data)
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"页码缓存无效，将重新分页: {path}: {e}")
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return boundaries
+
+    def store(self, content_hash: str, boundaries: PageBoundaries) -> bool:
+        """原子写入缓存条目（先写临时文件再替换），写入后按大小上限淘汰"""
+        path = self.entry_path(content_hash, boundaries.engine)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(boundaries.to_dict(content_hash), f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"写入页码缓存失败 {path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+
+        self.evict(keep=path)
+        return True
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """总大小超过上限时，按mtime从旧到新删除条目，返回删除的条目数"""
+        entries = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if not entry.name.endswith(CACHE_SUFFIX) or not entry.is_file():
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            return 0
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+def open_page_map_cache(input_path: str) -> Optional[PageMapCache]:
+    """
+    打开输入文件对应的缓存
+
+    条目按内容哈希读写，哈希由调用方传入（拆分入口 @cached_split_result 已计算好），
+    这里不再读取输入文件。
+
+    Returns:
+        PageMapCache；缓存关闭时返回None
+    """
+    if not cache_enabled():
+        return None
+    return PageMapCache.for_input(input_path)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+页码范围列表（如 "1-3,7,20-25"）
+
+所有拆分入口都接受 --pages=<范围列表>：每个范围写出一个文件，
+未列出的页不写出，此时 <每文件页数> 参数被忽略。
+范围按页码映射一次性解析，只定位和写出请求的页段。
+"""
+
+from typing import List, Optional, Tuple
+
+PAGE_RANGES_FLAG = '--pages='
+
+PageRange = Tuple[int, int]
+
+
+def parse_page_ranges(spec: str) -> List[PageRange]:
+    """
+    解析范围列表
+
+    逗号（含中文逗号）分隔，每项为单页 "7" 或闭区间 "20-25"，忽略空白。
+    按输入顺序返回，重复的范围只保留第一次出现的（同名输出文件只写一次）。
+
+    Raises:
+        ValueError: 格式错误、页码小于1或区间起点大于终点
+    """
+    ranges: List[PageRange] = []
+    for item in spec.replace('，', ',').split(','):
+        item = ''.join(item.split())
+        if not item:
+            continue
+        start_text, sep, end_text = item.partition('-')
+        try:
+            start = int(start_text)
+            end = int(end_text) if sep else start
+        except ValueError:
+            raise ValueError(f"无效的页码范围: {item}")
+        if start < 1 or end < start:
+            raise ValueError(f"无效的页码范围: {item}")
+        if (start, end) not in ranges:
+            ranges.append((start, end))
+    if not ranges:
+        raise ValueError("页码范围为空")
+    return ranges
+
+
+def clamp_page_ranges(ranges: List[PageRange], total_pages: int) -> List[PageRange]:
+    """按文档总页数截断范围，完全超出的范围丢弃并提示"""
+    clamped = []
+    for start, end in ranges:
+        if start > total_pages:
+            print(f"警告: 页码范围 {start}-{end} 超出文档总页数 {total_pages}，已跳过")
+            continue
+        clamped.append((start, min(end, total_pages)))
+    return clamped
+
+
+def stride_page_ranges(total_pages: int, pages_per_file: int) -> List[PageRange]:
+    """按每文件页数均分的范围"""
+    return [
+        (start, min(start + pages_per_file - 1, total_pages))
+        for start in range(1, total_pages + 1, pages_per_file)
+    ]
+
+
+def extract_page_ranges_arg(argv: List[str]) -> Tuple[List[str], Optional[List[PageRange]]]:
+    """
+    从命令行参数中取出 --pages=<范围列表>
+
+    Returns:
+        (剩余参数, 解析后的范围或None)
+
+    Raises:
+        ValueError: 范围格式错误
+    """
+    remaining = []
+    ranges = None
+    for arg in argv:
+        if arg.startswith(PAGE_RANGES_FLAG):
+            ranges = parse_page_ranges(arg[len(PAGE_RANGES_FLAG):])
+        else:
+            remaining.append(arg)
+    return remaining, ranges
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Python脚本的按需性能剖析
+
+客户文件处理缓慢时，可以直接在线上开启剖析复现，不必再手动套cProfile。
+适用于 modify_excel.py、modify_excel_by_sequence.py 和 split_docx_pages_*.py。
+
+开启方式（二选一）：
+    环境变量  SCRIPT_PROFILE=1
+    命令行    --profile（在位置参数之外，任意位置均可）
+
+可选配置：
+    SCRIPT_PROFILE_DIR / --profile-dir=<目录>   输出目录，默认 logs/profiles
+    SCRIPT_PROFILE_JOB / --profile-job=<任务ID>  任务ID，默认 <脚本名>_<输入文件名>_<时间戳>
+    SCRIPT_PROFILE_INTERVAL=5                    调用栈采样间隔（毫秒）
+
+每次运行输出两个文件：
+    <任务ID>.pstats          cProfile统计，可用 python -m pstats / snakeviz 查看
+    <任务ID>.collapsed.txt   折叠调用栈（"a;b;c 次数"），可直接交给
+                             flamegraph.pl / speedscope / inferno 生成火焰图
+
+未开启时 profile_session 只返回None，不创建profiler也不启动采样线程。
+"""
+
+import os
+import re
+import sys
+import time
+import cProfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+PROFILE_ENV = 'SCRIPT_PROFILE'
+PROFILE_DIR_ENV = 'SCRIPT_PROFILE_DIR'
+PROFILE_JOB_ENV = 'SCRIPT_PROFILE_JOB'
+PROFILE_INTERVAL_ENV = 'SCRIPT_PROFILE_INTERVAL'
+
+PROFILE_FLAG = '--profile'
+PROFILE_DIR_FLAG = '--profile-dir='
+PROFILE_JOB_FLAG = '--profile-job='
+
+DEFAULT_PROFILE_DIR = os.path.join('logs', 'profiles')
+DEFAULT_INTERVAL_MS = 5.0
+
+
+def extract_profile_args(argv: List[str]) -> Tuple[List[str], Dict[str, str]]:
+    """
+    从命令行参数中取出剖析相关的参数
+
+    各脚本按位置参数个数校验用法，所以需要在解析前把剖析参数移除。
+
+    Returns:
+        元组 (剩余参数, 剖析选项字典)
+    """
+    remaining = []
+    options: Dict[str, str] = {}
+    for arg in argv:
+        if arg == PROFILE_FLAG:
+            options['enabled'] = '1'
+        elif arg.startswith(PROFILE_DIR_FLAG):
+            options['enabled'] = '1'
+            options['dir'] = arg[len(PROFILE_DIR_FLAG):]
+        elif arg.startswith(PROFILE_JOB_FLAG):
+            options['enabled'] = '1'
+            options['job'] = arg[len(PROFILE_JOB_FLAG):]
+        else:
+            remaining.append(arg)
+    return remaining, options
+
+
+def profiling_enabled(options: Optional[Dict[str, str]] = None) -> bool:
+    """命令行参数或环境变量是否开启了剖析"""
+    if options and options.get('enabled'):
+        return True
+    return os.environ.get(PROFILE_ENV, '').strip().lower() in ('1', 'true', 'yes')
+
+
+def _sanitize_job_id(job_id: str) -> str:
+    return re.sub(r'[^\w.-]+', '_', job_id).strip('._') or 'job'
+
+
+def default_job_id(script: str, input_path: Optional[str] = None) -> str:
+    """默认任务ID：<脚本名>_<输入文件名>_<时间戳>"""
+    parts = [os.path.splitext(os.path.basename(script))[0]]
+    if input_path:
+        parts.append(os.path.splitext(os.path.basename(input_path))[0])
+    parts.append(time.strftime('%Y%m%d-%H%M%S'))
+    return '_'.join(parts)
+
+
+class _StackSampler(threading.Thread):
+    """定时采样目标线程的调用栈，累计为折叠栈计数"""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.counts[';'.join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+class ProfileSession:
+    """一次剖析运行，结束后写出pstats和折叠栈文件"""
+
+    def __init__(self, job_id: str, output_dir: str, interval_ms: float = DEFAULT_INTERVAL_MS):
+        self.job_id = _sanitize_job_id(job_id)
+        self.output_dir = output_dir
+        self.pstats_path = os.path.join(output_dir, f"{self.job_id}.pstats")
+        self.collapsed_path = os.path.join(output_dir, f"{self.job_id}.collapsed.txt")
+        self._profiler = cProfile.Profile()
+        self._sampler = _StackSampler(threading.get_ident(), max(interval_ms, 0.5) / 1000.0)
+
+    def start(self) -> None:
+        self._sampler.start()
+        self._profiler.enable()
+
+    def stop(self) -> None:
+        self._profiler.disable()
+        self._sampler.stop()
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._profiler.dump_stats(self.pstats_path)
+        with open(self.collapsed_path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self._sampler.counts.items()):
+                f.write(f"{stack} {count}\n")
+
+    def to_dict(self) -> Dict[str, str]:
+        """写入运行结果JSON的内容"""
+        return {
+            'job_id': self.job_id,
+            'pstats_path': os.path.abspath(self.pstats_path),
+            'collapsed_path': os.path.abspath(self.collapsed_path),
+        }
+
+
+@contextmanager
+def profile_session(job_id: str, options: Optional[Dict[str, str]] = None, announce: bool = False):
+    """
+    按需剖析代码块
+
+    未开启剖析时直接yield None；开启时yield ProfileSession，
+    退出代码块后（包括异常和sys.exit退出）写出剖析文件。
+
+    Args:
+        job_id: 默认任务ID（命令行/环境变量指定时被覆盖）
+        options: extract_profile_args 返回的剖析选项
+        announce: 是否在标准输出打印 "PROFILE:<pstats路径>"，
+                  供没有结果JSON的拆分脚本使用
+
+    Example:
+        >>> argv, options = extract_profile_args(sys.argv)
+        >>> with profile_session(default_job_id(argv[0], argv[1]), options) as session:
+        ...     result = run(...)
+        >>> if session:
+        ...     result['profile'] = session.to_dict()
+    """
+    if not profiling_enabled(options):
+        yield None
+        return
+
+    options = options or {}
+    job_id = options.get('job') or os.environ.get(PROFILE_JOB_ENV) or job_id
+    output_dir = options.get('dir') or os.environ.get(PROFILE_DIR_ENV) or DEFAULT_PROFILE_DIR
+    try:
+        interval_ms = float(os.environ.get(PROFILE_INTERVAL_ENV, DEFAULT_INTERVAL_MS))
+    except ValueError:
+        interval_ms = DEFAULT_INTERVAL_MS
+
+    session = ProfileSession(job_id, output_dir, interval_ms)
+    session.start()
+    try:
+        yield session
+    finally:
+        try:
+            session.stop()
+            if announce:
+                print(f"PROFILE:{os.path.abspath(session.pstats_path)}", flush=True)
+        except OSError as e:
+            print(f"写出剖析文件失败: {e}", file=sys.stderr)
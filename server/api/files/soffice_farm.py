@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多实例 headless soffice 农场（供常驻拆分服务使用）
+
+端口2002上只有一个 soffice，本机上的所有拆分都排队经过它。
+libreoffice_split_service.py --instances=N 时由 SofficeFarm 管理N个槽位，每个槽位：
+
+    - 一个 soffice 进程：独立端口和独立的用户配置目录（-env:UserInstallation），
+      实例之间不共享配置锁和恢复信息
+    - 一个工作进程：本模块所在目录的 libreoffice_split_service.py，
+      只连接这个 soffice（单连接的 UnoBridgePool），依次执行分到它的任务
+
+调度：任务进来后等待一个空闲槽位（先到先得），由该槽位的工作进程执行，
+输出原样转发。任务结束后按以下规则回收（重启）soffice：
+
+    - 该实例已执行 SOFFICE_FARM_MAX_JOBS 个任务（默认50）
+    - soffice 进程组的常驻内存超过 SOFFICE_FARM_MAX_MEMORY_MB（默认1024，仅Linux可统计）
+    - 任务超过 SOFFICE_FARM_HANG_TIMEOUT 秒（默认300）没有任何输出：视为卡死，
+      soffice 和工作进程一起结束后重启，任务以失败结束（可带 --resume 重试）
+
+任务进行中 soffice 退出（工作进程的UNO调用超时，被 uno_watchdog 结束）时，
+转发线程立即调用 restart_soffice，工作进程重新连接后只重试受影响的分块。
+单次UNO调用的截止时间（LIBREOFFICE_CALL_TIMEOUT / LIBREOFFICE_LOAD_TIMEOUT）
+应小于 SOFFICE_FARM_HANG_TIMEOUT，卡死的调用先由工作进程处理，不必重启整个槽位。
+
+其他环境变量：
+    SOFFICE_BINARY=soffice                 soffice 可执行文件（默认查找 soffice / libreoffice）
+    SOFFICE_FARM_BASE_PORT=2102            第i个 soffice 的端口为 BASE+i
+    SOFFICE_FARM_WORKER_BASE_PORT=2202     第i个工作进程的端口为 BASE+i
+    SOFFICE_FARM_PROFILE_DIR=<临时目录>/soffice-farm   各实例的用户配置目录
+"""
+
+import os
+import sys
+import time
+import queue
+import shutil
+import signal
+import socket
+import logging
+import tempfile
+import subprocess
+import contextlib
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+SOFFICE_BINARY_ENV = 'SOFFICE_BINARY'
+BASE_PORT_ENV = 'SOFFICE_FARM_BASE_PORT'
+WORKER_BASE_PORT_ENV = 'SOFFICE_FARM_WORKER_BASE_PORT'
+PROFILE_DIR_ENV = 'SOFFICE_FARM_PROFILE_DIR'
+MAX_JOBS_ENV = 'SOFFICE_FARM_MAX_JOBS'
+MAX_MEMORY_MB_ENV = 'SOFFICE_FARM_MAX_MEMORY_MB'
+HANG_TIMEOUT_ENV = 'SOFFICE_FARM_HANG_TIMEOUT'
+
+DEFAULT_BASE_PORT = 2102
+DEFAULT_WORKER_BASE_PORT = 2202
+DEFAULT_MAX_JOBS = 50
+DEFAULT_MAX_MEMORY_MB = 1024
+DEFAULT_HANG_TIMEOUT = 300
+
+# soffice / 工作进程启动后等待端口可连接的时间
+STARTUP_TIMEOUT = 60
+STOP_TIMEOUT = 5
+
+SERVICE_SCRIPT = Path(__file__).with_name('libreoffice_split_service.py')
+
+
+def _env_number(name: str, default, cast=int):
+    try:
+        return cast(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def find_soffice() -> str:
+    binary = os.environ.get(SOFFICE_BINARY_ENV) or shutil.which('soffice') or shutil.which('libreoffice')
+    if not binary:
+        raise FileNotFoundError("未找到 soffice，请安装 LibreOffice 或设置 SOFFICE_BINARY")
+    return binary
+
+
+def wait_for_port(port: int, timeout: float, process: Optional[subprocess.Popen] = None) -> bool:
+    """等待本机端口可连接；进程提前退出时返回False"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        with contextlib.suppress(OSError):
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return True
+        time.sleep(0.2)
+    return False
+
+
+def stop_process(process: Optional[subprocess.Popen]) -> None:
+    """结束进程及其进程组（soffice 启动脚本会再派生 soffice.bin）"""
+    if process is None or process.poll() is not None:
+        return
+    try:
+        if hasattr(os, 'killpg'):
+            os.killpg(process.pid, signal.SIGTERM)
+        else:
+            process.terminate()
+        process.wait(STOP_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        if hasattr(os, 'killpg'):
+            with contextlib.suppress(OSError):
+                os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+        process.wait()
+    except OSError:
+        pass
+
+
+def session_rss_mb(session_id: int) -> Optional[float]:
+    """进程会话（start_new_session 启动的进程组）的常驻内存总和（MB）；非Linux返回None"""
+    proc = Path('/proc')
+    if not proc.is_dir():
+        return None
+    total_kb = 0
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / 'stat').read_text()
+            # comm 可能含空格，取最后一个右括号之后的字段：state ppid pgrp session
+            if int(stat.rsplit(')', 1)[1].split()[3]) != session_id:
+                continue
+            for line in (entry / 'status').read_text().splitlines():
+                if line.startswith('VmRSS:'):
+                    total_kb += int(line.split()[1])
+                    break
+        except (OSError, ValueError, IndexError):
+            continue
+    return total_kb / 1024
+
+
+class FarmSlot:
+    """
+    农场中的一个槽位：一个 soffice 和只连接它的工作进程
+
+    Args:
+        index: 槽位序号（0起）
+        soffice_port: soffice 的 --accept 端口
+        worker_port: 工作进程（拆分服务）监听的端口
+        profile_dir: soffice 的用户配置目录
+    """
+
+    def __init__(self, index: int, soffice_port: int, worker_port: int, profile_dir: str):
+        self.index = index
+        self.soffice_port = soffice_port
+        self.worker_port = worker_port
+        self.profile_dir = profile_dir
+        self.soffice: Optional[subprocess.Popen] = None
+        self.worker: Optional[subprocess.Popen] = None
+        self.jobs = 0
+        self.recycles = 0
+
+    @property
+    def worker_address(self) -> str:
+        return f"127.0.0.1:{self.worker_port}"
+
+    def start_soffice(self, binary: str) -> None:
+        os.makedirs(self.profile_dir, exist_ok=True)
+        self.soffice = subprocess.Popen(
+            [binary, '--headless', '--invisible', '--nologo', '--norestore', '--nofirststartwizard',
+             f'-env:UserInstallation={Path(self.profile_dir).resolve().as_uri()}',
+             f'--accept=socket,host=127.0.0.1,port={self.soffice_port};urp;'],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        if not wait_for_port(self.soffice_port, STARTUP_TIMEOUT, self.soffice):
+            raise RuntimeError(f"soffice 实例 {self.index} 启动失败（端口 {self.soffice_port}）")
+        self.jobs = 0
+
+    def start_worker(self) -> None:
+        env = dict(os.environ, LIBREOFFICE_ENDPOINTS=f'127.0.0.1:{self.soffice_port}')
+        env.pop('LIBREOFFICE_SPLIT_SERVICE', None)
+        self.worker = subprocess.Popen(
+            [sys.executable, str(SERVICE_SCRIPT), f'--listen={self.worker_address}'],
+            stdin=subprocess.DEVNULL, env=env, start_new_session=True,
+        )
+        if not wait_for_port(self.worker_port, STARTUP_TIMEOUT, self.worker):
+            raise RuntimeError(f"拆分工作进程 {self.index} 启动失败（端口 {self.worker_port}）")
+
+    def start(self, binary: str) -> None:
+        self.start_soffice(binary)
+        self.start_worker()
+
+    def memory_mb(self) -> Optional[float]:
+        if self.soffice is None or self.soffice.poll() is not None:
+            return None
+        return session_rss_mb(self.soffice.pid)
+
+    def recycle(self, binary: str, restart_worker: bool = False) -> None:
+        """重启 soffice（工作进程下一个任务取连接时发现连接失效并重连）；卡死时连工作进程一起重启"""
+        stop_process(self.soffice)
+        if restart_worker or self.worker is None or self.worker.poll() is not None:
+            stop_process(self.worker)
+            self.start(binary)
+        else:
+            self.start_soffice(binary)
+        self.recycles += 1
+
+    def stop(self) -> None:
+        stop_process(self.worker)
+        stop_process(self.soffice)
+
+    def status(self) -> dict:
+        return {
+            'index': self.index,
+            'soffice_port': self.soffice_port,
+            'worker_port': self.worker_port,
+            'jobs': self.jobs,
+            'recycles': self.recycles,
+            'memory_mb': self.memory_mb(),
+        }
+
+
+class SofficeFarm:
+    """
+    N个槽位和空闲队列
+
+    Args:
+        instances: 槽位数
+    """
+
+    def __init__(self, instances: int):
+        self.binary = find_soffice()
+        base_port = _env_number(BASE_PORT_ENV, DEFAULT_BASE_PORT)
+        worker_base_port = _env_number(WORKER_BASE_PORT_ENV, DEFAULT_WORKER_BASE_PORT)
+        profile_root = os.environ.get(PROFILE_DIR_ENV) or os.path.join(tempfile.gettempdir(), 'soffice-farm')
+        self.max_jobs = _env_number(MAX_JOBS_ENV, DEFAULT_MAX_JOBS)
+        self.max_memory_mb = _env_number(MAX_MEMORY_MB_ENV, DEFAULT_MAX_MEMORY_MB, float)
+        self.hang_timeout = _env_number(HANG_TIMEOUT_ENV, DEFAULT_HANG_TIMEOUT, float)
+        self.slots: List[FarmSlot] = [
+            FarmSlot(index, base_port + index, worker_base_port + index,
+                     os.path.join(profile_root, f'instance-{index}'))
+            for index in range(instances)
+        ]
+        self._idle: 'queue.Queue[FarmSlot]' = queue.Queue()
+
+    def start(self) -> None:
+        for slot in self.slots:
+            slot.start(self.binary)
+            logger.info(f"soffice 实例 {slot.index} 已启动: soffice={slot.soffice_port} "
+                        f"工作进程={slot.worker_port}")
+            self._idle.put(slot)
+
+    def stop(self) -> None:
+        for slot in self.slots:
+            slot.stop()
+
+    @contextlib.contextmanager
+    def acquire(self):
+        """等待并占用一个空闲槽位；用完后按任务数和内存决定是否回收，再放回空闲队列"""
+        slot = self._idle.get()
+        hung = False
+        try:
+            yield slot
+        except TimeoutError:
+            hung = True
+            raise
+        finally:
+            slot.jobs += 1
+            try:
+                self._after_job(slot, hung)
+            finally:
+                self._idle.put(slot)
+
+    def restart_soffice(self, slot: FarmSlot) -> None:
+        """任务进行中 soffice 退出时重启它（由占用该槽位的转发线程调用）"""
+        logger.warning(f"soffice 实例 {slot.index} 在任务中退出（UNO调用超时），重启")
+        try:
+            slot.recycle(self.binary)
+        except Exception as e:
+            # 工作进程等不到 soffice 时以失败结束任务，之后 _after_job 再次尝试回收
+            logger.error(f"重启 soffice 实例 {slot.index} 失败: {e}")
+
+    def _after_job(self, slot: FarmSlot, hung: bool) -> None:
+        reason = None
+        if hung:
+            reason = f"任务超过 {self.hang_timeout:.0f} 秒没有输出"
+        elif slot.worker is None or slot.worker.poll() is not None:
+            reason = "工作进程已退出"
+        elif slot.jobs >= self.max_jobs:
+            reason = f"已执行 {slot.jobs} 个任务"
+        else:
+            memory = slot.memory_mb()
+            if memory is not None and memory > self.max_memory_mb:
+                reason = f"内存 {memory:.0f}MB 超过上限 {self.max_memory_mb:.0f}MB"
+            elif slot.soffice is None or slot.soffice.poll() is not None:
+                reason = "soffice 已退出"
+        if reason is None:
+            return
+        logger.warning(f"回收 soffice 实例 {slot.index}: {reason}")
+        try:
+            slot.recycle(self.binary, restart_worker=hung)
+        except Exception as e:
+            # 留在空闲队列中，下一个任务取连接失败时报错，之后再次尝试回收
+            logger.error(f"回收 soffice 实例 {slot.index} 失败: {e}")
+
+    def status(self) -> List[dict]:
+        return [slot.status() for slot in self.slots]
@@ -3,10 +3,20 @@ import { promises as fs } from 'fs'
 import { spawn } from 'child_process'
 import AdmZip from 'adm-zip'
 
+const SPLIT_ENGINES = ['auto', 'libreoffice', 'hybrid', 'python-docx']
+
 export default defineEventHandler(async event => {
   const query = getQuery(event)
-  const { fileId, pagesPerFile = 30, originalName } = query
+  const { fileId, pagesPerFile = 30, originalName, pageRanges, tokenBudget, resume, engine } = query
+  // 续拆：保留上次的输出目录，脚本按其中的断点只拆缺失的分块
+  const resumeSplit = resume === '1' || resume === 'true'
   const pages = parseInt(pagesPerFile as string) || 30
+  // 可选的页码范围列表（如 "1-3,7,20-25"）：只写出这些页段，每个范围一个文件
+  const ranges = pageRanges ? (pageRanges as string).replace(/[\s，]/g, m => (m === '，' ? ',' : '')) : ''
+  // 可选的token预算：按估算token数切块（供AI分析使用），此时忽略每文件页数
+  const tokens = tokenBudget ? parseInt(tokenBudget as string) : 0
+  // 可选的拆分方案：libreoffice / hybrid 经常驻拆分服务（LIBREOFFICE_SPLIT_SERVICE）执行
+  const splitEngine = engine ? String(engine).trim().toLowerCase() : ''
 
   if (!fileId) {
     throw createError({
@@ -15,6 +25,27 @@ export default defineEventHandler(async event => {
     })
   }
 
+  if (ranges && !/^\d+(-\d+)?(,\d+(-\d+)?)*$/.test(ranges)) {
+    throw createError({
+      statusCode: 400,
+      statusMessage: '页码范围格式错误，应为如 1-3,7,20-25',
+    })
+  }
+
+  if (tokenBudget && !(tokens >= 100)) {
+    throw createError({
+      statusCode: 400,
+      statusMessage: 'token预算必须是不小于100的整数',
+    })
+  }
+
+  if (splitEngine && !SPLIT_ENGINES.includes(splitEngine)) {
+    throw createError({
+      statusCode: 400,
+      statusMessage: `不支持的拆分方案，可选: ${SPLIT_ENGINES.join(', ')}`,
+    })
+  }
+
   // 获取原文件名（不含扩展名）
   const baseFileName = originalName 
     ? (originalName as string).replace(/\.docx$/i, '') 
@@ -37,11 +68,13 @@ export default defineEventHandler(async event => {
     const inputPath = join(process.cwd(), 'uploads', `${fileId}.docx`)
     const outputDir = join(process.cwd(), 'uploads', `split_${fileId}`)
 
-    // 清理旧的输出目录（如果存在）
-    try {
-      await fs.rm(outputDir, { recursive: true, force: true })
-    } catch (error) {
-      // 忽略目录不存在的错误
+    // 清理旧的输出目录（如果存在；续拆时保留）
+    if (!resumeSplit) {
+      try {
+        await fs.rm(outputDir, { recursive: true, force: true })
+      } catch (error) {
+        // 忽略目录不存在的错误
+      }
     }
 
     // 创建全新的输出目录
@@ -63,7 +96,17 @@ export default defineEventHandler(async event => {
     // 启动Python进程，传递原始文件名
     const pythonProcess = spawn(
       'python',
-      [scriptPath, inputPath, outputDir, pages.toString(), baseFileName],
+      [
+        scriptPath,
+        inputPath,
+        outputDir,
+        pages.toString(),
+        baseFileName,
+        ...(ranges ? [`--pages=${ranges}`] : []),
+        ...(tokens ? [`--tokens=${tokens}`] : []),
+        ...(resumeSplit ? ['--resume'] : []),
+        ...(splitEngine ? [`--engine=${splitEngine}`] : []),
+      ],
       {
         stdio: ['pipe', 'pipe', 'pipe'],
       }
@@ -73,6 +116,8 @@ export default defineEventHandler(async event => {
     let currentFileIndex = 0
     let stdoutBuffer = ''
     let stderrBuffer = ''
+    // 文件名 → 估算token数
+    const chunkTokens = new Map<string, number>()
 
     // 处理Python输出
     pythonProcess.stdout?.on('data', (data: Buffer) => {
@@ -119,6 +164,17 @@ export default defineEventHandler(async event => {
                 })
                 break
 
+              case 'FILE_TOKENS':
+                const tokensIndex = parseInt(parts[2])
+                const estimatedTokens = parseInt(parts[3])
+                chunkTokens.set(parts.slice(4).join(':'), estimatedTokens)
+                sendMessage('progress', {
+                  type: 'file_tokens',
+                  fileIndex: tokensIndex,
+                  tokens: estimatedTokens,
+                })
+                break
+
               case 'FILE_COMPLETE':
                 const completedIndex = parseInt(parts[2])
                 sendMessage('progress', {
@@ -212,7 +268,7 @@ export default defineEventHandler(async event => {
       return
     }
 
-    // 获取文件信息（名称和大小）
+    // 获取文件信息（名称、大小和估算token数）
     const docxFiles = await Promise.all(
       docxFileNames.map(async fileName => {
         const filePath = join(outputDir, fileName)
@@ -220,6 +276,7 @@ export default defineEventHandler(async event => {
         return {
           name: fileName,
           size: stats.size,
+          estimatedTokens: chunkTokens.get(fileName),
         }
       })
     )
@@ -275,6 +332,9 @@ export default defineEventHandler(async event => {
       success: true,
       totalFiles: docxFiles.length,
       pagesPerFile: pages,
+      pageRanges: ranges || undefined,
+      tokenBudget: tokens || undefined,
+      engine: splitEngine || undefined,
       files: docxFiles,
       downloadUrl,
       message: `成功拆分为 ${docxFiles.length} 个文件`,
@@ -6,11 +6,18 @@ import AdmZip from 'adm-zip'
 
 const execAsync = promisify(exec)
 const UPLOAD_DIR = join(process.cwd(), 'uploads')
+const SPLIT_ENGINES = ['auto', 'libreoffice', 'hybrid', 'python-docx']
 
 export default defineEventHandler(async event => {
   try {
     const body = await readBody(event)
-    const { fileId, pagesPerFile = 30, originalName } = body
+    const { fileId, pagesPerFile = 30, originalName, pageRanges, tokenBudget, resume, engine } = body
+    // 可选的页码范围列表（如 "1-3,7,20-25"）：只写出这些页段，每个范围一个文件
+    const ranges = pageRanges ? String(pageRanges).replace(/[\s，]/g, m => (m === '，' ? ',' : '')) : ''
+    // 可选的token预算：按估算token数切块（供AI分析使用），此时忽略每文件页数
+    const tokens = tokenBudget ? parseInt(String(tokenBudget)) : 0
+    // 可选的拆分方案：libreoffice / hybrid 经常驻拆分服务（LIBREOFFICE_SPLIT_SERVICE）执行
+    const splitEngine = engine ? String(engine).trim().toLowerCase() : ''
 
     // 获取原文件名（不含扩展名）
     const baseFileName = originalName 
@@ -24,6 +31,27 @@ export default defineEventHandler(async event => {
       })
     }
 
+    if (ranges && !/^\d+(-\d+)?(,\d+(-\d+)?)*$/.test(ranges)) {
+      throw createError({
+        statusCode: 400,
+        statusMessage: '页码范围格式错误，应为如 1-3,7,20-25',
+      })
+    }
+
+    if (tokenBudget && !(tokens >= 100)) {
+      throw createError({
+        statusCode: 400,
+        statusMessage: 'token预算必须是不小于100的整数',
+      })
+    }
+
+    if (splitEngine && !SPLIT_ENGINES.includes(splitEngine)) {
+      throw createError({
+        statusCode: 400,
+        statusMessage: `不支持的拆分方案，可选: ${SPLIT_ENGINES.join(', ')}`,
+      })
+    }
+
     console.log(
       `开始拆分DOCX文档，文件ID: ${fileId}, 每个文件页数: ${pagesPerFile}`
     )
@@ -43,7 +71,12 @@ export default defineEventHandler(async event => {
       'files',
       'split_docx_pages_unified.py'
     )
-    const command = `python "${scriptPath}" "${inputPath}" "${outputDir}" ${pagesPerFile} "${baseFileName}"`
+    const rangesArg = ranges ? ` --pages=${ranges}` : ''
+    const tokensArg = tokens ? ` --tokens=${tokens}` : ''
+    // 续拆：脚本按输出目录中的断点只拆缺失的分块
+    const resumeArg = resume === true ? ' --resume' : ''
+    const engineArg = splitEngine ? ` --engine=${splitEngine}` : ''
+    const command = `python "${scriptPath}" "${inputPath}" "${outputDir}" ${pagesPerFile} "${baseFileName}"${rangesArg}${tokensArg}${resumeArg}${engineArg}`
 
     console.log(`执行命令: ${command}`)
 
@@ -91,7 +124,16 @@ export default defineEventHandler(async event => {
       })
     }
 
-    // 获取文件信息（名称和大小）
+    // 每个分块的估算token数：PROGRESS:FILE_TOKENS:<序号>:<token数>:<文件名>
+    const chunkTokens = new Map<string, number>()
+    for (const line of stdout.split('\n')) {
+      if (line.startsWith('PROGRESS:FILE_TOKENS:')) {
+        const parts = line.trim().split(':')
+        chunkTokens.set(parts.slice(4).join(':'), parseInt(parts[3]))
+      }
+    }
+
+    // 获取文件信息（名称、大小和估算token数）
     const docxFiles = await Promise.all(
       docxFileNames.map(async fileName => {
         const filePath = join(outputDir, fileName)
@@ -99,6 +141,7 @@ export default defineEventHandler(async event => {
         return {
           name: fileName,
           size: stats.size,
+          estimatedTokens: chunkTokens.get(fileName),
         }
       })
     )
@@ -122,6 +165,9 @@ export default defineEventHandler(async event => {
       success: true,
       totalFiles: docxFiles.length,
       pagesPerFile,
+      pageRanges: ranges || undefined,
+      tokenBudget: tokens || undefined,
+      engine: splitEngine || undefined,
       files: docxFiles,
       downloadUrl,
       message: `成功拆分为 ${docxFiles.length} 个文件`,
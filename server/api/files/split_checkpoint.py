@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+拆分断点（可续拆的长文档拆分）
+
+2000页的文档拆到第58个分块时失败（PROGRESS:FILE_ERROR），或者LibreOffice
+连接断开，下一次重试原本要清空输出目录从第1页重来。拆分引擎在每个分块保存后
+调用 SplitCheckpoint.record，把已完成的分块（序号、区间、输出文件名、大小和
+SHA-256）原子写入输出目录下的 .split-checkpoint.json（先写临时文件再替换）。
+
+带 --resume 重新运行时：
+    - 断点与本次的输入文件内容、引擎、分块规则和文件名前缀都一致时，保留输出目录，
+      逐个核对已完成分块的输出文件（存在、大小和SHA-256相符），
+      核对通过的分块直接输出 FILE_START / FILE_COMPLETE 后跳过，只拆缺失的部分
+    - 不一致或没有断点时与普通拆分相同：清空输出目录从头开始
+
+区间的含义由引擎决定：Word / LibreOffice 为页码，python-docx 为body块索引。
+断点文件以点开头，API只打包 .docx 文件，拆分结果缓存也不收录它。
+
+用法:
+    checkpoint = SplitCheckpoint.open(output_dir, content_hash, engine, spec, original_filename, resume)
+    if not checkpoint.resuming:
+        ...                                   # 清空并重建输出目录
+    if checkpoint.completed(file_index, start, end, out_path):
+        ...                                   # 跳过
+    ...                                       # 写出分块
+    checkpoint.record(file_index, start, end, out_path)
+"""
+
+import os
+import json
+import logging
+from typing import Dict, Optional
+
+from excel_sidecar import compute_content_hash
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = '.split-checkpoint.json'
+CHECKPOINT_VERSION = 1
+RESUME_FLAG = '--resume'
+
+
+class SplitCheckpoint:
+    """
+    一次拆分任务的断点
+
+    Args:
+        output_dir: 输出目录（断点文件保存在其中）
+        key: 输入文件内容哈希、引擎、分块规则和文件名前缀
+        chunks: 已完成的分块，文件序号 → 记录
+        resuming: 是否沿用了已有断点（此时不应清空输出目录）
+    """
+
+    def __init__(self, output_dir: str, key: Dict, chunks: Optional[Dict[int, Dict]] = None,
+                 resuming: bool = False):
+        self.output_dir = output_dir
+        self.key = key
+        self.chunks: Dict[int, Dict] = chunks or {}
+        self.resuming = resuming
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.output_dir, CHECKPOINT_NAME)
+
+    @classmethod
+    def open(cls, output_dir: str, content_hash: str, engine: str, spec: str,
+             original_filename: str, resume: bool = False) -> 'SplitCheckpoint':
+        """
+        resume为True且输出目录中的断点与本次任务一致时沿用，否则返回空断点
+
+        content_hash 为输入文件的SHA-256（拆分入口已计算好，这里不再读取输入文件）
+        """
+        key = {
+            'version': CHECKPOINT_VERSION,
+            'content_hash': content_hash,
+            'engine': engine,
+            'spec': spec,
+            'original_filename': original_filename,
+        }
+        checkpoint = cls(output_dir, key)
+        if not resume:
+            return checkpoint
+
+        try:
+            with open(checkpoint.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            print("没有可续拆的断点，从头开始拆分")
+            return checkpoint
+        except (OSError, ValueError) as e:
+            logger.warning(f"断点文件无效，从头开始拆分: {checkpoint.path}: {e}")
+            return checkpoint
+
+        if data.get('key') != key:
+            print("断点与本次拆分的文件或参数不一致，从头开始拆分")
+            return checkpoint
+
+        chunks = {int(index): chunk for index, chunk in data.get('chunks', {}).items()}
+        print(f"断点续拆: 已完成 {len(chunks)} 个分块，只拆缺失的部分")
+        return cls(output_dir, key, chunks, resuming=True)
+
+    def completed(self, file_index: int, start: int, end: int, out_path: str) -> bool:
+        """
+        该分块是否已完成：区间和文件名一致，输出文件存在且大小、SHA-256相符
+
+        未通过核对的残留输出文件（如写到一半）会被删除，重新写出时不会原地覆盖。
+        """
+        chunk = self.chunks.pop(file_index, None)
+        if chunk is None:
+            return False
+        if (chunk.get('start'), chunk.get('end'), chunk.get('file')) == (start, end, os.path.basename(out_path)):
+            try:
+                if (os.path.getsize(out_path) == chunk.get('size')
+                        and compute_content_hash(out_path) == chunk.get('sha256')):
+                    self.chunks[file_index] = chunk
+                    return True
+            except OSError:
+                pass
+        try:
+            os.remove(out_path)
+        except OSError:
+            pass
+        return False
+
+    def record(self, file_index: int, start: int, end: int, out_path: str) -> None:
+        """记录一个已保存的分块并原子写出断点文件"""
+        self.chunks[file_index] = {
+            'start': start,
+            'end': end,
+            'file': os.path.basename(out_path),
+            'size': os.path.getsize(out_path),
+            'sha256': compute_content_hash(out_path),
+        }
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'key': self.key,
+                    'chunks': {str(index): chunk for index, chunk in sorted(self.chunks.items())},
+                }, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"写入断点文件失败 {self.path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def extract_resume_arg(argv):
+    """从命令行参数中取出 --resume，返回 (剩余参数, 是否续拆)"""
+    return [arg for arg in argv if arg != RESUME_FLAG], RESUME_FLAG in argv
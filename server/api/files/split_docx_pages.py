@@ -5,6 +5,13 @@ from pathlib import Path
 
 import win32com.client as win32
 from win32com.client import gencache
+from page_map_cache import PageBoundaries, open_page_map_cache
+from page_ranges import clamp_page_ranges, extract_page_ranges_arg, stride_page_ranges
+from split_checkpoint import SplitCheckpoint, extract_resume_arg
+from split_result_cache import cached_split_result, chunking_spec
+from profiling_hook import default_job_id, extract_profile_args, profile_session
+
+PAGE_MAP_ENGINE = 'word'
 
 
 def sanitize_filename(name: str) -> str:
@@ -201,8 +208,15 @@ def split_docx_by_page(input_path: str, output_dir: str) -> None:
         word.Quit()
 
 
-def split_docx_by_page_range(input_path: str, output_dir: str, pages_per_file: int = 30, original_filename: str = None) -> None:
-    """按指定页数范围拆分DOCX文档"""
+@cached_split_result(PAGE_MAP_ENGINE)
+def split_docx_by_page_range(input_path: str, output_dir: str, pages_per_file: int = 30, original_filename: str = None,
+                             page_ranges=None, resume: bool = False, content_hash: str = None) -> None:
+    """
+    按指定页数范围拆分DOCX文档；page_ranges（如 [(1, 3), (7, 7)]）不为空时只写出这些页段
+
+    每个分块保存后写入断点（split_checkpoint）；resume=True 时只写出缺失的分块。
+    content_hash 为输入文件的SHA-256，由 @cached_split_result 计算后传入。
+    """
     import time
     import subprocess
     
@@ -213,9 +227,12 @@ def split_docx_by_page_range(input_path: str, output_dir: str, pages_per_file: i
     if original_filename is None:
         original_filename = Path(input_path).stem
     
-    # 清理旧的输出目录（如果存在）
+    # 清理旧的输出目录（如果存在；续拆时保留已完成的分块）
     import shutil
-    if os.path.exists(output_dir):
+    checkpoint = SplitCheckpoint.open(output_dir, content_hash, PAGE_MAP_ENGINE,
+                                      chunking_spec(pages_per_file, page_ranges),
+                                      original_filename, resume)
+    if not checkpoint.resuming and os.path.exists(output_dir):
         try:
             shutil.rmtree(output_dir)
             print(f"已清理旧的输出目录: {output_dir}")
@@ -227,7 +244,7 @@ def split_docx_by_page_range(input_path: str, output_dir: str, pages_per_file: i
     
     print(f"开始拆分文档: {input_path}")
     print(f"输出目录: {output_dir}")
-    print(f"每个文件页数: {pages_per_file}")
+    print(f"每个文件页数: {pages_per_file}" if page_ranges is None else f"页码范围: {page_ranges}")
     
     # 杀死可能存在的Word进程
     try:
@@ -238,6 +255,11 @@ def split_docx_by_page_range(input_path: str, output_dir: str, pages_per_file: i
     except Exception:
         pass
     
+    # 页码缓存：总页数和各页起始字符偏移（GoTo结果）按文件内容复用
+    cache = open_page_map_cache(input_path)
+    boundaries = cache.load(content_hash, PAGE_MAP_ENGINE) if cache is not None else None
+    cached_starts = len(boundaries.starts) if boundaries is not None else 0
+    
     word = None
     doc = None
     
@@ -266,7 +288,12 @@ def split_docx_by_page_range(input_path: str, output_dir: str, pages_per_file: i
             # 等待文档完全加载
             time.sleep(2)
             
-            # 获取页数 - 使用更安全的方法
+            # 获取页数 - 使用更安全的方法（命中页码缓存时跳过）
+            if boundaries is not None:
+                total_pages = boundaries.total_pages
+                print(f"✓ 命中页码缓存: {cache.entry_path(content_hash, PAGE_MAP_ENGINE)}")
+                break
+            
             print("正在计算页数...")
             try:
                 # 方法1: 直接计算统计信息
@@ -282,6 +309,7 @@ def split_docx_by_page_range(input_path: str, output_dir: str, pages_per_file: i
                     # 方法3: 简单估算（假设每页500字符）
                     total_chars = len(doc.Range().Text)
                     total_pages = max(1, total_chars // 500)
+                    cache = None  # 估算的页数不写入缓存
                     print(f"使用估算方法，估算页数: {total_pages}")
             
             break  # 如果成功，跳出重试循环
@@ -319,22 +347,52 @@ def split_docx_by_page_range(input_path: str, output_dir: str, pages_per_file: i
         raise Exception("无法初始化Word应用程序")
     
     print(f"总页数: {total_pages}")
-    print(f"每个文件包含: {pages_per_file} 页")
+    if page_ranges is None:
+        print(f"每个文件包含: {pages_per_file} 页")
+    
+    if boundaries is None:
+        boundaries = PageBoundaries(engine=PAGE_MAP_ENGINE, total_pages=total_pages)
+    
+    def page_start(page: int) -> int:
+        """第page页的起始字符偏移，未缓存时通过GoTo定位并记录"""
+        if page not in boundaries.starts:
+            boundaries.starts[page] = doc.GoTo(
+                What=getattr(win32.constants, "wdGoToPage", 1),
+                Which=getattr(win32.constants, "wdGoToAbsolute", 1),
+                Count=page,
+            ).Start
+        return boundaries.starts[page]
     
-    # 计算总文件数
-    total_files = (total_pages + pages_per_file - 1) // pages_per_file
+    # 计算总文件数（指定页码范围时只定位和写出这些页段）
+    if page_ranges is not None:
+        page_ranges = clamp_page_ranges(page_ranges, total_pages)
+    else:
+        page_ranges = stride_page_ranges(total_pages, pages_per_file)
+    total_files = len(page_ranges)
     print(f"PROGRESS:TOTAL_FILES:{total_files}")
     
     try:
         file_index = 1
-        start_page = 1
         
-        while start_page <= total_pages:
-            end_page = min(start_page + pages_per_file - 1, total_pages)
-            
+        for start_page, end_page in page_ranges:
             print(f"正在处理第 {file_index} 个文件: 第{start_page}-{end_page}页")
             print(f"PROGRESS:FILE_START:{file_index}:{total_files}")
             
+            # 生成文件名：原文件名 (第X页) 或 原文件名 (第X-Y页)
+            if start_page == end_page:
+                # 单页
+                out_filename = f"{original_filename} (第{start_page}页).docx"
+            else:
+                # 多页
+                out_filename = f"{original_filename} (第{start_page}-{end_page}页).docx"
+            out_path = os.path.join(output_dir, out_filename)
+            
+            if checkpoint.completed(file_index, start_page, end_page, out_path):
+                print(f"已完成（断点）: {out_filename}")
+                print(f"PROGRESS:FILE_COMPLETE:{file_index}:{total_files}")
+                file_index += 1
+                continue
+            
             newdoc = None
             try:
                 # 创建新文档
@@ -345,19 +403,11 @@ def split_docx_by_page_range(input_path: str, output_dir: str, pages_per_file: i
                 # 获取起始位置
                 print(f"  定位到第{start_page}页...")
                 print(f"PROGRESS:FILE_STEP:{file_index}:定位页面:20")
-                start_pos = doc.GoTo(
-                    What=getattr(win32.constants, "wdGoToPage", 1),
-                    Which=getattr(win32.constants, "wdGoToAbsolute", 1),
-                    Count=start_page,
-                ).Start
+                start_pos = page_start(start_page)
                 
                 # 获取结束位置
                 if end_page < total_pages:
-                    end_pos = doc.GoTo(
-                        What=getattr(win32.constants, "wdGoToPage", 1),
-                        Which=getattr(win32.constants, "wdGoToAbsolute", 1),
-                        Count=end_page + 1,
-                    ).Start - 1
+                    end_pos = page_start(end_page + 1) - 1
                 else:
                     end_pos = doc.Content.End
                 
@@ -424,17 +474,10 @@ def split_docx_by_page_range(input_path: str, output_dir: str, pages_per_file: i
                     pass
                 
                 # 保存文件
-                # 生成文件名：原文件名 (第X页) 或 原文件名 (第X-Y页)
-                if start_page == end_page:
-                    # 单页
-                    out_filename = f"{original_filename} (第{start_page}页).docx"
-                else:
-                    # 多页
-                    out_filename = f"{original_filename} (第{start_page}-{end_page}页).docx"
-                out_path = os.path.join(output_dir, out_filename)
                 print(f"  保存文件: {out_filename}")
                 print(f"PROGRESS:FILE_STEP:{file_index}:保存文件:90")
                 newdoc.SaveAs2(out_path, FileFormat=constants.wdFormatXMLDocument)
+                checkpoint.record(file_index, start_page, end_page, out_path)
                 
                 print(f"已保存: {out_filename}")
                 print(f"PROGRESS:FILE_COMPLETE:{file_index}:{total_files}")
@@ -452,10 +495,13 @@ def split_docx_by_page_range(input_path: str, output_dir: str, pages_per_file: i
                         print(f"  关闭新文档时出错: {e}")
             
             file_index += 1
-            start_page = end_page + 1
             
         print(f"拆分完成！共生成 {file_index - 1} 个文件")
         print(f"PROGRESS:ALL_FILES_COMPLETE:{file_index - 1}:{total_files}")
+        
+        # 有新定位的页时写回缓存，下次换页数拆分可直接复用
+        if cache is not None and len(boundaries.starts) > cached_starts:
+            cache.store(content_hash, boundaries)
             
     except Exception as e:
         print(f"拆分过程中发生错误: {e}")
@@ -480,24 +526,33 @@ def split_docx_by_page_range(input_path: str, output_dir: str, pages_per_file: i
 
 
 def main() -> None:
-    if len(sys.argv) < 2:
-        print("用法: python split_docx_pages.py <输入docx路径> [输出目录] [每个文件页数]")
+    argv, profile_options = extract_profile_args(sys.argv)
+    argv, resume = extract_resume_arg(argv)
+    try:
+        argv, page_ranges = extract_page_ranges_arg(argv)
+    except ValueError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+    
+    if len(argv) < 2:
+        print("用法: python split_docx_pages.py <输入docx路径> [输出目录] [每个文件页数] [原始文件名] [--pages=1-3,7] [--resume]")
         sys.exit(1)
     
-    input_path = sys.argv[1]
-    output_dir = sys.argv[2]
+    input_path = argv[1]
+    output_dir = argv[2]
     pages_per_file = 30
     original_filename = None
     
     # 如果提供了第三个参数，作为每个文件页数
-    if len(sys.argv) >= 4:
-        pages_per_file = int(sys.argv[3])
+    if len(argv) >= 4:
+        pages_per_file = int(argv[3])
     
     # 如果提供了第四个参数，作为原始文件名
-    if len(sys.argv) >= 5:
-        original_filename = sys.argv[4]
+    if len(argv) >= 5:
+        original_filename = argv[4]
     
-    split_docx_by_page_range(input_path, output_dir, pages_per_file, original_filename)
+    with profile_session(default_job_id(argv[0], input_path), profile_options, announce=True):
+        split_docx_by_page_range(input_path, output_dir, pages_per_file, original_filename, page_ranges, resume)
 
 
 if __name__ == "__main__":
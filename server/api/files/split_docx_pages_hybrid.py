@@ -0,0 +1,406 @@
+"""
+混合拆分：LibreOffice 只负责分页，分块由zip级写出器直接切片源DOCX
+
+LibreOffice 方案排版准确但慢：每个分块都要新建 swriter 文档、插入内容再 storeToURL；
+python-docx 方案写出快，但页码是估算的。混合方案：
+
+    1. 用 LibreOffice 隐藏、只读打开源文档一次，枚举正文顶层的段落和表格，
+       与DOCX body块（段落、表格、内容控件中的段落和表格）按类型和文字对齐，
+       再用视图光标取得各body块起始处的页码（页码随文档顺序单调，只需二分查找页码变化处），
+       随即关闭文档
+    2. 得到与 python-docx 方案相同形式的页码映射（body块索引 → 起始页），
+       写入页码缓存（引擎名 libreoffice_hybrid）；同一文件再次拆分时不再启动 LibreOffice
+    3. 分块由 DocxChunkWriter 从源DOCX切片写出，样式、编号、页眉页脚和图片原样保留
+
+类型和文字完全相同的顶层元素不足九成时（LibreOffice导入时改变了文档结构），
+回退到 python-docx 方案的估算页码并提示；估算结果只写入 python-docx 方案的页码缓存，
+拆分结果也不写入拆分结果缓存，之后的拆分仍会先尝试 LibreOffice 分页。
+
+用法:
+    python split_docx_pages_hybrid.py <输入文件> <输出目录> <每文件页数> [原始文件名] [--pages=1-3,7] [--resume]
+    python split_docx_pages_libreoffice.py ... --hybrid        # 同上，可经常驻拆分服务执行
+"""
+import os
+import re
+import sys
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from lxml import etree
+
+from docx_chunk_writer import DocxChunkWriter, W_NS
+from docx_page_map import PageMap, build_page_map
+from page_ranges import extract_page_ranges_arg
+from profiling_hook import default_job_id, extract_profile_args, profile_session
+from split_checkpoint import SplitCheckpoint, extract_resume_arg
+from split_docx_pages_libreoffice import (LIBREOFFICE_AVAILABLE, PAGE_PROGRESS_SECONDS, SOURCE_LOST_ERRORS,
+                                          connect_to_libreoffice, make_property_value)
+from split_docx_pages_python_docx import load_page_map, plan_chunks
+from split_result_cache import cached_split_result, chunking_spec, skip_result_cache
+from uno_watchdog import CHUNK_ATTEMPTS, UnoWatchdog
+
+if LIBREOFFICE_AVAILABLE:
+    import uno
+
+PAGE_MAP_ENGINE = 'libreoffice_hybrid'
+HYBRID_FLAG = '--hybrid'
+
+# 对齐时向前查找多出元素的窗口，以及认为对齐可信的最低比例
+ALIGN_WINDOW = 8
+MIN_ALIGNED_RATIO = 0.9
+# 比较段落时只取去掉空白后的前若干个字符
+TEXT_KEY_LENGTH = 40
+
+_P = f'{{{W_NS}}}p'
+_TBL = f'{{{W_NS}}}tbl'
+_SDT = f'{{{W_NS}}}sdt'
+_SDT_CONTENT = f'{{{W_NS}}}sdtContent'
+# 段落自身的文字，不含文本框（LibreOffice 中文本框是独立的图形对象）
+_PARAGRAPH_TEXT = etree.XPath('.//w:t[not(ancestor::w:txbxContent)]/text()', namespaces={'w': W_NS})
+_SPACES_RE = re.compile(r'\s+')
+
+Token = Tuple[str, str]
+
+
+class AlignmentFailed(Exception):
+    """LibreOffice 的文档结构与DOCX对不上，页码映射不可信"""
+
+
+def _text_key(text: str) -> str:
+    return _SPACES_RE.sub('', text)[:TEXT_KEY_LENGTH]
+
+
+def docx_leaf_tokens(blocks: List) -> Tuple[List[Token], List[int]]:
+    """
+    把body块展开为 LibreOffice 正文顶层对应的元素序列（内容控件展开为其中的段落和表格）
+
+    Returns:
+        (元素序列 [(类型, 文字键)], 每个元素所属的body块索引)
+    """
+    tokens: List[Token] = []
+    owners: List[int] = []
+
+    def add(element, owner: int) -> None:
+        if element.tag == _P:
+            tokens.append(('p', _text_key(''.join(_PARAGRAPH_TEXT(element)))))
+            owners.append(owner)
+        elif element.tag == _TBL:
+            tokens.append(('tbl', ''))
+            owners.append(owner)
+        elif element.tag == _SDT:
+            content = element.find(_SDT_CONTENT)
+            if content is not None:
+                for child in content:
+                    add(child, owner)
+
+    for index, block in enumerate(blocks):
+        add(block, index)
+    return tokens, owners
+
+
+def align_tokens(docx_tokens: List[Token], lo_tokens: List[Token]) -> Tuple[List[Optional[int]], int]:
+    """
+    按顺序对齐两个元素序列
+
+    相同则对应；一侧多出元素（如 LibreOffice 在文末表格后补的空段落）时在窗口内跳过；
+    类型相同但文字不同（修订、域结果等）时按位置对应，但不计入完全相同的个数——
+    两侧结构对不上时按位置对应的元素会占满映射，只有完全相同的个数能反映对齐是否可信。
+
+    Returns:
+        (每个DOCX元素对应的 LibreOffice 元素索引（未对齐为None）, 完全相同的元素个数)
+    """
+    mapping: List[Optional[int]] = [None] * len(docx_tokens)
+    exact = 0
+    i = j = 0
+    while i < len(docx_tokens) and j < len(lo_tokens):
+        if docx_tokens[i] == lo_tokens[j]:
+            mapping[i] = j
+            exact += 1
+            i += 1
+            j += 1
+            continue
+        skip = next((k for k in range(1, ALIGN_WINDOW)
+                     if j + k < len(lo_tokens) and lo_tokens[j + k] == docx_tokens[i]), None)
+        if skip is not None:
+            j += skip
+            continue
+        skip = next((k for k in range(1, ALIGN_WINDOW)
+                     if i + k < len(docx_tokens) and docx_tokens[i + k] == lo_tokens[j]), None)
+        if skip is not None:
+            i += skip
+            continue
+        if docx_tokens[i][0] == lo_tokens[j][0]:
+            mapping[i] = j
+        i += 1
+        j += 1
+    return mapping, exact
+
+
+def _lo_elements(doc):
+    """正文顶层的段落和表格及其元素序列"""
+    elements = []
+    tokens: List[Token] = []
+    enumeration = doc.getText().createEnumeration()
+    while enumeration.hasMoreElements():
+        element = enumeration.nextElement()
+        if element.supportsService('com.sun.star.text.TextTable'):
+            tokens.append(('tbl', ''))
+        else:
+            tokens.append(('p', _text_key(element.getString())))
+        elements.append(element)
+    return elements, tokens
+
+
+def _element_page(view_cursor, element) -> int:
+    """元素起始处所在的页码（表格取第一个单元格）"""
+    if element.supportsService('com.sun.star.text.TextTable'):
+        anchor = element.getCellByName(element.getCellNames()[0]).getStart()
+    else:
+        anchor = element.getStart()
+    view_cursor.gotoRange(anchor, False)
+    return view_cursor.getPage()
+
+
+def bisect_pages(count: int, page_of) -> List[int]:
+    """
+    取得 count 个按文档顺序排列的元素的页码
+
+    页码随顺序单调不减，两端页码相同时中间全部相同，
+    所以只在页码变化处二分，调用 page_of 的次数约为 页数 × log(元素数)。
+    """
+    if count == 0:
+        return []
+    pages: List[Optional[int]] = [None] * count
+
+    def page(index: int) -> int:
+        if pages[index] is None:
+            pages[index] = page_of(index)
+        return pages[index]
+
+    stack = [(0, count - 1)]
+    while stack:
+        low, high = stack.pop()
+        if high - low <= 1:
+            page(low)
+            page(high)
+            continue
+        if page(low) == page(high):
+            pages[low + 1:high] = [pages[low]] * (high - low - 1)
+            continue
+        middle = (low + high) // 2
+        stack.append((low, middle))
+        stack.append((middle, high))
+    return pages
+
+
+def libreoffice_page_map(input_path: str, blocks: List, bridge=None) -> Optional[PageMap]:
+    """
+    用 LibreOffice 确定每个body块的起始页
+
+    每次UNO调用都有截止时间（uno_watchdog）；超时（soffice 已被结束）或连接断开时，
+    等其重新启动后重新分页一次，仍失败则抛出该异常。
+
+    Returns:
+        页码映射；对齐比例不足 MIN_ALIGNED_RATIO 时返回None（由调用方回退到估算）
+    """
+    if bridge is not None:
+        print(f"PROGRESS:FILE_STEP:0:已连接:10")
+        desktop = bridge.desktop
+    else:
+        desktop, _ = connect_to_libreoffice()
+
+    with UnoWatchdog.for_bridge(bridge) as watchdog:
+        for attempt in range(1, CHUNK_ATTEMPTS + 1):
+            try:
+                return _paginate(input_path, blocks, desktop, watchdog)
+            except SOURCE_LOST_ERRORS as e:
+                print(f"⚠ LibreOffice 分页: {e}")
+                if attempt == CHUNK_ATTEMPTS:
+                    raise
+                print(f"重启 soffice 后重新分页（第 {attempt + 1}/{CHUNK_ATTEMPTS} 次）")
+                desktop = watchdog.wait_for_restart(bridge)
+
+
+def _paginate(input_path: str, blocks: List, desktop, watchdog: UnoWatchdog) -> Optional[PageMap]:
+    print(f"PROGRESS:FILE_STEP:0:LibreOffice分页:15")
+    load_props = (
+        make_property_value("Hidden", True),
+        make_property_value("ReadOnly", True),
+    )
+    with watchdog.deadline('loadComponentFromURL', watchdog.load_timeout):
+        doc = desktop.loadComponentFromURL(uno.systemPathToFileUrl(os.path.abspath(input_path)),
+                                           "_blank", 0, load_props)
+    try:
+        # 枚举正文和跳到最后一页都要排版全文，按打开文档的时限计时
+        with watchdog.deadline('枚举正文元素', watchdog.load_timeout):
+            view_cursor = doc.getCurrentController().getViewCursor()
+            elements, lo_tokens = _lo_elements(doc)
+        with watchdog.deadline('jumpToLastPage', watchdog.load_timeout):
+            view_cursor.jumpToLastPage()
+            total_pages = view_cursor.getPage()
+
+        docx_tokens, owners = docx_leaf_tokens(blocks)
+        mapping, exact = align_tokens(docx_tokens, lo_tokens)
+        aligned = sum(1 for target in mapping if target is not None)
+        print(f"LibreOffice 正文元素 {len(lo_tokens)} 个，DOCX {len(docx_tokens)} 个，"
+              f"已对齐 {aligned} 个（完全相同 {exact} 个）")
+        if docx_tokens and exact < len(docx_tokens) * MIN_ALIGNED_RATIO:
+            return None
+
+        # 每个body块取第一个已对齐元素的页码
+        anchors: Dict[int, int] = {}
+        for owner, target in zip(owners, mapping):
+            if target is not None and owner not in anchors:
+                anchors[owner] = target
+        ordered = sorted(anchors.items())
+        # 长文档的二分可能几分钟没有输出，定期报告进度（同 map_page_starts）
+        reported_at = time.monotonic()
+
+        def page_of(index: int) -> int:
+            nonlocal reported_at
+            with watchdog.deadline('getPage'):
+                page = _element_page(view_cursor, elements[ordered[index][1]])
+            if time.monotonic() - reported_at >= PAGE_PROGRESS_SECONDS:
+                print(f"PROGRESS:FILE_STEP:0:LibreOffice分页(第{page}页):15", flush=True)
+                reported_at = time.monotonic()
+            return page
+
+        pages = bisect_pages(len(ordered), page_of)
+        anchor_pages = {owner: page for (owner, _), page in zip(ordered, pages)}
+    finally:
+        try:
+            with watchdog.deadline('close'):
+                doc.close(True)
+            print("✓ LibreOffice 分页完成，已关闭文档")
+        except Exception as e:
+            print(f"关闭文档时出错: {e}")
+
+    # 未对齐的块（如空的内容控件）沿用前一块的页码，保证单调
+    block_pages = []
+    current = 1
+    for index in range(len(blocks)):
+        current = min(max(current, anchor_pages.get(index, current)), total_pages)
+        block_pages.append(current)
+    return PageMap(block_pages=block_pages, total_pages=total_pages, method='libreoffice')
+
+
+@cached_split_result(PAGE_MAP_ENGINE)
+def split_docx_hybrid(input_path: str, output_dir: str, pages_per_file: int, original_filename: str = None,
+                      page_ranges=None, resume: bool = False, bridge=None, content_hash: str = None):
+    """
+    LibreOffice 分页 + zip级切片写出
+
+    page_ranges（如 [(1, 3), (7, 7)]）不为空时只写出这些页段；
+    断点（split_checkpoint）的区间为body块索引，resume=True 时只写出缺失的分块。
+    bridge 为常驻拆分服务从连接池取出的连接，为None时新建连接（页码缓存命中时不连接）。
+    content_hash 为输入文件的SHA-256，由 @cached_split_result 计算后传入。
+    """
+    if not LIBREOFFICE_AVAILABLE:
+        raise ImportError("LibreOffice UNO 未安装。请运行: pip install pyuno")
+
+    if original_filename is None:
+        original_filename = Path(input_path).stem
+
+    print(f"开始拆分文档: {input_path}")
+    print(f"输出目录: {output_dir}")
+    print(f"每个文件页数: {pages_per_file}" if page_ranges is None else f"页码范围: {page_ranges}")
+
+    checkpoint = SplitCheckpoint.open(output_dir, content_hash, PAGE_MAP_ENGINE,
+                                      chunking_spec(pages_per_file, page_ranges),
+                                      original_filename, resume)
+    if not checkpoint.resuming and os.path.exists(output_dir):
+        try:
+            shutil.rmtree(output_dir)
+            print(f"已清理旧的输出目录: {output_dir}")
+        except Exception as e:
+            print(f"清理目录时出错: {e}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    with DocxChunkWriter(input_path) as writer:
+        blocks = writer.body_blocks()
+        print(f"文档总块数: {len(blocks)}")
+
+        def build() -> PageMap:
+            page_map = libreoffice_page_map(input_path, blocks, bridge)
+            if page_map is None:
+                # 抛出异常，load_page_map 不会把回退结果写入混合引擎的页码缓存
+                raise AlignmentFailed()
+            return page_map
+
+        try:
+            page_map = load_page_map(input_path, content_hash, len(blocks), build, engine=PAGE_MAP_ENGINE)
+        except AlignmentFailed:
+            # 估算的页码只存放在 python-docx 方案的缓存条目中，拆分结果也不以混合引擎的名义缓存
+            print("警告: LibreOffice 的文档结构与DOCX对不上，改用估算的页码")
+            page_map = load_page_map(input_path, content_hash, len(blocks),
+                                     lambda: build_page_map(input_path, writer.root))
+            skip_result_cache("页码为估算值（混合方案回退）")
+        print(f"✓ 文档总页数: {page_map.total_pages}")
+
+        chunks = plan_chunks(page_map, pages_per_file, output_dir, original_filename, page_ranges)
+        total_files = len(chunks)
+        print(f"PROGRESS:TOTAL_FILES:{total_files}")
+        print(f"将拆分为 {total_files} 个文件")
+
+        for file_index, start, end, out_path, out_filename in chunks:
+            print(f"\nPROGRESS:FILE_START:{file_index}")
+            if checkpoint.completed(file_index, start, end, out_path):
+                print(f"✓ 已完成（断点）: {out_filename}")
+                print(f"PROGRESS:FILE_COMPLETE:{file_index}:{total_files}")
+                continue
+            print(f"正在处理第 {file_index} 个文件 (页 {page_map.block_pages[start]}-{page_map.block_pages[end - 1]})")
+            print(f"PROGRESS:FILE_STEP:{file_index}:保存文档:90")
+            try:
+                writer.write_chunk(out_path, blocks[start:end])
+            except Exception as e:
+                print(f"处理第 {file_index} 个文件时出错: {e}")
+                print(f"PROGRESS:FILE_ERROR:{file_index}:{str(e)}")
+                continue
+            checkpoint.record(file_index, start, end, out_path)
+            print(f"✓ 已保存: {out_filename}")
+            print(f"PROGRESS:FILE_COMPLETE:{file_index}:{total_files}")
+
+    print(f"\n拆分完成！共生成 {total_files} 个文件")
+    print(f"PROGRESS:ALL_FILES_COMPLETE:{total_files}:{total_files}")
+
+
+def main():
+    """主函数"""
+    argv, profile_options = extract_profile_args(sys.argv)
+    argv, resume = extract_resume_arg(argv)
+    try:
+        argv, page_ranges = extract_page_ranges_arg(argv)
+    except ValueError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+
+    if len(argv) not in [4, 5]:
+        print("用法: python split_docx_pages_hybrid.py <输入文件> <输出目录> <每文件页数> [原始文件名] [--pages=1-3,7] [--resume]")
+        sys.exit(1)
+
+    input_path = argv[1]
+    output_dir = argv[2]
+    pages_per_file = int(argv[3])
+    original_filename = argv[4] if len(argv) == 5 else Path(input_path).stem
+
+    if not os.path.exists(input_path):
+        print(f"错误: 输入文件不存在: {input_path}")
+        sys.exit(1)
+
+    if pages_per_file < 1 or pages_per_file > 1000:
+        print(f"错误: 每文件页数必须在 1-1000 之间")
+        sys.exit(1)
+
+    try:
+        with profile_session(default_job_id(argv[0], input_path), profile_options, announce=True):
+            split_docx_hybrid(input_path, output_dir, pages_per_file, original_filename, page_ranges, resume)
+        print("拆分成功!")
+    except Exception as e:
+        print(f"拆分失败: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
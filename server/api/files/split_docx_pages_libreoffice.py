@@ -4,24 +4,48 @@
 支持 Linux/macOS/Windows
 修复 Linux 平台拆分问题 - 确保资源正确清理
 整合超时处理机制
+分块内容通过控制器的 XTransferable 直接插入新文档，不经过系统剪贴板和 Dispatcher
 """
 import os
 import re
 import sys
 import time
-import gc
 from pathlib import Path
+from page_map_cache import PageBoundaries, open_page_map_cache
+from page_ranges import clamp_page_ranges, extract_page_ranges_arg, stride_page_ranges
+from split_checkpoint import SplitCheckpoint, extract_resume_arg
+from split_result_cache import cached_split_result, chunking_spec
+from profiling_hook import default_job_id, extract_profile_args, profile_session
+from uno_watchdog import CHUNK_ATTEMPTS, UnoDeadlineExceeded, UnoWatchdog
 
 # LibreOffice UNO 导入
 try:
     import uno
     from com.sun.star.beans import PropertyValue
     from com.sun.star.text.ControlCharacter import PARAGRAPH_BREAK
+    from com.sun.star.uno import RuntimeException as UnoRuntimeException
     LIBREOFFICE_AVAILABLE = True
 except ImportError:
     LIBREOFFICE_AVAILABLE = False
     print("警告: LibreOffice UNO 未安装，无法使用此脚本")
 
+    class UnoRuntimeException(Exception):
+        """未安装 UNO 时的占位（不会被抛出）"""
+
+# 源文档失效的异常：UNO调用超时（soffice 已被看门狗结束），或 soffice 崩溃、连接断开
+# （DisposedException 等 com.sun.star.uno.RuntimeException）。都需要重新连接并打开源文档。
+SOURCE_LOST_ERRORS = (UnoDeadlineExceeded, UnoRuntimeException)
+
+
+# UNO文本范围无法跨进程保存，页码缓存只记录总页数：
+# 只有指定页码范围时用得上（走到最后一个页段即停），均分时仍要走完全文取得每页起始位置
+PAGE_MAP_ENGINE = 'libreoffice'
+
+# 遍历页界时每走过这么多页、或距上一条进度超过这么多秒，输出一条 FILE_STEP
+# （拆分服务农场把 SOFFICE_FARM_HANG_TIMEOUT 秒没有输出的任务视为卡死）
+PAGE_PROGRESS_INTERVAL = 20
+PAGE_PROGRESS_SECONDS = 30
+
 
 def sanitize_filename(name: str) -> str:
     """清理文件名，移除非法字符"""
@@ -125,6 +149,47 @@ def connect_to_libreoffice(host='localhost', port=2002, max_retries=3, timeout=1
     raise Exception(error_details)
 
 
+def map_page_starts(view_cursor, watchdog, last_page=None):
+    """
+    从第1页起用视图光标逐页走一遍，记录每页起始处的文本位置
+
+    只按顺序排版一次，各分块直接从映射中取起止位置，不再每块两次 jumpToPage。
+    last_page 不为None时走到该页即停止（只需要前面的页界）；
+    否则走到文档末尾，映射的页数即总页数。
+    每一页的UNO调用各有 watchdog 的截止时间，排版卡死在某一页时抛出 UnoDeadlineExceeded。
+    长文档的遍历每 PAGE_PROGRESS_INTERVAL 页（或 PAGE_PROGRESS_SECONDS 秒）输出一条 FILE_STEP，
+    避免被拆分服务农场当作卡死的任务。
+
+    Returns:
+        {页码: 该页起始处的 XTextRange}
+    """
+    page_starts = {}
+    with watchdog.deadline('jumpToFirstPage'):
+        view_cursor.jumpToFirstPage()
+    reported_at = time.monotonic()
+    while True:
+        with watchdog.deadline('getPage'):
+            view_cursor.jumpToStartOfPage()
+            page = view_cursor.getPage()
+            page_starts[page] = view_cursor.getStart()
+        if last_page is not None and page >= last_page:
+            break
+        if len(page_starts) % PAGE_PROGRESS_INTERVAL == 0 or time.monotonic() - reported_at >= PAGE_PROGRESS_SECONDS:
+            print(f"PROGRESS:FILE_STEP:0:计算页数(第{page}页):20", flush=True)
+            reported_at = time.monotonic()
+        with watchdog.deadline(f'jumpToNextPage（第 {page} 页）'):
+            has_next = view_cursor.jumpToNextPage()
+        if not has_next:
+            break
+    return page_starts
+
+
+def page_start_at(page_starts, page):
+    """第page页（或其后第一个记录到的页，如奇偶分节插入的空白页之后）的起始位置；都没有时返回None"""
+    pages = [number for number in page_starts if number >= page]
+    return page_starts[min(pages)] if pages else None
+
+
 def make_property_value(name, value):
     """创建 PropertyValue 对象"""
     prop = PropertyValue()
@@ -133,8 +198,200 @@ def make_property_value(name, value):
     return prop
 
 
-def split_docx_by_pages_libreoffice(input_path: str, output_dir: str, pages_per_file: int, original_filename: str = None):
-    """使用 LibreOffice 按页数拆分 DOCX"""
+class SourceDocument:
+    """
+    拆分中打开的源文档及其页界映射
+
+    soffice 因UNO调用超时被看门狗结束（或崩溃、连接断开）后，reopen 等待其重新启动、
+    重新连接并打开文档，页界映射重新走到 last_page（UNO文本范围随旧连接失效）。
+    """
+
+    def __init__(self, input_path, watchdog, bridge=None):
+        self.input_path = input_path
+        self.watchdog = watchdog
+        self.bridge = bridge
+        self.desktop = None
+        self.doc = None
+        self.controller = None
+        self.page_starts = {}
+
+    def open(self, desktop, last_page=None):
+        """
+        打开文档并记录各页起始位置；last_page 为None时走到文档末尾
+
+        与混合方案的分页一致，打开或遍历时源文档失效（SOURCE_LOST_ERRORS）
+        则等 soffice 重新启动后再试一次，仍失败时抛出该异常。
+        """
+        for attempt in range(1, CHUNK_ATTEMPTS + 1):
+            try:
+                return self._load(desktop, last_page)
+            except SOURCE_LOST_ERRORS as e:
+                print(f"⚠ 打开文档: {e}")
+                self.doc = None
+                self.controller = None
+                if attempt == CHUNK_ATTEMPTS:
+                    raise
+                print(f"重新连接 soffice 后重新打开文档（第 {attempt + 1}/{CHUNK_ATTEMPTS} 次）")
+                desktop = self.watchdog.wait_for_restart(self.bridge)
+
+    def _load(self, desktop, last_page):
+        self.desktop = desktop
+        file_url = uno.systemPathToFileUrl(os.path.abspath(self.input_path))
+        load_props = (
+            make_property_value("Hidden", True),
+            make_property_value("ReadOnly", True),
+        )
+        with self.watchdog.deadline('loadComponentFromURL', self.watchdog.load_timeout):
+            self.doc = desktop.loadComponentFromURL(file_url, "_blank", 0, load_props)
+        print("✓ 文档打开成功")
+        
+        self.controller = self.doc.getCurrentController()
+        view_cursor = self.controller.getViewCursor()
+        self.page_starts = map_page_starts(view_cursor, self.watchdog, last_page)
+        return self.page_starts
+
+    def reopen(self, last_page):
+        """soffice 被回收后重新连接、打开文档并重建页界映射（旧文档随 soffice 一起结束）"""
+        self.doc = None
+        self.controller = None
+        self.page_starts = {}
+        desktop = self.watchdog.wait_for_restart(self.bridge)
+        print("✓ 已重新连接 LibreOffice，重新打开文档")
+        self.open(desktop, last_page)
+
+    def close(self):
+        if self.doc is None:
+            return
+        try:
+            print("正在关闭文档...")
+            with self.watchdog.deadline('close'):
+                self.doc.close(True)
+        except Exception as e:
+            print(f"关闭文档时出错: {e}")
+        self.doc = None
+
+
+def write_page_chunk(source, file_index, start_page, end_page, total_pages, output_path):
+    """
+    把第 start_page-end_page 页写成一个新文档
+
+    每次UNO调用都有截止时间；超时时抛出 UnoDeadlineExceeded（soffice 已被结束），
+    由调用方重新打开源文档后重试这个分块。
+    """
+    watchdog = source.watchdog
+    desktop = source.desktop
+    doc = source.doc
+    controller = source.controller
+    new_doc = None
+    try:
+        # 创建新文档
+        print(f"PROGRESS:FILE_STEP:{file_index}:创建新文档:10")
+        with watchdog.deadline('新建文档'):
+            new_doc = desktop.loadComponentFromURL(
+                "private:factory/swriter", "_blank", 0, (make_property_value("Hidden", True),)
+            )
+        
+        # 复制指定页面范围的内容
+        print(f"PROGRESS:FILE_STEP:{file_index}:选择页面范围:30")
+        
+        # 跳转到起始页并选择到结束页
+        print(f"选择页面 {start_page} 到 {end_page}...")
+        
+        # 使用直接设置Start/End属性的方式选择范围
+        try:
+            with watchdog.deadline('选择页面范围'):
+                text = doc.getText()
+                
+                # 起始位置和结束位置取自页界映射，不再移动视图光标
+                start_pos = page_start_at(source.page_starts, start_page)
+                end_pos = page_start_at(source.page_starts, end_page + 1) if end_page < total_pages else None
+                if start_pos is None:
+                    raise ValueError(f"页界映射中没有第 {start_page} 页")
+                if end_pos is None:
+                    print(f"选择到文档末尾...")
+                    end_pos = text.getEnd()
+                
+                # 创建文本光标并直接设置Start和End属性
+                selection_cursor = text.createTextCursor()
+                selection_cursor.gotoStart(False)  # 先移到开始
+                
+                # 直接设置光标的起始和结束位置
+                try:
+                    # 尝试直接设置Start和End属性
+                    selection_cursor.Start = start_pos
+                    selection_cursor.End = end_pos
+                except:
+                    # 如果直接设置失败，使用gotoRange的非扩展模式
+                    selection_cursor.gotoRange(start_pos, False)
+                    selection_cursor.gotoRange(end_pos, True)
+                
+                # 选择这个范围
+                controller.select(selection_cursor)
+            
+            print(f"✓ 已选择页面 {start_page}-{end_page}")
+            
+        except UnoDeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"❌ 页面选择失败: {e}")
+            import traceback
+            traceback.print_exc()
+            
+            # 回退：选择全文
+            print(f"回退到全选方式")
+            with watchdog.deadline('全选'):
+                selection_cursor = doc.getText().createTextCursor()
+                selection_cursor.gotoStart(False)
+                selection_cursor.gotoEnd(True)
+                controller.select(selection_cursor)
+        
+        # 取出选中内容的 XTransferable（不经过系统剪贴板，同一实例上的并发任务互不干扰）
+        print(f"PROGRESS:FILE_STEP:{file_index}:复制内容:50")
+        with watchdog.deadline('getTransferable'):
+            transferable = controller.getTransferable()
+        
+        # 插入到新文档（同步调用，返回时内容已插入，无需等待）
+        print(f"PROGRESS:FILE_STEP:{file_index}:粘贴到新文档:70")
+        with watchdog.deadline('insertTransferable'):
+            new_doc.getCurrentController().insertTransferable(transferable)
+        
+        # 保存新文档
+        print(f"PROGRESS:FILE_STEP:{file_index}:保存文档:90")
+        output_url = uno.systemPathToFileUrl(os.path.abspath(output_path))
+        
+        save_props = (
+            make_property_value("FilterName", "MS Word 2007 XML"),
+            make_property_value("Overwrite", True),
+        )
+        
+        with watchdog.deadline('storeToURL', watchdog.load_timeout):
+            new_doc.storeToURL(output_url, save_props)
+        
+    finally:
+        # 关键：确保新文档被正确关闭（修复Linux平台问题）
+        if new_doc is not None:
+            try:
+                print(f"关闭第 {file_index} 个文档...")
+                with watchdog.deadline('close'):
+                    new_doc.close(True)
+            except Exception as close_error:
+                print(f"关闭文档时出错: {close_error}")
+
+
+@cached_split_result(PAGE_MAP_ENGINE)
+def split_docx_by_pages_libreoffice(input_path: str, output_dir: str, pages_per_file: int, original_filename: str = None,
+                                    page_ranges=None, resume: bool = False, bridge=None,
+                                    content_hash: str = None):
+    """
+    使用 LibreOffice 按页数拆分 DOCX；page_ranges（如 [(1, 3), (7, 7)]）不为空时只写出这些页段
+
+    每个分块保存后写入断点（split_checkpoint）；resume=True 时只写出缺失的分块，
+    LibreOffice连接中途断开后可从断点继续。
+    bridge 为常驻拆分服务从连接池取出的连接（uno_bridge_pool.UnoBridge），为None时新建连接。
+    content_hash 为输入文件的SHA-256，由 @cached_split_result 计算后传入。
+    每次UNO调用都有截止时间（uno_watchdog）：超时时结束卡死的 soffice，
+    等其重新启动后重新打开文档，只重试受影响的分块。
+    """
     
     if not LIBREOFFICE_AVAILABLE:
         raise ImportError("LibreOffice UNO 未安装。请运行: pip install pyuno")
@@ -145,11 +402,14 @@ def split_docx_by_pages_libreoffice(input_path: str, output_dir: str, pages_per_
     
     print(f"开始拆分文档: {input_path}")
     print(f"输出目录: {output_dir}")
-    print(f"每个文件页数: {pages_per_file}")
+    print(f"每个文件页数: {pages_per_file}" if page_ranges is None else f"页码范围: {page_ranges}")
     
-    # 清理旧的输出目录（如果存在）
+    # 清理旧的输出目录（如果存在；续拆时保留已完成的分块）
     import shutil
-    if os.path.exists(output_dir):
+    checkpoint = SplitCheckpoint.open(output_dir, content_hash, PAGE_MAP_ENGINE,
+                                      chunking_spec(pages_per_file, page_ranges),
+                                      original_filename, resume)
+    if not checkpoint.resuming and os.path.exists(output_dir):
         try:
             shutil.rmtree(output_dir)
             print(f"已清理旧的输出目录: {output_dir}")
@@ -159,183 +419,96 @@ def split_docx_by_pages_libreoffice(input_path: str, output_dir: str, pages_per_
     # 创建全新的输出目录
     os.makedirs(output_dir, exist_ok=True)
     
-    # 连接到 LibreOffice
-    desktop, ctx = connect_to_libreoffice()
+    # 连接到 LibreOffice（拆分服务中复用连接池的连接）
+    if bridge is not None:
+        print(f"PROGRESS:FILE_STEP:0:已连接:10")
+        desktop = bridge.desktop
+    else:
+        desktop, ctx = connect_to_libreoffice()
     
-    doc = None
+    watchdog = UnoWatchdog.for_bridge(bridge)
+    source = SourceDocument(input_path, watchdog, bridge)
+    watchdog.start()
     try:
-        # 打开文档
+        # 打开文档，获取文档总页数和各页起始位置（一次遍历）
         print(f"PROGRESS:FILE_STEP:0:打开文档:15")
-        file_url = uno.systemPathToFileUrl(os.path.abspath(input_path))
+        cache = open_page_map_cache(input_path)
+        boundaries = None
+        if cache is not None and page_ranges is not None:
+            boundaries = cache.load(content_hash, PAGE_MAP_ENGINE)
+        if boundaries is not None:
+            # 总页数已知且只写出指定页段：只需走到最后一个页段的下一页
+            total_pages = boundaries.total_pages
+            print(f"✓ 命中页码缓存: {cache.entry_path(content_hash, PAGE_MAP_ENGINE)}")
+            page_ranges = clamp_page_ranges(page_ranges, total_pages)
+            last_page = min(max((end for _, end in page_ranges), default=0) + 1, total_pages)
+            print(f"PROGRESS:FILE_STEP:0:计算页数:20")
+            source.open(desktop, last_page)
+        else:
+            print(f"PROGRESS:FILE_STEP:0:计算页数:20")
+            total_pages = max(source.open(desktop))
+            # 均分时不查缓存，走完全文后照样写入总页数，供之后指定页码范围的拆分使用
+            if cache is not None:
+                cache.store(content_hash, PageBoundaries(engine=PAGE_MAP_ENGINE, total_pages=total_pages))
+            if page_ranges is not None:
+                page_ranges = clamp_page_ranges(page_ranges, total_pages)
         
-        load_props = (
-            make_property_value("Hidden", True),
-            make_property_value("ReadOnly", True),
-        )
-        
-        doc = desktop.loadComponentFromURL(file_url, "_blank", 0, load_props)
-        print("✓ 文档打开成功")
+        print(f"✓ 文档总页数: {total_pages}（已记录 {len(source.page_starts)} 个页界）")
         
-        # 获取文档总页数
-        print(f"PROGRESS:FILE_STEP:0:计算页数:20")
-        controller = doc.getCurrentController()
-        
-        # 跳到文档末尾获取总页数
-        view_cursor = controller.getViewCursor()
-        view_cursor.gotoEnd(False)
-        total_pages = view_cursor.getPage()
-        
-        print(f"✓ 文档总页数: {total_pages}")
-        
-        # 计算需要拆分的文件数
-        total_files = (total_pages + pages_per_file - 1) // pages_per_file
+        # 计算需要拆分的文件数（指定页码范围时只定位和写出这些页段）
+        if page_ranges is None:
+            page_ranges = stride_page_ranges(total_pages, pages_per_file)
+        total_files = len(page_ranges)
         print(f"PROGRESS:TOTAL_FILES:{total_files}")
         print(f"将拆分为 {total_files} 个文件")
-        
-        # 获取文档文本内容
-        text = doc.Text
-        text_cursor = text.createTextCursor()
+        # soffice 被回收后重新打开时，页界映射只需走到最后一个页段的下一页
+        reopen_last_page = min(max((end for _, end in page_ranges), default=0) + 1, total_pages)
         
         # 按页拆分
         file_index = 1
-        current_page = 1
         
-        while current_page <= total_pages:
-            start_page = current_page
-            end_page = min(current_page + pages_per_file - 1, total_pages)
-            
+        for start_page, end_page in page_ranges:
             print(f"\nPROGRESS:FILE_START:{file_index}")
             print(f"正在处理第 {file_index} 个文件 (页 {start_page}-{end_page})")
             
-            new_doc = None
-            try:
-                # 创建新文档
-                print(f"PROGRESS:FILE_STEP:{file_index}:创建新文档:10")
-                new_doc = desktop.loadComponentFromURL(
-                    "private:factory/swriter", "_blank", 0, ()
-                )
-                
-                # 复制指定页面范围的内容
-                print(f"PROGRESS:FILE_STEP:{file_index}:选择页面范围:30")
-                
-                # 使用 Dispatcher 进行页面选择
-                dispatcher = ctx.ServiceManager.createInstance("com.sun.star.frame.DispatchHelper")
-                
-                # 跳转到起始页并选择到结束页
-                print(f"选择页面 {start_page} 到 {end_page}...")
-                
-                # 使用直接设置Start/End属性的方式选择范围
+            # 生成文件名：原文件名 (第X页) 或 原文件名 (第X-Y页)
+            if start_page == end_page:
+                # 单页
+                output_filename = f"{original_filename} (第{start_page}页).docx"
+            else:
+                # 多页
+                output_filename = f"{original_filename} (第{start_page}-{end_page}页).docx"
+            output_path = os.path.join(output_dir, output_filename)
+            
+            if checkpoint.completed(file_index, start_page, end_page, output_path):
+                print(f"✓ 已完成（断点）: {output_filename}")
+                print(f"PROGRESS:FILE_COMPLETE:{file_index}:{total_files}")
+                file_index += 1
+                continue
+            
+            for attempt in range(1, CHUNK_ATTEMPTS + 1):
+                if source.doc is None:
+                    # 上一次UNO调用超时或连接断开，源文档已失效：重新连接并打开文档
+                    source.reopen(reopen_last_page)
                 try:
-                    text = doc.getText()
-                    
-                    # 获取起始位置
-                    print(f"定位起始页 {start_page}...")
-                    view_cursor.jumpToPage(start_page)
-                    time.sleep(0.02)
-                    start_pos = view_cursor.getStart()
-                    
-                    # 获取结束位置
-                    if end_page < total_pages:
-                        print(f"定位结束页边界...")
-                        view_cursor.jumpToPage(end_page + 1)
-                        time.sleep(0.02)
-                        end_pos = view_cursor.getStart()
+                    write_page_chunk(source, file_index, start_page, end_page, total_pages, output_path)
+                    checkpoint.record(file_index, start_page, end_page, output_path)
+                    print(f"✓ 已保存: {output_filename}")
+                    print(f"PROGRESS:FILE_COMPLETE:{file_index}:{total_files}")
+                    break
+                except SOURCE_LOST_ERRORS as e:
+                    print(f"⚠ 第 {file_index} 个文件: {e}")
+                    source.doc = None
+                    if attempt == CHUNK_ATTEMPTS:
+                        print(f"PROGRESS:FILE_ERROR:{file_index}:{str(e)}")
                     else:
-                        print(f"选择到文档末尾...")
-                        end_pos = text.getEnd()
-                    
-                    # 创建文本光标并直接设置Start和End属性
-                    selection_cursor = text.createTextCursor()
-                    selection_cursor.gotoStart(False)  # 先移到开始
-                    
-                    # 直接设置光标的起始和结束位置
-                    try:
-                        # 尝试直接设置Start和End属性
-                        selection_cursor.Start = start_pos
-                        selection_cursor.End = end_pos
-                    except:
-                        # 如果直接设置失败，使用gotoRange的非扩展模式
-                        selection_cursor.gotoRange(start_pos, False)
-                        selection_cursor.gotoRange(end_pos, True)
-                    
-                    # 选择这个范围
-                    controller.select(selection_cursor)
-                    
-                    print(f"✓ 已选择页面 {start_page}-{end_page}")
-                    
+                        print(f"重新连接 soffice 后重试第 {file_index} 个文件（第 {attempt + 1}/{CHUNK_ATTEMPTS} 次）")
                 except Exception as e:
-                    print(f"❌ 页面选择失败: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    
-                    # 回退：使用全选
-                    print(f"回退到全选方式")
-                    dispatcher.executeDispatch(controller.Frame, ".uno:SelectAll", "", 0, ())
-                
-                # 复制选中内容
-                print(f"PROGRESS:FILE_STEP:{file_index}:复制内容:50")
-                dispatcher.executeDispatch(controller.Frame, ".uno:Copy", "", 0, ())
-                
-                # 给剪贴板一点时间（Linux平台需要）
-                time.sleep(0.1)
-                
-                # 粘贴到新文档
-                print(f"PROGRESS:FILE_STEP:{file_index}:粘贴到新文档:70")
-                new_controller = new_doc.getCurrentController()
-                dispatcher.executeDispatch(new_controller.Frame, ".uno:Paste", "", 0, ())
-                
-                # 等待粘贴完成（Linux平台需要）
-                time.sleep(0.1)
-                
-                # 保存新文档
-                print(f"PROGRESS:FILE_STEP:{file_index}:保存文档:90")
-                # 生成文件名：原文件名 (第X页) 或 原文件名 (第X-Y页)
-                if start_page == end_page:
-                    # 单页
-                    output_filename = f"{original_filename} (第{start_page}页).docx"
-                else:
-                    # 多页
-                    output_filename = f"{original_filename} (第{start_page}-{end_page}页).docx"
-                    
-                output_path = os.path.join(output_dir, output_filename)
-                output_url = uno.systemPathToFileUrl(os.path.abspath(output_path))
-                
-                save_props = (
-                    make_property_value("FilterName", "MS Word 2007 XML"),
-                    make_property_value("Overwrite", True),
-                )
-                
-                new_doc.storeToURL(output_url, save_props)
-                print(f"✓ 已保存: {output_filename}")
-                
-                print(f"PROGRESS:FILE_COMPLETE:{file_index}:{total_files}")
-                
-            except Exception as e:
-                print(f"处理第 {file_index} 个文件时出错: {e}")
-                print(f"PROGRESS:FILE_ERROR:{file_index}:{str(e)}")
-                
-            finally:
-                # 关键：确保新文档被正确关闭（修复Linux平台问题）
-                if new_doc is not None:
-                    try:
-                        print(f"关闭第 {file_index} 个文档...")
-                        new_doc.close(True)
-                        new_doc = None
-                    except Exception as close_error:
-                        print(f"关闭文档时出错: {close_error}")
-                
-                # 重置原文档的光标（重要：Linux平台需要）
-                try:
-                    view_cursor.gotoStart(False)
-                except Exception as cursor_error:
-                    print(f"重置光标时出错: {cursor_error}")
-                
-                # 清理内存（Linux平台需要）
-                gc.collect()
-                time.sleep(0.2)
+                    print(f"处理第 {file_index} 个文件时出错: {e}")
+                    print(f"PROGRESS:FILE_ERROR:{file_index}:{str(e)}")
+                    break
             
             file_index += 1
-            current_page = end_page + 1
         
         print(f"\n拆分完成！共生成 {file_index - 1} 个文件")
         print(f"PROGRESS:ALL_FILES_COMPLETE:{file_index - 1}:{total_files}")
@@ -348,25 +521,41 @@ def split_docx_by_pages_libreoffice(input_path: str, output_dir: str, pages_per_
         
     finally:
         # 关闭文档
-        if doc is not None:
-            try:
-                print("正在关闭文档...")
-                doc.close(True)
-            except Exception as e:
-                print(f"关闭文档时出错: {e}")
+        source.close()
+        watchdog.stop()
 
 
-def main():
-    """主函数"""
-    if len(sys.argv) not in [4, 5]:
-        print("用法: python split_docx_pages_libreoffice.py <输入文件> <输出目录> <每文件页数> [原始文件名]")
+def main(argv=None, bridge=None):
+    """主函数；常驻拆分服务以任务参数和连接池中的连接调用"""
+    argv = list(sys.argv if argv is None else argv)
+    
+    # 设置了 LIBREOFFICE_SPLIT_SERVICE 时交给常驻拆分服务（已连接好 LibreOffice）
+    if bridge is None and os.environ.get('LIBREOFFICE_SPLIT_SERVICE'):
+        from libreoffice_split_service import submit_job
+        code = submit_job(os.environ['LIBREOFFICE_SPLIT_SERVICE'], argv)
+        if code is not None:
+            sys.exit(code)
+    
+    argv, profile_options = extract_profile_args(argv)
+    argv, resume = extract_resume_arg(argv)
+    # --hybrid: LibreOffice 只负责分页，分块由zip级写出器切片（split_docx_pages_hybrid）
+    hybrid = '--hybrid' in argv
+    argv = [arg for arg in argv if arg != '--hybrid']
+    try:
+        argv, page_ranges = extract_page_ranges_arg(argv)
+    except ValueError as e:
+        print(f"错误: {e}")
         sys.exit(1)
     
-    input_path = sys.argv[1]
-    output_dir = sys.argv[2]
-    pages_per_file = int(sys.argv[3])
+    if len(argv) not in [4, 5]:
+        print("用法: python split_docx_pages_libreoffice.py <输入文件> <输出目录> <每文件页数> [原始文件名] [--pages=1-3,7] [--resume] [--hybrid]")
+        sys.exit(1)
+    
+    input_path = argv[1]
+    output_dir = argv[2]
+    pages_per_file = int(argv[3])
     # 如果提供了原始文件名参数，使用它；否则从input_path提取
-    original_filename = sys.argv[4] if len(sys.argv) == 5 else Path(input_path).stem
+    original_filename = argv[4] if len(argv) == 5 else Path(input_path).stem
     
     if not os.path.exists(input_path):
         print(f"错误: 输入文件不存在: {input_path}")
@@ -376,8 +565,15 @@ def main():
         print(f"错误: 每文件页数必须在 1-1000 之间")
         sys.exit(1)
     
+    if hybrid:
+        from split_docx_pages_hybrid import split_docx_hybrid
+        split = split_docx_hybrid
+    else:
+        split = split_docx_by_pages_libreoffice
+    
     try:
-        split_docx_by_pages_libreoffice(input_path, output_dir, pages_per_file, original_filename)
+        with profile_session(default_job_id(argv[0], input_path), profile_options, announce=True):
+            split(input_path, output_dir, pages_per_file, original_filename, page_ranges, resume, bridge)
         print("拆分成功!")
     except Exception as e:
         print(f"拆分失败: {e}")
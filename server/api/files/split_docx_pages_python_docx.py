@@ -5,140 +5,351 @@
 """
 import os
 import sys
+import json
+import zipfile
+import contextlib
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from docx import Document
 from docx.shared import Pt, Inches
 from docx.oxml import parse_xml
 from docx.oxml.ns import nsdecls
+from lxml import etree
+from docx_chunk_writer import BODY_BLOCK_TAGS, BODY_TAG, DocxChunkWriter
+from docx_markdown import MarkdownConverter
+from docx_page_fragments import FragmentStore, PageFragments, fragment_cache_enabled
+from docx_page_map import PageMap, build_page_map, build_page_map_streaming
+from docx_stream_reader import StreamingBodyReader
+from docx_token_budget import estimate_block_tokens, extract_token_budget_arg, plan_token_chunks
+from excel_sidecar import compute_content_hash
+from page_map_cache import PageBoundaries, open_page_map_cache
+from page_ranges import clamp_page_ranges, extract_page_ranges_arg, stride_page_ranges
+from split_checkpoint import SplitCheckpoint, extract_resume_arg
+from split_result_cache import cached_split_result, chunking_spec
+from profiling_hook import default_job_id, extract_profile_args, profile_session
 
 
-def estimate_page_breaks(doc):
-    """估算文档中的分页符位置（段落索引）"""
-    page_breaks = [0]  # 第一页从索引0开始
+PAGE_MAP_METHODS = {
+    'rendered': '来自Word渲染分页标记',
+    'app_pages': '按docProps页数校准的估算',
+    'metrics': '按页面尺寸和字号估算',
+}
+
+PAGE_MAP_ENGINE = 'python_docx'
+
+# 并行写出分块的进程数：--workers=N 或环境变量 SPLIT_WORKERS，0 表示使用全部CPU
+SPLIT_WORKERS_ENV = 'SPLIT_WORKERS'
+WORKERS_FLAG = '--workers='
+
+
+# 流式拆分：包解压后总大小超过阈值（MB）时自动使用，--stream 或 SPLIT_STREAMING=1/0 强制开关
+SPLIT_STREAMING_ENV = 'SPLIT_STREAMING'
+STREAMING_THRESHOLD_ENV = 'SPLIT_STREAMING_THRESHOLD_MB'
+DEFAULT_STREAMING_THRESHOLD_MB = 200
+STREAM_FLAG = '--stream'
+
+# 直接提取Markdown而不生成DOCX：--extract=markdown 每段一个.md文件，--extract=ndjson 每段一行JSON输出到标准输出
+EXTRACT_FLAG = '--extract='
+EXTRACT_FORMATS = ('markdown', 'ndjson')
+
+
+def use_streaming(input_path: str, requested: bool = None) -> bool:
+    """是否使用流式拆分：显式指定优先，其次按解压后的包大小判断"""
+    if requested is None:
+        value = os.environ.get(SPLIT_STREAMING_ENV, '').strip().lower()
+        if value in ('1', 'true', 'yes'):
+            return True
+        if value in ('0', 'false', 'no'):
+            return False
+    elif requested:
+        return True
+    else:
+        return False
+    try:
+        threshold = float(os.environ.get(STREAMING_THRESHOLD_ENV, DEFAULT_STREAMING_THRESHOLD_MB))
+    except ValueError:
+        threshold = DEFAULT_STREAMING_THRESHOLD_MB
+    with zipfile.ZipFile(input_path) as archive:
+        total_size = sum(info.file_size for info in archive.infolist())
+    return total_size > threshold * 1024 * 1024
+
+
+def resolve_workers(value=None) -> int:
+    """解析并行写出的进程数，默认1（顺序写出）"""
+    if value is None:
+        value = os.environ.get(SPLIT_WORKERS_ENV, '1')
+    try:
+        workers = int(value)
+    except (TypeError, ValueError):
+        return 1
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def extract_workers_arg(argv):
+    """从命令行参数中取出 --workers=N，返回 (剩余参数, N或None)"""
+    remaining = []
+    workers = None
+    for arg in argv:
+        if arg.startswith(WORKERS_FLAG):
+            workers = arg[len(WORKERS_FLAG):]
+        else:
+            remaining.append(arg)
+    return remaining, workers
+
+
+# 子进程中的分块写出器和页面片段。片段由父进程生成，子进程只负责拼接和保存
+_worker_writer = None
+_worker_fragments = None
+
+
+def _init_chunk_worker(input_path: str, fragments_dir: str, content_hash: str):
+    global _worker_writer, _worker_fragments
+    _worker_writer = DocxChunkWriter(input_path, parse_document=False)
+    _worker_fragments = PageFragments.open(fragments_dir, content_hash)
+    if _worker_fragments is None:
+        raise RuntimeError(f"无法打开页面片段: {fragments_dir}")
+
+
+def _write_chunk_task(file_index: int, start: int, end: int, out_path: str) -> int:
+    write_fragment_chunk(_worker_writer, _worker_fragments, start, end, out_path)
+    return file_index
+
+
+def write_fragment_chunk(writer: DocxChunkWriter, fragments: PageFragments,
+                         start: int, end: int, out_path: str) -> None:
+    """拼接body块 [start, end) 的片段并按zip级写出"""
+    writer.write_document(
+        out_path,
+        fragments.document_xml(start, end),
+        fragments.references(start, end),
+    )
+
+
+def print_chunk_tokens(fragments: PageFragments, file_index: int, start: int, end: int, out_filename: str) -> None:
+    """输出分块的估算token数，供分析流水线按上下文容量装填"""
+    tokens = sum(fragments.block_tokens[start:end])
+    print(f"PROGRESS:FILE_TOKENS:{file_index}:{tokens}:{out_filename}", flush=True)
+
+
+def write_chunks_parallel(input_path: str, fragments: PageFragments, content_hash: str,
+                          chunks, total_files: int, workers: int, checkpoint: SplitCheckpoint) -> None:
+    """
+    在进程池中并行写出分块
+
+    分块边界已由父进程确定，子进程只负责拼接片段和保存；
+    进度行只由父进程输出，保证每行完整：FILE_START 在提交分块时输出，
+    FILE_COMPLETE 按完成顺序输出。
+
+    Args:
+        chunks: plan_chunks 的结果中尚未完成的分块
+        checkpoint: 每个分块保存后由父进程记录
+    """
+    # fork出的子进程退出时会刷新继承的stdout缓冲，先清空避免进度行重复输出
+    sys.stdout.flush()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_chunk_worker,
+                             initargs=(input_path, fragments.directory, content_hash)) as pool:
+        futures = {}
+        for file_index, start, end, out_path, out_filename in chunks:
+            futures[pool.submit(_write_chunk_task, file_index, start, end, out_path)] = \
+                (file_index, start, end, out_path, out_filename)
+            print(f"PROGRESS:FILE_START:{file_index}:{total_files}", flush=True)
+        for future in as_completed(futures):
+            file_index, start, end, out_path, out_filename = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"PROGRESS:FILE_ERROR:{file_index}:{e}", flush=True)
+                for pending in futures:
+                    pending.cancel()
+                raise
+            checkpoint.record(file_index, start, end, out_path)
+            print(f"已保存: {out_filename}")
+            print_chunk_tokens(fragments, file_index, start, end, out_filename)
+            print(f"PROGRESS:FILE_COMPLETE:{file_index}:{total_files}", flush=True)
+
+
+def load_page_map(input_path: str, content_hash: str, block_count: int, build,
+                  engine: str = PAGE_MAP_ENGINE) -> PageMap:
+    """
+    读取页码缓存，未命中（或与当前块数不符）时调用 build() 构建页码映射并写回缓存
+
+    engine 为缓存条目的引擎名：混合引擎（split_docx_pages_hybrid）的映射同为body块索引，
+    但页界来自 LibreOffice，单独存放。
+    """
+    cache = open_page_map_cache(input_path)
+    if cache is not None:
+        cached = cache.load(content_hash, engine)
+        if cached is not None and cached.starts.get(cached.total_pages + 1) == block_count:
+            print(f"✓ 命中页码缓存: {cache.entry_path(content_hash, engine)}")
+            return PageMap.from_page_starts(cached.starts, cached.total_pages, cached.method)
     
-    # 定义Word命名空间
-    from docx.oxml.ns import qn
+    page_map = build()
+    if cache is not None:
+        cache.store(content_hash, PageBoundaries(
+            engine=engine,
+            total_pages=page_map.total_pages,
+            starts=page_map.page_starts(),
+            method=page_map.method,
+        ))
+    return page_map
+
+
+def plan_chunks(page_map: PageMap, pages_per_file: int, output_dir: str, original_filename: str,
+                page_ranges=None):
+    """
+    按页码确定所有分块的页段和文件名
+
+    均分时没有任何块起始的页段跳过；指定了页码范围（page_ranges）时每个范围一个文件，
+    范围内没有块起始（整页都是上一页延续下来的长表格等）时向前扩展到该块的起始页。
+
+    Returns:
+        [(文件序号, 起始块索引, 结束块索引（不含）, 输出路径, 输出文件名)]
+    """
+    chunks = []
+    file_index = 1
+    total_pages = page_map.total_pages
+    explicit = page_ranges is not None
+    if explicit:
+        page_ranges = clamp_page_ranges(page_ranges, total_pages)
+    else:
+        page_ranges = stride_page_ranges(total_pages, pages_per_file)
     
-    for i, para in enumerate(doc.paragraphs):
-        # 检查段落是否包含分页符
-        # 查找 w:br 元素，并检查 w:type 属性是否为 "page"
-        for br in para._element.iter(qn('w:br')):
-            br_type = br.get(qn('w:type'))
-            if br_type == 'page':
-                page_breaks.append(i + 1)
-                break
+    for start_page, end_page in page_ranges:
+        block_index, end_block_index = page_map.block_range(start_page, end_page)
+        if block_index >= end_block_index:
+            if not explicit or block_index == 0:
+                continue
+            block_index, _ = page_map.block_range(page_map.block_pages[block_index - 1], end_page)
         
-        # 检查段落格式中的分页设置
-        try:
-            if para.paragraph_format.page_break_before:
-                if i not in page_breaks:
-                    page_breaks.append(i)
-        except:
-            pass
-    
-    return page_breaks
+        # 生成输出文件名
+        if start_page == end_page:
+            out_filename = f"{original_filename} (第{start_page}页).docx"
+        else:
+            out_filename = f"{original_filename} (第{start_page}-{end_page}页).docx"
+        
+        out_path = os.path.join(output_dir, out_filename)
+        chunks.append((file_index, block_index, end_block_index, out_path, out_filename))
+        file_index += 1
+    return chunks
 
 
-def count_pages_docx(doc):
-    """估算DOCX文档的页数"""
-    # 方法1: 查找所有分页符
-    page_breaks = estimate_page_breaks(doc)
-    estimated_pages = len(page_breaks)
-    
-    # 方法2: 根据内容估算（如果没有明显的分页符）
-    if estimated_pages <= 1:
-        total_paragraphs = len(doc.paragraphs)
-        # 假设每页约20个段落（粗略估算）
-        estimated_pages = max(1, (total_paragraphs + 19) // 20)
-    
-    return estimated_pages
+def plan_token_budget_chunks(page_map: PageMap, block_tokens, token_budget: int,
+                             output_dir: str, original_filename: str):
+    """
+    按token预算确定分块（docx_token_budget）
 
+    边界只落在顶层段落、表格和内容控件之间；文件名带分块序号和覆盖的页码。
 
-def copy_paragraph(source_para, target_doc):
-    """复制段落到目标文档"""
-    new_para = target_doc.add_paragraph()
-    
-    # 复制段落格式
-    if source_para.style:
-        try:
-            new_para.style = source_para.style
-        except:
-            pass
+    Returns:
+        与 plan_chunks 相同
+    """
+    chunks = []
+    for file_index, (start, end, tokens) in enumerate(plan_token_chunks(block_tokens, token_budget), start=1):
+        if tokens > token_budget:
+            print(f"警告: 第 {file_index} 块只有一个段落或表格，估算 {tokens} tokens，超出预算 {token_budget}")
+        first_page, last_page = page_map.block_pages[start], page_map.block_pages[end - 1]
+        pages = f"第{first_page}页" if first_page == last_page else f"第{first_page}-{last_page}页"
+        out_filename = f"{original_filename} (第{file_index}部分 {pages}).docx"
+        chunks.append((file_index, start, end, os.path.join(output_dir, out_filename), out_filename))
+    return chunks
+
+
+def build_fragments(input_path: str, content_hash: str, store: FragmentStore, streaming: bool) -> PageFragments:
+    """
+    解析源文档、分页并生成页面片段
+
+    普通文档用python-docx载入；超大文档（或 streaming=True）用 StreamingBodyReader
+    逐块读取，第一遍取得块数和最后一节的节设置，第二遍构建页码映射（命中页码缓存时跳过），
+    第三遍逐块写入片段，内存中始终只有当前块。
+    """
+    if streaming:
+        print("流式读取文档...")
+        reader = StreamingBodyReader(input_path)
+        block_count = reader.scan()
+        print(f"文档总块数: {block_count}")
+        # scan() 后的 reader.root 只剩文档外壳和最后一节的节设置，生成片段首尾只用到这些
+        writer = DocxChunkWriter(input_path, reader.root)
+        page_map = load_page_map(input_path, content_hash, block_count,
+                                 lambda: build_page_map_streaming(reader))
+        blocks = reader.iter_blocks()
+    else:
+        print("加载文档...")
+        doc = Document(input_path)
+        # 分块写出器和页码映射都直接复用python-docx已解析的document.xml
+        writer = DocxChunkWriter(input_path, doc.element)
+        blocks = writer.body_blocks()
+        page_map = load_page_map(input_path, content_hash, len(blocks),
+                                 lambda: build_page_map(input_path, doc.element))
+        print(f"文档总段落数: {len(doc.paragraphs)}")
+        print(f"文档总表格数: {len(doc.tables)}")
     
-    # 复制段落级别格式
+    print(f"总页数: {page_map.total_pages}（{PAGE_MAP_METHODS.get(page_map.method, page_map.method)}）")
+    print("生成页面片段...")
+    builder = store.builder(content_hash, writer, page_map)
     try:
-        new_para.paragraph_format.alignment = source_para.paragraph_format.alignment
-        new_para.paragraph_format.left_indent = source_para.paragraph_format.left_indent
-        new_para.paragraph_format.right_indent = source_para.paragraph_format.right_indent
-        new_para.paragraph_format.first_line_indent = source_para.paragraph_format.first_line_indent
-        new_para.paragraph_format.space_before = source_para.paragraph_format.space_before
-        new_para.paragraph_format.space_after = source_para.paragraph_format.space_after
-        new_para.paragraph_format.line_spacing = source_para.paragraph_format.line_spacing
-    except:
-        pass
-    
-    # 复制文本内容和run格式
-    for run in source_para.runs:
-        new_run = new_para.add_run(run.text)
-        try:
-            new_run.bold = run.bold
-            new_run.italic = run.italic
-            new_run.underline = run.underline
-            if run.font.size:
-                new_run.font.size = run.font.size
-            if run.font.name:
-                new_run.font.name = run.font.name
-            if run.font.color.rgb:
-                new_run.font.color.rgb = run.font.color.rgb
-        except:
-            pass
-    
-    return new_para
+        for block in blocks:
+            builder.add(block)
+        fragments = builder.finish()
+    except Exception:
+        builder.abort()
+        raise
+    finally:
+        writer.close()
+    store.evict(keep=fragments.directory)
+    return fragments
+
 
+@cached_split_result(PAGE_MAP_ENGINE)
+def split_docx_by_sections(input_path: str, output_dir: str, pages_per_file: int, original_filename: str = None,
+                           workers: int = None, streaming: bool = None, page_ranges=None,
+                           token_budget: int = None, resume: bool = False, content_hash: str = None):
+    """
+    按页拆分DOCX文档
+    注意：python-docx无法排版，页码来自 docx_page_map：优先使用Word保存的
+    渲染分页标记和docProps中的页数，没有时按页面尺寸和字号估算；
+    结果按文件内容缓存（page_map_cache），同一文件换页数重新拆分时直接复用
 
-def copy_table(source_table, target_doc):
-    """复制表格到目标文档"""
-    # 获取表格的行列数
-    rows_count = len(source_table.rows)
-    cols_count = len(source_table.columns)
+    第一次拆分时每个段落、表格和内容控件序列化一次，按页写入页面片段缓存
+    （docx_page_fragments）；每个分块的document.xml由对应页段的片段拼接而成，
+    样式、编号、主题、页眉页脚和图片等其余part按源文件原样拷贝，
+    表格、图片、编号和行内格式都会保留。之后同一文件无论换多少页一个文件，
+    都直接拼接片段，不再解析源文档，也不再分页。
+
+    workers大于1时，分块边界在本进程中确定，拼接和保存在进程池中并行完成。
     
-    # 创建新表格
-    new_table = target_doc.add_table(rows=rows_count, cols=cols_count)
+    超大文档（或 streaming=True）生成片段时改用流式读取。
     
-    # 尝试复制表格样式
-    try:
-        if source_table.style:
-            new_table.style = source_table.style
-    except:
-        pass
+    page_ranges（如 [(1, 3), (7, 7)]）不为空时只写出这些页段，每个范围一个文件。
     
-    # 复制每个单元格的内容
-    for i, row in enumerate(source_table.rows):
-        for j, cell in enumerate(row.cells):
-            new_cell = new_table.rows[i].cells[j]
-            # 复制单元格中的段落
-            new_cell.text = ''  # 清空默认段落
-            for para in cell.paragraphs:
-                copy_paragraph(para, new_cell)
+    token_budget 不为空时改为按估算token数切块（docx_token_budget），
+    忽略 pages_per_file；每个分块的估算token数都通过 PROGRESS:FILE_TOKENS 输出。
     
-    return new_table
-
-
-def split_docx_by_sections(input_path: str, output_dir: str, pages_per_file: int, original_filename: str = None):
-    """
-    按段落和分页符拆分DOCX文档
-    注意：由于python-docx无法精确获取页数，此方法按段落分组拆分
+    每个分块保存后写入断点（split_checkpoint）；resume=True 时沿用输出目录中
+    一致的断点，只写出缺失或损坏的分块。
+    
+    content_hash 为输入文件的SHA-256，由 @cached_split_result 计算后传入。
     """
     if original_filename is None:
         original_filename = Path(input_path).stem
     
     print(f"开始拆分文档: {input_path}")
     print(f"输出目录: {output_dir}")
-    print(f"目标：每 {pages_per_file} 页一个文件（基于段落估算）")
+    if token_budget:
+        print(f"目标：每个文件不超过约 {token_budget} tokens")
+    elif page_ranges:
+        print(f"目标：页码范围 {','.join(f'{a}-{b}' if a != b else str(a) for a, b in page_ranges)}")
+    else:
+        print(f"目标：每 {pages_per_file} 页一个文件")
     
-    # 清理并创建输出目录
+    # 清理并创建输出目录（续拆时保留已完成的分块）
     import shutil
-    if os.path.exists(output_dir):
+    checkpoint = SplitCheckpoint.open(output_dir, content_hash, PAGE_MAP_ENGINE,
+                                      chunking_spec(pages_per_file, page_ranges, token_budget),
+                                      original_filename, resume)
+    if not checkpoint.resuming and os.path.exists(output_dir):
         try:
             shutil.rmtree(output_dir)
             print(f"已清理旧的输出目录")
@@ -147,112 +358,241 @@ def split_docx_by_sections(input_path: str, output_dir: str, pages_per_file: int
     
     os.makedirs(output_dir, exist_ok=True)
     
-    # 加载文档
-    print("加载文档...")
-    doc = Document(input_path)
+    # 页面片段：关闭缓存时生成到临时目录，用完即删
+    keep_fragments = fragment_cache_enabled()
+    store = FragmentStore.for_input(input_path) if keep_fragments else FragmentStore(tempfile.mkdtemp())
+    fragments = store.open(content_hash) if keep_fragments else None
+    if fragments is not None:
+        print(f"✓ 命中页面片段缓存: {fragments.directory}")
+        print(f"总页数: {fragments.total_pages}（{PAGE_MAP_METHODS.get(fragments.method, fragments.method)}）")
+    else:
+        fragments = build_fragments(input_path, content_hash, store, use_streaming(input_path, streaming))
     
-    # 估算总页数
-    total_pages = count_pages_docx(doc)
-    print(f"估算总页数: {total_pages}")
-    
-    # 计算总文件数
-    total_files = (total_pages + pages_per_file - 1) // pages_per_file
-    print(f"预计生成文件数: {total_files}")
-    print(f"PROGRESS:TOTAL_FILES:{total_files}")
-    
-    # 计算每个文件大约应包含多少段落
-    total_paragraphs = len(doc.paragraphs)
-    total_tables = len(doc.tables)
+    try:
+        page_map = fragments.page_map()
+        if token_budget:
+            chunks = plan_token_budget_chunks(page_map, fragments.block_tokens, token_budget,
+                                              output_dir, original_filename)
+        else:
+            chunks = plan_chunks(page_map, pages_per_file, output_dir, original_filename, page_ranges)
+        total_files = len(chunks)
+        print(f"预计生成文件数: {total_files}")
+        print(f"PROGRESS:TOTAL_FILES:{total_files}")
+        
+        pending = []
+        for chunk in chunks:
+            file_index, start, end, out_path, out_filename = chunk
+            if not checkpoint.completed(file_index, start, end, out_path):
+                pending.append(chunk)
+                continue
+            print(f"PROGRESS:FILE_START:{file_index}:{total_files}")
+            print(f"已完成（断点）: {out_filename}")
+            print_chunk_tokens(fragments, file_index, start, end, out_filename)
+            print(f"PROGRESS:FILE_COMPLETE:{file_index}:{total_files}")
+        
+        workers = min(resolve_workers(workers), len(pending))
+        if workers > 1:
+            print(f"使用 {workers} 个进程并行写出 {len(pending)} 个文件")
+            write_chunks_parallel(input_path, fragments, content_hash, pending, total_files, workers, checkpoint)
+        elif pending:
+            with DocxChunkWriter(input_path, parse_document=False) as writer:
+                for file_index, start, end, out_path, out_filename in pending:
+                    print(f"\n正在创建第 {file_index} 个文件...")
+                    print(f"PROGRESS:FILE_START:{file_index}:{total_files}")
+                    print(f"  拼接第 {page_map.block_pages[start]}-{page_map.block_pages[end - 1]} 页的片段...")
+                    print(f"PROGRESS:FILE_STEP:{file_index}:复制内容:50")
+                    
+                    # 保存文件
+                    print(f"  保存文件: {out_filename}")
+                    print(f"PROGRESS:FILE_STEP:{file_index}:保存文件:90")
+                    try:
+                        write_fragment_chunk(writer, fragments, start, end, out_path)
+                    except Exception as e:
+                        print(f"PROGRESS:FILE_ERROR:{file_index}:{e}")
+                        raise
+                    checkpoint.record(file_index, start, end, out_path)
+                    
+                    print(f"已保存: {out_filename}")
+                    print_chunk_tokens(fragments, file_index, start, end, out_filename)
+                    print(f"PROGRESS:FILE_COMPLETE:{file_index}:{total_files}")
+    finally:
+        fragments.close()
+        if not keep_fragments:
+            shutil.rmtree(store.cache_dir, ignore_errors=True)
     
-    print(f"文档总段落数: {total_paragraphs}")
-    print(f"文档总表格数: {total_tables}")
+    print(f"\n拆分完成！共生成 {len(chunks)} 个文件")
+    print(f"PROGRESS:ALL_FILES_COMPLETE:{len(chunks)}:{total_files}")
+
+
+def _iter_fragment_markdown(fragments: PageFragments, converter: MarkdownConverter, chunks):
+    """命中页面片段缓存：只解析每个分块对应的片段"""
+    for chunk in chunks:
+        _, start, end, _, _ = chunk
+        root = etree.fromstring(fragments.document_xml(start, end), etree.XMLParser(huge_tree=True))
+        yield chunk, converter.blocks_to_markdown(root.find(BODY_TAG).iterchildren(*BODY_BLOCK_TAGS))
+
+
+def _iter_streaming_markdown(reader: StreamingBodyReader, converter: MarkdownConverter, chunks):
+    """
+    流式读取一遍，按分块结束的顺序产出Markdown
+
+    每个body块最多转换一次，同时追加到覆盖它的所有分块（指定的页码范围可能重叠、乱序）；
+    不在任何分块内的块不转换，读到最后一个分块的结束位置即停止。
+    """
+    starting, ending = {}, {}
+    for chunk in chunks:
+        starting.setdefault(chunk[1], []).append(chunk)
+        ending.setdefault(chunk[2], []).append(chunk)
+    last_end = max(ending) if ending else 0
+    active = {}
+    for index, block in enumerate(reader.iter_blocks()):
+        if index >= last_end:
+            break
+        for chunk in starting.get(index, ()):
+            active[chunk[0]] = []
+        if active:
+            markdown = converter.block_to_markdown(block)
+            if markdown:
+                for parts in active.values():
+                    parts.append(markdown)
+        for chunk in ending.get(index + 1, ()):
+            yield chunk, '\n\n'.join(active.pop(chunk[0]))
+
+
+def extract_markdown_by_sections(input_path: str, output_dir: str, pages_per_file: int, original_filename: str = None,
+                                 page_ranges=None, token_budget: int = None, output_format: str = 'markdown'):
+    """
+    按与 split_docx_by_sections 相同的分块规则直接提取Markdown，不生成DOCX
+
+    段落和表格由 docx_markdown 转换，表格为管道表格。分块边界的确定方式不变
+    （每文件页数、page_ranges 或 token_budget），但不构造 Document()，也不写zip：
+    命中页面片段缓存时只解析每个分块对应的片段；未命中时流式读取源文档，
+    页码映射照常使用页码缓存，且不为提取生成片段缓存。
+
+    output_format:
+        markdown  每个分块写出一个 .md 文件（文件名与DOCX拆分相同），进度行照常输出
+        ndjson    每个分块一行JSON输出到标准输出：
+                  {"index", "start_page", "end_page", "tokens", "markdown"}，
+                  其余日志输出到标准错误，标准输出只有JSON行
+    """
+    if output_format == 'ndjson':
+        # 标准输出只留给JSON行，其余输出（包括页码缓存、范围截断等提示）转到标准错误
+        records = sys.stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            _extract_markdown(input_path, output_dir, pages_per_file, original_filename,
+                              page_ranges, token_budget, records)
+    else:
+        _extract_markdown(input_path, output_dir, pages_per_file, original_filename,
+                          page_ranges, token_budget, None)
+
+
+def _extract_markdown(input_path: str, output_dir: str, pages_per_file: int, original_filename,
+                      page_ranges, token_budget, records):
+    """extract_markdown_by_sections 的实现；records 不为None时把每个分块作为JSON行写入其中"""
+    if original_filename is None:
+        original_filename = Path(input_path).stem
     
-    # 按段落数平均分配
-    paras_per_file = max(1, total_paragraphs // total_files)
+    print(f"开始提取文档: {input_path}")
+    if records is None:
+        import shutil
+        if os.path.exists(output_dir):
+            shutil.rmtree(output_dir, ignore_errors=True)
+        os.makedirs(output_dir, exist_ok=True)
+        print(f"输出目录: {output_dir}")
     
-    # 开始拆分
-    file_index = 1
-    para_index = 0
+    converter = MarkdownConverter.for_input(input_path)
+    content_hash = compute_content_hash(input_path)
+    fragments = FragmentStore.for_input(input_path).open(content_hash) if fragment_cache_enabled() else None
+    reader = None
+    if fragments is not None:
+        print(f"✓ 命中页面片段缓存: {fragments.directory}")
+        page_map = fragments.page_map()
+        block_tokens = fragments.block_tokens
+    else:
+        print("流式读取文档...")
+        reader = StreamingBodyReader(input_path)
+        # 第一遍同时取得块数、最后一节的节设置和每块的token估算
+        block_tokens = [estimate_block_tokens(block) for block in reader.iter_blocks()]
+        page_map = load_page_map(input_path, content_hash, len(block_tokens),
+                                 lambda: build_page_map_streaming(reader))
+    print(f"总页数: {page_map.total_pages}（{PAGE_MAP_METHODS.get(page_map.method, page_map.method)}）")
     
-    while para_index < total_paragraphs:
-        print(f"\n正在创建第 {file_index} 个文件...")
-        print(f"PROGRESS:FILE_START:{file_index}:{total_files}")
-        
-        # 创建新文档
-        print(f"PROGRESS:FILE_STEP:{file_index}:创建新文档:10")
-        new_doc = Document()
-        
-        # 复制文档的节设置
-        try:
-            new_section = new_doc.sections[0]
-            source_section = doc.sections[0]
-            new_section.page_height = source_section.page_height
-            new_section.page_width = source_section.page_width
-            new_section.left_margin = source_section.left_margin
-            new_section.right_margin = source_section.right_margin
-            new_section.top_margin = source_section.top_margin
-            new_section.bottom_margin = source_section.bottom_margin
-        except Exception as e:
-            print(f"  复制页面设置失败: {e}")
-        
-        # 确定本文件的段落范围
-        end_para_index = min(para_index + paras_per_file, total_paragraphs)
-        
-        # 如果是最后一个文件，包含所有剩余段落
-        if file_index == total_files:
-            end_para_index = total_paragraphs
-        
-        print(f"  复制段落 {para_index + 1} 到 {end_para_index}...")
-        print(f"PROGRESS:FILE_STEP:{file_index}:复制内容:50")
-        
-        # 复制段落
-        copied_count = 0
-        for i in range(para_index, end_para_index):
-            try:
-                copy_paragraph(doc.paragraphs[i], new_doc)
-                copied_count += 1
-            except Exception as e:
-                print(f"  复制段落 {i} 时出错: {e}")
-        
-        print(f"  已复制 {copied_count} 个段落")
-        
-        # 生成输出文件名
-        start_page = (file_index - 1) * pages_per_file + 1
-        end_page = min(file_index * pages_per_file, total_pages)
-        
-        if start_page == end_page:
-            out_filename = f"{original_filename} (第{start_page}页).docx"
+    try:
+        if token_budget:
+            chunks = plan_token_budget_chunks(page_map, block_tokens, token_budget, output_dir, original_filename)
         else:
-            out_filename = f"{original_filename} (第{start_page}-{end_page}页).docx"
-        
-        out_path = os.path.join(output_dir, out_filename)
-        
-        # 保存文件
-        print(f"  保存文件: {out_filename}")
-        print(f"PROGRESS:FILE_STEP:{file_index}:保存文件:90")
-        new_doc.save(out_path)
+            chunks = plan_chunks(page_map, pages_per_file, output_dir, original_filename, page_ranges)
+        total_files = len(chunks)
+        print(f"PROGRESS:TOTAL_FILES:{total_files}")
         
-        print(f"已保存: {out_filename}")
-        print(f"PROGRESS:FILE_COMPLETE:{file_index}:{total_files}")
-        
-        # 更新索引
-        file_index += 1
-        para_index = end_para_index
+        if fragments is not None:
+            results = _iter_fragment_markdown(fragments, converter, chunks)
+        else:
+            results = _iter_streaming_markdown(reader, converter, chunks)
+        for (file_index, start, end, out_path, out_filename), markdown in results:
+            tokens = sum(block_tokens[start:end])
+            start_page, end_page = page_map.block_pages[start], page_map.block_pages[end - 1]
+            if records is not None:
+                print(json.dumps({
+                    'index': file_index,
+                    'start_page': start_page,
+                    'end_page': end_page,
+                    'tokens': tokens,
+                    'markdown': markdown,
+                }, ensure_ascii=False), file=records, flush=True)
+                continue
+            out_filename = out_filename[:-len('.docx')] + '.md'
+            print(f"PROGRESS:FILE_START:{file_index}:{total_files}")
+            with open(os.path.join(output_dir, out_filename), 'w', encoding='utf-8') as f:
+                f.write(markdown + '\n')
+            print(f"已保存: {out_filename}")
+            print(f"PROGRESS:FILE_TOKENS:{file_index}:{tokens}:{out_filename}")
+            print(f"PROGRESS:FILE_COMPLETE:{file_index}:{total_files}")
+    finally:
+        if fragments is not None:
+            fragments.close()
     
-    print(f"\n拆分完成！共生成 {file_index - 1} 个文件")
-    print(f"PROGRESS:ALL_FILES_COMPLETE:{file_index - 1}:{total_files}")
+    print(f"\n提取完成！共 {total_files} 段")
+    print(f"PROGRESS:ALL_FILES_COMPLETE:{total_files}:{total_files}")
+
+
+def extract_format_arg(argv):
+    """从命令行参数中取出 --extract=markdown|ndjson，返回 (剩余参数, 格式或None)"""
+    remaining = []
+    output_format = None
+    for arg in argv:
+        if arg.startswith(EXTRACT_FLAG):
+            output_format = arg[len(EXTRACT_FLAG):].strip().lower()
+            if output_format not in EXTRACT_FORMATS:
+                raise ValueError(f"不支持的提取格式: {output_format}（可选: {', '.join(EXTRACT_FORMATS)}）")
+        else:
+            remaining.append(arg)
+    return remaining, output_format
 
 
 def main():
     """主函数"""
-    if len(sys.argv) not in [4, 5]:
-        print("用法: python split_docx_pages_python_docx.py <输入文件> <输出目录> <每文件页数> [原始文件名]")
+    argv, profile_options = extract_profile_args(sys.argv)
+    argv, workers = extract_workers_arg(argv)
+    argv, resume = extract_resume_arg(argv)
+    streaming = True if STREAM_FLAG in argv else None
+    argv = [arg for arg in argv if arg != STREAM_FLAG]
+    try:
+        argv, page_ranges = extract_page_ranges_arg(argv)
+        argv, token_budget = extract_token_budget_arg(argv)
+        argv, output_format = extract_format_arg(argv)
+    except ValueError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+    
+    if len(argv) not in [4, 5]:
+        print("用法: python split_docx_pages_python_docx.py <输入文件> <输出目录> <每文件页数> [原始文件名] [--workers=N] [--stream] [--pages=1-3,7] [--tokens=N] [--resume] [--extract=markdown|ndjson]")
         sys.exit(1)
     
-    input_path = sys.argv[1]
-    output_dir = sys.argv[2]
-    pages_per_file = int(sys.argv[3])
-    original_filename = sys.argv[4] if len(sys.argv) == 5 else None
+    input_path = argv[1]
+    output_dir = argv[2]
+    pages_per_file = int(argv[3])
+    original_filename = argv[4] if len(argv) == 5 else None
     
     if not os.path.exists(input_path):
         print(f"错误: 输入文件不存在: {input_path}")
@@ -262,8 +602,23 @@ def main():
         print(f"错误: 每文件页数必须在 1-1000 之间")
         sys.exit(1)
     
+    if output_format is not None:
+        try:
+            with profile_session(default_job_id(argv[0], input_path), profile_options,
+                                 announce=output_format != 'ndjson'):
+                extract_markdown_by_sections(input_path, output_dir, pages_per_file, original_filename,
+                                             page_ranges, token_budget, output_format)
+        except Exception as e:
+            print(f"提取失败: {e}", file=sys.stderr)
+            import traceback
+            traceback.print_exc()
+            sys.exit(1)
+        return
+    
     try:
-        split_docx_by_sections(input_path, output_dir, pages_per_file, original_filename)
+        with profile_session(default_job_id(argv[0], input_path), profile_options, announce=True):
+            split_docx_by_sections(input_path, output_dir, pages_per_file, original_filename, workers, streaming,
+                                   page_ranges, token_budget, resume)
         print("拆分成功!")
     except Exception as e:
         print(f"拆分失败: {e}")
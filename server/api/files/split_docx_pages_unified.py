@@ -7,6 +7,10 @@ import os
 import sys
 import platform
 import io
+import inspect
+from docx_token_budget import extract_token_budget_arg
+from page_ranges import PAGE_RANGES_FLAG, extract_page_ranges_arg
+from profiling_hook import default_job_id, extract_profile_args, profile_session
 
 # 设置标准输出编码为 UTF-8，避免 Windows 下的编码问题
 if sys.platform == 'win32':
@@ -15,13 +19,43 @@ if sys.platform == 'win32':
     sys.stderr = io.TextIOWrapper(
         sys.stderr.buffer, encoding='utf-8', errors='replace')
 
+ENGINE_FLAG = '--engine='
+# auto: 按平台优先级；libreoffice / hybrid 需要 LibreOffice 服务（设置了 LIBREOFFICE_SPLIT_SERVICE 时经常驻拆分服务执行）
+ENGINES = ('auto', 'libreoffice', 'hybrid', 'python-docx')
+LIBREOFFICE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'split_docx_pages_libreoffice.py')
 
-def get_platform_handler():
-    """根据平台获取对应的处理函数（按优先级）"""
+
+def get_platform_handler(python_docx_only=False, engine='auto'):
+    """
+    根据平台获取对应的处理函数（按优先级）；按token预算拆分和提取Markdown只有 python-docx 方案支持
+
+    engine 为 libreoffice / hybrid 时优先使用 LibreOffice 方案或混合方案（LibreOffice 分页 + zip级切片），
+    LibreOffice 不可用时按原优先级回退；为 python-docx 时只用 python-docx 方案。
+    """
     system = platform.system()
+    python_docx_only = python_docx_only or engine == 'python-docx'
+
+    if engine == 'libreoffice' and not python_docx_only:
+        try:
+            from split_docx_pages_libreoffice import LIBREOFFICE_AVAILABLE, split_docx_by_pages_libreoffice
+            if LIBREOFFICE_AVAILABLE:
+                return split_docx_by_pages_libreoffice, "LibreOffice"
+            print("警告: LibreOffice UNO 不可用，尝试其他方案...")
+        except ImportError as e:
+            print(f"警告: LibreOffice 方案不可用 ({e})")
+
+    if engine == 'hybrid' and not python_docx_only:
+        try:
+            from split_docx_pages_hybrid import split_docx_hybrid
+            from split_docx_pages_libreoffice import LIBREOFFICE_AVAILABLE
+            if LIBREOFFICE_AVAILABLE:
+                return split_docx_hybrid, "LibreOffice 分页 + zip级切片 (混合)"
+            print("警告: LibreOffice UNO 不可用，混合方案无法使用，尝试其他方案...")
+        except ImportError as e:
+            print(f"警告: 混合方案不可用 ({e})")
 
     # 优先级1: Windows 平台使用 win32com（最精确）
-    if system == "Windows":
+    if system == "Windows" and not python_docx_only:
         try:
             from split_docx_pages import split_docx_by_page_range
             return split_docx_by_page_range, "Windows (win32com)"
@@ -48,17 +82,112 @@ def get_platform_handler():
     sys.exit(1)
 
 
+def submit_to_split_service(input_path, output_dir, pages_per_file, original_filename,
+                            page_ranges, resume, engine):
+    """
+    LibreOffice / 混合方案：设置了 LIBREOFFICE_SPLIT_SERVICE 时把任务交给常驻拆分服务
+    （已连接好 soffice，农场模式下分给空闲实例），原样转发其输出
+
+    Returns:
+        任务的退出码；未设置或服务不可用时返回None，由调用方在本进程中拆分
+    """
+    address = os.environ.get('LIBREOFFICE_SPLIT_SERVICE')
+    if not address:
+        return None
+    from libreoffice_split_service import submit_job
+
+    argv = [LIBREOFFICE_SCRIPT, input_path, output_dir, str(pages_per_file)]
+    if original_filename is not None:
+        argv.append(original_filename)
+    if page_ranges is not None:
+        argv.append(PAGE_RANGES_FLAG + ','.join(f'{a}-{b}' for a, b in page_ranges))
+    if resume:
+        argv.append('--resume')
+    if engine == 'hybrid':
+        argv.append('--hybrid')
+    print(f"处理方式: 常驻拆分服务 {address} ({engine})")
+    return submit_job(address, argv)
+
+
+def extract_markdown(input_path, output_dir, pages_per_file, original_filename,
+                     page_ranges, token_budget, output_format, script_path, profile_options):
+    """--extract 模式：转交 python-docx 方案的 extract_markdown_by_sections"""
+    # ndjson 模式下标准输出只能有JSON行，日志写到标准错误
+    log = sys.stderr if output_format == 'ndjson' else sys.stdout
+    try:
+        from split_docx_pages_python_docx import EXTRACT_FORMATS, extract_markdown_by_sections
+    except ImportError as e:
+        print(f"错误: 提取Markdown需要 python-docx ({e})", file=log)
+        sys.exit(1)
+    if output_format not in EXTRACT_FORMATS:
+        print(f"错误: 不支持的提取格式: {output_format}（可选: {', '.join(EXTRACT_FORMATS)}）", file=log)
+        sys.exit(1)
+
+    try:
+        with profile_session(default_job_id(script_path, input_path), profile_options,
+                             announce=output_format != 'ndjson'):
+            extract_markdown_by_sections(input_path, output_dir, pages_per_file, original_filename,
+                                         page_ranges, token_budget, output_format)
+        print("\n[OK] 提取成功!", file=log)
+    except Exception as e:
+        print(f"\n[ERROR] 提取失败: {e}", file=log)
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
 def main():
     """主函数"""
-    if len(sys.argv) not in [4, 5]:
+    argv, profile_options = extract_profile_args(sys.argv)
+
+    # --workers=N 只对 python-docx 方案生效（并行写出分块）
+    workers = None
+    for arg in list(argv):
+        if arg.startswith('--workers='):
+            argv.remove(arg)
+            workers = arg[len('--workers='):]
+
+    # --resume 沿用输出目录中的断点，只拆缺失的分块
+    resume = '--resume' in argv
+    argv = [arg for arg in argv if arg != '--resume']
+
+    # --engine=libreoffice|hybrid|python-docx 指定拆分方案（默认auto按平台优先级）；
+    # --hybrid 同 --engine=hybrid：LibreOffice 分页、zip级切片写出
+    engine = 'hybrid' if '--hybrid' in argv else 'auto'
+    argv = [arg for arg in argv if arg != '--hybrid']
+    for arg in list(argv):
+        if arg.startswith(ENGINE_FLAG):
+            argv.remove(arg)
+            engine = arg[len(ENGINE_FLAG):].strip().lower()
+    if engine not in ENGINES:
+        print(f"错误: 不支持的拆分方案: {engine}（可选: {', '.join(ENGINES)}）")
+        sys.exit(1)
+
+    # --pages=1-3,7,20-25 只写出指定页段（每个范围一个文件），此时忽略每文件页数
+    try:
+        argv, page_ranges = extract_page_ranges_arg(argv)
+        # --tokens=N 按估算token数切块（供AI分析使用），此时忽略每文件页数
+        argv, token_budget = extract_token_budget_arg(argv)
+    except ValueError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+
+    # --extract=markdown|ndjson 直接提取Markdown，不生成DOCX（只有 python-docx 方案支持）
+    output_format = None
+    for arg in list(argv):
+        if arg.startswith('--extract='):
+            argv.remove(arg)
+            output_format = arg[len('--extract='):].strip().lower()
+
+    if len(argv) not in [4, 5]:
         print(
-            "用法: python split_docx_pages_unified.py <输入文件> <输出目录> <每文件页数> [原始文件名]")
+            "用法: python split_docx_pages_unified.py <输入文件> <输出目录> <每文件页数> [原始文件名] [--workers=N] [--pages=1-3,7] [--tokens=N] [--resume] [--engine=auto|libreoffice|hybrid|python-docx] [--extract=markdown|ndjson]")
         sys.exit(1)
 
-    input_path = sys.argv[1]
-    output_dir = sys.argv[2]
-    pages_per_file = int(sys.argv[3])
-    original_filename = sys.argv[4] if len(sys.argv) == 5 else None
+    input_path = argv[1]
+    output_dir = argv[2]
+    pages_per_file = int(argv[3])
+    original_filename = argv[4] if len(argv) == 5 else None
 
     # 验证参数
     if not os.path.exists(input_path):
@@ -69,24 +198,48 @@ def main():
         print(f"错误: 每文件页数必须在 1-1000 之间")
         sys.exit(1)
 
+    if output_format is not None:
+        extract_markdown(input_path, output_dir, pages_per_file, original_filename,
+                         page_ranges, token_budget, output_format, argv[0], profile_options)
+        return
+
+    # LibreOffice / 混合方案优先交给常驻拆分服务（按token预算拆分只有 python-docx 方案支持）
+    if engine in ('libreoffice', 'hybrid') and token_budget is None:
+        code = submit_to_split_service(input_path, output_dir, pages_per_file, original_filename,
+                                       page_ranges, resume, engine)
+        if code is not None:
+            sys.exit(code)
+
     # 获取平台对应的处理函数
-    handler, handler_type = get_platform_handler()
+    handler, handler_type = get_platform_handler(python_docx_only=token_budget is not None, engine=engine)
 
     print(f"\n{'='*60}")
     print(f"平台: {platform.system()} {platform.release()}")
     print(f"处理方式: {handler_type}")
     print(f"输入文件: {input_path}")
     print(f"输出目录: {output_dir}")
-    print(f"每文件页数: {pages_per_file}")
+    if token_budget is not None:
+        print(f"每文件token预算: {token_budget}")
+    elif page_ranges is None:
+        print(f"每文件页数: {pages_per_file}")
+    else:
+        print(f"页码范围: {', '.join(f'{a}-{b}' if a != b else str(a) for a, b in page_ranges)}")
     print(f"{'='*60}\n")
 
     # 执行拆分
     try:
-        # 传递原始文件名参数（如果有的话）
-        if original_filename:
-            handler(input_path, output_dir, pages_per_file, original_filename)
-        else:
-            handler(input_path, output_dir, pages_per_file)
+        with profile_session(default_job_id(argv[0], input_path), profile_options, announce=True):
+            # 传递原始文件名参数（如果有的话）
+            kwargs = {}
+            if workers is not None and 'workers' in inspect.signature(handler).parameters:
+                kwargs['workers'] = workers
+            if page_ranges is not None:
+                kwargs['page_ranges'] = page_ranges
+            if token_budget is not None:
+                kwargs['token_budget'] = token_budget
+            if resume:
+                kwargs['resume'] = True
+            handler(input_path, output_dir, pages_per_file, original_filename, **kwargs)
         print("\n[OK] 拆分成功!")
     except Exception as e:
         print(f"\n[ERROR] 拆分失败: {e}")
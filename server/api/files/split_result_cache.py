@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+拆分结果缓存（按输入内容和拆分参数寻址）
+
+三个拆分实现每次都先清空输出目录、完整重跑一遍，即使几分钟前刚用同样的
+参数拆过同一个文件。@cached_split_result 装饰拆分函数：
+
+    - 键为 (输入文件SHA-256, 引擎, 分块规则, 输出文件名前缀)；分块规则为
+      每文件页数、页码范围列表或token预算之一
+    - 命中时把缓存的输出文件以硬链接放进输出目录（跨文件系统时退回复制），
+      并按原顺序重放当时输出的 PROGRESS 行，完全跳过拆分引擎
+    - 未命中时照常拆分，同时记录标准输出中的 PROGRESS 行；全部分块成功
+      （没有 PROGRESS:FILE_ERROR）后把输出文件硬链接进缓存
+    - 拆分函数调用 skip_result_cache(原因) 时本次结果不写入缓存
+      （如混合引擎回退到估算页码，结果与引擎名不符）
+    - 输入文件只在这里哈希一次，以 content_hash 参数传给拆分函数，
+      断点和页码缓存直接使用，不再各自读一遍输入文件
+
+每个条目一个目录：
+    <缓存目录>/<sha256>.<引擎>.<参数摘要>/manifest.json   参数、文件列表和PROGRESS行
+    <缓存目录>/<sha256>.<引擎>.<参数摘要>/files/           输出文件（与输出目录中的为同一inode）
+
+输出文件之后只会被打包下载或整目录删除，不会原地修改，所以可以和缓存共用inode。
+
+缓存目录默认为上传目录下的 .splitcache，可通过环境变量调整：
+    SPLIT_RESULT_CACHE=0               关闭缓存
+    SPLIT_RESULT_CACHE_DIR=<目录>       缓存目录
+    SPLIT_RESULT_CACHE_MAX_MB=2048      缓存总大小上限，超出时按最近使用时间淘汰
+
+命中时刷新 manifest.json 的mtime，fileCleanup.ts 按24小时规则清理长期未使用的条目。
+"""
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import inspect
+import logging
+import functools
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from excel_sidecar import compute_content_hash
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_ENV = 'SPLIT_RESULT_CACHE'
+RESULT_CACHE_DIR_ENV = 'SPLIT_RESULT_CACHE_DIR'
+RESULT_CACHE_MAX_MB_ENV = 'SPLIT_RESULT_CACHE_MAX_MB'
+
+CACHE_DIRNAME = '.splitcache'
+MANIFEST_NAME = 'manifest.json'
+FILES_DIRNAME = 'files'
+RESULT_CACHE_VERSION = 1
+DEFAULT_MAX_MB = 2048
+
+PROGRESS_PREFIX = 'PROGRESS:'
+FILE_ERROR_PREFIX = 'PROGRESS:FILE_ERROR:'
+
+
+# 当前拆分不写入缓存的原因（由 skip_result_cache 设置，每次拆分开始时清空）
+_skip_reason: Optional[str] = None
+
+
+def skip_result_cache(reason: str) -> None:
+    """本次拆分的结果不写入拆分结果缓存（在被 @cached_split_result 装饰的函数中调用）"""
+    global _skip_reason
+    _skip_reason = reason
+
+
+def result_cache_enabled() -> bool:
+    return os.environ.get(RESULT_CACHE_ENV, '1').strip().lower() not in ('0', 'false', 'no')
+
+
+def _max_bytes() -> int:
+    try:
+        return int(float(os.environ.get(RESULT_CACHE_MAX_MB_ENV, DEFAULT_MAX_MB)) * 1024 * 1024)
+    except ValueError:
+        return DEFAULT_MAX_MB * 1024 * 1024
+
+
+def chunking_spec(pages_per_file: int, page_ranges=None, token_budget: int = None) -> str:
+    """分块规则的规范写法：tokens=N / pages=1-3,7 / per=30"""
+    if token_budget:
+        return f'tokens={token_budget}'
+    if page_ranges is not None:
+        return 'pages=' + ','.join(f'{a}-{b}' if a != b else str(a) for a, b in page_ranges)
+    return f'per={pages_per_file}'
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    """硬链接，跨文件系统或不支持时复制"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class _ProgressRecorder:
+    """包装标准输出：原样写出，同时收集完整的 PROGRESS 行"""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._partial = ''
+        self.lines: List[str] = []
+
+    def write(self, text):
+        self._partial += text
+        if '\n' in self._partial:
+            *complete, self._partial = self._partial.split('\n')
+            self.lines.extend(line for line in complete if line.startswith(PROGRESS_PREFIX))
+        return self._stream.write(text)
+
+    def finish(self) -> None:
+        if self._partial.startswith(PROGRESS_PREFIX):
+            self.lines.append(self._partial)
+        self._partial = ''
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class SplitResultCache:
+    """内容寻址的拆分结果缓存目录"""
+
+    def __init__(self, cache_dir: str, max_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = _max_bytes() if max_bytes is None else max_bytes
+
+    @classmethod
+    def for_input(cls, input_path: str) -> 'SplitResultCache':
+        """默认缓存目录：输入文件所在目录（即uploads）下的 .splitcache"""
+        cache_dir = os.environ.get(RESULT_CACHE_DIR_ENV) or os.path.join(
+            os.path.dirname(os.path.abspath(input_path)), CACHE_DIRNAME)
+        return cls(cache_dir)
+
+    @staticmethod
+    def make_key(content_hash: str, engine: str, spec: str, original_filename: str) -> Dict:
+        return {
+            'version': RESULT_CACHE_VERSION,
+            'content_hash': content_hash,
+            'engine': engine,
+            'spec': spec,
+            'original_filename': original_filename,
+        }
+
+    def entry_path(self, key: Dict) -> str:
+        digest = hashlib.sha256(json.dumps(key, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key['content_hash']}.{key['engine']}.{digest[:16]}")
+
+    def load(self, key: Dict) -> Optional[Dict]:
+        """读取条目的manifest，命中时刷新mtime；不存在、损坏或文件缺失时返回None"""
+        entry = self.entry_path(key)
+        manifest_path = os.path.join(entry, MANIFEST_NAME)
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"拆分结果缓存无效，将重新拆分: {entry}: {e}")
+            return None
+        if manifest.get('key') != key:
+            return None
+        files_dir = os.path.join(entry, FILES_DIRNAME)
+        if not all(os.path.isfile(os.path.join(files_dir, name)) for name in manifest.get('files', [])):
+            return None
+        try:
+            os.utime(manifest_path)
+        except OSError:
+            pass
+        return manifest
+
+    def materialize(self, key: Dict, manifest: Dict, output_dir: str) -> None:
+        """把缓存的输出文件放进（已清空的）输出目录"""
+        files_dir = os.path.join(self.entry_path(key), FILES_DIRNAME)
+        os.makedirs(output_dir, exist_ok=True)
+        for name in manifest['files']:
+            _link_or_copy(os.path.join(files_dir, name), os.path.join(output_dir, name))
+
+    def store(self, key: Dict, output_dir: str, progress: List[str]) -> bool:
+        """把输出目录中的文件硬链接进新条目（先写临时目录再改名），写入后按大小上限淘汰"""
+        entry = self.entry_path(key)
+        tmp_dir = f"{entry}.{os.getpid()}.tmp"
+        try:
+            # 以点开头的是拆分过程的辅助文件（如断点），不属于输出
+            names = sorted(name for name in os.listdir(output_dir)
+                           if not name.startswith('.') and os.path.isfile(os.path.join(output_dir, name)))
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(os.path.join(tmp_dir, FILES_DIRNAME))
+            for name in names:
+                _link_or_copy(os.path.join(output_dir, name), os.path.join(tmp_dir, FILES_DIRNAME, name))
+            with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+                json.dump({'key': key, 'files': names, 'progress': progress}, f, ensure_ascii=False)
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp_dir, entry)
+        except OSError as e:
+            logger.warning(f"写入拆分结果缓存失败 {entry}: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return False
+
+        self.evict(keep=entry)
+        return True
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """总大小超过上限时，按manifest的mtime从旧到新删除条目，返回删除的条目数"""
+        entries = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if not entry.is_dir() or entry.name.endswith('.tmp'):
+                        continue
+                    try:
+                        mtime = os.stat(os.path.join(entry.path, MANIFEST_NAME)).st_mtime
+                        size = sum(child.stat().st_size
+                                   for child in os.scandir(os.path.join(entry.path, FILES_DIRNAME)))
+                    except OSError:
+                        continue
+                    entries.append((mtime, size, entry.path))
+        except OSError:
+            return 0
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+
+def _reset_output_dir(output_dir: str) -> None:
+    if os.path.exists(output_dir):
+        try:
+            shutil.rmtree(output_dir)
+            print(f"已清理旧的输出目录: {output_dir}")
+        except Exception as e:
+            print(f"清理目录时出错: {e}")
+    os.makedirs(output_dir, exist_ok=True)
+
+
+def cached_split_result(engine: str):
+    """
+    拆分函数的结果缓存装饰器
+
+    被装饰的函数签名需为 (input_path, output_dir, pages_per_file, original_filename=None, ...,
+    content_hash=None)，可选的 page_ranges / token_budget 参数参与缓存键，其他参数
+    （如 workers）不影响输出，不参与。调用方没有传入 content_hash 时在这里计算后传入，
+    缓存关闭时也一样。
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = bound.arguments
+            input_path, output_dir = params['input_path'], params['output_dir']
+            if not params.get('content_hash'):
+                params['content_hash'] = compute_content_hash(input_path)
+            content_hash = params['content_hash']
+            if not result_cache_enabled():
+                return func(*bound.args, **bound.kwargs)
+
+            original_filename = params.get('original_filename') or Path(input_path).stem
+            spec = chunking_spec(params['pages_per_file'], params.get('page_ranges'), params.get('token_budget'))
+
+            cache = SplitResultCache.for_input(input_path)
+            key = cache.make_key(content_hash, engine, spec, original_filename)
+            manifest = cache.load(key)
+            if manifest is not None:
+                print(f"✓ 命中拆分结果缓存: {cache.entry_path(key)}")
+                _reset_output_dir(output_dir)
+                cache.materialize(key, manifest, output_dir)
+                for line in manifest['progress']:
+                    print(line)
+                sys.stdout.flush()
+                print(f"拆分完成！共 {len(manifest['files'])} 个文件（来自缓存）")
+                return None
+
+            global _skip_reason
+            _skip_reason = None
+            recorder = _ProgressRecorder(sys.stdout)
+            sys.stdout = recorder
+            try:
+                result = func(*bound.args, **bound.kwargs)
+            finally:
+                sys.stdout = recorder._stream
+                recorder.finish()
+
+            if any(line.startswith(FILE_ERROR_PREFIX) for line in recorder.lines):
+                print("有分块失败，本次结果不写入拆分结果缓存")
+            elif _skip_reason is not None:
+                print(f"{_skip_reason}，本次结果不写入拆分结果缓存")
+            elif cache.store(key, output_dir, recorder.lines):
+                print(f"已写入拆分结果缓存: {cache.entry_path(key)}")
+            return result
+
+        return wrapper
+    return decorator
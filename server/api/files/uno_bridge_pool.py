@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+UNO连接池（供常驻拆分服务使用）
+
+split_docx_pages_libreoffice.py 每次运行都要重新解析 uno:socket 连接
+（connect_to_libreoffice 最多重试3次，每次间隔3秒），拆完即断开，
+连接耗时常常有好几秒。UnoBridgePool 在常驻进程中保持到一个或多个
+headless soffice 的连接：
+
+    - 每个 soffice 地址一个连接，首次使用时建立，之后在任务之间复用
+    - 取用前做健康检查（一次轻量的远程调用），失效的连接丢弃后重连一次
+    - 当前地址不可用时依次尝试其他地址
+    - 空闲时由服务定期调用 check_all，提前重连断开的连接，不占用下一个任务的时间
+
+soffice 地址来自环境变量 LIBREOFFICE_ENDPOINTS（逗号分隔的 host:port），
+未设置时使用 LIBREOFFICE_HOST / LIBREOFFICE_PORT（默认 127.0.0.1:2002）。
+
+用法:
+    pool = UnoBridgePool.from_env()
+    with pool.acquire() as bridge:
+        split_docx_by_pages_libreoffice(..., bridge=bridge)
+"""
+
+import os
+import time
+import logging
+import contextlib
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ENDPOINTS_ENV = 'LIBREOFFICE_ENDPOINTS'
+HOST_ENV = 'LIBREOFFICE_HOST'
+PORT_ENV = 'LIBREOFFICE_PORT'
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 2002
+# 连接池内重连只尝试一次，不可用时换下一个地址
+CONNECT_TIMEOUT = 10
+
+Endpoint = Tuple[str, int]
+
+
+def parse_endpoints(spec: str) -> List[Endpoint]:
+    """
+    解析 "host:port,host:port"，只写端口时主机为 127.0.0.1
+
+    Raises:
+        ValueError: 端口不是整数
+    """
+    endpoints = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        host, sep, port = item.rpartition(':')
+        if not sep:
+            host, port = DEFAULT_HOST, item
+        try:
+            endpoint = (host or DEFAULT_HOST, int(port))
+        except ValueError:
+            raise ValueError(f"无效的LibreOffice地址: {item}")
+        if endpoint not in endpoints:
+            endpoints.append(endpoint)
+    return endpoints
+
+
+def endpoints_from_env() -> List[Endpoint]:
+    spec = os.environ.get(ENDPOINTS_ENV)
+    if spec:
+        endpoints = parse_endpoints(spec)
+        if endpoints:
+            return endpoints
+    return [(os.environ.get(HOST_ENV) or DEFAULT_HOST, int(os.environ.get(PORT_ENV) or DEFAULT_PORT))]
+
+
+class UnoBridge:
+    """
+    到一个 soffice 的UNO连接
+
+    Args:
+        host, port: soffice 的 --accept 地址
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.desktop = None
+        self.ctx = None
+        self.connected_at: Optional[float] = None
+        self.jobs = 0
+
+    @property
+    def address(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    @property
+    def connected(self) -> bool:
+        return self.desktop is not None
+
+    def connect(self) -> None:
+        """建立连接（只尝试一次）；失败时抛出异常"""
+        from split_docx_pages_libreoffice import connect_to_libreoffice
+        self.desktop, self.ctx = connect_to_libreoffice(self.host, self.port, max_retries=1,
+                                                        timeout=CONNECT_TIMEOUT)
+        self.connected_at = time.time()
+
+    def healthy(self) -> bool:
+        """连接是否可用：对 Desktop 做一次远程调用，soffice 退出或重启后会抛出 DisposedException"""
+        if not self.connected:
+            return False
+        try:
+            self.desktop.getComponents()
+            return True
+        except Exception as e:
+            logger.warning(f"LibreOffice 连接已失效 {self.address}: {e}")
+            return False
+
+    def reset(self) -> None:
+        """丢弃连接（pyuno 在引用释放后关闭桥接）"""
+        self.desktop = None
+        self.ctx = None
+        self.connected_at = None
+
+    def ensure(self) -> bool:
+        """保证连接可用：已连接且健康时直接返回，否则重连一次"""
+        if self.healthy():
+            return True
+        self.reset()
+        try:
+            self.connect()
+            return True
+        except Exception as e:
+            logger.warning(f"连接 LibreOffice 失败 {self.address}: {e}")
+            return False
+
+    def status(self) -> dict:
+        return {
+            'address': self.address,
+            'connected': self.connected,
+            'connected_at': self.connected_at,
+            'jobs': self.jobs,
+        }
+
+
+class UnoBridgePool:
+    """到多个 soffice 的连接池，按地址轮流取用"""
+
+    def __init__(self, endpoints: List[Endpoint]):
+        if not endpoints:
+            raise ValueError("LibreOffice 地址为空")
+        self.bridges = [UnoBridge(host, port) for host, port in endpoints]
+        self._next = 0
+
+    @classmethod
+    def from_env(cls) -> 'UnoBridgePool':
+        return cls(endpoints_from_env())
+
+    @contextlib.contextmanager
+    def acquire(self):
+        """
+        取一个可用的连接，从上次之后的地址开始依次尝试
+
+        Raises:
+            ConnectionError: 所有地址都不可用
+        """
+        count = len(self.bridges)
+        for offset in range(count):
+            bridge = self.bridges[(self._next + offset) % count]
+            if bridge.ensure():
+                self._next = (self._next + offset + 1) % count
+                bridge.jobs += 1
+                yield bridge
+                return
+        addresses = ', '.join(bridge.address for bridge in self.bridges)
+        raise ConnectionError(f"无法连接到 LibreOffice 服务（{addresses}），"
+                              f"请检查服务状态: pnpm libreoffice:status")
+
+    def check_all(self) -> int:
+        """检查并重连所有连接，返回可用的连接数"""
+        return sum(1 for bridge in self.bridges if bridge.ensure())
+
+    def status(self) -> List[dict]:
+        return [bridge.status() for bridge in self.bridges]
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+UNO调用的截止时间和卡死 soffice 的回收
+
+connect_to_libreoffice 只有建立连接受 SIGALRM 保护。loadComponentFromURL、
+逐页遍历（jumpToNextPage / getPage）、getTransferable / insertTransferable、
+storeToURL 遇到损坏的文档或排版死循环时会一直阻塞，Node 端的拆分请求
+（split-docx-stream.get.ts）和常驻拆分服务的工作进程也跟着一直挂起。
+SIGALRM 帮不上忙：阻塞在 pyuno 的远程调用中时，Python 的信号处理函数要等调用返回才会执行。
+
+UnoWatchdog 用一个后台线程给每次UNO调用计时：
+
+    with UnoWatchdog.for_bridge(bridge) as watchdog:
+        with watchdog.deadline('storeToURL', watchdog.load_timeout):
+            new_doc.storeToURL(url, props)
+
+超过截止时间时，看门狗结束本机上监听该端口的 soffice（pkill -9），
+阻塞的调用随即因连接断开而抛出异常，deadline 把它换成 UnoDeadlineExceeded。
+soffice 由其管理者重新启动（pm2 的 libreoffice-headless 应用，或拆分服务农场的转发线程），
+拆分引擎用 wait_for_restart 重新连接、重新打开源文档后只重试受影响的分块，
+已完成的分块留在断点（split_checkpoint）中。
+
+环境变量（秒）：
+    LIBREOFFICE_CALL_TIMEOUT=60       单次UNO调用（翻页、选择、插入内容、关闭文档等）
+    LIBREOFFICE_LOAD_TIMEOUT=180      打开源文档、保存分块
+    LIBREOFFICE_RESTART_TIMEOUT=90    回收后等待 soffice 重新可连接
+
+只能回收本机的 soffice；远程地址或 Windows（无 pkill）上只报告超时，阻塞的调用无法中断。
+"""
+
+import os
+import time
+import logging
+import platform
+import threading
+import subprocess
+import contextlib
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CALL_TIMEOUT_ENV = 'LIBREOFFICE_CALL_TIMEOUT'
+LOAD_TIMEOUT_ENV = 'LIBREOFFICE_LOAD_TIMEOUT'
+RESTART_TIMEOUT_ENV = 'LIBREOFFICE_RESTART_TIMEOUT'
+
+DEFAULT_CALL_TIMEOUT = 60
+DEFAULT_LOAD_TIMEOUT = 180
+DEFAULT_RESTART_TIMEOUT = 90
+
+# 与 connect_to_libreoffice 的默认地址一致
+DEFAULT_HOST = 'localhost'
+DEFAULT_PORT = 2002
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+# 回收后每次尝试重新连接的间隔
+RECONNECT_INTERVAL = 1
+
+# 一个分块最多尝试的次数（首次 + 回收 soffice 后重试一次）
+CHUNK_ATTEMPTS = 2
+
+
+def _env_seconds(name: str, default: float) -> float:
+    try:
+        value = float(os.environ.get(name, default))
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+class UnoDeadlineExceeded(TimeoutError):
+    """UNO调用超过截止时间（此时看门狗已尝试结束 soffice）"""
+
+    def __init__(self, operation: str, seconds: float, recycled: bool):
+        self.operation = operation
+        self.seconds = seconds
+        self.recycled = recycled
+        action = "已结束卡死的 soffice" if recycled else "无法结束 soffice"
+        super().__init__(f"{operation} 超过 {seconds:g} 秒未返回，{action}")
+
+
+def kill_soffice(host: str, port: int) -> bool:
+    """结束本机上以 --accept=...port=<port>; 启动的 soffice，返回是否找到进程"""
+    if host not in LOCAL_HOSTS or platform.system() == 'Windows':
+        return False
+    try:
+        # 卡死的 soffice 不一定处理 SIGTERM，直接 SIGKILL
+        result = subprocess.run(['pkill', '-9', '-f', f'soffice.*--accept=socket,.*port={port};'],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"结束 soffice 失败 {host}:{port}: {e}")
+        return False
+    return result.returncode == 0
+
+
+class UnoWatchdog:
+    """
+    一个 soffice 连接上的UNO调用计时器
+
+    Args:
+        host, port: soffice 的 --accept 地址（超时时按端口结束该 soffice）
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        self.host = host
+        self.port = port
+        self.call_timeout = _env_seconds(CALL_TIMEOUT_ENV, DEFAULT_CALL_TIMEOUT)
+        self.load_timeout = _env_seconds(LOAD_TIMEOUT_ENV, DEFAULT_LOAD_TIMEOUT)
+        self.restart_timeout = _env_seconds(RESTART_TIMEOUT_ENV, DEFAULT_RESTART_TIMEOUT)
+        self.recycles = 0
+        # 计时中的调用：令牌 → (截止时刻, 操作名)；超时的令牌 → 是否结束了 soffice
+        self._armed: Dict[object, Tuple[float, str]] = {}
+        self._expired: Dict[object, bool] = {}
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    @classmethod
+    def for_bridge(cls, bridge=None) -> 'UnoWatchdog':
+        """拆分服务连接池的连接用其地址，否则用 connect_to_libreoffice 的默认地址"""
+        if bridge is None:
+            return cls()
+        return cls(bridge.host, bridge.port)
+
+    def __enter__(self) -> 'UnoWatchdog':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='uno-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @contextlib.contextmanager
+    def deadline(self, operation: str, seconds: Optional[float] = None):
+        """
+        为块中的UNO调用计时（默认 call_timeout 秒）
+
+        Raises:
+            UnoDeadlineExceeded: 超过截止时间（块中抛出的异常作为其 __cause__）
+        """
+        seconds = self.call_timeout if seconds is None else seconds
+        token = object()
+        with self._condition:
+            self._armed[token] = (time.monotonic() + seconds, operation)
+            self._condition.notify()
+        try:
+            yield
+        except Exception as e:
+            recycled = self._disarm(token)
+            if recycled is not None:
+                raise UnoDeadlineExceeded(operation, seconds, recycled) from e
+            raise
+        recycled = self._disarm(token)
+        if recycled is not None:
+            # 调用恰好在 soffice 被结束前返回：连接已不可用，同样按超时处理
+            raise UnoDeadlineExceeded(operation, seconds, recycled)
+
+    def _disarm(self, token) -> Optional[bool]:
+        """停止计时；已超时时返回是否结束了 soffice，否则返回None"""
+        with self._condition:
+            self._armed.pop(token, None)
+            return self._expired.pop(token, None)
+
+    def _run(self) -> None:
+        with self._condition:
+            while not self._stopping:
+                now = time.monotonic()
+                expired = [(token, operation) for token, (deadline, operation) in self._armed.items()
+                           if deadline <= now]
+                for token, operation in expired:
+                    self._armed.pop(token)
+                    self._expired[token] = self._recycle(operation)
+                wait = min((deadline for deadline, _ in self._armed.values()), default=None)
+                self._condition.wait(None if wait is None else max(wait - now, 0))
+
+    def _recycle(self, operation: str) -> bool:
+        recycled = kill_soffice(self.host, self.port)
+        if recycled:
+            self.recycles += 1
+            logger.warning(f"{operation} 超时，已结束 soffice {self.host}:{self.port}")
+        else:
+            logger.warning(f"{operation} 超时，未能结束 soffice {self.host}:{self.port}")
+        return recycled
+
+    def wait_for_restart(self, bridge=None):
+        """
+        等待被回收的 soffice 重新启动并重新连接
+
+        Returns:
+            新连接的 Desktop（bridge 不为None时同时更新 bridge）
+
+        Raises:
+            ConnectionError: restart_timeout 秒内没有重新连上
+        """
+        from split_docx_pages_libreoffice import connect_to_libreoffice
+
+        print(f"等待 soffice {self.host}:{self.port} 重新启动...")
+        if bridge is not None:
+            bridge.reset()
+        deadline = time.monotonic() + self.restart_timeout
+        while time.monotonic() < deadline:
+            time.sleep(RECONNECT_INTERVAL)
+            if bridge is not None:
+                if bridge.ensure():
+                    return bridge.desktop
+                continue
+            try:
+                desktop, _ = connect_to_libreoffice(self.host, self.port, max_retries=1)
+                return desktop
+            except Exception:
+                continue
+        raise ConnectionError(f"soffice {self.host}:{self.port} 在 {self.restart_timeout:.0f} 秒内没有重新启动")
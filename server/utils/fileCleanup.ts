@@ -1,4 +1,5 @@
-import { promises as fs } from 'fs'
+import { createReadStream, promises as fs } from 'fs'
+import { createHash } from 'crypto'
 import { join } from 'path'
 import { createLogger } from './logger'
 
@@ -6,6 +7,98 @@ const logger = createLogger('file-cleanup')
 
 const UPLOAD_DIR = join(process.cwd(), 'uploads')
 const CLEANUP_INTERVAL_MS = 24 * 60 * 60 * 1000 // 24 hours in milliseconds
+// Files stored next to an upload under the same basename; they expire with it.
+// `.sheetcache` is the columnar sidecar written by the Excel modify scripts.
+const COMPANION_SUFFIXES = ['.meta.json', '.sheetcache']
+// Content-addressed caches of the DOCX split scripts, keyed by the upload's
+// SHA-256. Entries are touched on every hit, so mtime is the last-used time.
+// - `.pagemapcache/<sha256>.<engine>.json`: page boundaries (page_map_cache.py)
+// - `.fragmentcache/<sha256>/`: per-page body fragments, last use recorded on
+//   `manifest.json` (docx_page_fragments.py)
+// - `.splitcache/<sha256>.<engine>.<params>/`: finished split outputs,
+//   hardlinked into the output directory on a hit (split_result_cache.py)
+const PAGE_MAP_CACHE_DIR = join(UPLOAD_DIR, '.pagemapcache')
+const FRAGMENT_CACHE_DIR = join(UPLOAD_DIR, '.fragmentcache')
+const SPLIT_RESULT_CACHE_DIR = join(UPLOAD_DIR, '.splitcache')
+export const CONTENT_CACHE_DIRS = ['.pagemapcache', '.fragmentcache', '.splitcache']
+
+async function hashFile(filePath: string): Promise<string> {
+  const hash = createHash('sha256')
+  for await (const chunk of createReadStream(filePath)) {
+    hash.update(chunk)
+  }
+  return hash.digest('hex')
+}
+
+/**
+ * Delete content-cache entries that have not been used since the cutoff
+ */
+async function cleanupContentCaches(cutoffTime: Date): Promise<number> {
+  let deletedCount = 0
+
+  for (const cacheDir of [PAGE_MAP_CACHE_DIR, FRAGMENT_CACHE_DIR, SPLIT_RESULT_CACHE_DIR]) {
+    let entries: string[]
+    try {
+      entries = await fs.readdir(cacheDir)
+    } catch {
+      continue
+    }
+
+    for (const entry of entries) {
+      const entryPath = join(cacheDir, entry)
+      try {
+        let stats = await fs.stat(entryPath)
+        if (stats.isDirectory()) {
+          // Unfinished `.tmp` directories have no manifest; use their own mtime
+          try {
+            stats = await fs.stat(join(entryPath, 'manifest.json'))
+          } catch {
+            // Fall back to the directory mtime
+          }
+        }
+        if (stats.mtime < cutoffTime) {
+          await fs.rm(entryPath, { recursive: true, force: true })
+          deletedCount++
+        }
+      } catch {
+        // Entry removed concurrently (e.g. LRU eviction), ignore
+      }
+    }
+  }
+  return deletedCount
+}
+
+/**
+ * Delete the content-cache entries (page maps of all engines, page fragments
+ * and split results) for an upload. Must be called before the upload itself
+ * is removed.
+ */
+export async function removeContentCacheEntries(filePath: string): Promise<void> {
+  let contentHash: string
+  try {
+    contentHash = await hashFile(filePath)
+  } catch {
+    return
+  }
+
+  await fs.rm(join(FRAGMENT_CACHE_DIR, contentHash), { recursive: true, force: true })
+
+  for (const cacheDir of [PAGE_MAP_CACHE_DIR, SPLIT_RESULT_CACHE_DIR]) {
+    let entries: string[]
+    try {
+      entries = await fs.readdir(cacheDir)
+    } catch {
+      continue
+    }
+
+    for (const entry of entries) {
+      if (entry.startsWith(contentHash + '.')) {
+        // Split results are directories, page map entries are files
+        await fs.rm(join(cacheDir, entry), { recursive: true, force: true })
+      }
+    }
+  }
+}
 
 /**
  * Clean up files older than 24 hours from the uploads directory
@@ -46,17 +139,21 @@ export async function cleanupOldFiles(): Promise<void> {
           deletedCount++
           logger.info(`Deleted old file: ${filename}`)
 
-          // Also delete corresponding metadata file if it exists
-          if (!filename.endsWith('.meta.json')) {
-            const metaFilename = filename.replace(/\.[^.]+$/, '') + '.meta.json'
-            const metaFilePath = join(UPLOAD_DIR, metaFilename)
-
-            try {
-              await fs.access(metaFilePath)
-              await fs.unlink(metaFilePath)
-              logger.info(`Deleted metadata file: ${metaFilename}`)
-            } catch {
-              // Metadata file doesn't exist, ignore
+          // Also delete companion files (metadata, sidecar cache) if they exist
+          if (!COMPANION_SUFFIXES.some(suffix => filename.endsWith(suffix))) {
+            const baseName = filename.replace(/\.[^.]+$/, '')
+
+            for (const suffix of COMPANION_SUFFIXES) {
+              const companionFilename = baseName + suffix
+              const companionFilePath = join(UPLOAD_DIR, companionFilename)
+
+              try {
+                await fs.access(companionFilePath)
+                await fs.unlink(companionFilePath)
+                logger.info(`Deleted companion file: ${companionFilename}`)
+              } catch {
+                // Companion file doesn't exist, ignore
+              }
             }
           }
         }
@@ -66,6 +163,11 @@ export async function cleanupOldFiles(): Promise<void> {
       }
     }
 
+    const deletedCacheEntries = await cleanupContentCaches(cutoffTime)
+    if (deletedCacheEntries > 0) {
+      logger.info(`Deleted ${deletedCacheEntries} unused split cache entries`)
+    }
+
     logger.info(
       `Cleanup completed. Deleted ${deletedCount} files. Errors: ${errorCount}`
     )
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Python 脚本的测试
+
+拆分和 Excel 修改脚本都在 server/api/files 下以平铺模块互相导入，
+这里把该目录加入 sys.path；测试用的文档和工作簿都在临时目录中现场生成。
+"""
+
+import os
+import struct
+import sys
+import zlib
+
+import pytest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server', 'api', 'files')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+
+def _png_bytes() -> bytes:
+    """1x1 像素的 PNG"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    header = struct.pack('>IIBBBBB', 1, 1, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(b'\x00\xff\x00\x00')) + chunk(b'IEND', b''))
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path, monkeypatch):
+    """页码缓存、片段缓存和拆分结果缓存都不落到共享目录"""
+    monkeypatch.setenv('PAGE_MAP_CACHE_DIR', str(tmp_path / 'page-map-cache'))
+    monkeypatch.setenv('SPLIT_RESULT_CACHE', '0')
+    monkeypatch.setenv('SPLIT_FRAGMENT_CACHE', '0')
+
+
+@pytest.fixture
+def sample_docx(tmp_path):
+    """
+    6 个段落（第 3 段前强制分页、第 5 段带图片）加一个表格的文档
+
+    Returns:
+        文档路径
+    """
+    from docx import Document
+
+    image_path = tmp_path / 'pixel.png'
+    image_path.write_bytes(_png_bytes())
+
+    document = Document()
+    for index in range(1, 7):
+        paragraph = document.add_paragraph(f'第{index}段')
+        if index == 3:
+            paragraph.paragraph_format.page_break_before = True
+        if index == 5:
+            paragraph.add_run().add_picture(str(image_path))
+    table = document.add_table(rows=2, cols=2)
+    table.cell(0, 0).text = '表格'
+    path = tmp_path / 'sample.docx'
+    document.save(str(path))
+    return str(path)
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+import io
+import zipfile
+
+import pytest
+from docx import Document
+from lxml import etree
+
+import docx_chunk_writer
+from docx_chunk_writer import DocxChunkWriter
+
+
+# 每个分块重新生成的部件，其余部件原样拷贝
+GENERATED_PARTS = ('[Content_Types].xml', 'word/document.xml', 'word/_rels/document.xml.rels')
+
+
+class _Unseekable(io.RawIOBase):
+    """不可seek的输出，zipfile写入时改用数据描述符"""
+
+    def __init__(self, target):
+        self.target = target
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.target.write(data)
+
+
+def _with_custom_xml_rels(rels_xml, names):
+    """文档关系中加入指向附加条目的customXml关系（结构关系，写出分块时始终保留）"""
+    root = etree.fromstring(rels_xml)
+    for index, name in enumerate(names, start=1):
+        etree.SubElement(root, f'{{{root.nsmap[None]}}}Relationship', Id=f'rIdCustom{index}',
+                         Type='http://schemas.openxmlformats.org/officeDocument/2006/relationships/customXml',
+                         Target=f'../{name}')
+    return etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+
+
+def _texts(path):
+    return [paragraph.text for paragraph in Document(path).paragraphs]
+
+
+def _assert_valid(path):
+    with zipfile.ZipFile(path) as archive:
+        assert archive.testzip() is None
+        names = archive.namelist()
+        assert names[0] == '[Content_Types].xml'
+        for name in names:
+            if name.endswith('.xml') or name.endswith('.rels'):
+                etree.fromstring(archive.read(name))
+
+
+@pytest.fixture
+def mixed_entry_docx(sample_docx, tmp_path):
+    """
+    把 sample_docx 重新打包：正文部件用数据描述符写出（不可seek的输出），
+    另附不压缩、带ZIP64扩展字段和非ASCII文件名的条目
+
+    Returns:
+        (文档路径, {条目名: 内容})
+    """
+    buffer = io.BytesIO()
+    extras = {
+        'customXml/stored.xml': (b'<stored/>', zipfile.ZIP_STORED, False),
+        'customXml/zip64.xml': (b'<zip64>' + b'x' * 4096 + b'</zip64>', zipfile.ZIP_DEFLATED, True),
+        'customXml/数据.xml': ('<名称>数据</名称>'.encode('utf-8'), zipfile.ZIP_DEFLATED, False),
+    }
+    with zipfile.ZipFile(sample_docx) as source, \
+            zipfile.ZipFile(_Unseekable(buffer), 'w', zipfile.ZIP_DEFLATED) as target:
+        for info in source.infolist():
+            data = source.read(info)
+            if info.filename == 'word/_rels/document.xml.rels':
+                data = _with_custom_xml_rels(data, extras)
+            target.writestr(info.filename, data)
+    with zipfile.ZipFile(buffer, 'a') as target:
+        for name, (data, method, force_zip64) in extras.items():
+            info = zipfile.ZipInfo(name, date_time=(2024, 1, 5, 12, 30, 0))
+            info.compress_type = method
+            with target.open(info, 'w', force_zip64=force_zip64) as f:
+                f.write(data)
+
+    path = tmp_path / 'mixed.docx'
+    path.write_bytes(buffer.getvalue())
+    with zipfile.ZipFile(path) as archive:
+        assert archive.getinfo('word/document.xml').flag_bits & 0x08
+        contents = {info.filename: archive.read(info) for info in archive.infolist()}
+    return str(path), contents
+
+
+def test_chunks_are_valid_docx(sample_docx, tmp_path):
+    first, second = str(tmp_path / 'first.docx'), str(tmp_path / 'second.docx')
+    with DocxChunkWriter(sample_docx) as writer:
+        blocks = writer.body_blocks()
+        writer.write_chunk(first, blocks[:2])
+        writer.write_chunk(second, blocks[2:])
+
+    for path in (first, second):
+        _assert_valid(path)
+    assert _texts(first) == ['第1段', '第2段']
+    assert _texts(second)[:4] == ['第3段', '第4段', '第5段', '第6段']
+    assert len(Document(second).tables) == 1
+
+
+def test_copies_every_entry_type(mixed_entry_docx, tmp_path):
+    source, contents = mixed_entry_docx
+    out = str(tmp_path / 'chunk.docx')
+    with DocxChunkWriter(source) as writer:
+        writer.write_document(out, writer.build_document_xml(writer.body_blocks()), None)
+
+    _assert_valid(out)
+    with zipfile.ZipFile(out) as archive:
+        for info in archive.infolist():
+            assert not info.flag_bits & 0x08
+            if info.filename not in GENERATED_PARTS:
+                assert archive.read(info) == contents[info.filename]
+        assert archive.getinfo('customXml/stored.xml').compress_type == zipfile.ZIP_STORED
+        assert archive.getinfo('customXml/数据.xml').flag_bits & 0x800
+        assert archive.getinfo('customXml/zip64.xml').date_time == (2024, 1, 5, 12, 30, 0)
+    assert _texts(out)[:2] == ['第1段', '第2段']
+
+
+def test_writes_zip64_records(mixed_entry_docx, tmp_path, monkeypatch):
+    # 把ZIP64阈值降到很小，大小、偏移和中央目录都走ZIP64记录
+    monkeypatch.setattr(docx_chunk_writer, '_ZIP64_LIMIT', 64)
+    source, contents = mixed_entry_docx
+    out = str(tmp_path / 'chunk64.docx')
+    with DocxChunkWriter(source) as writer:
+        writer.write_chunk(out, writer.body_blocks())
+
+    _assert_valid(out)
+    with zipfile.ZipFile(out) as archive:
+        assert archive.read('customXml/zip64.xml') == contents['customXml/zip64.xml']
+        assert archive.getinfo('customXml/zip64.xml').header_offset > 64
+    data = open(out, 'rb').read()
+    assert b'PK\x06\x06' in data and b'PK\x06\x07' in data
+    assert _texts(out)[:6] == [f'第{index}段' for index in range(1, 7)]
+
+
+def _media(path):
+    with zipfile.ZipFile(path) as archive:
+        return [name for name in archive.namelist() if name.startswith('word/media/')]
+
+
+def test_chunk_keeps_only_referenced_media(sample_docx, tmp_path):
+    without_image, with_image = str(tmp_path / 'a.docx'), str(tmp_path / 'b.docx')
+    with DocxChunkWriter(sample_docx) as writer:
+        blocks = writer.body_blocks()
+        writer.write_chunk(without_image, blocks[:4])
+        writer.write_chunk(with_image, blocks[4:5])
+
+    assert _media(without_image) == []
+    assert len(_media(with_image)) == 1
+    with zipfile.ZipFile(without_image) as archive:
+        rels = archive.read('word/_rels/document.xml.rels').decode('utf-8')
+        content_types = archive.read('[Content_Types].xml').decode('utf-8')
+    assert '/image' not in rels
+    assert 'styles' in rels
+    assert 'Extension="png"' not in content_types
+    with zipfile.ZipFile(with_image) as archive:
+        content_types = archive.read('[Content_Types].xml').decode('utf-8')
+    assert 'image/png' in content_types
+    assert len(Document(with_image).inline_shapes) == 1
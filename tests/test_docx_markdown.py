@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""DOCX → Markdown 转换和按页提取的测试"""
+
+import json
+import os
+
+import pytest
+from docx import Document
+
+from docx_markdown import MarkdownConverter
+from split_docx_pages_python_docx import extract_markdown_by_sections, split_docx_by_sections
+
+
+@pytest.fixture
+def structured_docx(tmp_path):
+    """标题、列表、带合并单元格的表格，第二个标题前强制分页"""
+    document = Document()
+    document.add_heading('概述', level=1)
+    document.add_paragraph('正文\t内容')
+    document.add_paragraph('第一项', style='List Bullet')
+    table = document.add_table(rows=3, cols=3)
+    table.cell(0, 0).text = '序号'
+    table.cell(0, 1).text = '名称'
+    table.cell(1, 0).text = '1'
+    table.cell(1, 1).merge(table.cell(1, 2)).text = 'A|B'
+    table.cell(2, 0).merge(table.cell(1, 0))
+    table.cell(2, 1).text = '第二行'
+    heading = document.add_heading('细则', level=2)
+    heading.paragraph_format.page_break_before = True
+    document.add_paragraph('')
+    document.add_paragraph('结尾')
+    path = tmp_path / 'structured.docx'
+    document.save(str(path))
+    return str(path)
+
+
+def test_converter_output(structured_docx):
+    converter = MarkdownConverter.for_input(structured_docx)
+    body = Document(structured_docx).element.body
+    markdown = converter.blocks_to_markdown(body.iterchildren())
+
+    assert markdown.split('\n\n') == [
+        '# 概述',
+        '正文 内容',
+        '- 第一项',
+        '| 序号 | 名称 | 列3 |\n| --- | --- | --- |\n| 1 | A｜B |  |\n|  | 第二行 |  |',
+        '## 细则',
+        '结尾',
+    ]
+
+
+def test_extract_markdown_files(structured_docx, tmp_path, capsys):
+    output_dir = str(tmp_path / 'md')
+    extract_markdown_by_sections(structured_docx, output_dir, 1, 'doc')
+
+    assert sorted(os.listdir(output_dir)) == ['doc (第1页).md', 'doc (第2页).md']
+    with open(os.path.join(output_dir, 'doc (第2页).md'), encoding='utf-8') as f:
+        assert f.read() == '## 细则\n\n结尾\n'
+    out = capsys.readouterr().out
+    assert 'PROGRESS:TOTAL_FILES:2' in out
+    assert 'PROGRESS:ALL_FILES_COMPLETE:2:2' in out
+
+
+def test_extract_ndjson_keeps_stdout_clean(structured_docx, tmp_path, capsys):
+    extract_markdown_by_sections(structured_docx, str(tmp_path / 'unused'), 1, 'doc',
+                                 page_ranges=[(2, 2), (1, 2)], output_format='ndjson')
+
+    captured = capsys.readouterr()
+    records = [json.loads(line) for line in captured.out.splitlines()]
+    assert [(r['index'], r['start_page'], r['end_page']) for r in records] == [(1, 2, 2), (2, 1, 2)]
+    assert records[0]['markdown'] == '## 细则\n\n结尾'
+    assert records[1]['markdown'].startswith('# 概述') and records[1]['markdown'].endswith('结尾')
+    assert all(r['tokens'] > 0 for r in records)
+    assert 'PROGRESS:TOTAL_FILES:2' in captured.err
+    assert not os.path.exists(str(tmp_path / 'unused'))
+
+
+def test_fragment_cache_hit_gives_the_same_markdown(structured_docx, tmp_path, monkeypatch, capsys):
+    streamed_dir = str(tmp_path / 'streamed')
+    extract_markdown_by_sections(structured_docx, streamed_dir, 1, 'doc')
+
+    # 拆分一次生成片段缓存，之后的提取只解析片段
+    monkeypatch.setenv('SPLIT_FRAGMENT_CACHE', '1')
+    monkeypatch.setenv('SPLIT_FRAGMENT_CACHE_DIR', str(tmp_path / 'fragments'))
+    split_docx_by_sections(structured_docx, str(tmp_path / 'docx'), 1, 'doc', workers=1)
+    capsys.readouterr()
+    cached_dir = str(tmp_path / 'cached')
+    extract_markdown_by_sections(structured_docx, cached_dir, 1, 'doc')
+    assert '命中页面片段缓存' in capsys.readouterr().out
+
+    for name in os.listdir(streamed_dir):
+        with open(os.path.join(streamed_dir, name), encoding='utf-8') as a, \
+                open(os.path.join(cached_dir, name), encoding='utf-8') as b:
+            assert a.read() == b.read()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""docx_page_map 三级页码来源和强制分页索引的测试"""
+
+import shutil
+import zipfile
+
+import pytest
+from docx import Document
+from docx.oxml import OxmlElement
+from lxml import etree
+
+from docx_chunk_writer import BODY_BLOCK_TAGS, BODY_TAG, W_NS
+from docx_page_map import APP_PART, build_page_break_index, build_page_map
+
+APP_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Properties xmlns="http://schemas.openxmlformats.org/officeDocument/2006/extended-properties">'
+    '<Pages>{pages}</Pages><Words>{words}</Words></Properties>'
+)
+
+
+def _replace_part(path, name: str, data: bytes):
+    """重写DOCX中的一个部件"""
+    source = f'{path}.orig'
+    shutil.move(str(path), source)
+    with zipfile.ZipFile(source) as src, zipfile.ZipFile(str(path), 'w', zipfile.ZIP_DEFLATED) as dst:
+        for info in src.infolist():
+            dst.writestr(info, data if info.filename == name else src.read(info))
+
+
+def _build(tmp_path, paragraphs: int, rendered=(), forced=(), pages=None, words=100) -> str:
+    """
+    生成测试文档
+
+    Args:
+        paragraphs: 段落数
+        rendered: 在文字前带 w:lastRenderedPageBreak 的段落序号（0-based）
+        forced: 设置段前分页的段落序号
+        pages: docProps/app.xml 的 <Pages>，None 时保留 python-docx 模板（Words=0）
+        words: docProps/app.xml 的 <Words>
+    """
+    document = Document()
+    for index in range(paragraphs):
+        paragraph = document.add_paragraph(f'第{index + 1}段')
+        if index in rendered:
+            paragraph.runs[0]._r.insert(0, OxmlElement('w:lastRenderedPageBreak'))
+        if index in forced:
+            paragraph.paragraph_format.page_break_before = True
+    path = tmp_path / 'pages.docx'
+    document.save(str(path))
+    if pages is not None:
+        _replace_part(path, APP_PART, APP_XML.format(pages=pages, words=words).encode('utf-8'))
+    return str(path)
+
+
+def test_rendered_hints_give_block_pages(tmp_path):
+    path = _build(tmp_path, 6, rendered=(2, 4), pages=3)
+    page_map = build_page_map(path)
+    assert page_map.method == 'rendered'
+    assert page_map.block_pages == [1, 1, 2, 2, 3, 3]
+    assert page_map.total_pages == 3
+    assert page_map.block_range(2, 2) == (2, 4)
+
+
+def test_rendered_hints_used_when_app_xml_is_stale(tmp_path):
+    # python-docx 模板的 app.xml（Words=0）不参与校验
+    path = _build(tmp_path, 4, rendered=(2,))
+    page_map = build_page_map(path)
+    assert page_map.method == 'rendered'
+    assert page_map.block_pages == [1, 1, 2, 2]
+
+
+def test_rendered_hints_rejected_when_far_from_app_pages(tmp_path):
+    path = _build(tmp_path, 4, rendered=(2,), forced=(1, 2, 3), pages=20)
+    page_map = build_page_map(path)
+    assert page_map.method != 'rendered'
+
+
+def test_app_pages_scales_metrics(tmp_path):
+    # 度量模型得到 3 页（全部来自段前分页），<Pages>=6 时按比例放大
+    path = _build(tmp_path, 3, forced=(1, 2), pages=6)
+    page_map = build_page_map(path)
+    assert page_map.method == 'app_pages'
+    assert page_map.total_pages == 6
+    assert page_map.block_pages == [1, 3, 5]
+
+
+@pytest.mark.parametrize('pages, words', [
+    (2, 100),   # 少于强制分页得到的页数
+    (50, 100),  # 与度量结果相差超过一倍
+    (6, 0),     # 有文字而 Words=0，视为过期
+])
+def test_untrusted_app_pages_fall_back_to_metrics(tmp_path, pages, words):
+    path = _build(tmp_path, 3, forced=(1, 2), pages=pages, words=words)
+    page_map = build_page_map(path)
+    assert page_map.method == 'metrics'
+    assert page_map.block_pages == [1, 2, 3]
+    assert page_map.total_pages == 3
+
+
+def test_document_element_is_reused(tmp_path):
+    path = _build(tmp_path, 4, rendered=(2,))
+    with zipfile.ZipFile(path) as archive:
+        root = etree.fromstring(archive.read('word/document.xml'))
+    assert build_page_map(path, document_element=root) == build_page_map(path)
+
+
+BODY_XML = f"""
+<w:document xmlns:w="{W_NS}"><w:body>
+  <w:p><w:r><w:t>0 普通段落</w:t></w:r></w:p>
+  <w:p><w:pPr><w:pageBreakBefore/></w:pPr><w:r><w:t>1 段前分页</w:t></w:r></w:p>
+  <w:p><w:pPr><w:pageBreakBefore w:val="0"/></w:pPr><w:r><w:t>2 直接关闭</w:t></w:r></w:p>
+  <w:p><w:r><w:t>3 手动分页</w:t></w:r><w:r><w:br w:type="page"/></w:r></w:p>
+  <w:p><w:r><w:br/><w:t>4 普通换行</w:t></w:r></w:p>
+  <w:tbl><w:tr><w:tc><w:p><w:r><w:br w:type="page"/></w:r></w:p></w:tc></w:tr></w:tbl>
+  <w:p><w:pPr><w:sectPr><w:type w:val="continuous"/></w:sectPr></w:pPr></w:p>
+  <w:p><w:pPr><w:sectPr><w:type w:val="nextPage"/></w:sectPr></w:pPr></w:p>
+  <w:sdt><w:sdtContent><w:p><w:pPr><w:sectPr/></w:pPr></w:p></w:sdtContent></w:sdt>
+  <w:p><w:pPr><w:pStyle w:val="Chapter"/></w:pPr><w:r><w:t>9 样式段前分页</w:t></w:r></w:p>
+  <w:p><w:pPr><w:pStyle w:val="SubChapter"/></w:pPr><w:r><w:t>10 继承样式</w:t></w:r></w:p>
+  <w:p><w:pPr><w:pStyle w:val="Chapter"/><w:pageBreakBefore w:val="false"/></w:pPr></w:p>
+  <w:p><w:pPr><w:pStyle w:val="Plain"/></w:pPr><w:r><w:t>12 样式已关闭</w:t></w:r></w:p>
+  <w:sectPr/>
+</w:body></w:document>
+"""
+
+STYLES_XML = f"""
+<w:styles xmlns:w="{W_NS}">
+  <w:style w:type="paragraph" w:styleId="Chapter"><w:pPr><w:pageBreakBefore/></w:pPr></w:style>
+  <w:style w:type="paragraph" w:styleId="SubChapter"><w:basedOn w:val="Chapter"/></w:style>
+  <w:style w:type="paragraph" w:styleId="Plain">
+    <w:basedOn w:val="Chapter"/><w:pPr><w:pageBreakBefore w:val="0"/></w:pPr>
+  </w:style>
+  <w:style w:type="character" w:styleId="Chapter"><w:pPr><w:pageBreakBefore/></w:pPr></w:style>
+</w:styles>
+"""
+
+
+def _body_blocks():
+    body = etree.fromstring(BODY_XML.encode('utf-8')).find(BODY_TAG)
+    return body, [child for child in body if child.tag in BODY_BLOCK_TAGS]
+
+
+def test_page_break_index_finds_every_forced_break():
+    body, blocks = _body_blocks()
+    index = build_page_break_index(body, blocks, etree.fromstring(STYLES_XML.encode('utf-8')))
+    assert index.before == [1, 9, 10]
+    assert index.after == [3, 5, 7, 8]
+    assert index.breaks_before(9) and not index.breaks_before(11)
+    assert index.breaks_after(5) and not index.breaks_after(6)
+
+
+def test_page_break_index_without_styles_ignores_style_breaks():
+    body, blocks = _body_blocks()
+    index = build_page_break_index(body, blocks)
+    assert index.before == [1]
+    assert index.after == [3, 5, 7, 8]
+
+
+def test_page_break_index_empty_body():
+    index = build_page_break_index(None, [])
+    assert index.before == [] and index.after == []
+    assert not index.breaks_before(0)
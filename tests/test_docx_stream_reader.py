@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""StreamingBodyReader 流式读取和流式拆分的测试"""
+
+import copy
+import os
+import shutil
+import zipfile
+
+import pytest
+from docx import Document
+
+from docx_chunk_writer import DOCUMENT_PART, SECT_PR_TAG, W_NS, DocxChunkWriter
+from docx_page_map import build_page_map, build_page_map_streaming
+from docx_stream_reader import StreamingBodyReader
+from split_docx_pages_python_docx import split_docx_by_sections, use_streaming
+
+# body外的 w:background、body中的非块元素、段落内和表格内的分节符、最后一节的节设置
+DOCUMENT_XML = f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<w:document xmlns:w="{W_NS}">
+  <w:background w:color="FFFFFF"/>
+  <w:body>
+    <w:p><w:r><w:t>第一节</w:t></w:r></w:p>
+    <w:bookmarkStart w:id="0" w:name="mark"/>
+    <w:p><w:pPr><w:sectPr><w:pgSz w:w="11111" w:h="22222"/></w:sectPr></w:pPr><w:r><w:t>节尾</w:t></w:r></w:p>
+    <w:tbl><w:tr><w:tc><w:p><w:pPr><w:sectPr/></w:pPr><w:r><w:t>单元格</w:t></w:r></w:p></w:tc></w:tr></w:tbl>
+    <w:bookmarkEnd w:id="0"/>
+    <w:sdt><w:sdtContent><w:p><w:r><w:t>内容控件</w:t></w:r></w:p></w:sdtContent></w:sdt>
+    <w:sectPr><w:pgSz w:w="12240" w:h="15840"/></w:sectPr>
+  </w:body>
+</w:document>
+"""
+
+
+@pytest.fixture
+def sectioned_docx(sample_docx, tmp_path):
+    """用 DOCUMENT_XML 替换正文的文档"""
+    path = tmp_path / 'sectioned.docx'
+    with zipfile.ZipFile(sample_docx) as src, zipfile.ZipFile(str(path), 'w', zipfile.ZIP_DEFLATED) as dst:
+        for info in src.infolist():
+            data = DOCUMENT_XML.encode('utf-8') if info.filename == DOCUMENT_PART else src.read(info)
+            dst.writestr(info, data)
+    return str(path)
+
+
+def _text(element) -> str:
+    return ''.join(element.itertext())
+
+
+def test_blocks_match_in_memory_body(sample_docx):
+    reader = StreamingBodyReader(sample_docx)
+    assert reader.scan() == 7
+
+    with DocxChunkWriter(sample_docx) as writer:
+        expected = [(block.tag, _text(block)) for block in writer.body_blocks()]
+    assert [(block.tag, _text(block)) for block in reader.iter_blocks()] == expected
+
+
+def test_only_the_body_sect_pr_is_the_last_section(sectioned_docx):
+    reader = StreamingBodyReader(sectioned_docx)
+    assert reader.scan() == 4
+    assert reader.sect_pr is not None
+    assert reader.sect_pr.find(f'{{{W_NS}}}pgSz').get(f'{{{W_NS}}}w') == '12240'
+
+    # 段落内、单元格内的分节符留在各自的块中
+    blocks = [_text(block) for block in reader.iter_blocks()]
+    assert blocks == ['第一节', '节尾', '单元格', '内容控件']
+
+
+def test_scan_leaves_a_document_shell(sectioned_docx):
+    reader = StreamingBodyReader(sectioned_docx)
+    reader.scan()
+
+    assert reader.root.find(f'{{{W_NS}}}background') is not None
+    # 已读过的块都被清空，body中只留下最后一节的节设置
+    assert reader.body[-1].tag == SECT_PR_TAG
+    assert ''.join(reader.body.itertext()).strip() == ''
+
+
+def test_sect_pr_is_published_per_complete_pass(sample_docx):
+    reader = StreamingBodyReader(sample_docx)
+    assert reader.sect_pr is None
+    reader.scan()
+    scanned = reader.sect_pr
+
+    # 中途放弃的一遍不改变 sect_pr
+    blocks = reader.iter_blocks()
+    next(blocks)
+    blocks.close()
+    assert reader.sect_pr is scanned
+
+    assert sum(1 for _ in reader.iter_blocks()) == 7
+    assert reader.sect_pr is not None and reader.sect_pr is not scanned
+
+
+def test_streaming_page_map_matches_in_memory(sample_docx, sectioned_docx):
+    for path in (sample_docx, sectioned_docx):
+        reader = StreamingBodyReader(path)
+        reader.scan()
+        assert build_page_map_streaming(reader) == build_page_map(path)
+
+
+def test_chunk_from_streamed_blocks(sample_docx, tmp_path):
+    reader = StreamingBodyReader(sample_docx)
+    reader.scan()
+
+    # 流式产出的块在取下一个块时即被释放，需要保留时深拷贝
+    blocks = [copy.deepcopy(block) for index, block in enumerate(reader.iter_blocks()) if 2 <= index < 5]
+    out = str(tmp_path / 'streamed.docx')
+    with DocxChunkWriter(sample_docx, reader.root) as writer:
+        writer.write_chunk(out, blocks, owned=True)
+
+    with zipfile.ZipFile(out) as archive:
+        assert archive.testzip() is None
+        media = [name for name in archive.namelist() if name.startswith('word/media/')]
+    assert [p.text for p in Document(out).paragraphs] == ['第3段', '第4段', '第5段']
+    assert len(media) == 1
+
+
+@pytest.mark.parametrize('env, requested, expected', [
+    ('1', None, True),
+    ('0', None, False),
+    ('', True, True),
+    ('1', False, False),
+    ('', None, False),
+])
+def test_use_streaming(sample_docx, monkeypatch, env, requested, expected):
+    monkeypatch.setenv('SPLIT_STREAMING', env)
+    assert use_streaming(sample_docx, requested) is expected
+
+
+def test_streaming_threshold(sample_docx, monkeypatch):
+    monkeypatch.delenv('SPLIT_STREAMING', raising=False)
+    monkeypatch.setenv('SPLIT_STREAMING_THRESHOLD_MB', '0')
+    assert use_streaming(sample_docx)
+
+
+def test_streaming_split_matches_in_memory_split(sample_docx, tmp_path):
+    outputs = {}
+    for streaming in (False, True):
+        output_dir = str(tmp_path / f'out-{streaming}')
+        split_docx_by_sections(sample_docx, output_dir, 1, 'doc', workers=1, streaming=streaming)
+        outputs[streaming] = {
+            name: [p.text for p in Document(os.path.join(output_dir, name)).paragraphs]
+            for name in sorted(os.listdir(output_dir)) if name.endswith('.docx')
+        }
+        shutil.rmtree(output_dir)
+    assert outputs[True] == outputs[False]
+    assert len(outputs[True]) == 2
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""按token预算拆分的测试"""
+
+import os
+import re
+
+import pytest
+from docx import Document
+from lxml import etree
+
+from docx_chunk_writer import W_NS
+from docx_page_map import PageMap
+from docx_token_budget import (estimate_block_tokens, estimate_text_tokens, extract_token_budget_arg,
+                               plan_token_chunks)
+from split_docx_pages_python_docx import plan_token_budget_chunks, split_docx_by_sections
+
+
+def _block(xml: str):
+    return etree.fromstring(f'<w:body xmlns:w="{W_NS}">{xml}</w:body>')[0]
+
+
+def test_estimate_text_tokens():
+    assert estimate_text_tokens('中文字符') == pytest.approx(2.4)
+    assert estimate_text_tokens('abc 123') == pytest.approx(2.1)
+    assert estimate_text_tokens('') == 0
+
+
+def test_estimate_paragraph_tokens():
+    # 10个中文字符 6 + 换行 1
+    paragraph = _block('<w:p><w:r><w:t>十个中文字符十个中文</w:t></w:r></w:p>')
+    assert estimate_block_tokens(paragraph) == 7
+
+
+def test_estimate_table_tokens():
+    # 2行×2列：文字 4×0.6，每行 1，每个单元格 2，单元格内段落各 1
+    cell = '<w:tc><w:p><w:r><w:t>格</w:t></w:r></w:p></w:tc>'
+    table = _block(f'<w:tbl><w:tr>{cell}{cell}</w:tr><w:tr>{cell}{cell}</w:tr></w:tbl>')
+    assert estimate_block_tokens(table) == int(4 * 0.6 + 2 + 4 * 2 + 4 + 0.5)
+
+
+def test_plan_token_chunks():
+    assert plan_token_chunks([3, 3, 3, 10, 1], 6) == [(0, 2, 6), (2, 3, 3), (3, 4, 10), (4, 5, 1)]
+    assert plan_token_chunks([], 6) == []
+
+
+def test_plan_token_budget_chunks(tmp_path):
+    page_map = PageMap(block_pages=[1, 1, 2, 3, 3], total_pages=3, method='estimated')
+    chunks = plan_token_budget_chunks(page_map, [3, 3, 3, 10, 1], 6, str(tmp_path), 'doc')
+
+    assert [(index, start, end) for index, start, end, _, _ in chunks] == [(1, 0, 2), (2, 2, 3), (3, 3, 4), (4, 4, 5)]
+    names = [name for _, _, _, _, name in chunks]
+    assert names == ['doc (第1部分 第1页).docx', 'doc (第2部分 第2页).docx',
+                     'doc (第3部分 第3页).docx', 'doc (第4部分 第3页).docx']
+    assert all(path == os.path.join(str(tmp_path), name) for _, _, _, path, name in chunks)
+
+
+def test_plan_token_budget_chunks_names_page_span(tmp_path):
+    page_map = PageMap(block_pages=[1, 2, 4], total_pages=4, method='estimated')
+    chunks = plan_token_budget_chunks(page_map, [1, 1, 1], 100, str(tmp_path), 'doc')
+
+    assert [(start, end, name) for _, start, end, _, name in chunks] == [(0, 3, 'doc (第1部分 第1-4页).docx')]
+
+
+def test_extract_token_budget_arg():
+    argv = ['split.py', 'in.docx', 'out', '--tokens=4000', '10']
+    assert extract_token_budget_arg(argv) == (['split.py', 'in.docx', 'out', '10'], 4000)
+    assert extract_token_budget_arg(['split.py']) == (['split.py'], None)
+
+
+@pytest.mark.parametrize('arg', ['--tokens=many', '--tokens=99'])
+def test_extract_token_budget_arg_rejects(arg):
+    with pytest.raises(ValueError):
+        extract_token_budget_arg(['split.py', arg])
+
+
+def test_split_by_token_budget(tmp_path, capsys):
+    document = Document()
+    for index in range(12):
+        document.add_paragraph('预算' * 50 + str(index))
+    path = str(tmp_path / 'long.docx')
+    document.save(path)
+
+    output_dir = str(tmp_path / 'out')
+    split_docx_by_sections(path, output_dir, 1, 'doc', workers=1, token_budget=200)
+
+    reported = re.findall(r'PROGRESS:FILE_TOKENS:(\d+):(\d+):(.+)', capsys.readouterr().out)
+    assert len(reported) > 1
+    assert all(int(tokens) <= 200 for _, tokens, _ in reported)
+    written = [Document(os.path.join(output_dir, name)).paragraphs for _, _, name in reported]
+    assert sum(len(paragraphs) for paragraphs in written) == 12
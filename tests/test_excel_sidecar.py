@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from excel_sidecar import (SIDECAR_MAGIC, SIDECAR_VERSION, _parse_header, canonical_key, load_snapshot,
+                           normalize_sequence, sidecar_path_for, write_snapshot)
+
+
+def _build_workbook():
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['清单'])
+    sheet.append(['序号', '名称', '数量'])
+    for index in range(1, 6):
+        sheet.append([index, f'名称{index}', index * 10])
+    sheet.append([2, '重复', None])
+    sheet.merge_cells('A1:C1')
+    return workbook
+
+
+def _write_workbook(path):
+    _build_workbook().save(path)
+
+
+def test_write_snapshot_layout():
+    out = io.BytesIO()
+    write_snapshot(_build_workbook().active, 'hash', out)
+    content = out.getvalue()
+
+    assert content.startswith(SIDECAR_MAGIC)
+    header, data_start = _parse_header(content)
+    assert data_start % 4 == 0
+    assert header['version'] == SIDECAR_VERSION
+    assert (header['max_row'], header['max_column']) == (8, 3)
+    assert len(header['columns']) == 3
+    assert header['header_candidates'][1] == ['序号', '名称', '数量']
+
+
+@pytest.mark.parametrize('use_cache', [True, False])
+def test_load_snapshot(tmp_path, use_cache):
+    path = str(tmp_path / 'book.xlsx')
+    _write_workbook(path)
+
+    snapshot, workbook = load_snapshot(path, use_cache)
+    try:
+        assert workbook is not None
+        assert os.path.exists(sidecar_path_for(path)) == use_cache
+        assert (snapshot.max_row, snapshot.max_column) == (8, 3)
+        assert list(snapshot[3]) == ['1', '名称1', '10']
+        assert snapshot.value(4, 2) == '名称2'
+        assert snapshot.value(99, 1) == ''
+        assert snapshot.is_merged(1, 2)
+        assert not snapshot.is_merged(1, 1)
+        index = snapshot.sequence_index
+        assert (index['column_index'], index['header_row']) == (1, 2)
+        assert index['map']['5'] == 7
+        assert index['duplicates'] == [['2', 4, 8]]
+    finally:
+        snapshot.close()
+        workbook.close()
+
+
+def test_load_snapshot_reuses_sidecar(tmp_path):
+    path = str(tmp_path / 'book.xlsx')
+    _write_workbook(path)
+
+    first, workbook = load_snapshot(path)
+    first.close()
+    workbook.close()
+
+    second, workbook = load_snapshot(path)
+    try:
+        assert workbook is None
+        assert second.is_mapped
+        assert list(second[5]) == ['3', '名称3', '30']
+    finally:
+        second.close()
+
+
+def test_stale_sidecar_is_rebuilt(tmp_path):
+    path = str(tmp_path / 'book.xlsx')
+    _write_workbook(path)
+    with open(sidecar_path_for(path), 'wb') as f:
+        f.write(b'not a sidecar')
+
+    snapshot, workbook = load_snapshot(path)
+    try:
+        assert workbook is not None
+        assert snapshot.max_row == 8
+    finally:
+        snapshot.close()
+        workbook.close()
+
+
+def test_overlay_writes(tmp_path):
+    path = str(tmp_path / 'book.xlsx')
+    _write_workbook(path)
+
+    snapshot, workbook = load_snapshot(path, use_cache=False)
+    try:
+        snapshot.set_value(3, 3, 99)
+        assert snapshot.value(3, 3) == '99'
+        assert snapshot.pending_writes == 1
+        with pytest.raises(AttributeError):
+            snapshot.set_value(1, 2, 'x')
+        assert snapshot.apply_writes(workbook.active) == 1
+        assert workbook.active.cell(3, 3).value == 99
+    finally:
+        snapshot.close()
+        workbook.close()
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, ''),
+    (10.0, '10'),
+    ('10.0', '10'),
+    ('10.50', '10.5'),
+    (10.5, '10.5'),
+    (Decimal('10.50'), '10.5'),
+    ('1,000', '1000'),
+    ('1,000.00', '1000'),
+    (1000, '1000'),
+    ('-0.0', '0'),
+    (0.1 + 0.2, '0.3'),
+    (1.5e-7, '0.00000015'),
+    ('１０．５', '10.5'),
+    ('  Abc ', 'abc'),
+    ('2024/1/5', '2024-01-05'),
+    (datetime(2024, 1, 5), '2024-01-05'),
+    (True, 'true'),
+])
+def test_canonical_key(value, expected):
+    assert canonical_key(value) == expected
+
+
+@pytest.mark.parametrize('text', ['007', '12,34', '1e5', 'inf', '1,0000'])
+def test_canonical_key_keeps_non_numeric_text(text):
+    assert canonical_key(text) == text
+
+
+def test_numeric_text_matches_numeric_cell():
+    assert canonical_key('1,000') == canonical_key(1000) == canonical_key(1000.0)
+    assert canonical_key('10.50') == canonical_key(10.5)
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, ''),
+    ('', ''),
+    (3, '3'),
+    (3.0, '3'),
+    ('003', '3'),
+    (' ０７ ', '7'),
+    ('1.0', '1.0'),
+    ('1.10', '1.10'),
+    ('A-01', 'A-01'),
+])
+def test_normalize_sequence(value, expected):
+    assert normalize_sequence(value) == expected
+
+
+def test_normalize_sequence_compares_literal_decimals():
+    assert normalize_sequence('1.10') != normalize_sequence('1.1')
+    assert normalize_sequence('2.20') != normalize_sequence('2.2')
+
+
+def test_sequence_index_keeps_decimal_sequences_apart(tmp_path):
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    workbook.active.append(['序号', '名称'])
+    for sequence in ['1.1', '1.10', '2.2', '2.20', '3']:
+        workbook.active.append([sequence, f'项目{sequence}'])
+    path = str(tmp_path / 'sequence.xlsx')
+    workbook.save(path)
+
+    snapshot, workbook = load_snapshot(path)
+    try:
+        index = snapshot.sequence_index
+        assert index['duplicates'] == []
+        assert index['map'] == {'1.1': 2, '1.10': 3, '2.2': 4, '2.20': 5, '3': 6}
+    finally:
+        snapshot.close()
+        workbook.close()
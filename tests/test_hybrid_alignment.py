@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""混合引擎（LibreOffice 分页 + zip级写出）的对齐和拆分测试"""
+
+import os
+
+import pytest
+from docx import Document
+
+import split_docx_pages_hybrid
+from docx_page_map import PageMap
+from split_docx_pages_hybrid import align_tokens, bisect_pages, split_docx_hybrid
+
+
+def test_align_identical():
+    tokens = [('p', 'a'), ('tbl', ''), ('p', 'b')]
+    assert align_tokens(tokens, list(tokens)) == ([0, 1, 2], 3)
+
+
+def test_align_skips_extra_libreoffice_element():
+    docx = [('p', 'a'), ('tbl', ''), ('p', 'b')]
+    lo = [('p', 'a'), ('tbl', ''), ('p', ''), ('p', 'b')]
+    assert align_tokens(docx, lo) == ([0, 1, 3], 3)
+
+
+def test_align_skips_extra_docx_element():
+    docx = [('p', 'a'), ('p', 'x'), ('p', 'b')]
+    lo = [('p', 'a'), ('p', 'b')]
+    assert align_tokens(docx, lo) == ([0, None, 1], 2)
+
+
+def test_positional_matches_do_not_count_as_exact():
+    docx = [('p', f'docx{index}') for index in range(10)]
+    lo = [('p', f'lo{index}') for index in range(10)]
+    mapping, exact = align_tokens(docx, lo)
+
+    assert mapping == list(range(10))
+    assert exact == 0
+
+
+def test_bisect_pages_matches_linear_scan():
+    pages = [1, 1, 1, 2, 2, 3, 5, 5, 5, 5, 5, 6]
+    calls = []
+
+    def page_of(index):
+        calls.append(index)
+        return pages[index]
+
+    assert bisect_pages(len(pages), page_of) == pages
+    assert len(set(calls)) < len(pages)
+
+
+def test_bisect_pages_single_page_reads_ends_only():
+    calls = []
+
+    def page_of(index):
+        calls.append(index)
+        return 1
+
+    assert bisect_pages(1000, page_of) == [1] * 1000
+    assert sorted(set(calls)) == [0, 999]
+
+
+def test_bisect_pages_empty():
+    assert bisect_pages(0, lambda index: 1) == []
+
+
+@pytest.fixture
+def fake_libreoffice(monkeypatch):
+    """不启动 LibreOffice：libreoffice_page_map 返回 pages 给出的块页码，为None时表示对不齐"""
+    calls = []
+    result = {'pages': None}
+
+    def page_map(input_path, blocks, bridge=None):
+        calls.append(len(blocks))
+        pages = result['pages']
+        return None if pages is None else PageMap(block_pages=pages, total_pages=pages[-1], method='libreoffice')
+
+    monkeypatch.setattr(split_docx_pages_hybrid, 'LIBREOFFICE_AVAILABLE', True)
+    monkeypatch.setattr(split_docx_pages_hybrid, 'libreoffice_page_map', page_map)
+    return calls, result
+
+
+def _docx_files(output_dir):
+    return sorted(name for name in os.listdir(output_dir) if name.endswith('.docx'))
+
+
+def test_hybrid_split_uses_libreoffice_pages_and_caches_them(sample_docx, tmp_path, fake_libreoffice, capsys):
+    calls, result = fake_libreoffice
+    result['pages'] = [1, 1, 1, 1, 2, 2, 3]
+
+    split_docx_hybrid(sample_docx, str(tmp_path / 'first'), 2, 'doc')
+    assert _docx_files(str(tmp_path / 'first')) == ['doc (第1-2页).docx', 'doc (第3页).docx']
+    last = Document(str(tmp_path / 'first' / 'doc (第3页).docx'))
+    assert last.paragraphs == [] and len(last.tables) == 1
+
+    # 第二次从混合引擎的页码缓存取页码，不再连接 LibreOffice
+    split_docx_hybrid(sample_docx, str(tmp_path / 'second'), 1, 'doc')
+    assert len(calls) == 1
+    assert '命中页码缓存' in capsys.readouterr().out
+    assert _docx_files(str(tmp_path / 'second')) == ['doc (第1页).docx', 'doc (第2页).docx', 'doc (第3页).docx']
+
+
+def test_hybrid_falls_back_to_estimated_pages(sample_docx, tmp_path, fake_libreoffice, monkeypatch, capsys):
+    calls, _ = fake_libreoffice
+    monkeypatch.setenv('SPLIT_RESULT_CACHE', '1')
+    monkeypatch.setenv('SPLIT_RESULT_CACHE_DIR', str(tmp_path / 'split-cache'))
+
+    for run in range(2):
+        split_docx_hybrid(sample_docx, str(tmp_path / f'out{run}'), 1, 'doc')
+        out = capsys.readouterr().out
+        assert '改用估算的页码' in out
+        assert '本次结果不写入拆分结果缓存' in out
+        assert _docx_files(str(tmp_path / f'out{run}')) == ['doc (第1页).docx', 'doc (第2页).docx']
+
+    # 估算结果既不写入混合引擎的页码缓存，也不写入拆分结果缓存，每次都重新尝试 LibreOffice
+    assert len(calls) == 2
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""常驻 LibreOffice 拆分服务的协议测试（不需要 LibreOffice）"""
+
+import contextlib
+import json
+import socket
+import threading
+
+import pytest
+
+import split_docx_pages_libreoffice
+from libreoffice_split_service import EXIT_PREFIX, parse_address, run_job, submit_job
+
+
+class _OneShotServer:
+    """在本机随机端口接受一个连接：读取请求行，写回 reply 后关闭"""
+
+    def __init__(self, reply: bytes):
+        self.reply = reply
+        self.request = None
+        self._server = socket.create_server(('127.0.0.1', 0))
+        self.port = self._server.getsockname()[1]
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        with self._server:
+            conn, _ = self._server.accept()
+            with conn, conn.makefile('rb') as reader:
+                self.request = reader.readline()
+                conn.sendall(self.reply)
+
+    def join(self):
+        self._thread.join(timeout=5)
+
+
+def _closed_port() -> int:
+    with socket.create_server(('127.0.0.1', 0)) as server:
+        return server.getsockname()[1]
+
+
+@pytest.mark.parametrize('spec, expected', [
+    ('127.0.0.1:2012', ('127.0.0.1', 2012)),
+    (' 2013 ', ('127.0.0.1', 2013)),
+    (':2014', ('127.0.0.1', 2014)),
+    ('split-host:80', ('split-host', 80)),
+])
+def test_parse_address(spec, expected):
+    assert parse_address(spec) == expected
+
+
+def test_parse_address_rejects_bad_port():
+    with pytest.raises(ValueError):
+        parse_address('127.0.0.1:port')
+
+
+def test_submit_job_forwards_output_and_exit_code(capsys):
+    server = _OneShotServer(f"第一行\nPROGRESS:TOTAL_FILES:2\n{EXIT_PREFIX}3\n不应输出\n".encode('utf-8'))
+    code = submit_job(f'127.0.0.1:{server.port}', ['split.py', 'in.docx', 'out', '10'])
+    server.join()
+
+    assert code == 3
+    assert capsys.readouterr().out == '第一行\nPROGRESS:TOTAL_FILES:2\n'
+    request = json.loads(server.request)
+    assert request['argv'] == ['split.py', 'in.docx', 'out', '10']
+    assert request['cwd']
+
+
+def test_submit_job_without_exit_line_fails(capsys):
+    server = _OneShotServer(b'PROGRESS:FILE_START:1\n')
+    assert submit_job(f'127.0.0.1:{server.port}', ['split.py']) == 1
+    server.join()
+    assert '在任务完成前断开了连接' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('address', [lambda: f'127.0.0.1:{_closed_port()}', lambda: 'no-port:here'])
+def test_submit_job_returns_none_when_service_is_unreachable(address, capsys):
+    assert submit_job(address(), ['split.py']) is None
+    assert '在本进程中拆分' in capsys.readouterr().out
+
+
+class _FakeBridge:
+    address = 'fake:0'
+    jobs = 1
+
+
+class _FakePool:
+    @contextlib.contextmanager
+    def acquire(self):
+        yield _FakeBridge()
+
+
+def _run(request: bytes, split_main, monkeypatch):
+    """用 socketpair 执行一个任务，返回 (退出码, 客户端收到的全部输出)"""
+    monkeypatch.setattr(split_docx_pages_libreoffice, 'main', split_main)
+    client, conn = socket.socketpair()
+    with client, conn:
+        client.sendall(request)
+        client.shutdown(socket.SHUT_WR)
+        code = run_job(conn, _FakePool())
+        conn.shutdown(socket.SHUT_WR)
+        received = client.makefile('r', encoding='utf-8').read()
+    return code, received
+
+
+@pytest.mark.parametrize('outcome, expected', [
+    (None, 0),
+    (SystemExit(2), 2),
+    (SystemExit('失败'), 1),
+    (RuntimeError('boom'), 1),
+])
+def test_run_job_sends_output_and_exit_line(tmp_path, monkeypatch, outcome, expected):
+    calls = []
+
+    def split_main(argv, bridge=None):
+        calls.append((argv, bridge))
+        print('PROGRESS:TOTAL_FILES:1')
+        if outcome is not None:
+            raise outcome
+
+    request = json.dumps({'argv': ['split.py', 'in.docx', 7], 'cwd': str(tmp_path)}) + '\n'
+    code, received = _run(request.encode('utf-8'), split_main, monkeypatch)
+
+    assert code == expected
+    lines = received.splitlines()
+    assert 'PROGRESS:TOTAL_FILES:1' in lines
+    assert lines[-1] == f'{EXIT_PREFIX}{expected}'
+    assert calls[0][0] == ['split.py', 'in.docx', '7']
+    assert isinstance(calls[0][1], _FakeBridge)
+
+
+def test_run_job_ignores_empty_connection(monkeypatch):
+    def split_main(argv, bridge=None):
+        raise AssertionError('不应执行')
+
+    assert _run(b'', split_main, monkeypatch) == (0, '')
+
+
+def test_run_job_rejects_request_without_argv(monkeypatch):
+    with pytest.raises(ValueError):
+        _run(b'{"cwd": "/"}\n', lambda argv, bridge=None: None, monkeypatch)
+
+
+def test_libreoffice_script_hands_job_to_service(monkeypatch, capsys):
+    server = _OneShotServer(f"PROGRESS:ALL_FILES_COMPLETE:1:1\n{EXIT_PREFIX}0\n".encode('utf-8'))
+    monkeypatch.setenv('LIBREOFFICE_SPLIT_SERVICE', f'127.0.0.1:{server.port}')
+    argv = ['split_docx_pages_libreoffice.py', 'in.docx', 'out', '10', '--resume']
+
+    with pytest.raises(SystemExit) as exit_info:
+        split_docx_pages_libreoffice.main(argv)
+    server.join()
+
+    assert exit_info.value.code == 0
+    assert json.loads(server.request)['argv'] == argv
+    assert 'PROGRESS:ALL_FILES_COMPLETE:1:1' in capsys.readouterr().out
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import signal
+
+import pytest
+
+from log_ring_buffer import (LOG_MODE_RING, LOG_MODE_STREAM, RingBufferHandler, _DumpOnErrorHandler,
+                             configure_row_logging, default_log_mode, default_ring_size, dump_log_buffer, dump_requested)
+
+
+class _Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class _Counted:
+    """记录被格式化的次数"""
+
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return 'counted'
+
+
+@pytest.fixture
+def script_logger(request):
+    logger = logging.getLogger(f'test_ring.{request.node.name}')
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    previous = signal.getsignal(signal.SIGUSR1) if hasattr(signal, 'SIGUSR1') else None
+    yield logger
+    configure_row_logging(logger, LOG_MODE_STREAM)
+    if previous is not None:
+        signal.signal(signal.SIGUSR1, previous)
+
+
+def _ring_of(row_logger):
+    return next(handler for handler in row_logger.handlers if isinstance(handler, RingBufferHandler))
+
+
+def test_ring_keeps_latest_records_and_counts_dropped():
+    target = _Collect()
+    ring = RingBufferHandler(3, target)
+    for index in range(5):
+        ring.handle(logging.makeLogRecord({'msg': 'row %d', 'args': (index,), 'levelno': logging.INFO}))
+
+    assert ring.dropped == 2
+    assert ring.dump('测试') == 3
+    assert target.messages[0].startswith('---- 逐行日志缓冲 (3 条，已丢弃更早的 2 条)：测试')
+    assert target.messages[1:] == ['row 2', 'row 3', 'row 4']
+    assert ring.dump() == 0
+    assert ring.dropped == 0
+
+
+def test_ring_defers_formatting_until_dump():
+    target = _Collect()
+    ring = RingBufferHandler(10, target)
+    value = _Counted()
+    ring.handle(logging.makeLogRecord({'msg': 'value %s', 'args': (value,), 'levelno': logging.INFO}))
+
+    assert value.formatted == 0
+    ring.dump()
+    assert value.formatted == 1
+
+
+def test_ring_mode_dumps_on_error(script_logger):
+    row_logger = configure_row_logging(script_logger, LOG_MODE_RING, capacity=10)
+    target = _Collect()
+    _ring_of(row_logger).target = target
+
+    row_logger.info('第%d行已匹配', 1)
+    row_logger.info('第%d行已匹配', 2)
+    assert not row_logger.propagate
+    assert target.messages == []
+
+    script_logger.error('写入失败')
+    assert target.messages[1:] == ['第1行已匹配', '第2行已匹配']
+    assert '遇到错误' in target.messages[0]
+
+
+def test_dump_log_buffer(script_logger):
+    row_logger = configure_row_logging(script_logger, LOG_MODE_RING, capacity=10)
+    target = _Collect()
+    _ring_of(row_logger).target = target
+    row_logger.info('row')
+
+    assert dump_log_buffer(row_logger, '处理结束') == 1
+    assert target.messages[-1] == 'row'
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGUSR1'), reason='需要SIGUSR1')
+def test_sigusr1_dumps(script_logger):
+    row_logger = configure_row_logging(script_logger, LOG_MODE_RING, capacity=10)
+    target = _Collect()
+    _ring_of(row_logger).target = target
+    row_logger.info('row')
+
+    os.kill(os.getpid(), signal.SIGUSR1)
+    assert target.messages[-1] == 'row'
+    assert '收到SIGUSR1' in target.messages[0]
+
+
+def test_stream_mode_propagates_and_reconfigures(script_logger):
+    configure_row_logging(script_logger, LOG_MODE_RING, capacity=10)
+    row_logger = configure_row_logging(script_logger, LOG_MODE_STREAM)
+
+    assert row_logger.propagate
+    assert not any(isinstance(handler, RingBufferHandler) for handler in row_logger.handlers)
+    assert not any(isinstance(handler, _DumpOnErrorHandler) for handler in script_logger.handlers)
+    assert dump_log_buffer(row_logger) == 0
+
+
+def test_environment_defaults(monkeypatch):
+    monkeypatch.setenv('EXCEL_LOG_MODE', ' Ring ')
+    monkeypatch.setenv('EXCEL_LOG_RING_SIZE', '5')
+    monkeypatch.setenv('EXCEL_LOG_DUMP', 'yes')
+    assert (default_log_mode(), default_ring_size(), dump_requested()) == (LOG_MODE_RING, 5, True)
+
+    monkeypatch.setenv('EXCEL_LOG_MODE', 'verbose')
+    monkeypatch.setenv('EXCEL_LOG_RING_SIZE', 'many')
+    monkeypatch.delenv('EXCEL_LOG_DUMP')
+    assert (default_log_mode(), default_ring_size(), dump_requested()) == (LOG_MODE_STREAM, 2000, False)
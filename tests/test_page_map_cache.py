@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""页码边界缓存的测试"""
+
+import json
+import os
+
+import pytest
+
+from docx_page_map import PageMap
+from page_map_cache import CACHE_VERSION, PageBoundaries, PageMapCache
+from split_docx_pages_python_docx import load_page_map
+
+HASH_A = 'a' * 64
+HASH_B = 'b' * 64
+HASH_C = 'c' * 64
+
+
+def _boundaries(total_pages: int = 2) -> PageBoundaries:
+    return PageBoundaries(engine='python_docx', total_pages=total_pages,
+                          starts={page: page - 1 for page in range(1, total_pages + 2)}, method='metrics')
+
+
+def _set_mtime(path: str, mtime: float):
+    os.utime(path, (mtime, mtime))
+
+
+def test_page_map_round_trip():
+    page_map = PageMap(block_pages=[1, 1, 2, 4], total_pages=4, method='estimated')
+    starts = page_map.page_starts()
+
+    assert starts == {1: 0, 2: 2, 3: 3, 4: 3, 5: 4}
+    assert PageMap.from_page_starts(starts, 4, 'estimated') == page_map
+
+
+def test_store_and_load(tmp_path):
+    cache = PageMapCache(str(tmp_path))
+    assert cache.load(HASH_A, 'python_docx') is None
+
+    assert cache.store(HASH_A, _boundaries(3))
+    assert cache.load(HASH_A, 'python_docx') == _boundaries(3)
+    # 引擎不同的条目互不影响
+    assert cache.load(HASH_A, 'word') is None
+
+
+@pytest.mark.parametrize('change', [
+    {'version': CACHE_VERSION + 1},
+    {'content_hash': HASH_B},
+    {'engine': 'word'},
+])
+def test_mismatched_entry_is_ignored(tmp_path, change):
+    cache = PageMapCache(str(tmp_path))
+    cache.store(HASH_A, _boundaries())
+    path = cache.entry_path(HASH_A, 'python_docx')
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    data.update(change)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+    assert cache.load(HASH_A, 'python_docx') is None
+
+
+def test_corrupt_entry_is_ignored(tmp_path):
+    cache = PageMapCache(str(tmp_path))
+    cache.store(HASH_A, _boundaries())
+    with open(cache.entry_path(HASH_A, 'python_docx'), 'w', encoding='utf-8') as f:
+        f.write('{')
+
+    assert cache.load(HASH_A, 'python_docx') is None
+
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    cache = PageMapCache(str(tmp_path), max_bytes=10 ** 9)
+    for content_hash in (HASH_A, HASH_B):
+        cache.store(content_hash, _boundaries())
+    path_a = cache.entry_path(HASH_A, 'python_docx')
+    path_b = cache.entry_path(HASH_B, 'python_docx')
+    _set_mtime(path_a, 1000)
+    _set_mtime(path_b, 2000)
+
+    # 命中刷新mtime：A 变成最近使用，B 成为最旧的条目
+    assert cache.load(HASH_A, 'python_docx') is not None
+    assert os.path.getmtime(path_a) > 2000
+
+    # 上限只容得下两个条目，写入 C 时淘汰 B
+    cache.max_bytes = os.path.getsize(path_a) * 2
+    cache.store(HASH_C, _boundaries())
+
+    assert os.path.exists(path_a)
+    assert not os.path.exists(path_b)
+    assert os.path.exists(cache.entry_path(HASH_C, 'python_docx'))
+
+
+def test_eviction_keeps_the_entry_just_written(tmp_path):
+    cache = PageMapCache(str(tmp_path), max_bytes=1)
+    cache.store(HASH_A, _boundaries())
+    cache.store(HASH_B, _boundaries())
+
+    assert not os.path.exists(cache.entry_path(HASH_A, 'python_docx'))
+    assert cache.load(HASH_B, 'python_docx') == _boundaries()
+
+
+def test_max_size_from_environment(monkeypatch):
+    monkeypatch.setenv('PAGE_MAP_CACHE_MAX_MB', '0.5')
+    assert PageMapCache('unused').max_bytes == 512 * 1024
+    monkeypatch.setenv('PAGE_MAP_CACHE_MAX_MB', 'many')
+    assert PageMapCache('unused').max_bytes == 64 * 1024 * 1024
+
+
+def test_load_page_map_builds_once(sample_docx):
+    page_map = PageMap(block_pages=[1, 1, 2], total_pages=2, method='metrics')
+    builds = []
+
+    def build():
+        builds.append(1)
+        return page_map
+
+    assert load_page_map(sample_docx, HASH_A, 3, build) == page_map
+    assert load_page_map(sample_docx, HASH_A, 3, build) == page_map
+    assert len(builds) == 1
+
+    # 块数与缓存不符（同一哈希下文档结构变了）时重新构建
+    load_page_map(sample_docx, HASH_A, 4, build)
+    assert len(builds) == 2
+
+
+def test_load_page_map_respects_disabled_cache(sample_docx, monkeypatch):
+    monkeypatch.setenv('PAGE_MAP_CACHE', '0')
+    page_map = PageMap(block_pages=[1], total_pages=1, method='metrics')
+    builds = []
+
+    def build():
+        builds.append(1)
+        return page_map
+
+    load_page_map(sample_docx, HASH_A, 1, build)
+    load_page_map(sample_docx, HASH_A, 1, build)
+    assert len(builds) == 2
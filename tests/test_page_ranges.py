@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""页码范围解析的测试"""
+
+import pytest
+
+from page_ranges import clamp_page_ranges, extract_page_ranges_arg, parse_page_ranges, stride_page_ranges
+
+
+def test_parse_page_ranges():
+    assert parse_page_ranges('1-3, 7，20 - 25') == [(1, 3), (7, 7), (20, 25)]
+
+
+def test_parse_page_ranges_drops_duplicates_keeps_order():
+    assert parse_page_ranges('7,1-3,7,1-3') == [(7, 7), (1, 3)]
+
+
+@pytest.mark.parametrize('spec', ['', ' , ', '0', '3-1', 'a-b', '1-', '-2'])
+def test_parse_page_ranges_rejects(spec):
+    with pytest.raises(ValueError):
+        parse_page_ranges(spec)
+
+
+def test_clamp_page_ranges():
+    assert clamp_page_ranges([(1, 3), (8, 12), (11, 15)], 10) == [(1, 3), (8, 10)]
+
+
+def test_stride_page_ranges():
+    assert stride_page_ranges(7, 3) == [(1, 3), (4, 6), (7, 7)]
+
+
+def test_extract_page_ranges_arg():
+    argv = ['split.py', 'in.docx', 'out', '--pages=2-4', '10']
+    assert extract_page_ranges_arg(argv) == (['split.py', 'in.docx', 'out', '10'], [(2, 4)])
+    assert extract_page_ranges_arg(['split.py']) == (['split.py'], None)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import pstats
+import time
+
+import pytest
+
+from profiling_hook import default_job_id, extract_profile_args, profile_session, profiling_enabled
+
+
+@pytest.fixture(autouse=True)
+def no_profile_env(monkeypatch):
+    for name in ('SCRIPT_PROFILE', 'SCRIPT_PROFILE_DIR', 'SCRIPT_PROFILE_JOB', 'SCRIPT_PROFILE_INTERVAL'):
+        monkeypatch.delenv(name, raising=False)
+
+
+def _busy(seconds):
+    deadline = time.monotonic() + seconds
+    total = 0
+    while time.monotonic() < deadline:
+        total += sum(range(200))
+    return total
+
+
+def test_extract_profile_args():
+    argv = ['split.py', '--profile-dir=/tmp/p', 'in.docx', '--profile-job=job 1', 'out', '--profile']
+    remaining, options = extract_profile_args(argv)
+
+    assert remaining == ['split.py', 'in.docx', 'out']
+    assert options == {'enabled': '1', 'dir': '/tmp/p', 'job': 'job 1'}
+    assert extract_profile_args(['split.py', 'in.docx']) == (['split.py', 'in.docx'], {})
+
+
+def test_profiling_enabled(monkeypatch):
+    assert not profiling_enabled({})
+    assert profiling_enabled({'enabled': '1'})
+    monkeypatch.setenv('SCRIPT_PROFILE', 'yes')
+    assert profiling_enabled(None)
+
+
+def test_default_job_id():
+    job_id = default_job_id('/srv/modify_excel.py', '/uploads/报价 单.xlsx')
+    assert job_id.startswith('modify_excel_报价 单_')
+
+
+def test_disabled_session_yields_none(tmp_path):
+    with profile_session('job', {}) as session:
+        assert session is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_session_writes_pstats_and_collapsed_stacks(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv('SCRIPT_PROFILE_INTERVAL', '1')
+    options = {'enabled': '1', 'dir': str(tmp_path), 'job': 'split/任务 1'}
+    with profile_session('ignored', options, announce=True) as session:
+        _busy(0.2)
+
+    assert session.job_id == 'split_任务_1'
+    stats = pstats.Stats(session.pstats_path)
+    assert any(name == '_busy' for _, _, name in stats.stats)
+
+    lines = (tmp_path / 'split_任务_1.collapsed.txt').read_text(encoding='utf-8').splitlines()
+    assert lines
+    _, count = lines[0].rsplit(' ', 1)
+    assert int(count) >= 1
+    assert any('_busy (test_profiling_hook.py:' in line for line in lines)
+
+    assert capsys.readouterr().out.strip() == f'PROFILE:{session.to_dict()["pstats_path"]}'
+
+
+def test_session_writes_files_when_block_raises(tmp_path):
+    options = {'enabled': '1', 'dir': str(tmp_path), 'job': 'failed'}
+    with pytest.raises(SystemExit):
+        with profile_session('job', options):
+            raise SystemExit(1)
+
+    assert (tmp_path / 'failed.pstats').exists()
+    assert (tmp_path / 'failed.collapsed.txt').exists()
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""soffice 农场调度和转发的测试（用假的工作进程代替 soffice）"""
+
+import contextlib
+import socket
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import libreoffice_split_service
+from libreoffice_split_service import EXIT_PREFIX, instances_arg, proxy_job
+from soffice_farm import FarmSlot, SofficeFarm, stop_process, wait_for_port
+
+
+class _Process:
+    """只实现 poll() 的假进程"""
+
+    def __init__(self, code=None):
+        self.code = code
+
+    def poll(self):
+        return self.code
+
+
+class _FakeWorker:
+    """假的工作进程：接受一个任务，按 script 逐条发送输出（None 表示停顿）后关闭"""
+
+    def __init__(self, script):
+        self.script = script
+        self.request = None
+        self.release = threading.Event()
+        self._server = socket.create_server(('127.0.0.1', 0))
+        self.port = self._server.getsockname()[1]
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        with self._server:
+            conn, _ = self._server.accept()
+            with conn, conn.makefile('rb') as reader:
+                self.request = reader.readline()
+                for item in self.script:
+                    if item is None:
+                        self.release.wait(5)
+                    else:
+                        conn.sendall(item)
+
+
+class _FakeFarm:
+    def __init__(self, worker_port, hang_timeout=5.0, soffice=None):
+        self.slot = FarmSlot(0, 0, worker_port, 'unused')
+        self.slot.soffice = soffice
+        self.hang_timeout = hang_timeout
+        self.restarts = 0
+        self.acquired = 0
+
+    @contextlib.contextmanager
+    def acquire(self):
+        self.acquired += 1
+        yield self.slot
+
+    def restart_soffice(self, slot):
+        self.restarts += 1
+        slot.soffice = _Process()
+
+
+def _proxy(farm, request=b'{"argv": ["split.py"]}\n'):
+    """执行 proxy_job，返回 (客户端收到的输出, proxy_job 抛出的异常)"""
+    client, conn = socket.socketpair()
+    error = None
+    with client, conn:
+        client.sendall(request)
+        client.shutdown(socket.SHUT_WR)
+        try:
+            proxy_job(conn, farm)
+        except Exception as e:
+            error = e
+        conn.shutdown(socket.SHUT_WR)
+        received = client.makefile('r', encoding='utf-8').read()
+    return received, error
+
+
+@pytest.fixture
+def fast_poll(monkeypatch):
+    monkeypatch.setattr(libreoffice_split_service, 'POLL_INTERVAL', 0.05)
+
+
+def test_proxy_forwards_until_exit_line():
+    worker = _FakeWorker([b'PROGRESS:TOTAL_FILES:1\n', f'{EXIT_PREFIX}0\n'.encode(), b'after exit\n'])
+    received, error = _proxy(_FakeFarm(worker.port))
+
+    assert error is None
+    assert received == f'PROGRESS:TOTAL_FILES:1\n{EXIT_PREFIX}0\n'
+    assert worker.request == b'{"argv": ["split.py"]}\n'
+
+
+def test_proxy_reports_worker_exit_without_exit_line():
+    worker = _FakeWorker([b'PROGRESS:FILE_START:1\n'])
+    received, error = _proxy(_FakeFarm(worker.port))
+
+    assert error is None
+    lines = received.splitlines()
+    assert lines[0] == 'PROGRESS:FILE_START:1'
+    assert '在任务完成前退出' in lines[1]
+    assert lines[-1] == f'{EXIT_PREFIX}1'
+
+
+def test_proxy_reports_unavailable_worker():
+    with socket.create_server(('127.0.0.1', 0)) as server:
+        port = server.getsockname()[1]
+    received, error = _proxy(_FakeFarm(port))
+
+    assert error is None
+    assert '不可用' in received
+    assert received.splitlines()[-1] == f'{EXIT_PREFIX}1'
+
+
+def test_proxy_ignores_empty_and_rejects_partial_requests():
+    farm = _FakeFarm(0)
+    assert _proxy(farm, b'') == ('', None)
+    _, error = _proxy(farm, b'{"argv": [')
+    assert isinstance(error, ValueError)
+    assert farm.acquired == 0
+
+
+def test_proxy_times_out_silent_worker(fast_poll):
+    worker = _FakeWorker([b'PROGRESS:FILE_START:1\n', None])
+    received, error = _proxy(_FakeFarm(worker.port, hang_timeout=0.3))
+    worker.release.set()
+
+    assert isinstance(error, TimeoutError)
+    lines = received.splitlines()
+    assert lines[0] == 'PROGRESS:FILE_START:1'
+    assert '--resume' in lines[1]
+    assert lines[-1] == f'{EXIT_PREFIX}1'
+
+
+def test_proxy_restarts_soffice_that_exits_mid_job(fast_poll):
+    worker = _FakeWorker([None, f'{EXIT_PREFIX}0\n'.encode()])
+    farm = _FakeFarm(worker.port, soffice=_Process(code=-9))
+    threading.Timer(0.3, worker.release.set).start()
+    received, error = _proxy(farm)
+
+    assert error is None
+    assert farm.restarts == 1
+    assert received == f'{EXIT_PREFIX}0\n'
+
+
+@pytest.mark.parametrize('value, expected', [('3', 3), ('0', 0), (' auto ', 6)])
+def test_instances_arg(value, expected, monkeypatch):
+    monkeypatch.setattr(libreoffice_split_service.os, 'cpu_count', lambda: 6)
+    assert instances_arg(value) == expected
+
+
+def test_instances_arg_rejects_negative():
+    with pytest.raises(ValueError):
+        instances_arg('-1')
+
+
+@pytest.fixture
+def farm(monkeypatch, tmp_path):
+    """一个槽位的农场，不启动任何进程，recycle 只记录调用"""
+    monkeypatch.setenv('SOFFICE_BINARY', sys.executable)
+    monkeypatch.setenv('SOFFICE_FARM_PROFILE_DIR', str(tmp_path))
+    monkeypatch.setenv('SOFFICE_FARM_MAX_JOBS', '3')
+    monkeypatch.setenv('SOFFICE_FARM_MAX_MEMORY_MB', '100')
+    farm = SofficeFarm(1)
+    slot = farm.slots[0]
+    slot.soffice, slot.worker = _Process(), _Process()
+    slot.recycled = []
+    monkeypatch.setattr(slot, 'recycle', lambda binary, restart_worker=False: slot.recycled.append(restart_worker))
+    monkeypatch.setattr(slot, 'memory_mb', lambda: 50.0)
+    farm._idle.put(slot)
+    return farm
+
+
+def test_farm_keeps_healthy_slot(farm):
+    with farm.acquire() as slot:
+        pass
+    assert slot.jobs == 1
+    assert slot.recycled == []
+    assert farm._idle.get_nowait() is slot
+
+
+def test_farm_recycles_after_max_jobs(farm):
+    for _ in range(3):
+        with farm.acquire() as slot:
+            pass
+    assert slot.recycled == [False]
+
+
+@pytest.mark.parametrize('change', ['worker', 'soffice', 'memory'])
+def test_farm_recycles_unhealthy_slot(farm, monkeypatch, change):
+    slot = farm.slots[0]
+    if change == 'memory':
+        monkeypatch.setattr(slot, 'memory_mb', lambda: 500.0)
+    else:
+        setattr(slot, change, _Process(code=1))
+    with farm.acquire():
+        pass
+    assert slot.recycled == [False]
+
+
+def test_farm_restarts_worker_of_hung_slot(farm):
+    with pytest.raises(TimeoutError):
+        with farm.acquire():
+            raise TimeoutError('hung')
+    slot = farm._idle.get_nowait()
+    assert slot.recycled == [True]
+
+
+def test_wait_for_port_and_stop_process():
+    with socket.create_server(('127.0.0.1', 0)) as server:
+        assert wait_for_port(server.getsockname()[1], 1)
+
+    process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'], start_new_session=True)
+    # 进程在端口可连接前退出时立即返回
+    with socket.create_server(('127.0.0.1', 0)) as server:
+        closed_port = server.getsockname()[1]
+    stop_process(process)
+    assert process.poll() is not None
+    assert not wait_for_port(closed_port, 5, process)
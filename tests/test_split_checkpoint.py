@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""拆分断点的测试"""
+
+import json
+import os
+
+import pytest
+
+import split_checkpoint
+import split_result_cache
+from excel_sidecar import compute_content_hash
+from split_checkpoint import CHECKPOINT_NAME, SplitCheckpoint, extract_resume_arg
+from split_docx_pages_python_docx import split_docx_by_sections
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'input.docx'
+    path.write_bytes(b'source document')
+    return str(path)
+
+
+def _open(output_dir, source, resume=True, spec='pages=2'):
+    return SplitCheckpoint.open(str(output_dir), compute_content_hash(source), 'python_docx', spec, 'input', resume)
+
+
+def _write_chunks(output_dir, checkpoint, count):
+    paths = []
+    for index in range(1, count + 1):
+        path = output_dir / f'input ({index}).docx'
+        path.write_bytes(f'chunk {index}'.encode())
+        checkpoint.record(index, index * 10, index * 10 + 10, str(path))
+        paths.append(path)
+    return paths
+
+
+def test_resume_skips_verified_chunks(tmp_path, source):
+    output_dir = tmp_path / 'out'
+    output_dir.mkdir()
+    paths = _write_chunks(output_dir, _open(output_dir, source, resume=False), 3)
+
+    checkpoint = _open(output_dir, source)
+    assert checkpoint.resuming
+    assert checkpoint.completed(1, 10, 20, str(paths[0]))
+    assert checkpoint.completed(2, 20, 30, str(paths[1]))
+    assert not checkpoint.completed(4, 40, 50, str(output_dir / 'input (4).docx'))
+
+
+def test_resume_rewrites_corrupted_chunk(tmp_path, source):
+    output_dir = tmp_path / 'out'
+    output_dir.mkdir()
+    paths = _write_chunks(output_dir, _open(output_dir, source, resume=False), 2)
+    # 写到一半的分块：大小不变但内容不同
+    paths[1].write_bytes(b'chunk X')
+
+    checkpoint = _open(output_dir, source)
+    assert checkpoint.completed(1, 10, 20, str(paths[0]))
+    assert not checkpoint.completed(2, 20, 30, str(paths[1]))
+    assert not paths[1].exists()
+
+
+def test_resume_rejects_changed_range(tmp_path, source):
+    output_dir = tmp_path / 'out'
+    output_dir.mkdir()
+    paths = _write_chunks(output_dir, _open(output_dir, source, resume=False), 1)
+
+    checkpoint = _open(output_dir, source)
+    assert not checkpoint.completed(1, 10, 25, str(paths[0]))
+
+
+def test_changed_spec_or_input_starts_over(tmp_path, source):
+    output_dir = tmp_path / 'out'
+    output_dir.mkdir()
+    _write_chunks(output_dir, _open(output_dir, source, resume=False), 1)
+
+    assert not _open(output_dir, source, spec='pages=3').resuming
+    with open(source, 'ab') as f:
+        f.write(b' edited')
+    assert not _open(output_dir, source).resuming
+
+
+def test_corrupted_checkpoint_file_starts_over(tmp_path, source):
+    output_dir = tmp_path / 'out'
+    output_dir.mkdir()
+    (output_dir / CHECKPOINT_NAME).write_text('{"key": ', encoding='utf-8')
+
+    checkpoint = _open(output_dir, source)
+    assert not checkpoint.resuming
+    assert checkpoint.chunks == {}
+
+
+def test_record_writes_checkpoint_atomically(tmp_path, source):
+    output_dir = tmp_path / 'out'
+    output_dir.mkdir()
+    _write_chunks(output_dir, _open(output_dir, source, resume=False), 2)
+
+    data = json.loads((output_dir / CHECKPOINT_NAME).read_text(encoding='utf-8'))
+    assert sorted(data['chunks']) == ['1', '2']
+    assert data['chunks']['2']['file'] == 'input (2).docx'
+    assert [p.name for p in output_dir.iterdir() if p.name.endswith('.tmp')] == []
+
+
+def test_extract_resume_arg():
+    assert extract_resume_arg(['split.py', '--resume', 'in.docx']) == (['split.py', 'in.docx'], True)
+    assert extract_resume_arg(['split.py']) == (['split.py'], False)
+
+
+def test_python_docx_split_resumes_missing_chunks(sample_docx, tmp_path, capsys):
+    output_dir = tmp_path / 'out'
+    split_docx_by_sections(sample_docx, str(output_dir), 1, 'doc', workers=1)
+    kept = output_dir / 'doc (第1页).docx'
+    kept_mtime = os.path.getmtime(kept)
+    os.remove(output_dir / 'doc (第2页).docx')
+    capsys.readouterr()
+
+    split_docx_by_sections(sample_docx, str(output_dir), 1, 'doc', workers=1, resume=True)
+    out = capsys.readouterr().out
+
+    assert '已完成（断点）: doc (第1页).docx' in out
+    assert '已保存: doc (第2页).docx' in out
+    assert os.path.getmtime(kept) == kept_mtime
+    assert (output_dir / 'doc (第2页).docx').exists()
+
+
+def test_split_hashes_the_input_once(sample_docx, tmp_path, monkeypatch):
+    hashed = []
+
+    def counting_hash(path):
+        hashed.append(path)
+        return compute_content_hash(path)
+
+    monkeypatch.setattr(split_result_cache, 'compute_content_hash', counting_hash)
+    monkeypatch.setattr(split_checkpoint, 'compute_content_hash', counting_hash)
+    split_docx_by_sections(sample_docx, str(tmp_path / 'out'), 1, 'doc', workers=1)
+
+    # 断点只为写出的分块计算哈希，输入文件只在拆分入口哈希一次
+    assert hashed.count(sample_docx) == 1
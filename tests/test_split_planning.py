@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""python-docx 拆分的分块规划测试"""
+
+import os
+
+from docx import Document
+
+from docx_page_map import PageMap
+from split_docx_pages_python_docx import plan_chunks, split_docx_by_sections
+
+
+def _planned(chunks):
+    return [(start, end, name) for _, start, end, _, name in chunks]
+
+
+def test_plan_chunks_by_stride(tmp_path):
+    # 第3页没有块起始（第2页的块延续过来），均分时跳过
+    page_map = PageMap(block_pages=[1, 1, 2, 4], total_pages=4, method='metrics')
+    chunks = plan_chunks(page_map, 1, str(tmp_path), 'doc')
+
+    assert _planned(chunks) == [
+        (0, 2, 'doc (第1页).docx'),
+        (2, 3, 'doc (第2页).docx'),
+        (3, 4, 'doc (第4页).docx'),
+    ]
+    assert [index for index, _, _, _, _ in chunks] == [1, 2, 3]
+    assert all(path == os.path.join(str(tmp_path), name) for _, _, _, path, name in chunks)
+
+
+def test_plan_chunks_page_ranges(tmp_path):
+    page_map = PageMap(block_pages=[1, 1, 2, 3, 3, 4], total_pages=4, method='estimated')
+    chunks = plan_chunks(page_map, 2, str(tmp_path), 'doc', page_ranges=[(3, 4), (1, 1)])
+
+    assert _planned(chunks) == [
+        (3, 6, 'doc (第3-4页).docx'),
+        (0, 2, 'doc (第1页).docx'),
+    ]
+
+
+def test_plan_chunks_page_range_without_block_start(tmp_path):
+    # 指定的页没有块起始时向前扩展到延续过来的块；超出总页数的范围截断或丢弃
+    page_map = PageMap(block_pages=[1, 2, 2, 5], total_pages=5, method='metrics')
+    chunks = plan_chunks(page_map, 1, str(tmp_path), 'doc', page_ranges=[(3, 4), (5, 9), (8, 9)])
+
+    assert _planned(chunks) == [
+        (1, 3, 'doc (第3-4页).docx'),
+        (3, 4, 'doc (第5页).docx'),
+    ]
+
+
+def test_split_writes_only_requested_pages(sample_docx, tmp_path, capsys):
+    output_dir = str(tmp_path / 'out')
+    split_docx_by_sections(sample_docx, output_dir, 1, 'doc', workers=1, page_ranges=[(2, 2)])
+
+    assert [name for name in os.listdir(output_dir) if name.endswith('.docx')] == ['doc (第2页).docx']
+    paragraphs = [p.text for p in Document(os.path.join(output_dir, 'doc (第2页).docx')).paragraphs]
+    assert paragraphs[0] == '第3段'
+    assert 'PROGRESS:TOTAL_FILES:1' in capsys.readouterr().out
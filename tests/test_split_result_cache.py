@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""拆分结果缓存的测试"""
+
+import os
+
+import pytest
+
+import split_result_cache
+from excel_sidecar import compute_content_hash
+from split_result_cache import cached_split_result, skip_result_cache
+from split_docx_pages_python_docx import split_docx_by_sections
+
+
+@pytest.fixture
+def result_cache(tmp_path, monkeypatch):
+    """打开拆分结果缓存（conftest 默认关闭），缓存目录放在临时目录"""
+    cache_dir = tmp_path / 'split-cache'
+    monkeypatch.setenv('SPLIT_RESULT_CACHE', '1')
+    monkeypatch.setenv('SPLIT_RESULT_CACHE_DIR', str(cache_dir))
+    return cache_dir
+
+
+@pytest.fixture
+def input_file(tmp_path):
+    path = tmp_path / 'input.docx'
+    path.write_bytes(b'not really a docx')
+    return str(path)
+
+
+def _fake_splitter(calls, fail=False, skip=None):
+    """每页一个文件的假拆分函数，记录每次调用收到的 content_hash"""
+    @cached_split_result('fake')
+    def split(input_path, output_dir, pages_per_file, original_filename=None, page_ranges=None,
+              content_hash=None):
+        calls.append(content_hash)
+        os.makedirs(output_dir, exist_ok=True)
+        print(f"PROGRESS:TOTAL_FILES:{pages_per_file}")
+        for index in range(1, pages_per_file + 1):
+            print(f"PROGRESS:FILE_START:{index}:{pages_per_file}")
+            with open(os.path.join(output_dir, f'{original_filename}-{index}.docx'), 'w') as f:
+                f.write(f'chunk {index}')
+            print(f"PROGRESS:FILE_COMPLETE:{index}:{pages_per_file}")
+        with open(os.path.join(output_dir, '.split-checkpoint.json'), 'w') as f:
+            f.write('{}')
+        if fail:
+            print("PROGRESS:FILE_ERROR:1:boom")
+        if skip:
+            skip_result_cache(skip)
+        print(f"PROGRESS:ALL_FILES_COMPLETE:{pages_per_file}:{pages_per_file}")
+        return 'done'
+    return split
+
+
+def _progress(out: str):
+    return [line for line in out.splitlines() if line.startswith('PROGRESS:')]
+
+
+def test_hit_links_files_and_replays_progress(result_cache, input_file, tmp_path, capsys):
+    calls = []
+    split = _fake_splitter(calls)
+    first_dir, second_dir = str(tmp_path / 'first'), str(tmp_path / 'second')
+
+    assert split(input_file, first_dir, 2, 'doc') == 'done'
+    first_progress = _progress(capsys.readouterr().out)
+    assert split(input_file, second_dir, 2, 'doc') is None
+    out = capsys.readouterr().out
+
+    assert len(calls) == 1
+    assert '命中拆分结果缓存' in out
+    assert _progress(out) == first_progress
+    # 缓存只收录输出文件，不收录以点开头的断点文件；命中时与缓存共用inode
+    assert sorted(os.listdir(second_dir)) == ['doc-1.docx', 'doc-2.docx']
+    assert os.path.samefile(os.path.join(first_dir, 'doc-1.docx'), os.path.join(second_dir, 'doc-1.docx'))
+
+
+def test_parameters_are_part_of_the_key(result_cache, input_file, tmp_path):
+    calls = []
+    split = _fake_splitter(calls)
+    output_dir = str(tmp_path / 'out')
+
+    split(input_file, output_dir, 2, 'doc')
+    split(input_file, output_dir, 3, 'doc')
+    split(input_file, output_dir, 3, 'other')
+    split(input_file, output_dir, 3, 'other', page_ranges=[(1, 2)])
+    assert len(calls) == 4
+
+    with open(input_file, 'ab') as f:
+        f.write(b'!')
+    split(input_file, output_dir, 2, 'doc')
+    assert len(calls) == 5
+
+
+@pytest.mark.parametrize('fail, skip', [(True, None), (False, '页码为估算值')])
+def test_failed_or_skipped_results_are_not_stored(result_cache, input_file, tmp_path, capsys, fail, skip):
+    calls = []
+    split = _fake_splitter(calls, fail=fail, skip=skip)
+
+    split(input_file, str(tmp_path / 'out'), 1, 'doc')
+    assert '本次结果不写入拆分结果缓存' in capsys.readouterr().out
+    split(input_file, str(tmp_path / 'out'), 1, 'doc')
+    assert len(calls) == 2
+
+
+def test_input_is_hashed_once(result_cache, input_file, tmp_path, monkeypatch):
+    hashed = []
+
+    def counting_hash(path):
+        hashed.append(path)
+        return compute_content_hash(path)
+
+    monkeypatch.setattr(split_result_cache, 'compute_content_hash', counting_hash)
+    calls = []
+    split = _fake_splitter(calls)
+
+    split(input_file, str(tmp_path / 'out'), 1, 'doc')
+    assert hashed == [input_file]
+    assert calls == [compute_content_hash(input_file)]
+
+    # 调用方已有哈希时不再读取输入文件
+    split(input_file, str(tmp_path / 'out'), 2, 'doc', content_hash=calls[0])
+    assert hashed == [input_file]
+    assert calls[1] == calls[0]
+
+
+def test_hash_is_passed_when_cache_is_off(input_file, tmp_path):
+    calls = []
+    split = _fake_splitter(calls)
+
+    split(input_file, str(tmp_path / 'out'), 1, 'doc')
+    split(input_file, str(tmp_path / 'out'), 1, 'doc')
+    assert calls == [compute_content_hash(input_file)] * 2
+
+
+def test_python_docx_split_hit(result_cache, sample_docx, tmp_path, capsys):
+    split_docx_by_sections(sample_docx, str(tmp_path / 'first'), 1, 'doc', workers=1)
+    first_progress = _progress(capsys.readouterr().out)
+
+    split_docx_by_sections(sample_docx, str(tmp_path / 'second'), 1, 'doc', workers=1)
+    out = capsys.readouterr().out
+
+    assert '命中拆分结果缓存' in out
+    assert '开始拆分文档' not in out
+    assert _progress(out) == first_progress
+    assert sorted(os.listdir(str(tmp_path / 'second'))) == ['doc (第1页).docx', 'doc (第2页).docx']
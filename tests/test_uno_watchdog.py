@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""UNO调用截止时间和 soffice 回收的测试（用命令行像 soffice 的假进程代替 LibreOffice）"""
+
+import shutil
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+import uno_watchdog
+from uno_watchdog import UnoDeadlineExceeded, UnoWatchdog, kill_soffice
+
+needs_pkill = pytest.mark.skipif(shutil.which('pkill') is None or sys.platform == 'win32',
+                                 reason='回收 soffice 需要 pkill')
+
+
+def _unused_port() -> int:
+    with socket.create_server(('127.0.0.1', 0)) as server:
+        return server.getsockname()[1]
+
+
+@pytest.fixture
+def fake_soffice():
+    """命令行与 soffice --accept=... 相同的进程，kill_soffice 按端口能匹配到它"""
+    port = _unused_port()
+    process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)', 'soffice', '--headless',
+                                f'--accept=socket,host=127.0.0.1,port={port};urp;'])
+    yield process, port
+    if process.poll() is None:
+        process.kill()
+        process.wait()
+
+
+@pytest.fixture
+def short_timeouts(monkeypatch):
+    monkeypatch.setenv('LIBREOFFICE_CALL_TIMEOUT', '0.3')
+    monkeypatch.setenv('LIBREOFFICE_LOAD_TIMEOUT', '0.6')
+    monkeypatch.setenv('LIBREOFFICE_RESTART_TIMEOUT', '0.3')
+
+
+def test_timeouts_from_environment(monkeypatch):
+    monkeypatch.setenv('LIBREOFFICE_CALL_TIMEOUT', '5')
+    monkeypatch.setenv('LIBREOFFICE_LOAD_TIMEOUT', 'slow')
+    monkeypatch.setenv('LIBREOFFICE_RESTART_TIMEOUT', '-1')
+    watchdog = UnoWatchdog()
+    assert (watchdog.call_timeout, watchdog.load_timeout, watchdog.restart_timeout) == (5, 180, 90)
+
+
+def test_for_bridge_uses_bridge_address():
+    class Bridge:
+        host, port = '127.0.0.1', 2103
+
+    watchdog = UnoWatchdog.for_bridge(Bridge())
+    assert (watchdog.host, watchdog.port) == ('127.0.0.1', 2103)
+    watchdog = UnoWatchdog.for_bridge()
+    assert (watchdog.host, watchdog.port) == ('localhost', 2002)
+
+
+def test_fast_call_is_untouched(fake_soffice, short_timeouts):
+    process, port = fake_soffice
+    with UnoWatchdog('127.0.0.1', port) as watchdog:
+        with watchdog.deadline('getPage'):
+            pass
+        with pytest.raises(KeyError):
+            with watchdog.deadline('getPage'):
+                raise KeyError('普通异常原样抛出')
+    assert watchdog.recycles == 0
+    assert process.poll() is None
+
+
+@needs_pkill
+def test_hung_call_kills_soffice(fake_soffice, short_timeouts):
+    process, port = fake_soffice
+    started = time.monotonic()
+    with UnoWatchdog('127.0.0.1', port) as watchdog:
+        with pytest.raises(UnoDeadlineExceeded) as exc_info:
+            with watchdog.deadline('storeToURL'):
+                # 阻塞的远程调用在 soffice 被结束后因连接断开而抛出
+                process.wait(10)
+                raise RuntimeError('DisposedException')
+
+    assert time.monotonic() - started < 5
+    assert process.returncode == -9
+    assert exc_info.value.recycled
+    assert exc_info.value.operation == 'storeToURL'
+    assert isinstance(exc_info.value.__cause__, RuntimeError)
+    assert watchdog.recycles == 1
+
+
+@needs_pkill
+def test_call_returning_after_expiry_still_fails(fake_soffice, short_timeouts):
+    process, port = fake_soffice
+    with UnoWatchdog('127.0.0.1', port) as watchdog:
+        with pytest.raises(UnoDeadlineExceeded):
+            with watchdog.deadline('loadComponentFromURL', watchdog.load_timeout):
+                process.wait(10)
+    assert watchdog.recycles == 1
+
+
+def test_remote_soffice_is_not_killed(fake_soffice, short_timeouts):
+    process, port = fake_soffice
+    assert not kill_soffice('10.0.0.5', port)
+
+    with UnoWatchdog('10.0.0.5', port) as watchdog:
+        with pytest.raises(UnoDeadlineExceeded) as exc_info:
+            with watchdog.deadline('getPage', 0.1):
+                time.sleep(0.4)
+    assert not exc_info.value.recycled
+    assert watchdog.recycles == 0
+    assert process.poll() is None
+
+
+@needs_pkill
+def test_kill_soffice_matches_port_only(fake_soffice):
+    process, port = fake_soffice
+    assert not kill_soffice('127.0.0.1', _unused_port())
+    assert process.poll() is None
+    assert kill_soffice('localhost', port)
+    assert process.wait(5) == -9
+
+
+class _Bridge:
+    def __init__(self, ready_after: int):
+        self.ready_after = ready_after
+        self.ensured = 0
+        self.resets = 0
+        self.desktop = None
+
+    def reset(self):
+        self.resets += 1
+        self.desktop = None
+
+    def ensure(self):
+        self.ensured += 1
+        if self.ensured >= self.ready_after:
+            self.desktop = 'desktop'
+            return True
+        return False
+
+
+def test_wait_for_restart_reconnects_bridge(short_timeouts, monkeypatch):
+    monkeypatch.setattr(uno_watchdog, 'RECONNECT_INTERVAL', 0.01)
+    bridge = _Bridge(ready_after=3)
+    assert UnoWatchdog().wait_for_restart(bridge) == 'desktop'
+    assert bridge.resets == 1 and bridge.ensured == 3
+
+
+def test_wait_for_restart_gives_up(short_timeouts, monkeypatch):
+    monkeypatch.setattr(uno_watchdog, 'RECONNECT_INTERVAL', 0.01)
+    with pytest.raises(ConnectionError):
+        UnoWatchdog().wait_for_restart(_Bridge(ready_after=10 ** 6))